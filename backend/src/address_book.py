@@ -0,0 +1,235 @@
+"""
+Persistent Address Book for the P2P Network
+
+Keeps every peer address this node has heard of together with its reconnect
+state and the last time it was seen alive, so failed peers are retried with
+exponential backoff instead of being forgotten, known peers survive a restart,
+and peer exchange can hand out fresh random samples.
+
+Author: LunaLynx12
+"""
+
+
+from config import (
+    P2P_BACKOFF_BASE,
+    P2P_BACKOFF_MAX,
+    P2P_ADDRESS_BOOK_SIZE,
+    P2P_ADDRESS_HORIZON,
+)
+from typing import Dict, List, Optional, Set, Tuple
+import random
+import json
+import time
+import os
+
+
+Address = Tuple[str, int]
+
+
+class AddressBook:
+    """
+    Known peer addresses with per-address backoff state, stored as JSON on disk.
+
+    Each entry tracks:
+        - attempts: consecutive failed dials since the last success
+        - next_attempt: earliest UNIX time the address may be dialed again
+        - last_success: UNIX time of the last successful handshake (0 if never)
+        - last_seen: UNIX time the address was last known to be alive, by us or a peer
+        - banned_until: UNIX time until which the address is refused for misbehaving (0 if never)
+
+    `version` increases whenever a new address is learned, which lets peer
+    exchange skip rounds in which nothing changed.
+    """
+    def __init__(self, path: Optional[str] = None, max_size: int = P2P_ADDRESS_BOOK_SIZE):
+        """
+        Initializes the address book and loads any entries already on disk.
+
+        param path: JSON file backing the address book, or None to keep it in memory only
+        type path: Optional[str]
+        param max_size: Number of addresses kept before the stalest are evicted
+        type max_size: int
+        """
+        self.path = path
+        self.max_size = max_size
+        self.entries: Dict[Address, Dict[str, float]] = {}
+        self.version = 0
+        self.dirty = False
+        self.load()
+
+    def add(self, address: Address, last_seen: float = 0.0) -> bool:
+        """
+        Adds an address, or refreshes its last-seen time if it is already known.
+
+        param address: (host, port) of the peer's P2P listener
+        type address: Tuple[str, int]
+        param last_seen: UNIX time the address was last known alive, 0 if unknown
+        type last_seen: float
+        return: True if the address was new
+        """
+        last_seen = min(last_seen, time.time())
+        entry = self.entries.get(address)
+        if entry is not None:
+            if last_seen > entry["last_seen"]:
+                entry["last_seen"] = last_seen
+                self.dirty = True
+            return False
+        if len(self.entries) >= self.max_size and not self._evict():
+            return False
+        self.entries[address] = {
+            "attempts": 0, "next_attempt": 0.0, "last_success": 0.0, "last_seen": last_seen, "banned_until": 0.0
+        }
+        self.version += 1
+        self.dirty = True
+        return True
+
+    def remove(self, address: Address):
+        """Forgets an address entirely (used for our own listener)."""
+        if self.entries.pop(address, None) is not None:
+            self.dirty = True
+
+    def touch(self, address: Address):
+        """Marks a connected address as seen right now."""
+        self.add(address, time.time())
+
+    def mark_success(self, address: Address):
+        """
+        Resets the backoff of an address after a completed handshake.
+
+        param address: (host, port) that was dialed successfully
+        type address: Tuple[str, int]
+        """
+        self.touch(address)
+        entry = self.entries[address]
+        entry["attempts"] = 0
+        entry["next_attempt"] = 0.0
+        entry["last_success"] = time.time()
+        self.dirty = True
+
+    def mark_failure(self, address: Address) -> float:
+        """
+        Schedules the next dial of an address using exponential backoff with jitter.
+
+        The delay doubles with every consecutive failure up to P2P_BACKOFF_MAX and
+        is then drawn uniformly from [delay / 2, delay] so that nodes which lost the
+        same peer do not all redial it at the same instant.
+
+        param address: (host, port) that could not be reached
+        type address: Tuple[str, int]
+        return: Chosen delay in seconds
+        """
+        self.add(address)
+        entry = self.entries[address]
+        entry["attempts"] += 1
+        delay = min(P2P_BACKOFF_MAX, P2P_BACKOFF_BASE * 2 ** (entry["attempts"] - 1))
+        delay = random.uniform(delay / 2, delay)
+        entry["next_attempt"] = time.time() + delay
+        self.dirty = True
+        return delay
+
+    def ban(self, address: Address, duration: float):
+        """
+        Refuses an address for a while after its node misbehaved.
+
+        param address: (host, port) of the misbehaving peer
+        type address: Tuple[str, int]
+        param duration: Seconds the ban lasts
+        type duration: float
+        """
+        self.add(address)
+        entry = self.entries[address]
+        entry["banned_until"] = time.time() + duration
+        entry["next_attempt"] = max(entry["next_attempt"], entry["banned_until"])
+        self.dirty = True
+
+    def is_banned(self, address: Address) -> bool:
+        """True while a ban placed on the address is in force."""
+        entry = self.entries.get(address)
+        return entry is not None and entry["banned_until"] > time.time()
+
+    def candidates(self, exclude: Set[Address]) -> List[Address]:
+        """
+        Returns addresses that are due for a dial attempt.
+
+        Addresses with a recent successful handshake come first, the rest are shuffled.
+
+        param exclude: Addresses already connected or being dialed
+        type exclude: Set[Tuple[str, int]]
+        return: Dialable addresses, best candidates first
+        """
+        now = time.time()
+        due = [
+            address for address, entry in self.entries.items()
+            if address not in exclude and entry["next_attempt"] <= now
+        ]
+        random.shuffle(due)
+        due.sort(key=lambda address: self.entries[address]["last_success"], reverse=True)
+        return due
+
+    def sample(self, count: int, exclude: Set[Address]) -> List[Tuple[str, int, float]]:
+        """
+        Draws a random subset of recently seen addresses for peer exchange.
+
+        Addresses not seen within P2P_ADDRESS_HORIZON are never handed out.
+
+        param count: Maximum number of addresses to return
+        type count: int
+        param exclude: Addresses that must not be included (e.g. the recipient itself)
+        type exclude: Set[Tuple[str, int]]
+        return: List of (host, port, last_seen) tuples
+        """
+        horizon = time.time() - P2P_ADDRESS_HORIZON
+        fresh = [
+            (host, port, entry["last_seen"])
+            for (host, port), entry in self.entries.items()
+            if (host, port) not in exclude and entry["last_seen"] >= horizon
+        ]
+        return random.sample(fresh, min(count, len(fresh)))
+
+    def _evict(self) -> bool:
+        """
+        Drops the stalest address that has never been connected to.
+
+        return: True if room was made for a new address
+        """
+        unproven = [address for address, entry in self.entries.items() if not entry["last_success"]]
+        if not unproven:
+            return False
+        stalest = min(unproven, key=lambda address: (self.entries[address]["last_seen"], -self.entries[address]["attempts"]))
+        del self.entries[stalest]
+        return True
+
+    def load(self):
+        """Loads entries from disk, ignoring a missing or corrupt file."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                stored = json.load(f)
+            for item in stored[:self.max_size]:
+                self.entries[(item["host"], int(item["port"]))] = {
+                    "attempts": int(item.get("attempts", 0)),
+                    "next_attempt": float(item.get("next_attempt", 0.0)),
+                    "last_success": float(item.get("last_success", 0.0)),
+                    "last_seen": float(item.get("last_seen", 0.0)),
+                    "banned_until": float(item.get("banned_until", 0.0)),
+                }
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"[AddressBook] Ignoring unreadable address book {self.path}: {e}")
+
+    def save(self):
+        """Writes all entries to disk atomically."""
+        if not self.path:
+            self.dirty = False
+            return
+        folder = os.path.dirname(self.path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        stored = [
+            {"host": host, "port": port, **entry}
+            for (host, port), entry in self.entries.items()
+        ]
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(stored, f)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
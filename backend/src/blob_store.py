@@ -0,0 +1,265 @@
+"""
+Content-Addressed Blob Store
+
+Message payloads live off-chain in this store instead of inside transactions
+and the messages table. A blob is identified by the SHA-256 of its content and
+kept as fixed-size chunks, each stored once under its own SHA-256, so equal
+content and shared chunks are deduplicated. SQLite holds the manifests and the
+reference counts; the chunk files are deleted once nothing references them.
+Nodes missing a blob fetch it from their peers on demand (see p2p_node.py).
+
+Author: LunaLynx12
+"""
+
+
+from local_database import (
+    add_blob_reference, get_blob_manifest, release_blob_reference, pin_blob_chunk, release_blob_chunks, delete_unreferenced_chunk,
+)
+from config import BLOB_DIR, BLOB_CHUNK_SIZE
+from typing import Iterator, List, Optional, Tuple
+import hashlib
+import uuid
+import os
+import re
+
+
+BLOB_HASH_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+class BlobWriter:
+    """
+    Writes a blob of unknown size piece by piece.
+
+    Data is cut into chunks as it arrives and every chunk goes to disk right
+    away, so memory stays at one chunk whatever the blob size. Each chunk is
+    pinned in the database before its file is written, so it survives the
+    release of other blobs sharing it; the blob itself is only registered by
+    close(), and abort() drops the pins.
+    """
+    def __init__(self, store: "BlobStore"):
+        self.store = store
+        self.size = 0
+        self.chunks: List[Tuple[str, int]] = []
+        self._digest = hashlib.sha256()
+        self._buffer = bytearray()
+        self._closed = False
+        self._registered = False
+
+    def write(self, data: bytes):
+        """
+        Appends data to the blob.
+
+        param data: Next bytes of the blob
+        type data: bytes
+        """
+        if self._closed:
+            raise ValueError("Blob writer already closed")
+        self._digest.update(data)
+        self.size += len(data)
+        self._buffer += data
+        while len(self._buffer) >= self.store.chunk_size:
+            self._flush(bytes(self._buffer[:self.store.chunk_size]))
+            del self._buffer[:self.store.chunk_size]
+
+    def close(self, expected_hash: Optional[str] = None) -> str:
+        """
+        Writes the last chunk and registers the blob.
+
+        param expected_hash: Hash the content must have, for blobs received from peers
+        type expected_hash: Optional[str]
+        return: SHA-256 of the blob, hex
+        rtype: str
+        raises ValueError: If the content does not match expected_hash
+        """
+        if self._closed:
+            raise ValueError("Blob writer already closed")
+        self._closed = True
+        if self._buffer:
+            self._flush(bytes(self._buffer))
+            self._buffer.clear()
+        blob_hash = self._digest.hexdigest()
+        if expected_hash is not None and blob_hash != expected_hash:
+            self.abort()
+            raise ValueError(f"Blob content does not match {expected_hash[:16]}")
+        try:
+            unused = add_blob_reference(blob_hash, self.size, self.chunks)
+        except Exception:
+            self.abort()
+            raise
+        self._registered = True
+        for chunk_hash in unused:
+            self.store._delete_chunk(chunk_hash)
+        return blob_hash
+
+    def abort(self):
+        """Drops the pins of the chunks written so far, deleting those no stored blob uses."""
+        self._closed = True
+        if self._registered or not self.chunks:
+            return
+        unused = release_blob_chunks([chunk_hash for chunk_hash, _ in self.chunks])
+        self.chunks.clear()
+        for chunk_hash in unused:
+            self.store._delete_chunk(chunk_hash)
+
+    def _flush(self, chunk: bytes):
+        chunk_hash = hashlib.sha256(chunk).hexdigest()
+        pin_blob_chunk(chunk_hash, len(chunk))
+        self.chunks.append((chunk_hash, len(chunk)))
+        self.store._write_chunk(chunk_hash, chunk)
+
+
+class BlobStore:
+    """
+    Chunked, deduplicated, reference-counted storage of blobs by SHA-256.
+
+    Features:
+        - put() and writer() register one reference per call; release() drops one
+        - Chunk files shared between blobs are stored once
+        - Reads verify every chunk against its hash
+        - Blocking file and sqlite calls; run them through the executor's I/O pool
+    """
+    def __init__(self, root: str = BLOB_DIR, chunk_size: int = BLOB_CHUNK_SIZE):
+        """
+        Initializes the store.
+
+        param root: Directory holding the chunk files
+        type root: str
+        param chunk_size: Bytes per chunk
+        type chunk_size: int
+        """
+        self.root = root
+        self.chunk_size = chunk_size
+
+    def writer(self) -> BlobWriter:
+        """Returns a writer for a new blob."""
+        return BlobWriter(self)
+
+    def put(self, data: bytes) -> str:
+        """
+        Stores a blob, or adds a reference to it if it is already stored.
+
+        param data: Blob content
+        type data: bytes
+        return: SHA-256 of the blob, hex
+        rtype: str
+        """
+        writer = self.writer()
+        writer.write(data)
+        return writer.close()
+
+    def has(self, blob_hash: str) -> bool:
+        return get_blob_manifest(blob_hash) is not None
+
+    def size(self, blob_hash: str) -> Optional[int]:
+        manifest = get_blob_manifest(blob_hash)
+        return manifest[0] if manifest else None
+
+    def chunk_count(self, blob_hash: str) -> Optional[int]:
+        manifest = get_blob_manifest(blob_hash)
+        return len(manifest[1]) if manifest else None
+
+    def read_chunk(self, blob_hash: str, index: int) -> Optional[bytes]:
+        """
+        Reads one chunk of a blob.
+
+        param blob_hash: SHA-256 of the blob, hex
+        type blob_hash: str
+        param index: Chunk position within the blob
+        type index: int
+        return: Chunk data, or None if the blob or the chunk is not stored
+        rtype: Optional[bytes]
+        raises ValueError: If the chunk file is corrupt
+        """
+        manifest = get_blob_manifest(blob_hash)
+        if manifest is None or not 0 <= index < len(manifest[1]):
+            return None
+        chunk_hash = manifest[1][index]
+        try:
+            with open(self._chunk_path(chunk_hash), "rb") as f:
+                chunk = f.read()
+        except FileNotFoundError:
+            return None
+        if hashlib.sha256(chunk).hexdigest() != chunk_hash:
+            raise ValueError(f"Chunk {chunk_hash[:16]} is corrupt")
+        return chunk
+
+    def iter_chunks(self, blob_hash: str) -> Iterator[bytes]:
+        """
+        Yields the chunks of a blob in order.
+
+        param blob_hash: SHA-256 of the blob, hex
+        type blob_hash: str
+        return: Iterator over the blob's chunks, empty if the blob is not stored
+        """
+        count = self.chunk_count(blob_hash) or 0
+        for index in range(count):
+            chunk = self.read_chunk(blob_hash, index)
+            if chunk is None:
+                raise ValueError(f"Chunk {index} of blob {blob_hash[:16]} is missing")
+            yield chunk
+
+    def get(self, blob_hash: str) -> Optional[bytes]:
+        """
+        Reads a whole blob; use iter_chunks for large ones.
+
+        param blob_hash: SHA-256 of the blob, hex
+        type blob_hash: str
+        return: Blob content, or None if it is not stored
+        rtype: Optional[bytes]
+        """
+        if not self.has(blob_hash):
+            return None
+        return b"".join(self.iter_chunks(blob_hash))
+
+    def release(self, blob_hash: str):
+        """
+        Drops one reference to a blob, deleting its unshared chunks once it is unreferenced.
+
+        param blob_hash: SHA-256 of the blob, hex
+        type blob_hash: str
+        """
+        for chunk_hash in release_blob_reference(blob_hash):
+            self._delete_chunk(chunk_hash)
+
+    def _chunk_path(self, chunk_hash: str) -> str:
+        return os.path.join(self.root, chunk_hash[:2], chunk_hash)
+
+    def _write_chunk(self, chunk_hash: str, chunk: bytes):
+        # The caller pinned the chunk, so an existing file can no longer be deleted under us
+        path = self._chunk_path(chunk_hash)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written under a unique name and renamed, so readers never see a partial chunk
+        temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(chunk)
+        os.replace(temporary, path)
+
+    def _delete_chunk(self, chunk_hash: str):
+        # Another blob or writer may have started using the chunk since it was released
+        delete_unreferenced_chunk(chunk_hash, lambda: self._remove_chunk_file(chunk_hash))
+
+    def _remove_chunk_file(self, chunk_hash: str):
+        try:
+            os.remove(self._chunk_path(chunk_hash))
+        except FileNotFoundError:
+            pass
+
+
+_blob_store: Optional[BlobStore] = None
+"""
+Blob store of this process, created on first use.
+"""
+
+def get_blob_store() -> BlobStore:
+    """
+    Returns the blob store of this process.
+
+    return: Shared BlobStore instance
+    rtype: BlobStore
+    """
+    global _blob_store
+    if _blob_store is None:
+        _blob_store = BlobStore()
+    return _blob_store
@@ -9,11 +9,13 @@ Author: LunaLynx12
 
 
 from pydantic import BaseModel, Field, field_validator, model_validator
-from dilithium_py.dilithium import Dilithium2 as Dilithium
-from config import VALIDATORS, MAX_TRANSACTIONS_PER_BLOCK
-from typing import List, Dict, Optional
-from datetime import datetime
-from fastapi import WebSocket
+from validator_registry import ValidatorRegistry, get_validator_registry, verify_block_header
+from config import MAX_TRANSACTIONS_PER_BLOCK, SEEN_TX_CACHE_SIZE, GENESIS_TIMESTAMP, LEADER_TIMEOUT, CLOCK_SKEW_TOLERANCE
+from typing import Any, Callable, List, Dict, Optional, Tuple
+from pqc_backend import get_backend
+from collections import ChainMap, OrderedDict
+from datetime import datetime, timedelta
+from fastapi import HTTPException, WebSocket
 from threading import Lock
 import asyncio
 import hashlib
@@ -21,17 +23,23 @@ import base64
 import json
 
 
+MESSAGE_TYPES = ("PUBLIC_MESSAGE", "PRIVATE_MESSAGE", "GROUP_MESSAGE")
+"""
+Transaction types sent by a registered account and checked against its registered key.
+"""
+
+
 class Transaction(BaseModel):
     """
     Represents a single transaction in the blockchain.
 
     Attributes:
-        tx_type (str): Type of transaction - must be one of: REGISTER, PUBLIC_MESSAGE, GENESIS
+        tx_type (str): Type of transaction - must be one of: REGISTER, PUBLIC_MESSAGE, PRIVATE_MESSAGE, GROUP_MESSAGE, GENESIS
         sender (str): Wallet address of the sender
         receiver (str): Wallet address of the recipient (can be empty for system-level transactions)
         data (Dict[str, str]): Payload data such as keys or message hashes
     """
-    tx_type: str = Field(..., pattern="^(REGISTER|PUBLIC_MESSAGE|PRIVATE_MESSAGE|GENESIS)$")
+    tx_type: str = Field(..., pattern="^(REGISTER|PUBLIC_MESSAGE|PRIVATE_MESSAGE|GROUP_MESSAGE|GENESIS)$")
     sender: str                                                                     # Wallet address
     receiver: str                                                                   # Can be empty for system-level transactions
     data: Dict[str, str]                                                            # Payload like keys or message hashes
@@ -51,6 +59,17 @@ class Transaction(BaseModel):
             raise ValueError("Data must be a dictionary")
         return {k: str(v) for k, v in v.items()}
 
+    def compute_hash(self) -> str:
+        """
+        Computes the SHA-256 hash identifying this transaction.
+
+        Used to deduplicate transactions in the mempool and in P2P gossip.
+
+        return: Hex-encoded SHA-256 hash string
+        """
+        serialized = json.dumps(self.model_dump(), sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(serialized.encode()).hexdigest()
+
 class Block(BaseModel):
     """
     Represents a single block in the blockchain.
@@ -62,6 +81,7 @@ class Block(BaseModel):
         prev_hash (str): SHA-256 hash of the previous block (exactly 64 characters)
         timestamp (str): UTC timestamp when block was created (ISO format)
         hash (str): SHA-256 hash of the block contents (computed automatically)
+        signature (str): Base64 Dilithium signature of the hash by the validator (not part of the hash)
     """
     index: int = Field(..., ge=0)
     validator: str
@@ -69,6 +89,7 @@ class Block(BaseModel):
     prev_hash: str = Field(..., min_length=64, max_length=64)
     timestamp: str = Field(default_factory=lambda: datetime.utcnow().isoformat())
     hash: str = ""                                                                  # Allow empty initially
+    signature: str = ""                                                             # Set by the validator after hashing
 
     @model_validator(mode='after')
     def compute_hash_after_validation(self) -> 'Block':
@@ -87,7 +108,7 @@ class Block(BaseModel):
 
         return: Hex-encoded SHA-256 hash string
         """
-        block_data = self.model_dump(exclude={"hash"})
+        block_data = self.model_dump(exclude={"hash", "signature"})
         serialized = json.dumps(block_data, sort_keys=True, separators=(',', ':'))
         return hashlib.sha256(serialized.encode()).hexdigest()
     
@@ -101,18 +122,34 @@ class Blockchain:
         - Chain validation
         - Secure signing/verification using Dilithium
     """
-    def __init__(self):
+    def __init__(self, validators: Optional[ValidatorRegistry] = None):
         """
         Initializes a new blockchain instance with:
             - Genesis block
             - Empty pending transaction pool
             - Thread locks for safe concurrent access
+
+        param validators: Validator registry used to sign and verify blocks, defaults to the shared one
+        type validators: Optional[ValidatorRegistry]
         """
+        self.validators = validators if validators is not None else get_validator_registry()
         self._chain_lock = Lock()
         self._pending_lock = Lock()
         self.chain: List[Block] = [self._create_genesis_block()]
         self.pending_transactions: List[Transaction] = []
         self.subscribers: List[WebSocket] = []
+        self.transaction_listeners: List[Callable[[Transaction, Any], None]] = []
+        self.block_listeners: List[Callable[[Block, Any], None]] = []
+        self.tip_listeners: List[Callable[[Block, Any], None]] = []
+        # Hashes of recently admitted transactions; only transactions that passed
+        # validation get here, so it doubles as the "already verified" cache
+        self._seen_transactions: "OrderedDict[str, None]" = OrderedDict()
+        # Dilithium key of every registered address with the height of its first REGISTER,
+        # and the keys of REGISTER transactions still waiting in the mempool
+        self.account_keys: Dict[str, Tuple[str, int]] = {}
+        self._pending_keys: Dict[str, str] = {}
+        # Size declared by the first chained transaction carrying each blob
+        self._blob_sizes: Dict[str, int] = {}
     
     def _create_genesis_block(self) -> Block:
         """
@@ -134,7 +171,7 @@ class Blockchain:
             validator="system",
             transactions=[genesis_tx],
             prev_hash="0" * 64,
-            timestamp=datetime.utcnow().isoformat(),
+            timestamp=GENESIS_TIMESTAMP,
             hash=""
         )
 
@@ -143,31 +180,370 @@ class Blockchain:
 
         return genesis_block
 
-    def add_transaction(self, tx: Transaction) -> bool:
+    def add_transaction(self, tx: Transaction, origin: Any = None, verified: bool = False) -> bool:
         """
-        Adds a transaction to the pending pool in a thread-safe manner.
+        Admits a transaction into the pending pool in a thread-safe manner.
+
+        Local submissions and transactions relayed by peers go through the same
+        checks: duplicates (by transaction hash) are dropped, the transaction must
+        pass validation against the sender's registered key, a REGISTER may not
+        rebind an address to another key, and the pool must have room. Admitted transactions are
+        passed to every transaction listener so they can be gossiped further.
 
         param tx: Transaction to add
         type tx: Transaction
-        return: True if added successfully, False if pool is full
+        param origin: Peer the transaction came from, None for local submissions
+        type origin: Any
+        param verified: True if an API worker of this node already checked the signature
+        type verified: bool
+        return: True if added successfully, False if duplicate, invalid or pool is full
         """
+        tx_hash = tx.compute_hash()
+        with self._pending_lock:
+            if tx_hash in self._seen_transactions:
+                return False
+
+        keys = self.signer_keys([tx])
+        if keys is None:
+            print(f"[WARNING] Rejected REGISTER of {tx.sender}: the address is registered with another key")
+            return False
+        if tx.tx_type in MESSAGE_TYPES and tx.sender not in keys:
+            print(f"[WARNING] Rejected {tx.tx_type} from unregistered sender {tx.sender}")
+            return False
+        if not verified and not self._validate_transaction(tx, keys):
+            print(f"[WARNING] Rejected invalid {tx.tx_type} transaction {tx_hash[:16]}")
+            return False
+
         with self._pending_lock:
+            if tx_hash in self._seen_transactions:
+                return False
             if len(self.pending_transactions) >= MAX_TRANSACTIONS_PER_BLOCK:
                 return False
+            if tx.tx_type == "REGISTER":
+                # Checked again under the lock, against a concurrent registration of the same address
+                if self._registered_key(tx.sender) not in (None, tx.data.get("dilithium_pub")):
+                    return False
+                self._pending_keys.setdefault(tx.sender, tx.data.get("dilithium_pub", ""))
             self.pending_transactions.append(tx)
-            return True
+            self._remember_transaction(tx_hash)
 
-    def mine_block(self, validator_address: str) -> Optional[Block]:
+        for listener in self.transaction_listeners:
+            listener(tx, origin)
+        return True
+
+    def add_transaction_listener(self, listener: Callable[[Transaction, Any], None]):
         """
-        Mines a new block from pending transactions by a valid validator.
+        Registers a callback invoked as listener(tx, origin) for every admitted transaction.
 
-        param validator_address: Address of the validator attempting to mine
+        param listener: Callback taking the transaction and the peer it came from
+        type listener: Callable[[Transaction, Any], None]
+        """
+        if listener not in self.transaction_listeners:
+            self.transaction_listeners.append(listener)
+
+    def add_block_listener(self, listener: Callable[[Block, Any], None]):
+        """
+        Registers a callback invoked as listener(block, origin) for every block appended to the chain.
+
+        param listener: Callback taking the block and the peer it came from (None if mined locally)
+        type listener: Callable[[Block, Any], None]
+        """
+        if listener not in self.block_listeners:
+            self.block_listeners.append(listener)
+
+    def add_tip_listener(self, listener: Callable[[Block, Any], None]):
+        """
+        Registers a callback invoked as listener(tip, origin) whenever the chain tip changes.
+
+        Unlike block listeners, tip listeners also fire when a whole chain is replaced.
+
+        param listener: Callback taking the new tip block and the peer that caused the change
+        type listener: Callable[[Block, Any], None]
+        """
+        if listener not in self.tip_listeners:
+            self.tip_listeners.append(listener)
+
+    def _registered_key(self, address: str, height: Optional[int] = None, registered: Optional[Dict[str, Tuple[str, int]]] = None) -> Optional[str]:
+        """
+        Looks up the Dilithium key an address registered.
+
+        param address: Account address
+        type address: str
+        param height: Only registrations in blocks below this height count; None also counts the mempool
+        type height: Optional[int]
+        param registered: Registrations to use instead of this chain's, for validating another chain
+        type registered: Optional[Dict[str, Tuple[str, int]]]
+        return: Base64 public key, or None if the address is not registered
+        """
+        entry = (self.account_keys if registered is None else registered).get(address)
+        if entry is not None and (height is None or entry[1] < height):
+            return entry[0]
+        if height is None and registered is None:
+            return self._pending_keys.get(address)
+        return None
+
+    def signer_keys(
+        self,
+        transactions: List[Transaction],
+        height: Optional[int] = None,
+        registered: Optional[Dict[str, Tuple[str, int]]] = None,
+    ) -> Optional[Dict[str, bytes]]:
+        """
+        Resolves the registered key of every message sender in a list of transactions.
+
+        Registrations earlier in the same list count, so a block may register an
+        address and carry its first messages. An address keeps the key of its
+        first registration.
+
+        param transactions: Transactions in block order
+        type transactions: List[Transaction]
+        param height: Index of the block holding the transactions, None for the mempool
+        type height: Optional[int]
+        param registered: Registrations to use instead of this chain's, for validating another chain
+        type registered: Optional[Dict[str, Tuple[str, int]]]
+        return: Sender address -> public key, or None if a REGISTER would rebind an address to another key
+        """
+        listed: Dict[str, str] = {}
+        keys: Dict[str, bytes] = {}
+        for tx in transactions:
+            if tx.tx_type == "REGISTER":
+                public_key = tx.data.get("dilithium_pub")
+                known = listed.get(tx.sender) or self._registered_key(tx.sender, height, registered)
+                if known is not None and known != public_key:
+                    return None
+                listed.setdefault(tx.sender, public_key)
+            elif tx.tx_type in MESSAGE_TYPES:
+                public_key = listed.get(tx.sender) or self._registered_key(tx.sender, height, registered)
+                if public_key:
+                    try:
+                        keys[tx.sender] = base64.b64decode(public_key)
+                    except ValueError:
+                        pass
+        return keys
+
+    @staticmethod
+    def index_registrations(block: Block, registered: Dict[str, Tuple[str, int]]):
+        """
+        Records the first registration of every address registered in a block.
+
+        param block: Block whose REGISTER transactions are indexed
+        type block: Block
+        param registered: Address -> (public key, height) map updated in place
+        type registered: Dict[str, Tuple[str, int]]
+        """
+        for tx in block.transactions:
+            if tx.tx_type == "REGISTER" and tx.sender not in registered:
+                registered[tx.sender] = (tx.data.get("dilithium_pub", ""), block.index)
+
+    @staticmethod
+    def index_blobs(block: Block, blob_sizes: Dict[str, int]):
+        """
+        Records the declared size of every blob a block's transactions carry.
+
+        param block: Block whose message transactions are indexed
+        type block: Block
+        param blob_sizes: Blob hash -> size map updated in place
+        type blob_sizes: Dict[str, int]
+        """
+        for tx in block.transactions:
+            size = Blockchain._declared_blob_size(tx)
+            if size is not None:
+                blob_sizes.setdefault(tx.data["blob"], size)
+
+    @staticmethod
+    def _declared_blob_size(tx: Transaction) -> Optional[int]:
+        """Returns the size a message transaction declares for its blob, None if it carries none."""
+        if tx.tx_type not in MESSAGE_TYPES or "blob" not in tx.data:
+            return None
+        try:
+            size = int(tx.data.get("size", ""))
+        except ValueError:
+            return None
+        return size if size >= 0 else None
+
+    def blob_size(self, blob_hash: str) -> Optional[int]:
+        """
+        Looks up a blob among the transactions of the chain and the mempool.
+
+        param blob_hash: SHA-256 of the blob, hex
+        type blob_hash: str
+        return: Size declared by the transaction carrying the blob, None if no known transaction does
+        """
+        size = self._blob_sizes.get(blob_hash)
+        if size is not None:
+            return size
+        with self._pending_lock:
+            for tx in self.pending_transactions:
+                if tx.data.get("blob") == blob_hash:
+                    size = self._declared_blob_size(tx)
+                    if size is not None:
+                        return size
+        return None
+
+    def _on_appended(self, block: Block):
+        """Indexes the registrations and blobs of a block just appended to the chain."""
+        self.index_registrations(block, self.account_keys)
+        self.index_blobs(block, self._blob_sizes)
+        registered = {tx.sender for tx in block.transactions if tx.tx_type == "REGISTER"}
+        if not registered:
+            return
+        with self._pending_lock:
+            for address in registered:
+                self._pending_keys.pop(address, None)
+            # A pending REGISTER that lost the race to another key can no longer be mined
+            self.pending_transactions = [
+                tx for tx in self.pending_transactions
+                if tx.tx_type != "REGISTER" or tx.sender not in registered
+                or tx.data.get("dilithium_pub") == self.account_keys[tx.sender][0]
+            ]
+
+    def _reindex(self):
+        """Rebuilds the registration and blob indexes after the chain was replaced or cut back."""
+        registered: Dict[str, Tuple[str, int]] = {}
+        blob_sizes: Dict[str, int] = {}
+        for block in self.chain:
+            self.index_registrations(block, registered)
+            self.index_blobs(block, blob_sizes)
+        self.account_keys = registered
+        self._blob_sizes = blob_sizes
+
+    def _notify_tip(self, origin: Any = None):
+        """Invokes every tip listener with the current tip."""
+        tip = self.chain[-1]
+        for listener in self.tip_listeners:
+            listener(tip, origin)
+
+    def _remember_transaction(self, tx_hash: str):
+        """Marks a validated transaction as seen, evicting the oldest beyond SEEN_TX_CACHE_SIZE."""
+        self._seen_transactions[tx_hash] = None
+        self._seen_transactions.move_to_end(tx_hash)
+        while len(self._seen_transactions) > SEEN_TX_CACHE_SIZE:
+            self._seen_transactions.popitem(last=False)
+
+    def mark_verified(self, tx_hashes: List[str]):
+        """
+        Records transactions whose signatures were verified outside the mempool.
+
+        param tx_hashes: Hashes of the verified transactions
+        type tx_hashes: List[str]
+        """
+        with self._pending_lock:
+            for tx_hash in tx_hashes:
+                self._remember_transaction(tx_hash)
+
+    def is_verified(self, tx_hash: str) -> bool:
+        """
+        Checks whether a transaction already passed validation when it entered the mempool.
+
+        param tx_hash: Transaction hash to look up
+        type tx_hash: str
+        return: True if the transaction can skip signature verification
+        """
+        return tx_hash in self._seen_transactions
+
+    def add_block(
+        self,
+        block: Block,
+        origin: Any = None,
+        signatures_verified: bool = False,
+        audit_pending: bool = False,
+        live: bool = False,
+    ) -> bool:
+        """
+        Appends a block received from a peer on top of the current tip.
+
+        The block must extend the tip and pass validation. Its transactions are
+        removed from the pending pool and block listeners are notified.
+
+        param block: Block to append
+        type block: Block
+        param origin: Peer the block came from
+        type origin: Any
+        param signatures_verified: True if the caller already verified the header and transaction signatures
+        type signatures_verified: bool
+        param audit_pending: True if only the header was verified (fast sync); the transactions are then
+            not marked as verified until mark_verified is called by the audit
+        type audit_pending: bool
+        param live: True for a block announced as it was produced, which must arrive within its own slot
+        type live: bool
+        return: True if the block was appended
+        """
+        with self._chain_lock:
+            if block.index != len(self.chain) or block.prev_hash != self.chain[-1].hash:
+                return False
+            if not self.validate_block(block, check_signatures=not signatures_verified, live=live):
+                print(f"[ERROR] Relayed block {block.index} failed validation")
+                return False
+            self.chain.append(block)
+            self._on_appended(block)
+
+        included = {tx.compute_hash() for tx in block.transactions}
+        with self._pending_lock:
+            self.pending_transactions = [
+                tx for tx in self.pending_transactions if tx.compute_hash() not in included
+            ]
+            if not audit_pending:
+                for tx_hash in included:
+                    self._remember_transaction(tx_hash)
+
+        self.notify_subscribers()
+        for listener in self.block_listeners:
+            listener(block, origin)
+        self._notify_tip(origin)
+        return True
+
+    def find_block(self, block_hash: str) -> Optional[Block]:
+        """
+        Looks up a block by hash, newest blocks first.
+
+        param block_hash: Hash of the block
+        type block_hash: str
+        return: The block, or None if it is not in the chain
+        """
+        for block in reversed(self.chain):
+            if block.hash == block_hash:
+                return block
+        return None
+
+    def scheduled_leader(self, height: int, prev_block: Block, timestamp: str) -> Optional[str]:
+        """
+        Returns the validator entitled to produce a block at a given time.
+
+        param height: Index of the block
+        type height: int
+        param prev_block: Parent block, whose timestamp opens the first slot
+        type prev_block: Block
+        param timestamp: Timestamp of the block (ISO format)
+        type timestamp: str
+        return: Scheduled validator, or None if the timestamp precedes the parent or there is no validator
+        """
+        rank = slot_rank(prev_block.timestamp, timestamp)
+        if rank is None:
+            return None
+        return self.validators.leader(height, rank)
+
+    def next_leader(self) -> Optional[str]:
+        """
+        Returns the validator whose turn it is to produce the next block right now.
+
+        return: Scheduled validator for the current slot
+        """
+        with self._chain_lock:
+            last_block = self.chain[-1]
+            return self.scheduled_leader(last_block.index + 1, last_block, datetime.utcnow().isoformat())
+
+    def build_block(self, validator_address: str) -> Optional[Block]:
+        """
+        Assembles the next block from pending transactions, hashed but not yet signed.
+
+        param validator_address: Address of the validator producing the block
         type validator_address: str
-        return: New mined block if successful, None otherwise
+        return: Unsigned block, None if the validator is not authorized or there is nothing to mine
+        raises HTTPException: 409 if the validator is not the leader of the current slot
         """
         print(f"[DEBUG] Attempting to mine block by {validator_address}")
 
-        if validator_address not in VALIDATORS:
+        if not self.validators.is_validator(validator_address):
             print(f"[ERROR] Validator {validator_address} not authorized")
             return None
 
@@ -179,74 +555,192 @@ class Blockchain:
             print(f"[INFO] Mining block with {len(self.pending_transactions)} transactions")
 
             last_block = self.chain[-1]
+            timestamp = datetime.utcnow().isoformat()
+            leader = self.scheduled_leader(last_block.index + 1, last_block, timestamp)
+            if leader != validator_address:
+                print(f"[WARNING] Block {last_block.index + 1} is not due from {validator_address} in this slot (leader: {leader})")
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Not the scheduled leader for block {last_block.index + 1}, the current leader is {leader}",
+                )
+
             new_block = Block(
                 index=last_block.index + 1,
                 validator=validator_address,
                 transactions=self.pending_transactions.copy(),
                 prev_hash=last_block.hash,
+                timestamp=timestamp,
             )
-            new_block.hash = new_block.compute_hash()
+        new_block.hash = new_block.compute_hash()
+        print(f"[DEBUG] New block computed hash: {new_block.hash}")
+        return new_block
 
-            print(f"[DEBUG] New block computed hash: {new_block.hash}")
+    def commit_block(self, block: Block) -> Optional[Block]:
+        """
+        Appends a block built by build_block and signed on this node.
 
-            if self.validate_block(new_block):
-                print("[SUCCESS] Block validated successfully")
-                self.pending_transactions.clear()
-                self.chain.append(new_block)
-                
-                self.notify_subscribers()
+        Its transactions were verified when they entered the mempool, so only
+        the structure, linkage and leader slot are checked here.
 
-                return new_block
-            else:
+        param block: Signed block
+        type block: Block
+        return: The block if it was appended, None if the tip moved meanwhile or it is invalid
+        """
+        with self._chain_lock:
+            if block.index != len(self.chain) or block.prev_hash != self.chain[-1].hash:
+                print(f"[WARNING] Chain tip moved while block {block.index} was being signed")
+                return None
+            if not self.validate_block(block, check_signatures=False):
                 print("[ERROR] Block failed validation")
                 return None
+            self.chain.append(block)
+            self._on_appended(block)
+            print("[SUCCESS] Block validated successfully")
+
+        included = {tx.compute_hash() for tx in block.transactions}
+        with self._pending_lock:
+            self.pending_transactions = [
+                tx for tx in self.pending_transactions if tx.compute_hash() not in included
+            ]
+
+        self.notify_subscribers()
+        for listener in self.block_listeners:
+            listener(block, None)
+        self._notify_tip()
+        return block
+
+    def mine_block(self, validator_address: str) -> Optional[Block]:
+        """
+        Mines a new block from pending transactions by a valid validator.
 
-    def validate_block(self, block: Block) -> bool:
+        param validator_address: Address of the validator attempting to mine
+        type validator_address: str
+        return: New mined block if successful, None otherwise
+        """
+        try:
+            new_block = self.build_block(validator_address)
+        except HTTPException:
+            return None
+        if new_block is None:
+            return None
+
+        signature = self.validators.sign_block(validator_address, new_block.hash)
+        if signature is None:
+            print(f"[ERROR] This node does not hold the signing key of {validator_address}")
+            return None
+        new_block.signature = signature
+        return self.commit_block(new_block)
+
+    def validate_block(
+        self,
+        block: Block,
+        prev_block: Optional[Block] = None,
+        check_signatures: bool = True,
+        registered: Optional[Dict[str, Tuple[str, int]]] = None,
+        live: bool = False,
+    ) -> bool:
         """
         Performs comprehensive validation of a block before adding to the chain.
 
         param block: Block to validate
         type block: Block
+        param prev_block: Parent block, defaults to the block at index - 1 in the local chain
+        type prev_block: Optional[Block]
+        param check_signatures: False if the header and transaction signatures were already verified elsewhere
+        type check_signatures: bool
+        param registered: Registrations of the chain the block belongs to, defaults to this chain's
+        type registered: Optional[Dict[str, Tuple[str, int]]]
+        param live: Also reject a block whose slot ended before it arrived (backdated by its producer)
+        type live: bool
         return: True if block is valid, False otherwise
         """
         # Basic structural checks
         if not block.hash == block.compute_hash():
             return False
 
-        # Transaction validation
-        for tx in block.transactions:
-            if not self._validate_transaction(tx):
-                return False
-
         # Chain continuity check
         if block.index > 0:
-            prev_block = self.chain[block.index - 1]
-            if block.prev_hash != prev_block.hash:
+            if prev_block is None:
+                if block.index > len(self.chain):
+                    return False
+                prev_block = self.chain[block.index - 1]
+            if block.prev_hash != prev_block.hash or block.index != prev_block.index + 1:
                 return False
 
-        return True
+            # Only the leader of the slot the block is timestamped in may produce it,
+            # and the timestamp cannot lie ahead of our clock by more than the tolerated skew
+            rank = slot_rank(prev_block.timestamp, block.timestamp)
+            if rank is None or block.validator != self.validators.leader(block.index, rank):
+                return False
+            now = datetime.utcnow()
+            if datetime.fromisoformat(block.timestamp) > now + timedelta(seconds=CLOCK_SKEW_TOLERANCE):
+                return False
+            # A block announced live must still be in its slot: its timestamp cannot be earlier
+            # than the start of the slot that is open now, give or take the tolerated skew
+            received = (now - timedelta(seconds=CLOCK_SKEW_TOLERANCE)).isoformat()
+            if live and (slot_rank(prev_block.timestamp, received) or 0) > rank:
+                return False
+
+        if not check_signatures:
+            return True
+
+        # The block must be signed by the validator it names
+        if block.index > 0 and not self.validators.verify_block(block):
+            return False
+
+        # Transaction validation, skipping transactions verified on mempool admission. That
+        # check used this chain's keys, so a block of another chain is verified in full
+        keys = self.signer_keys(block.transactions, block.index, registered)
+        if keys is None:
+            return False
+        if registered is None:
+            unverified = [tx for tx in block.transactions if not self.is_verified(tx.compute_hash())]
+        else:
+            unverified = block.transactions
+        return verify_transactions(unverified, keys)
 
-    def _validate_transaction(self, tx: Transaction) -> bool:
+    @staticmethod
+    def _validate_transaction(tx: Transaction, keys: Dict[str, bytes]) -> bool:
         """
         Validates individual transactions based on type.
 
         param tx: Transaction to validate
         type tx: Transaction
+        param keys: Registered public keys of message senders, from signer_keys
+        type keys: Dict[str, bytes]
         return: True if transaction is valid, False otherwise
         """
+        claim = Blockchain._signature_claim(tx, keys)
+        if claim is None:
+            return True
+        return bool(claim) and get_backend().verify(*claim)
+
+    @staticmethod
+    def _signature_claim(tx: Transaction, keys: Dict[str, bytes]):
+        """
+        Extracts the signature a transaction's validity rests on.
+
+        param tx: Transaction to inspect
+        type tx: Transaction
+        param keys: Registered public keys of message senders, from signer_keys
+        type keys: Dict[str, bytes]
+        return: (public_key, message, signature) to verify, None for unsigned
+                transaction types, False if required fields are missing or malformed
+        """
         if tx.tx_type == "REGISTER":
-            return self._validate_registration(tx)
-        elif tx.tx_type == "PUBLIC_MESSAGE":
-            return self._validate_message(tx)
-        return True
+            return Blockchain._registration_claim(tx)
+        elif tx.tx_type in MESSAGE_TYPES:
+            return Blockchain._message_claim(tx, keys.get(tx.sender))
+        return None
 
-    def _validate_registration(self, tx: Transaction) -> bool:
+    @staticmethod
+    def _registration_claim(tx: Transaction):
         """
-        Validates registration transactions with digital signature.
+        Extracts the signature of a registration transaction.
 
         param tx: Registration transaction to validate
         type tx: Transaction
-        return: True if signature is valid, False otherwise
+        return: (public_key, message, signature), or False if fields are missing or malformed
         """
         required_fields = {"dilithium_pub", "kyber_pub", "signature"}
         if not required_fields.issubset(tx.data.keys()):
@@ -256,69 +750,164 @@ class Blockchain:
             pub_key = base64.b64decode(tx.data["dilithium_pub"])
             signature = base64.b64decode(tx.data["signature"])
             message = f"REGISTER:{tx.sender}"
-            return Dilithium.verify(pub_key, message.encode(), signature)
+            return pub_key, message.encode(), signature
         except:
             return False
 
-    def _validate_message(self, tx: Transaction) -> bool:
+    @staticmethod
+    def _message_claim(tx: Transaction, pub_key: Optional[bytes]):
         """
-        Validates public message transactions with digital signature.
+        Extracts the signature of a public, private or group message transaction.
+
+        The signature is checked against the key the sender registered; a key
+        embedded by older transactions must be that same key.
 
         param tx: Message transaction to validate
         type tx: Transaction
-        return: True if signature is valid, False otherwise
+        param pub_key: Key registered by the sender, None if the sender is not registered
+        type pub_key: Optional[bytes]
+        return: (public_key, message, signature), or False if fields are missing or malformed
         """
-        print(f"[DEBUG] Validating PUBLIC_MESSAGE: {tx.data.keys()}")
+        print(f"[DEBUG] Validating {tx.tx_type}: {tx.data.keys()}")
         if "message_hash" not in tx.data:
             print("[ERROR] Missing 'message_hash'")
             return False
         if "signature" not in tx.data:
             print("[ERROR] Missing 'signature'")
             return False
-        if "dilithium_pub" not in tx.data:
-            print("[ERROR] Missing 'dilithium_pub'")
+        if pub_key is None:
+            print(f"[ERROR] Sender {tx.sender} has no registered key")
             return False
 
         try:
-            pub_key = base64.b64decode(tx.data["dilithium_pub"])
+            if "dilithium_pub" in tx.data and base64.b64decode(tx.data["dilithium_pub"]) != pub_key:
+                print("[ERROR] Embedded 'dilithium_pub' is not the registered key")
+                return False
             signature = base64.b64decode(tx.data["signature"])
-            return Dilithium.verify(pub_key, tx.data["message_hash"].encode(), signature)
+            return pub_key, tx.data["message_hash"].encode(), signature
         except Exception as e:
             print(f"[ERROR] Signature verification failed: {str(e)}")
             return False
 
-    def replace_chain(self, new_chain: List[Block]) -> bool:
+    def replace_chain(
+        self, new_chain: List[Block], origin: Any = None, start: int = 1, signatures_verified: bool = False
+    ) -> bool:
         """
         Replaces the current chain with a longer, valid incoming chain.
 
+        Pending transactions that the new chain already contains are dropped from the pool.
+
         param new_chain: Candidate chain to replace current chain
         type new_chain: List[Block]
+        param origin: Peer the chain came from
+        type origin: Any
+        param start: Index of the first block that differs from ours; the blocks below must be ours
+        type start: int
+        param signatures_verified: True if the caller already verified the signatures of the blocks from start
+            (see fork_verification), leaving only the structural checks under the chain lock
+        type signatures_verified: bool
         return: True if chain replaced, False otherwise
         """
         with self._chain_lock:
-            if self.validate_chain(new_chain) and len(new_chain) > len(self.chain):
-                self.chain = new_chain
-                return True
-            return False
+            if len(new_chain) <= len(self.chain):
+                return False
+            if not self.validate_chain(new_chain, start, check_signatures=not signatures_verified):
+                return False
+            self.chain = new_chain
+            self._reindex()
+
+        included = {tx.compute_hash() for block in new_chain for tx in block.transactions}
+        with self._pending_lock:
+            self.pending_transactions = [
+                tx for tx in self.pending_transactions if tx.compute_hash() not in included
+            ]
+        self.notify_subscribers()
+        self._notify_tip(origin)
+        return True
+
+    def rollback(self, index: int) -> bool:
+        """
+        Drops the block at index and everything after it.
+
+        Used when a background audit finds an invalid transaction in a block
+        that was accepted by fast sync. Tip listeners are notified so the node
+        announces its new tip and resyncs.
+
+        param index: Index of the first block to drop (the genesis block is never dropped)
+        type index: int
+        return: True if blocks were dropped
+        """
+        with self._chain_lock:
+            if index < 1 or index >= len(self.chain):
+                return False
+            self.chain = self.chain[:index]
+            self._reindex()
+        self.notify_subscribers()
+        self._notify_tip()
+        return True
 
-    def validate_chain(self, chain: List[Block]) -> bool:
+    def validate_chain(self, chain: List[Block], start: int = 1, check_signatures: bool = True) -> bool:
         """
         Validates an entire blockchain chain for consistency and integrity.
 
+        The chain must start from the same genesis block as the local chain.
+        With start above 1, the blocks below start must be our own, and only
+        the blocks from start on are validated.
+
         param chain: Chain to validate
         type chain: List[Block]
+        param start: Index of the first block to validate
+        type start: int
+        param check_signatures: False if the signatures of the blocks from start were already verified
+        type check_signatures: bool
         return: True if chain is valid, False otherwise
         """
-        if not chain or chain[0].index != 0:
+        if not chain or chain[0].index != 0 or not 1 <= start <= min(len(chain), len(self.chain)):
+            return False
+        if chain[start - 1].hash != self.chain[start - 1].hash:
             return False
 
-        for i in range(1, len(chain)):
-            if not self.validate_block(chain[i]):
-                return False
-            if chain[i].prev_hash != chain[i-1].hash:
+        registered = self._registrations_below(start)
+        for i in range(start, len(chain)):
+            if not self.validate_block(chain[i], chain[i - 1], check_signatures=check_signatures, registered=registered):
                 return False
+            self.index_registrations(chain[i], registered)
 
         return True
+
+    def _registrations_below(self, height: int) -> Dict[str, Tuple[str, int]]:
+        """Returns the registrations of this chain's blocks below height."""
+        return {address: entry for address, entry in self.account_keys.items() if entry[1] < height}
+
+    def fork_verification(self, start: int, blocks: List[Block]) -> Optional[List[tuple]]:
+        """
+        Lists the signature checks of fork blocks that would replace ours from index start.
+
+        Every transaction is checked against the fork's own registrations, so
+        the verified-transaction cache of this chain is not used. The checks
+        are meant to run in the executor's CPU lane, after which replace_chain
+        is called with signatures_verified=True.
+
+        param start: Index of the first fork block; our blocks below it are kept
+        type start: int
+        param blocks: Fork blocks from start on, in chain order
+        type blocks: List[Block]
+        return: verify_block_signatures arguments for each block, or None if a block is signed by
+                an address that is not a validator at its height or rebinds a registered address
+        """
+        batch_keys: Dict[str, Tuple[str, int]] = {}
+        registered = ChainMap(batch_keys, self._registrations_below(start))
+        checks = []
+        for block in blocks:
+            public_key = self.validators.public_key(block.validator, block.index)
+            if public_key is None:
+                return None
+            keys = self.signer_keys(block.transactions, block.index, registered)
+            if keys is None:
+                return None
+            self.index_registrations(block, batch_keys)
+            checks.append((block.hash, block.signature, public_key, block.transactions, keys))
+        return checks
     
     def add_subscriber(self, websocket: WebSocket):
         """Register a new WebSocket client"""
@@ -359,6 +948,69 @@ def create_transaction(tx_type: str, sender: str, receiver: str, data: dict) ->
         data=data
     )
 
+def slot_rank(prev_timestamp: str, timestamp: str) -> Optional[int]:
+    """
+    Counts the leader slots elapsed between a parent block and a block.
+
+    param prev_timestamp: Timestamp of the parent block (ISO format)
+    type prev_timestamp: str
+    param timestamp: Timestamp of the block (ISO format)
+    type timestamp: str
+    return: Number of whole LEADER_TIMEOUT periods, None if the block is older than its parent or a timestamp is malformed
+    """
+    try:
+        elapsed = (datetime.fromisoformat(timestamp) - datetime.fromisoformat(prev_timestamp)).total_seconds()
+    except ValueError:
+        return None
+    if elapsed < 0:
+        return None
+    return int(elapsed // LEADER_TIMEOUT)
+
+def verify_transactions(transactions: List[Transaction], keys: Optional[Dict[str, bytes]] = None) -> bool:
+    """
+    Verifies the signatures of a batch of transactions.
+
+    Defined at module level so block sync can run it in a worker process;
+    a Blockchain instance holds locks and cannot be sent to one, so the
+    registered keys of message senders are passed in, resolved by signer_keys.
+
+    param transactions: Transactions to verify
+    type transactions: List[Transaction]
+    param keys: Sender address -> registered public key; message transactions of senders missing here are invalid
+    type keys: Optional[Dict[str, bytes]]
+    return: True if every transaction is valid
+    """
+    keys = keys or {}
+    claims = []
+    for tx in transactions:
+        claim = Blockchain._signature_claim(tx, keys)
+        if claim is False:
+            return False
+        if claim is not None:
+            claims.append(claim)
+    # One batch, so vectorizing backends verify all signatures together
+    return all(get_backend().verify_batch(claims))
+
+def verify_block_signatures(
+    block_hash: str, signature: str, public_key: bytes, transactions: List[Transaction], keys: Optional[Dict[str, bytes]] = None
+) -> bool:
+    """
+    Verifies a block header signature and then the given transactions, in a worker process during sync.
+
+    param block_hash: Hex hash of the block
+    type block_hash: str
+    param signature: Validator signature carried by the block
+    type signature: str
+    param public_key: Public key of the block's validator
+    type public_key: bytes
+    param transactions: Transactions that still need verification (empty in fast sync)
+    type transactions: List[Transaction]
+    param keys: Registered public keys of the message senders among them
+    type keys: Optional[Dict[str, bytes]]
+    return: True if everything is valid
+    """
+    return verify_block_header(block_hash, signature, public_key) and verify_transactions(transactions, keys)
+
 _blockchain = Blockchain()
 """
 Singleton instance of the blockchain shared across the application.
@@ -20,29 +20,62 @@ Predefined test cryptographic key used for development and testing purposes.
 This is a raw bytes value intended for symmetric encryption/decryption.
 """
 
-KNOWN_PEERS = [
-    "127.0.0.1:8001",
-    "127.0.0.1:8002",
-    "127.0.0.1:8003",
-    "127.0.0.1:8004",
-    "127.0.0.1:8005",
-    "127.0.0.1:8006",
-    "127.0.0.1:8007",
-    "127.0.0.1:8008",
-    "127.0.0.1:8009"
-]
+VALIDATORS = ["validator_001", "validator_002"]
 """
-List of known peer node URLs in the P2P network.
+Initial validator set, written to the validator_keys table the first time the node starts.
 
-These are used for discovery and initial connection during startup.
-Each URL points to another instance of the FastAPI service running on a different port.
+Afterwards the set is managed through the /validators routes and takes effect without a restart.
 """
 
-VALIDATORS = ["validator_001", "validator_002"]
+VALIDATOR_KEY_DIR = "../database/validators"
+"""
+Folder holding the Dilithium key files of the validators (<validator>.pub and <validator>.key).
+
+Every node needs the public keys to verify block headers; only a validator's own node holds its secret key.
+"""
+
+LEADER_TIMEOUT = 10.0
 """
-List of trusted validator identifiers currently active in the network.
+Length of a block production slot, in seconds.
 
-Used for testing consensus and validation logic.
+Block N is due from validator (N + rank) of the sorted active set, where rank is the
+number of whole slots elapsed since block N-1; if the scheduled leader stays silent
+for a slot, the next validator in line takes over.
+"""
+
+CLOCK_SKEW_TOLERANCE = 2.0
+"""
+Clock difference between nodes tolerated when checking block timestamps, in seconds.
+
+A block may be timestamped at most this far ahead of our clock, and a block announced
+as it is produced must arrive no later than this after the end of its slot, so that a
+validator cannot backdate a block into an earlier slot of its own.
+"""
+
+FAST_SYNC = False
+"""
+Accept downloaded blocks after checking only their validator signature.
+
+Transaction signatures of those blocks are then verified by a background audit,
+which rolls the chain back and turns fast sync off if it finds an invalid one.
+Enabled with the --fast-sync command line flag.
+"""
+
+DEV_VALIDATOR_KEYS = False
+"""
+Development networks only: generate key pairs on this node for validators that have no public key yet.
+
+Runs once at startup and for validators added without a public key. On a real network
+each validator creates its keys offline and only its public key is registered.
+Enabled with the --dev-validator-keys command line flag.
+"""
+
+ADMIN_TOKEN_ENV = "PQC_ADMIN_TOKEN"
+"""
+Environment variable holding the token that authorizes changes to the validator set.
+
+POST /validators, DELETE /validators/{address} and POST /validators/reload require it
+in the X-Admin-Token header; while the variable is unset, those routes are disabled.
 """
 
 MAX_TRANSACTIONS_PER_BLOCK = 100
@@ -52,6 +85,198 @@ Maximum number of transactions allowed in a single block.
 Imposes a limit to prevent oversized blocks and ensure system stability.
 """
 
+GENESIS_TIMESTAMP = "2025-01-01T00:00:00"
+"""
+Fixed timestamp of the genesis block.
+
+Every node must build the identical genesis block, otherwise their chains can never be exchanged.
+"""
+
+P2P_SEED_PEERS = [f"127.0.0.1:{port}" for port in range(8760, 8770)]
+"""
+Peer-to-peer addresses (host:port) seeded into the address book on startup.
+
+The connection manager only dials these when it is below its target peer count.
+"""
+
+P2P_TARGET_PEERS = 8
+"""
+Number of peer connections the connection manager tries to keep open.
+"""
+
+P2P_MAX_PEERS = 32
+"""
+Hard cap on simultaneous peer connections (inbound and outbound combined).
+
+Inbound connections beyond this limit are closed right after they are accepted.
+"""
+
+P2P_MAINTAIN_INTERVAL = 5.0
+"""
+Seconds between two passes of the connection manager over the address book.
+"""
+
+P2P_CONNECT_TIMEOUT = 5.0
+"""
+Seconds allowed for the WebSocket opening handshake and the HELLO exchange.
+"""
+
+P2P_BACKOFF_BASE = 2.0
+"""
+Reconnect delay in seconds after the first failed dial to an address.
+
+Each further failure doubles the delay, with random jitter applied.
+"""
+
+P2P_BACKOFF_MAX = 600.0
+"""
+Upper bound in seconds for the reconnect delay of a failing address.
+"""
+
+P2P_KEEPALIVE_INTERVAL = 15.0
+"""
+Seconds a connection may stay silent before a PING is sent on it.
+
+Connections that carry regular traffic are never pinged.
+"""
+
+P2P_PING_TIMEOUT = 10.0
+"""
+Seconds to wait for the PONG matching an outstanding PING before counting it as missed.
+"""
+
+P2P_MAX_MISSED_PINGS = 3
+"""
+Consecutive missed PINGs after which a peer is considered dead and disconnected.
+"""
+
+P2P_MAX_CONCURRENT_SYNCS = 2
+"""
+Maximum number of peers we download blocks from at the same time.
+
+Syncs are only started towards peers whose announced tip is ahead of ours, lowest RTT first.
+"""
+
+P2P_SYNC_BATCH = 500
+"""
+Maximum number of blocks requested, or served, in a single GET_BLOCKS/BLOCKS exchange.
+"""
+
+P2P_SYNC_TIMEOUT = 30.0
+"""
+Seconds to wait for a peer to answer a block download request before giving up on it.
+"""
+
+P2P_PIPELINE_WINDOW = 64
+"""
+Capacity of each queue between the stages of the block sync pipeline.
+
+Bounds how many downloaded blocks are held in memory, whatever the length of the chain.
+"""
+
+P2P_PEER_SHARE_INTERVAL = 10.0
+"""
+Seconds between two peer-exchange rounds.
+
+A round only sends to peers that have not yet seen the current address book version.
+"""
+
+P2P_PEER_SHARE_SIZE = 32
+"""
+Maximum number of addresses in one PEER_LIST message, drawn at random from the address book.
+"""
+
+P2P_MAX_PEER_LIST = 1000
+"""
+Largest address count accepted in an incoming PEER_LIST message.
+"""
+
+P2P_ADDRESS_BOOK_SIZE = 2048
+"""
+Maximum number of addresses kept in the address book before the stalest ones are evicted.
+"""
+
+P2P_ADDRESS_HORIZON = 3 * 24 * 3600
+"""
+Seconds after which an address that has not been seen is no longer shared with other peers.
+"""
+
+P2P_TX_RATE = 20.0
+"""
+Sustained number of relayed transactions per second accepted from a single peer.
+"""
+
+P2P_TX_BURST = 100
+"""
+Number of relayed transactions a single peer may send in a burst before P2P_TX_RATE applies.
+"""
+
+P2P_KNOWN_TX_CACHE = 4096
+"""
+Per-peer number of transaction hashes remembered as already known to that peer.
+
+Transactions a peer announced or was sent are never relayed back to it.
+"""
+
+P2P_MAX_PARTIAL_BLOCKS = 16
+"""
+Number of compact blocks kept while waiting for their missing transactions from a peer.
+"""
+
+SEEN_TX_CACHE_SIZE = 10000
+"""
+Number of recently admitted transaction hashes remembered by the mempool.
+
+A transaction whose hash is in this cache is rejected as a duplicate, which stops gossip loops.
+"""
+
+P2P_MAX_FRAME_SIZE = 8 * 1024 * 1024
+"""
+Largest WebSocket frame, in bytes, accepted from a peer; bigger frames close the connection.
+"""
+
+P2P_INBOUND_QUEUE = 256
+"""
+Number of received frames buffered per peer before we stop reading from its socket.
+"""
+
+P2P_MSG_RATE = 100.0
+"""
+Sustained message budget per peer, in cost units per second (most messages cost 1).
+"""
+
+P2P_MSG_BURST = 400
+"""
+Message budget a peer may spend in a burst before P2P_MSG_RATE applies.
+"""
+
+P2P_MAX_EXPENSIVE_HANDLERS = 4
+"""
+Number of expensive messages (chain requests and responses, block downloads) handled at the same time across all peers.
+"""
+
+P2P_BAN_SCORE = 100
+"""
+Misbehavior score at which a peer is disconnected and its address banned.
+
+Scores decay with a half-life of P2P_SCORE_HALF_LIFE, so occasional slips are forgiven.
+"""
+
+P2P_SCORE_HALF_LIFE = 600.0
+"""
+Seconds after which half of a peer's misbehavior score is forgiven.
+"""
+
+P2P_BAN_TIME = 3600.0
+"""
+Seconds during which a banned address is neither dialed nor accepted.
+"""
+
+P2P_ADDRESS_BOOK = "../database/peers_{port}.json"
+"""
+Path template of the on-disk address book, formatted with the local P2P port.
+"""
+
 # Load BIP-39 English word list of 2048 words
 WORDLIST = [
     "abandon", "ability", "able", "about", "above", "absent", "absorb", "abstract", "absurd", "abuse",
@@ -262,5 +487,141 @@ WORDLIST = [
     "cheque", "cherry", "chestnut", "chime", "chirp", "chronic", "clam"
 ]
 
+MNEMONIC_MAX_AMBIGUOUS_WORDS = 8
+"""
+Most words of a mnemonic that may appear twice in WORDLIST. Each such word
+doubles the index combinations tried against the checksum.
+"""
+
 api_port = 8000
-peer_port = 8762
\ No newline at end of file
+peer_port = 8762
+
+STATE_SOCKET = "../database/state.sock"
+"""
+Unix socket of the chain-state process.
+
+Used when the API runs in several worker processes: one process owns the chain,
+the mempool and the P2P node, and the workers reach it through this socket.
+"""
+
+STATE_CLIENT_CONNECTIONS = 8
+"""
+Idle connections each API worker keeps open to the chain-state process.
+"""
+
+EXECUTOR_CPU_WORKERS = None
+"""
+Processes running CPU-bound crypto (signing, key generation, encapsulation) for the API.
+
+None shares the cores out: one per core in single-process mode, and with
+--workers N each API worker and the chain-state process get cpu_count // (N + 1).
+"""
+
+API_WORKERS_ENV = "PQC_API_WORKERS"
+"""
+Environment variable holding the --workers count, set by main.py so every process
+of the node can size its share of the CPU pool and of the key pool.
+"""
+
+EXECUTOR_IO_WORKERS = 8
+"""
+Threads running blocking sqlite and file access for the API.
+"""
+
+EXECUTOR_CPU_QUEUE = 32
+"""
+CPU tasks allowed to wait for a free process; further requests are answered with 503.
+"""
+
+EXECUTOR_IO_QUEUE = 256
+"""
+I/O tasks allowed to wait for a free thread; further requests are answered with 503.
+"""
+
+KEY_POOL_SIZE = 256
+"""
+Pre-generated keypairs the API keeps per algorithm (Dilithium and ML-KEM-512) for registrations,
+divided evenly among the API workers.
+"""
+
+KEY_POOL_BATCH = 16
+"""
+Keypairs generated per background refill task.
+"""
+
+KEY_POOL_IDLE_WAIT = 0.2
+"""
+Seconds the key pool waits before checking again whether the CPU pool is idle enough to refill.
+"""
+
+PQC_BACKEND = "auto"
+"""
+Post-quantum crypto provider: "auto" uses the first of a native provider (liboqs) and the
+NumPy-vectorized arithmetic that is installed and passes the startup self-test against the
+pure-Python libraries, falling back to those; "native", "numpy" or "pure" force one.
+"""
+
+SIGNING_BATCH_SIZE = 64
+"""
+Most sign requests the signing service takes from its queue per batch.
+"""
+
+SIGNING_QUEUE_SIZE = 2048
+"""
+Sign requests allowed to wait in the signing service's queue; further requests are answered with 503.
+"""
+
+SIGNING_KEY_TTL = 30.0
+"""
+Seconds a decoded signer key stays cached in the signing service after it was loaded.
+"""
+
+SIGNING_KEY_CACHE_SIZE = 1024
+"""
+Most signer keys the signing service keeps cached at once.
+"""
+
+SESSION_MAX_MESSAGES = 1000
+"""
+Messages encrypted under one Kyber session before the sender-recipient pair is rekeyed.
+"""
+
+SESSION_MAX_AGE = 24 * 60 * 60
+"""
+Seconds a Kyber session is used for new messages before the pair is rekeyed.
+"""
+
+SESSION_CACHE_SIZE = 4096
+"""
+Sender-recipient sessions each API process keeps in memory; older ones are reloaded from the database when used again.
+"""
+
+GROUP_MAX_RECIPIENTS = 256
+"""
+Most recipients a single group message may be sent to.
+"""
+
+STREAM_CHUNK_SIZE = 64 * 1024
+"""
+Plaintext bytes per chunk of the streaming AES-GCM format.
+"""
+
+ATTACHMENT_MAX_SIZE = 64 * 1024 * 1024
+"""
+Largest attachment, in plaintext bytes, accepted by a streamed upload.
+"""
+
+BLOB_DIR = "../database/blobs"
+"""
+Directory holding the chunk files of the content-addressed blob store.
+"""
+
+BLOB_CHUNK_SIZE = 256 * 1024
+"""
+Bytes per blob chunk, the unit of deduplication and of P2P blob transfer.
+"""
+
+P2P_BLOB_TIMEOUT = 10.0
+"""
+Seconds to wait for a peer to answer a blob chunk request before trying the next peer.
+"""
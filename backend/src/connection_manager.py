@@ -0,0 +1,522 @@
+"""
+P2P Connection Manager
+
+Owns the set of live peer connections: keeps the node between its target and
+maximum peer counts, redials lost peers with exponential backoff, and drops
+duplicate sockets to the same node using the identity exchanged in HELLO.
+
+Author: LunaLynx12
+"""
+
+
+from config import (
+    P2P_TARGET_PEERS,
+    P2P_MAX_PEERS,
+    P2P_MAINTAIN_INTERVAL,
+    P2P_CONNECT_TIMEOUT,
+    P2P_SEED_PEERS,
+    P2P_ADDRESS_BOOK,
+    P2P_KEEPALIVE_INTERVAL,
+    P2P_PING_TIMEOUT,
+    P2P_MAX_MISSED_PINGS,
+    P2P_TX_RATE,
+    P2P_TX_BURST,
+    P2P_KNOWN_TX_CACHE,
+    P2P_MAX_FRAME_SIZE,
+    P2P_INBOUND_QUEUE,
+    P2P_MSG_RATE,
+    P2P_MSG_BURST,
+    P2P_BAN_SCORE,
+    P2P_SCORE_HALF_LIFE,
+    P2P_BAN_TIME,
+)
+from rate_limit import TokenBucket
+from collections import OrderedDict
+from protocol import serialize_ping, NONCE_SIZE
+from address_book import AddressBook, Address
+from typing import Dict, List, Optional, Set, Tuple
+import websockets
+import asyncio
+import time
+import os
+
+
+RTT_SMOOTHING = 0.125
+"""Weight of a new RTT sample in the smoothed estimate (same gain as TCP's SRTT)."""
+
+LIVENESS_SMOOTHING = 0.25
+"""Weight of the latest ping outcome in the liveness score."""
+
+
+class PeerConnection:
+    """
+    A single live WebSocket link to a remote node.
+
+    Attributes:
+        websocket: Underlying client or server connection
+        address (Tuple[str, int]): Remote address; the advertised P2P listener once the handshake completes
+        inbound (bool): True if the remote node dialed us
+        node_id (Optional[bytes]): Remote node identity, set by the handshake
+        connected_at (float): UNIX time the socket was opened
+        last_received (float): Monotonic time of the last frame received from the peer
+        rtt (Optional[float]): Smoothed round-trip time in seconds, None until the first PONG
+        liveness (float): Share of recent PINGs answered in time, between 0 and 1
+        shared_version (int): Address book version last sent to this peer in a PEER_LIST
+        tx_budget (TokenBucket): Rate limit for transactions relayed by this peer
+        tip_height (int): Index of the tip block the peer last announced, -1 until it does
+        tip_hash (Optional[str]): Hash of the tip block the peer last announced
+        announced_tip (Optional[str]): Hash of the last tip we announced to the peer
+        inbox (asyncio.Queue): Received frames waiting to be handled, bounded by P2P_INBOUND_QUEUE
+        msg_budget (TokenBucket): Rate limit for all messages from this peer, weighted by message cost
+    """
+    def __init__(self, websocket, address: Address, inbound: bool):
+        self.websocket = websocket
+        self.address = address
+        self.inbound = inbound
+        self.node_id: Optional[bytes] = None
+        self.connected_at = time.time()
+        self.last_received = time.monotonic()
+        self.rtt: Optional[float] = None
+        self.liveness = 1.0
+        self.shared_version = -1
+        self.tx_budget = TokenBucket(P2P_TX_RATE, P2P_TX_BURST)
+        self.msg_budget = TokenBucket(P2P_MSG_RATE, P2P_MSG_BURST)
+        self.inbox: asyncio.Queue = asyncio.Queue(P2P_INBOUND_QUEUE)
+        self._misbehavior = 0.0
+        self._misbehavior_at = time.monotonic()
+        self._known_transactions: "OrderedDict[str, None]" = OrderedDict()
+        self.tip_height = -1
+        self.tip_hash: Optional[str] = None
+        self.announced_tip: Optional[str] = None
+        self._pending_response: Optional[Tuple[int, asyncio.Future]] = None
+        self._stream: Optional[Tuple[int, asyncio.Queue]] = None
+        self.missed_pings = 0
+        self._ping_nonce: Optional[bytes] = None
+        self._ping_sent_at = 0.0
+
+    async def send(self, message: bytes):
+        """Sends one binary frame to the peer."""
+        await self.websocket.send(message)
+
+    def mark_received(self):
+        """Records inbound traffic, which proves the link is alive without a PING."""
+        self.last_received = time.monotonic()
+
+    @property
+    def misbehavior(self) -> float:
+        """Current misbehavior score, decayed with a half-life of P2P_SCORE_HALF_LIFE."""
+        elapsed = time.monotonic() - self._misbehavior_at
+        return self._misbehavior * 0.5 ** (elapsed / P2P_SCORE_HALF_LIFE)
+
+    def add_misbehavior(self, points: float) -> float:
+        """
+        Adds penalty points to the misbehavior score.
+
+        param points: Penalty for the offence
+        type points: float
+        return: The new score
+        """
+        self._misbehavior = self.misbehavior + points
+        self._misbehavior_at = time.monotonic()
+        return self._misbehavior
+
+    def update_tip(self, height: int, tip_hash: str) -> bool:
+        """
+        Records a tip announced by the peer, ignoring announcements older than the one we have.
+
+        param height: Index of the peer's tip block
+        type height: int
+        param tip_hash: Hash of the peer's tip block
+        type tip_hash: str
+        return: True if the peer's known tip moved
+        """
+        if height < self.tip_height or tip_hash == self.tip_hash:
+            return False
+        self.tip_height = height
+        self.tip_hash = tip_hash
+        return True
+
+    async def request(self, message: bytes, reply_type: int, timeout: float) -> bytes:
+        """
+        Sends a request and waits for the reply routed back through resolve_response.
+
+        Only one request may be outstanding per peer.
+
+        param message: Serialized request
+        type message: bytes
+        param reply_type: Message type of the expected reply
+        type reply_type: int
+        param timeout: Seconds to wait for the reply
+        type timeout: float
+        return: The raw reply frame
+        """
+        if self._pending_response is not None:
+            raise RuntimeError(f"{self} already has a request in flight")
+        future = asyncio.get_running_loop().create_future()
+        self._pending_response = (reply_type, future)
+        try:
+            await self.send(message)
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending_response = None
+
+    def resolve_response(self, message: bytes) -> bool:
+        """
+        Hands a reply frame to the outstanding request if it is of the expected type.
+
+        param message: Frame received from the peer
+        type message: bytes
+        return: True if the frame answered an outstanding request
+        """
+        if self._pending_response is None:
+            return False
+        reply_type, future = self._pending_response
+        if message[0] != reply_type or future.done():
+            return False
+        future.set_result(message)
+        return True
+
+    def open_stream(self, frame_type: int, maxsize: int) -> asyncio.Queue:
+        """
+        Starts collecting frames of one type into a bounded queue.
+
+        While the queue is full the read loop of this peer waits, so a fast
+        sender is slowed down instead of filling our memory.
+
+        param frame_type: Message type routed into the queue
+        type frame_type: int
+        param maxsize: Queue capacity
+        type maxsize: int
+        return: Queue receiving the raw frames
+        """
+        if self._stream is not None:
+            raise RuntimeError(f"{self} already has a stream open")
+        queue = asyncio.Queue(maxsize)
+        self._stream = (frame_type, queue)
+        return queue
+
+    def close_stream(self):
+        """Stops collecting frames; later frames of that type are dropped."""
+        self._stream = None
+
+    async def feed_stream(self, message: bytes) -> bool:
+        """
+        Queues a frame for the open stream if it has the stream's type.
+
+        param message: Frame received from the peer
+        type message: bytes
+        return: True if the frame was queued
+        """
+        if self._stream is None or message[0] != self._stream[0]:
+            return False
+        await self._stream[1].put(message)
+        return True
+
+    def knows_transaction(self, tx_hash: str) -> bool:
+        """True if the peer sent us this transaction or we already sent it to the peer."""
+        return tx_hash in self._known_transactions
+
+    def mark_transaction_known(self, tx_hash: str):
+        """Remembers that the peer has a transaction, forgetting the oldest beyond P2P_KNOWN_TX_CACHE."""
+        self._known_transactions[tx_hash] = None
+        self._known_transactions.move_to_end(tx_hash)
+        while len(self._known_transactions) > P2P_KNOWN_TX_CACHE:
+            self._known_transactions.popitem(last=False)
+
+    def start_ping(self) -> bytes:
+        """
+        Creates a PING with a fresh nonce and remembers when it was sent.
+
+        return: Serialized PING message
+        """
+        self._ping_nonce = os.urandom(NONCE_SIZE)
+        self._ping_sent_at = time.monotonic()
+        return serialize_ping(self._ping_nonce)
+
+    def handle_pong(self, nonce: bytes) -> bool:
+        """
+        Completes the outstanding PING if the nonce matches, updating RTT and liveness.
+
+        param nonce: Nonce echoed by the peer
+        type nonce: bytes
+        return: True if the PONG answered our outstanding PING
+        """
+        if self._ping_nonce is None or nonce != self._ping_nonce:
+            return False
+        sample = time.monotonic() - self._ping_sent_at
+        self.rtt = sample if self.rtt is None else (1 - RTT_SMOOTHING) * self.rtt + RTT_SMOOTHING * sample
+        self.liveness = (1 - LIVENESS_SMOOTHING) * self.liveness + LIVENESS_SMOOTHING
+        self.missed_pings = 0
+        self._ping_nonce = None
+        return True
+
+    def check_ping_timeout(self, now: float) -> bool:
+        """
+        Counts the outstanding PING as missed once P2P_PING_TIMEOUT has passed.
+
+        param now: Current monotonic time
+        type now: float
+        return: True if a PING was just counted as missed
+        """
+        if self._ping_nonce is None or now - self._ping_sent_at < P2P_PING_TIMEOUT:
+            return False
+        self._ping_nonce = None
+        self.missed_pings += 1
+        self.liveness = (1 - LIVENESS_SMOOTHING) * self.liveness
+        return True
+
+    @property
+    def ping_outstanding(self) -> bool:
+        """True while a PING is waiting for its PONG."""
+        return self._ping_nonce is not None
+
+    def stats(self) -> dict:
+        """Returns a JSON-serializable view of the connection health."""
+        return {
+            "address": f"{self.address[0]}:{self.address[1]}",
+            "node_id": self.node_id.hex() if self.node_id else None,
+            "direction": "inbound" if self.inbound else "outbound",
+            "rtt_ms": round(self.rtt * 1000, 2) if self.rtt is not None else None,
+            "liveness": round(self.liveness, 3),
+            "missed_pings": self.missed_pings,
+            "tip_height": self.tip_height,
+            "misbehavior": round(self.misbehavior, 1),
+            "inbox": self.inbox.qsize(),
+            "connected_for": round(time.time() - self.connected_at, 1),
+        }
+
+    async def close(self):
+        """Closes the underlying socket, ignoring errors on an already dead link."""
+        if self._pending_response is not None and not self._pending_response[1].done():
+            self._pending_response[1].set_exception(ConnectionError(f"{self} closed"))
+        if self._stream is not None:
+            # An empty frame ends the stream so its consumer does not wait for the timeout
+            try:
+                self._stream[1].put_nowait(b"")
+            except asyncio.QueueFull:
+                pass
+        try:
+            await self.websocket.close()
+        except Exception:
+            pass
+
+    def __repr__(self):
+        direction = "in" if self.inbound else "out"
+        return f"<Peer {self.address[0]}:{self.address[1]} {direction}>"
+
+
+class ConnectionManager:
+    """
+    Keeps a bounded, deduplicated set of peer connections.
+
+    Features:
+        - Dials addresses from the address book until target_peers is reached
+        - Refuses connections beyond max_peers
+        - Exponential backoff with jitter for unreachable addresses
+        - One connection per remote node identity
+    """
+    def __init__(self, node, target_peers: int = P2P_TARGET_PEERS, max_peers: int = P2P_MAX_PEERS):
+        """
+        Initializes the manager and seeds the address book.
+
+        param node: P2P node that serves accepted connections
+        type node: P2PNode
+        param target_peers: Number of connections to maintain
+        type target_peers: int
+        param max_peers: Hard cap on simultaneous connections
+        type max_peers: int
+        """
+        self.node = node
+        self.target_peers = target_peers
+        self.max_peers = max(max_peers, target_peers)
+        self.peers: Dict[bytes, PeerConnection] = {}
+        self.address_book = AddressBook(P2P_ADDRESS_BOOK.format(port=node.port))
+        self._dialing: Set[Address] = set()
+        self.address_book.remove(self.own_address)
+        for seed in P2P_SEED_PEERS:
+            host, port = seed.rsplit(":", 1)
+            if (host, int(port)) != self.own_address:
+                self.address_book.add((host, int(port)))
+
+    @property
+    def own_address(self) -> Address:
+        """Address of our own P2P listener."""
+        return (self.node.host, self.node.port)
+
+    def connected_addresses(self) -> Set[Address]:
+        """Returns the advertised addresses of all handshaken peers."""
+        return {peer.address for peer in self.peers.values()}
+
+    def active_peers(self) -> List[PeerConnection]:
+        """Returns a snapshot of all handshaken peers."""
+        return list(self.peers.values())
+
+    def fastest_peers(self, count: Optional[int] = None) -> List[PeerConnection]:
+        """
+        Returns peers ordered by RTT weighted with liveness and misbehavior, fastest first.
+
+        Peers without an RTT sample yet are placed after all measured ones.
+
+        param count: Maximum number of peers to return, or None for all
+        type count: Optional[int]
+        return: Ordered list of peers
+        """
+        ranked = sorted(
+            self.peers.values(),
+            key=lambda peer: (
+                peer.rtt is None,
+                (peer.rtt or 0.0) / max(peer.liveness, 0.05) * (1 + peer.misbehavior / P2P_BAN_SCORE),
+            ),
+        )
+        return ranked if count is None else ranked[:count]
+
+    def has_capacity(self) -> bool:
+        """True while another connection may be accepted."""
+        return len(self.peers) < self.max_peers
+
+    async def maintain(self):
+        """
+        Background loop that dials due addresses while below the target peer count.
+
+        At most (target_peers - connected) dials are in flight at any moment,
+        so the loop never fans out over the whole address book.
+        """
+        while True:
+            missing = self.target_peers - len(self.peers) - len(self._dialing)
+            if missing > 0:
+                exclude = self.connected_addresses() | self._dialing | {self.own_address}
+                for address in self.address_book.candidates(exclude)[:missing]:
+                    asyncio.create_task(self.dial(address))
+            if self.address_book.dirty:
+                self.address_book.save()
+            await asyncio.sleep(P2P_MAINTAIN_INTERVAL)
+
+    async def keepalive(self):
+        """
+        Background loop that pings idle connections and drops dead ones.
+
+        A PING is only sent when nothing was received from the peer for
+        P2P_KEEPALIVE_INTERVAL seconds, so busy links cost nothing extra.
+        New connections get one PING right away to seed their RTT estimate.
+        """
+        while True:
+            now = time.monotonic()
+            for peer in list(self.peers.values()):
+                if peer.check_ping_timeout(now) and peer.missed_pings >= P2P_MAX_MISSED_PINGS:
+                    print(f"[P2P] {peer} missed {peer.missed_pings} pings, disconnecting")
+                    self.unregister(peer)
+                    asyncio.create_task(peer.close())
+                elif not peer.ping_outstanding and (peer.rtt is None or now - peer.last_received >= P2P_KEEPALIVE_INTERVAL):
+                    try:
+                        await peer.send(peer.start_ping())
+                    except Exception:
+                        self.unregister(peer)
+            await asyncio.sleep(min(P2P_KEEPALIVE_INTERVAL, P2P_PING_TIMEOUT) / 2)
+
+    async def dial(self, address: Address):
+        """
+        Opens an outbound connection and hands it to the node.
+
+        Failures are recorded in the address book so the address is retried later.
+
+        param address: (host, port) of the remote P2P listener
+        type address: Tuple[str, int]
+        """
+        if address in self._dialing:
+            return
+        self._dialing.add(address)
+        host, port = address
+        try:
+            websocket = await websockets.connect(
+                f"ws://{host}:{port}/ws", open_timeout=P2P_CONNECT_TIMEOUT, ping_interval=None, max_size=P2P_MAX_FRAME_SIZE
+            )
+        except Exception:
+            delay = self.address_book.mark_failure(address)
+            print(f"[P2P] Could not reach {host}:{port}, retrying in {delay:.0f}s")
+            return
+        finally:
+            self._dialing.discard(address)
+        await self.node.serve_peer(PeerConnection(websocket, address, inbound=False))
+
+    def register(self, peer: PeerConnection, node_id: bytes, listen_port: int) -> bool:
+        """
+        Admits a peer after its HELLO, resolving duplicate links to the same node.
+
+        When two sockets connect the same pair of nodes, both ends keep the one
+        dialed by the node with the lower node_id, so they close the same socket.
+
+        param peer: Connection that just completed the handshake
+        type peer: PeerConnection
+        param node_id: Identity announced by the remote node
+        type node_id: bytes
+        param listen_port: P2P port the remote node listens on
+        type listen_port: int
+        return: True if the connection should be kept, False if it must be closed
+        """
+        if node_id == self.node.node_id:
+            # We dialed ourselves through some alias of our own address
+            self.address_book.remove(peer.address)
+            return False
+
+        if peer.inbound:
+            peer.address = (peer.address[0], listen_port)
+        if self.address_book.is_banned(peer.address):
+            return False
+
+        existing = self.peers.get(node_id)
+        if existing is not None:
+            if existing.inbound == peer.inbound:
+                return False
+            lower_dialer_is_us = self.node.node_id < node_id
+            keep_new = peer.inbound != lower_dialer_is_us
+            if not keep_new:
+                return False
+            print(f"[P2P] Replacing duplicate connection {existing} with {peer}")
+            self.peers.pop(node_id)
+            asyncio.create_task(existing.close())
+        elif not self.has_capacity():
+            return False
+
+        peer.node_id = node_id
+        self.peers[node_id] = peer
+        if peer.inbound:
+            self.address_book.touch(peer.address)
+        else:
+            self.address_book.mark_success(peer.address)
+        return True
+
+    def unregister(self, peer: PeerConnection):
+        """
+        Forgets a closed connection unless it was already replaced by another one.
+
+        param peer: Connection that has been closed
+        type peer: PeerConnection
+        """
+        if peer.node_id is not None and self.peers.get(peer.node_id) is peer:
+            del self.peers[peer.node_id]
+
+    def penalize(self, peer: PeerConnection, points: float, reason: str):
+        """
+        Raises a peer's misbehavior score, disconnecting and banning it at P2P_BAN_SCORE.
+
+        param peer: Misbehaving peer
+        type peer: PeerConnection
+        param points: Penalty for the offence
+        type points: float
+        param reason: Short description for the log
+        type reason: str
+        """
+        score = peer.add_misbehavior(points)
+        if score < P2P_BAN_SCORE:
+            return
+        print(f"[P2P] Banning {peer} for {P2P_BAN_TIME:.0f}s: {reason} (score {score:.0f})")
+        self.address_book.ban(peer.address, P2P_BAN_TIME)
+        self.unregister(peer)
+        asyncio.create_task(peer.close())
+
+    async def close_all(self):
+        """Closes every connection and persists the address book."""
+        for peer in list(self.peers.values()):
+            await peer.close()
+        self.peers.clear()
+        self.address_book.save()
@@ -5,7 +5,7 @@ as well as hashing messages for blockchain storage.
 Author: LunaLynx12
 """
 
-from dilithium_py.dilithium import Dilithium2 as Dilithium
+from pqc_backend import get_backend
 import hashlib
 import base64
 
@@ -19,6 +19,14 @@ def hash_message(message: str) -> str:
     """
     return hashlib.sha256(message.encode("utf-8")).hexdigest()
 
+def generate_dilithium_keys() -> tuple[bytes, bytes]:
+    """
+    Generates a Dilithium public/secret keypair.
+
+    return: Tuple (public_key, secret_key) in raw bytes
+    """
+    return get_backend().sign_keygen()
+
 def sign_message(secret_key: bytes, message: str) -> bytes:
     """
     Signs a message using the provided Dilithium private key.
@@ -31,7 +39,7 @@ def sign_message(secret_key: bytes, message: str) -> bytes:
     rtype: bytes
     """
     message_bytes = message.encode("utf-8")
-    return Dilithium.sign(secret_key, message_bytes)
+    return get_backend().sign(secret_key, message_bytes)
     
 def verify_signature(public_key: bytes, message: str, signature_b64: str) -> bool:
     """
@@ -50,7 +58,7 @@ def verify_signature(public_key: bytes, message: str, signature_b64: str) -> boo
     try:
         message_bytes = message.encode("utf-8")
         signature_bytes = base64.b64decode(signature_b64)
-        return Dilithium.verify(public_key, message_bytes, signature_bytes)
+        return get_backend().verify(public_key, message_bytes, signature_bytes)
     except Exception as e:
         print(f"[!] Signature verification error: {e}")
         return False
@@ -2,12 +2,30 @@
 Implements AES-GCM symmetric encryption using shared key from Kyber.
 Used to encrypt/decrypt messages after establishing a shared secret via Kyber.
 
+Large payloads use a chunked streaming format instead of a single blob:
+
+    header: version (1B) + nonce prefix (7B) + chunk size (4B, big-endian)
+    chunks: ciphertext + tag (16B), every chunk but the last holding exactly
+            chunk size plaintext bytes
+
+Chunk i is sealed under the nonce `prefix + i (4B) + final flag (1B)` with
+the header as associated data, so reordering, dropping, truncating or
+extending the stream fails authentication.
+
 Author: LunaLynx12
 """
 
 
+from typing import Iterable, Iterator
+from config import STREAM_CHUNK_SIZE
+from Crypto.Random import get_random_bytes
 from Crypto.Cipher import AES
 
+
+STREAM_VERSION = 1
+STREAM_HEADER_SIZE = 12
+STREAM_TAG_SIZE = 16
+
 def aes_encrypt(key: bytes, plaintext: str) -> bytes:
     """
     Encrypts a plaintext string using AES-GCM with a shared key.
@@ -52,4 +70,237 @@ def aes_decrypt(key: bytes, data: bytes) -> str:
         plaintext = cipher.decrypt_and_verify(ciphertext, tag)
         return plaintext.decode()
     except ValueError as e:
-        raise ValueError(f"Decryption failed - authentication tag mismatch: {e}")
\ No newline at end of file
+        raise ValueError(f"Decryption failed - authentication tag mismatch: {e}")
+
+def wrap_key(kek: bytes, key: bytes) -> bytes:
+    """
+    Wraps a content key under a key-encryption key using AES-GCM.
+
+    Output layout: `nonce (12B) + tag (16B) + wrapped key`.
+
+    param kek: Key-encryption key, typically a Kyber shared secret
+    type kek: bytes
+    param key: Content key to wrap
+    type key: bytes
+    return: Wrapped key blob
+    rtype: bytes
+    """
+    cipher = AES.new(kek[:32], AES.MODE_GCM, nonce=get_random_bytes(12))
+    cipher.update(b"key-wrap")
+    wrapped, tag = cipher.encrypt_and_digest(key)
+    return cipher.nonce + tag + wrapped
+
+def unwrap_key(kek: bytes, data: bytes) -> bytes:
+    """
+    Recovers a content key wrapped by wrap_key.
+
+    param kek: Key-encryption key
+    type kek: bytes
+    param data: Wrapped key blob
+    type data: bytes
+    return: Content key
+    rtype: bytes
+    raises ValueError: If the blob was not wrapped under this key or was tampered with
+    """
+    cipher = AES.new(kek[:32], AES.MODE_GCM, nonce=data[:12])
+    cipher.update(b"key-wrap")
+    return cipher.decrypt_and_verify(data[28:], data[12:28])
+
+
+
+def _chunk_cipher(key: bytes, prefix: bytes, header: bytes, index: int, final: bool):
+    if index >= 1 << 32:
+        raise ValueError("Stream too long")
+    nonce = prefix + index.to_bytes(4, "big") + (b"\x01" if final else b"\x00")
+    cipher = AES.new(key[:32], AES.MODE_GCM, nonce=nonce)
+    cipher.update(header)
+    return cipher
+
+
+class StreamEncryptor:
+    """
+    Incremental encryptor for the chunked streaming format.
+
+    Feed plaintext with update() in pieces of any size and call finalize()
+    once; the concatenated outputs form the encrypted stream. At most one
+    chunk of plaintext is buffered, so memory stays constant.
+    """
+    def __init__(self, key: bytes, chunk_size: int = STREAM_CHUNK_SIZE):
+        """
+        param key: Symmetric key (32 bytes)
+        type key: bytes
+        param chunk_size: Plaintext bytes per chunk
+        type chunk_size: int
+        """
+        self.key = key
+        self.chunk_size = chunk_size
+        self.prefix = get_random_bytes(7)
+        self.header = bytes([STREAM_VERSION]) + self.prefix + chunk_size.to_bytes(4, "big")
+        self.index = 0
+        self.size = 0
+        self._buffer = bytearray()
+        self._started = False
+        self._finished = False
+
+    def update(self, data: bytes) -> bytes:
+        """
+        Encrypts more plaintext.
+
+        param data: Next plaintext bytes
+        type data: bytes
+        return: Encrypted bytes ready to be written, possibly empty
+        rtype: bytes
+        """
+        if self._finished:
+            raise ValueError("Stream already finalized")
+        self._buffer += data
+        self.size += len(data)
+        out = bytearray(self._start())
+        # A full chunk is only sealed once more data follows it, since the last chunk carries the final flag
+        while len(self._buffer) > self.chunk_size:
+            out += self._seal(bytes(self._buffer[:self.chunk_size]), final=False)
+            del self._buffer[:self.chunk_size]
+        return bytes(out)
+
+    def finalize(self) -> bytes:
+        """
+        Seals the last chunk.
+
+        return: Remaining encrypted bytes
+        rtype: bytes
+        """
+        if self._finished:
+            raise ValueError("Stream already finalized")
+        self._finished = True
+        out = self._start() + self._seal(bytes(self._buffer), final=True)
+        self._buffer.clear()
+        return out
+
+    def _start(self) -> bytes:
+        if self._started:
+            return b""
+        self._started = True
+        return self.header
+
+    def _seal(self, chunk: bytes, final: bool) -> bytes:
+        ciphertext, tag = _chunk_cipher(self.key, self.prefix, self.header, self.index, final).encrypt_and_digest(chunk)
+        self.index += 1
+        return ciphertext + tag
+
+
+class StreamDecryptor:
+    """
+    Incremental decryptor for the chunked streaming format.
+
+    Plaintext is only released for chunks whose tag verified; finalize()
+    checks that the stream ended with its final chunk.
+    """
+    def __init__(self, key: bytes):
+        """
+        param key: Symmetric key (32 bytes)
+        type key: bytes
+        """
+        self.key = key
+        self.header = b""
+        self.index = 0
+        self._sealed_size = 0
+        self._buffer = bytearray()
+        self._finished = False
+
+    def update(self, data: bytes) -> bytes:
+        """
+        Decrypts more of the stream.
+
+        param data: Next encrypted bytes
+        type data: bytes
+        return: Authenticated plaintext, possibly empty
+        rtype: bytes
+        raises ValueError: If the header is invalid or a chunk fails authentication
+        """
+        if self._finished:
+            raise ValueError("Stream already finalized")
+        self._buffer += data
+        if not self.header:
+            if len(self._buffer) < STREAM_HEADER_SIZE:
+                return b""
+            header = bytes(self._buffer[:STREAM_HEADER_SIZE])
+            if header[0] != STREAM_VERSION:
+                raise ValueError(f"Unsupported stream version {header[0]}")
+            self.header = header
+            self._sealed_size = int.from_bytes(header[8:12], "big") + STREAM_TAG_SIZE
+            del self._buffer[:STREAM_HEADER_SIZE]
+        out = bytearray()
+        # Keep the last full chunk back until it is known not to be the final one
+        while len(self._buffer) > self._sealed_size:
+            out += self._open(bytes(self._buffer[:self._sealed_size]), final=False)
+            del self._buffer[:self._sealed_size]
+        return bytes(out)
+
+    def finalize(self) -> bytes:
+        """
+        Decrypts the last chunk.
+
+        return: Remaining plaintext
+        rtype: bytes
+        raises ValueError: If the stream is truncated or the last chunk fails authentication
+        """
+        if self._finished:
+            raise ValueError("Stream already finalized")
+        self._finished = True
+        if not self.header or len(self._buffer) < STREAM_TAG_SIZE:
+            raise ValueError("Stream truncated")
+        out = self._open(bytes(self._buffer), final=True)
+        self._buffer.clear()
+        return out
+
+    def _open(self, sealed: bytes, final: bool) -> bytes:
+        cipher = _chunk_cipher(self.key, self.header[1:8], self.header, self.index, final)
+        try:
+            plaintext = cipher.decrypt_and_verify(sealed[:-STREAM_TAG_SIZE], sealed[-STREAM_TAG_SIZE:])
+        except ValueError:
+            raise ValueError(f"Stream chunk {self.index} failed authentication")
+        self.index += 1
+        return plaintext
+
+
+def encrypt_stream(key: bytes, chunks: Iterable[bytes], chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Encrypts an iterable of plaintext pieces into the chunked streaming format.
+
+    param key: Symmetric key (32 bytes)
+    type key: bytes
+    param chunks: Plaintext pieces of any size
+    type chunks: Iterable[bytes]
+    param chunk_size: Plaintext bytes per chunk
+    type chunk_size: int
+    return: Iterator of encrypted pieces
+    rtype: Iterator[bytes]
+    """
+    encryptor = StreamEncryptor(key, chunk_size)
+    for chunk in chunks:
+        out = encryptor.update(chunk)
+        if out:
+            yield out
+    yield encryptor.finalize()
+
+
+def decrypt_stream(key: bytes, chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Decrypts an iterable of pieces of an encrypted stream.
+
+    param key: Symmetric key (32 bytes)
+    type key: bytes
+    param chunks: Encrypted pieces of any size
+    type chunks: Iterable[bytes]
+    return: Iterator of authenticated plaintext pieces
+    rtype: Iterator[bytes]
+    raises ValueError: If the stream was modified, reordered or truncated
+    """
+    decryptor = StreamDecryptor(key)
+    for chunk in chunks:
+        out = decryptor.update(chunk)
+        if out:
+            yield out
+    out = decryptor.finalize()
+    if out:
+        yield out
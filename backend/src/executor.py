@@ -0,0 +1,275 @@
+"""
+Execution Layer for Blocking Work
+
+The API is served by a single event loop per process, so pure-Python
+post-quantum crypto and synchronous sqlite calls must not run on it. The
+TaskExecutor sends CPU-bound work to a process pool and blocking I/O to a
+thread pool. Each lane admits a bounded number of tasks at once and a bounded
+number of waiters; requests beyond that are refused with 503 instead of
+piling up latency for everyone else. Every operation is timed by name.
+
+Author: LunaLynx12
+"""
+
+
+from config import EXECUTOR_CPU_WORKERS, EXECUTOR_IO_WORKERS, EXECUTOR_CPU_QUEUE, EXECUTOR_IO_QUEUE, API_WORKERS_ENV
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional
+from collections import deque
+from fastapi import HTTPException
+import asyncio
+import time
+import os
+
+
+def api_workers() -> int:
+    """Returns the number of API worker processes of this node, from API_WORKERS_ENV."""
+    return max(1, int(os.environ.get(API_WORKERS_ENV, "1")))
+
+
+def default_cpu_workers() -> int:
+    """
+    Returns this process's share of the cores.
+
+    With several API workers the chain-state process runs an executor too, so
+    the cores are split among the workers and that process.
+
+    return: Processes for the CPU pool, at least 1
+    rtype: int
+    """
+    workers = api_workers()
+    processes = workers + 1 if workers > 1 else 1
+    return max(1, (os.cpu_count() or 1) // processes)
+
+
+class OperationStats:
+    """
+    Latency record of one named operation.
+
+    Attributes:
+        count (int): Completed runs
+        errors (int): Runs that raised
+        rejected (int): Submissions refused because the lane was full
+        total (float): Summed run time in seconds
+        recent (Deque[float]): Run times of the latest runs, for percentiles
+        waits (Deque[float]): Queueing delays of the latest runs
+    """
+    __slots__ = ("count", "errors", "rejected", "total", "recent", "waits")
+
+    def __init__(self, window: int = 1024):
+        self.count = 0
+        self.errors = 0
+        self.rejected = 0
+        self.total = 0.0
+        self.recent: Deque[float] = deque(maxlen=window)
+        self.waits: Deque[float] = deque(maxlen=window)
+
+    @staticmethod
+    def _percentile(values, fraction: float) -> float:
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def describe(self) -> dict:
+        """Returns counts and latencies in milliseconds."""
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(self._percentile(self.recent, 0.50) * 1000, 3),
+            "p99_ms": round(self._percentile(self.recent, 0.99) * 1000, 3),
+            "max_ms": round(max(self.recent, default=0.0) * 1000, 3),
+            "p99_wait_ms": round(self._percentile(self.waits, 0.99) * 1000, 3),
+        }
+
+
+class _Lane:
+    """One pool with its admission limits."""
+    def __init__(self, name: str, pool: Executor, max_running: int, max_waiting: int):
+        self.name = name
+        self.pool = pool
+        self.max_running = max_running
+        self.max_waiting = max_waiting
+        self.slots = asyncio.Semaphore(max_running)
+        self.running = 0
+        self.waiting = 0
+
+    def describe(self) -> dict:
+        return {"running": self.running, "waiting": self.waiting, "max_waiting": self.max_waiting}
+
+
+class TaskExecutor:
+    """
+    Runs blocking work off the event loop.
+
+    Features:
+        - CPU lane: process pool for signing, key generation, encapsulation and key derivation
+        - I/O lane: thread pool for sqlite and file access
+        - At most one running task per pool worker and a bounded wait queue per lane;
+          a full queue answers 503 with Retry-After
+        - Per-operation counts, run time percentiles and queueing delay
+    """
+    def __init__(
+        self,
+        cpu_workers: Optional[int] = EXECUTOR_CPU_WORKERS,
+        io_workers: int = EXECUTOR_IO_WORKERS,
+        cpu_queue: int = EXECUTOR_CPU_QUEUE,
+        io_queue: int = EXECUTOR_IO_QUEUE,
+    ):
+        """
+        Initializes the executor; the pools are created by start().
+
+        param cpu_workers: Processes in the CPU pool, None for this process's share of the cores (see default_cpu_workers)
+        type cpu_workers: Optional[int]
+        param io_workers: Threads in the I/O pool
+        type io_workers: int
+        param cpu_queue: CPU tasks allowed to wait for a free process
+        type cpu_queue: int
+        param io_queue: I/O tasks allowed to wait for a free thread
+        type io_queue: int
+        """
+        # Resolved again by start(): the shared executor is created at import, before main.py sets API_WORKERS_ENV
+        self._requested_cpu_workers = cpu_workers
+        self.cpu_workers = cpu_workers or default_cpu_workers()
+        self.io_workers = io_workers
+        self.cpu_queue = cpu_queue
+        self.io_queue = io_queue
+        self.cpu: Optional[_Lane] = None
+        self.io: Optional[_Lane] = None
+        self.operations: Dict[str, OperationStats] = {}
+
+    def start(self):
+        """Creates the pools; must be called from the event loop that will use them."""
+        if self.cpu is not None:
+            return
+        self.cpu_workers = self._requested_cpu_workers or default_cpu_workers()
+        processes = ProcessPoolExecutor(max_workers=self.cpu_workers)
+        # Fork the workers now rather than on the first requests
+        for _ in range(self.cpu_workers):
+            processes.submit(os.getpid)
+        self.cpu = _Lane("cpu", processes, self.cpu_workers, self.cpu_queue)
+        self.io = _Lane("io", ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="io"), self.io_workers, self.io_queue)
+
+    def shutdown(self):
+        """Stops both pools, cancelling queued work."""
+        for lane in (self.cpu, self.io):
+            if lane is not None:
+                lane.pool.shutdown(wait=False, cancel_futures=True)
+        self.cpu = self.io = None
+
+    async def run_cpu(self, operation: str, fn: Callable, *args) -> Any:
+        """
+        Runs a CPU-bound function in the process pool.
+
+        The function and its arguments must be picklable (module-level functions).
+
+        param operation: Name the timing is recorded under
+        type operation: str
+        param fn: Function to run
+        type fn: Callable
+        return: The function's result
+        """
+        if self.cpu is None:
+            self.start()
+        return await self._run(self.cpu, operation, fn, args)
+
+    async def run_cpu_background(self, operation: str, fn: Callable, *args) -> Any:
+        """
+        Runs CPU-bound background work (block sync) in the process pool.
+
+        Unlike run_cpu it is never refused: the caller bounds how much work it
+        has in flight, and its waiting jobs do not count against the queue
+        limit, so a sync backlog cannot get API requests refused.
+
+        param operation: Name the timing is recorded under
+        type operation: str
+        param fn: Function to run
+        type fn: Callable
+        return: The function's result
+        """
+        if self.cpu is None:
+            self.start()
+        return await self._run(self.cpu, operation, fn, args, admit=False)
+
+    async def run_io(self, operation: str, fn: Callable, *args) -> Any:
+        """
+        Runs a blocking I/O function in the thread pool.
+
+        param operation: Name the timing is recorded under
+        type operation: str
+        param fn: Function to run
+        type fn: Callable
+        return: The function's result
+        """
+        if self.io is None:
+            self.start()
+        return await self._run(self.io, operation, fn, args)
+
+    async def _run(self, lane: _Lane, operation: str, fn: Callable, args: tuple, admit: bool = True) -> Any:
+        stats = self.operations.get(operation)
+        if stats is None:
+            stats = self.operations[operation] = OperationStats()
+        if admit and lane.slots.locked() and lane.waiting >= lane.max_waiting:
+            stats.rejected += 1
+            raise HTTPException(status_code=503, detail=f"Server busy ({lane.name} queue full)", headers={"Retry-After": "1"})
+
+        queued_at = time.perf_counter()
+        waiting = 1 if admit else 0
+        lane.waiting += waiting
+        try:
+            await lane.slots.acquire()
+        finally:
+            lane.waiting -= waiting
+        started_at = time.perf_counter()
+        lane.running += 1
+
+        def finished(job: asyncio.Future):
+            # The slot is held until the job itself ends, even if its caller was cancelled
+            lane.running -= 1
+            lane.slots.release()
+            finished_at = time.perf_counter()
+            if job.cancelled() or job.exception() is not None:
+                stats.errors += 1
+            stats.count += 1
+            stats.total += finished_at - started_at
+            stats.recent.append(finished_at - started_at)
+            stats.waits.append(started_at - queued_at)
+
+        try:
+            job = asyncio.get_running_loop().run_in_executor(lane.pool, fn, *args)
+        except Exception:
+            lane.running -= 1
+            lane.slots.release()
+            stats.errors += 1
+            raise
+        job.add_done_callback(finished)
+        return await asyncio.shield(job)
+
+    def cpu_idle(self) -> bool:
+        """True if the CPU lane has a free process and nobody waiting, i.e. background work will not delay requests."""
+        return self.cpu is not None and self.cpu.waiting == 0 and self.cpu.running < self.cpu.max_running
+
+    def stats(self) -> dict:
+        """Returns lane occupancy and per-operation timings."""
+        return {
+            "pid": os.getpid(),
+            "lanes": {lane.name: lane.describe() for lane in (self.cpu, self.io) if lane is not None},
+            "operations": {name: stats.describe() for name, stats in sorted(self.operations.items())},
+        }
+
+
+_executor = TaskExecutor()
+"""
+Executor of this process, shared by the routes and the state service.
+"""
+
+def get_executor() -> TaskExecutor:
+    """
+    Returns the executor of this process.
+
+    return: Shared TaskExecutor instance
+    rtype: TaskExecutor
+    """
+    return _executor
@@ -5,10 +5,11 @@ Author: LunaLynx12
 """
 
 
-from dilithium_py.dilithium import Dilithium2 as Dilithium
-from mnemonics import seed_to_master_key
-from kyber_py.ml_kem import ML_KEM_512
-from typing import Tuple
+from mnemonics import mnemonic_to_entropy, normalize_mnemonic, seed_to_master_key
+from executor import TaskExecutor, get_executor
+from pqc_backend import REFERENCE_BACKEND
+from typing import Optional, Tuple
+import asyncio
 
 
 def derive_dilithium_keypair(mnemonic: str) -> Tuple[bytes, bytes]:
@@ -18,8 +19,7 @@ def derive_dilithium_keypair(mnemonic: str) -> Tuple[bytes, bytes]:
     :param mnemonic: Recovery phrase (12–24 words)
     :return: (public_key, secret_key) bytes
     """
-    seed = seed_to_master_key(mnemonic)
-    return Dilithium.keygen(seed[:32])  # Use first 32 bytes as seed
+    return generate_dilithium_keys_from_seed(seed_to_master_key(normalize_mnemonic(mnemonic)))
 
 
 def derive_kyber_keypair(mnemonic: str) -> Tuple[bytes, bytes]:
@@ -29,10 +29,45 @@ def derive_kyber_keypair(mnemonic: str) -> Tuple[bytes, bytes]:
     :param mnemonic: Recovery phrase (12–24 words)
     :return: (public_key, secret_key) bytes
     """
-    seed = seed_to_master_key(mnemonic)
+    seed = seed_to_master_key(normalize_mnemonic(mnemonic))
     return generate_kyber_keys_from_seed(seed)
 
 
+async def derive_identity(mnemonic: str, executor: Optional[TaskExecutor] = None) -> Tuple[Tuple[bytes, bytes], Tuple[bytes, bytes]]:
+    """
+    Derives both keypairs of an account from its mnemonic.
+
+    The phrase is normalized (NFKD, single spaces) and its checksum checked
+    before anything else, the seed is computed once, and the two keygens run
+    in parallel in the process pool.
+
+    :param mnemonic: Recovery phrase (12–24 words)
+    :param executor: Executor running the derivation, defaults to the process executor
+    :return: ((dilithium_public, dilithium_secret), (kyber_public, kyber_secret))
+    :raises ValueError: If the mnemonic is malformed or its checksum is wrong
+    """
+    mnemonic = normalize_mnemonic(mnemonic)
+    mnemonic_to_entropy(mnemonic)
+    executor = executor or get_executor()
+    seed = await executor.run_cpu("mnemonic_seed", seed_to_master_key, mnemonic)
+    dilithium, kyber = await asyncio.gather(
+        executor.run_cpu("derive_dilithium", generate_dilithium_keys_from_seed, seed),
+        executor.run_cpu("derive_kyber", generate_kyber_keys_from_seed, seed),
+    )
+    return dilithium, kyber
+
+
+def generate_dilithium_keys_from_seed(seed: bytes) -> Tuple[bytes, bytes]:
+    """
+    Dilithium key generation using deterministic seed.
+
+    :param seed: Master key derived from the mnemonic
+    :return: (public_key, secret_key) bytes
+    """
+    # Seeded keygen must match on every node, so it always uses the reference backend
+    return REFERENCE_BACKEND.sign_keygen_from_seed(seed[:32])  # Use first 32 bytes as seed
+
+
 def generate_kyber_keys_from_seed(seed: bytes) -> Tuple[bytes, bytes]:
     """
     Custom Kyber key generation using deterministic seed.
@@ -40,6 +75,5 @@ def generate_kyber_keys_from_seed(seed: bytes) -> Tuple[bytes, bytes]:
     :param seed: Random entropy used to derive keys
     :return: (public_key, secret_key) bytes
     """
-    # You can hash or split the seed further if needed
-    public_key, secret_key = ML_KEM_512.keygen(seed[:32])
+    public_key, secret_key = REFERENCE_BACKEND.kem_keygen_from_seed(seed[:64])
     return public_key, secret_key
\ No newline at end of file
@@ -0,0 +1,195 @@
+"""
+Pre-generated Key Pool
+
+Registration needs a fresh Dilithium and a fresh ML-KEM-512 keypair. Instead
+of generating them while the client waits, a background task keeps a buffer of
+keypairs per algorithm, generated in batches by the CPU pool whenever it has
+nothing else to do. Requests take from the buffer and only generate inline
+when it has run dry.
+
+Author: LunaLynx12
+"""
+
+
+from config import KEY_POOL_SIZE, KEY_POOL_BATCH, KEY_POOL_IDLE_WAIT
+from executor import TaskExecutor, api_workers, get_executor
+from dilithium import generate_dilithium_keys
+from kyber import generate_kyber_keys
+from pqc_backend import get_backend
+from typing import Deque, Dict, List, Optional, Tuple
+from collections import deque
+import asyncio
+import time
+
+
+KEY_GENERATORS = {
+    "dilithium": generate_dilithium_keys,
+    "kyber": generate_kyber_keys,
+}
+
+
+def generate_keypairs(kind: str, count: int) -> List[Tuple[bytes, bytes]]:
+    """
+    Generates a batch of keypairs; runs in a worker process.
+
+    param kind: Key algorithm, a key of KEY_GENERATORS
+    type kind: str
+    param count: Number of keypairs
+    type count: int
+    return: List of (public_key, secret_key)
+    """
+    backend = get_backend()
+    if kind == "dilithium":
+        return backend.sign_keygen_batch(count)
+    return backend.kem_keygen_batch(count)
+
+
+class KeyPool:
+    """
+    Buffers of unused keypairs, one per algorithm, refilled in the background.
+
+    Features:
+        - Constant-time take() from the buffer on the request path
+        - Refills in batches, only while the CPU pool is idle, so it never
+          competes with requests
+        - Inline generation when a buffer is empty
+        - Fill level, hits, misses and refill rate for the metrics route
+    """
+    def __init__(
+        self,
+        executor: Optional[TaskExecutor] = None,
+        size: Optional[int] = None,
+        batch: int = KEY_POOL_BATCH,
+        idle_wait: float = KEY_POOL_IDLE_WAIT,
+    ):
+        """
+        Initializes the pool; buffers start empty and fill once start() is called.
+
+        param executor: Executor whose CPU pool generates the keys, defaults to the process executor
+        type executor: Optional[TaskExecutor]
+        param size: Keypairs kept per algorithm, None for this API worker's share of KEY_POOL_SIZE
+        type size: Optional[int]
+        param batch: Keypairs generated per background task
+        type batch: int
+        param idle_wait: Seconds between checks while the CPU pool is busy
+        type idle_wait: float
+        """
+        self.executor = executor or get_executor()
+        # With several API workers each keeps a share, so together they hold and refill KEY_POOL_SIZE keys
+        self.size = size or max(1, KEY_POOL_SIZE // api_workers())
+        self.batch = batch
+        self.idle_wait = idle_wait
+        self.buffers: Dict[str, Deque[Tuple[bytes, bytes]]] = {kind: deque() for kind in KEY_GENERATORS}
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self._refills: Deque[Tuple[float, int]] = deque(maxlen=64)
+        self._drained = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Starts the background refill task."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._refill_loop())
+
+    async def stop(self):
+        """Stops refilling; keys already buffered are discarded with the pool."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def take(self, kind: str) -> Optional[Tuple[bytes, bytes]]:
+        """
+        Removes a pre-generated keypair from the buffer.
+
+        param kind: Key algorithm
+        type kind: str
+        return: (public_key, secret_key), or None if the buffer is empty
+        """
+        buffer = self.buffers[kind]
+        if len(buffer) < self.size:
+            self._drained.set()
+        if not buffer:
+            return None
+        return buffer.popleft()
+
+    async def get(self, kind: str) -> Tuple[bytes, bytes]:
+        """
+        Returns an unused keypair, generating one in the CPU pool if the buffer is empty.
+
+        param kind: Key algorithm
+        type kind: str
+        return: (public_key, secret_key)
+        """
+        keypair = self.take(kind)
+        if keypair is not None:
+            self.hits += 1
+            return keypair
+        self.misses += 1
+        return await self.executor.run_cpu(f"{kind}_keygen", KEY_GENERATORS[kind])
+
+    def _most_depleted(self) -> Optional[str]:
+        kind = min(self.buffers, key=lambda k: len(self.buffers[k]))
+        return kind if len(self.buffers[kind]) < self.size else None
+
+    async def _refill_loop(self):
+        """Tops up the emptiest buffer one batch at a time while the CPU pool is idle."""
+        while True:
+            kind = self._most_depleted()
+            if kind is None:
+                self._drained.clear()
+                await self._drained.wait()
+                continue
+            if not self.executor.cpu_idle():
+                await asyncio.sleep(self.idle_wait)
+                continue
+            count = min(self.batch, self.size - len(self.buffers[kind]))
+            try:
+                keypairs = await self.executor.run_cpu(f"{kind}_keypool", generate_keypairs, kind, count)
+            except Exception as e:
+                print(f"[KeyPool] Refill of {kind} keys failed: {e}")
+                await asyncio.sleep(self.idle_wait)
+                continue
+            self.buffers[kind].extend(keypairs)
+            self.generated += len(keypairs)
+            self._refills.append((time.monotonic(), len(keypairs)))
+
+    def refill_rate(self) -> float:
+        """Keypairs generated per second over the recent refills."""
+        if len(self._refills) < 2:
+            return 0.0
+        elapsed = time.monotonic() - self._refills[0][0]
+        return sum(count for _, count in list(self._refills)[1:]) / elapsed if elapsed > 0 else 0.0
+
+    def stats(self) -> dict:
+        """Returns fill levels, hit/miss counts and the refill rate."""
+        return {
+            "capacity": self.size,
+            "fill": {kind: len(buffer) for kind, buffer in self.buffers.items()},
+            "hits": self.hits,
+            "misses": self.misses,
+            "generated": self.generated,
+            "refill_rate_per_s": round(self.refill_rate(), 2),
+        }
+
+
+_key_pool: Optional[KeyPool] = None
+"""
+Key pool of this process, created on first use.
+"""
+
+def get_key_pool() -> KeyPool:
+    """
+    Returns the key pool of this process.
+
+    return: Shared KeyPool instance
+    rtype: KeyPool
+    """
+    global _key_pool
+    if _key_pool is None:
+        _key_pool = KeyPool()
+    return _key_pool
@@ -6,7 +6,7 @@ Author: LunaLynx12
 """
 
 
-from kyber_py.ml_kem import ML_KEM_512
+from pqc_backend import get_backend
 
 def generate_kyber_keys():
     """
@@ -16,7 +16,7 @@ def generate_kyber_keys():
         - public_key (bytes): Encoded public key for sharing
         - secret_key (bytes): Secret key for decryption
     """
-    public_key, secret_key = ML_KEM_512.keygen()
+    public_key, secret_key = get_backend().kem_keygen()
     return public_key, secret_key
 
 
@@ -32,7 +32,7 @@ def generate_shared_key(public_key: bytes) -> tuple[bytes, bytes]:
         - shared_key (bytes): Symmetric key derived during encapsulation
         - ciphertext (bytes): Encrypted data to be sent to the recipient
     """
-    return ML_KEM_512.encaps(public_key)
+    return get_backend().encaps(public_key)
 
 
 def recover_shared_key(secret_key: bytes, ciphertext: bytes) -> bytes:
@@ -48,4 +48,4 @@ def recover_shared_key(secret_key: bytes, ciphertext: bytes) -> bytes:
     return: Shared secret key used for symmetric encryption/decryption.
     rtype: bytes
     """
-    return ML_KEM_512.decaps(secret_key, ciphertext)
\ No newline at end of file
+    return get_backend().decaps(secret_key, ciphertext)
\ No newline at end of file
@@ -8,7 +8,7 @@ Author: LunaLynx12
 """
 
 
-from typing import Optional, Generator
+from typing import Callable, Dict, List, Optional, Generator, Tuple
 from config import DATABASE
 import sqlite3
 import os
@@ -23,6 +23,10 @@ def init_db():
         - users: Stores user identity and cryptographic keys
         - messages: Stores encrypted messages between users
         - validators: Tracks validator nodes in the network (linked to users)
+        - validator_keys: Key history of each validator, one row per (key, block height range)
+        - sessions: Kyber shared secrets reused for the private messages of a sender-recipient pair
+        - message_wraps: Per-recipient wraps of the content key of a group message
+        - blobs / blob_chunks: Manifests and reference counts of the content-addressed blob store
 
     return: None
     """
@@ -67,6 +71,82 @@ def init_db():
         )
     ''')
 
+    # Create validator key history table; at most one range per validator is still open
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS validator_keys (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            address TEXT NOT NULL,
+            public_key TEXT,
+            from_height INTEGER NOT NULL,
+            to_height INTEGER,
+            FOREIGN KEY(address) REFERENCES validators(address) ON DELETE CASCADE
+        )
+    ''')
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS validator_keys_open ON validator_keys (address) WHERE to_height IS NULL")
+
+    # Create sessions table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY NOT NULL,
+            sender TEXT NOT NULL,
+            receiver TEXT NOT NULL,
+            kem_ciphertext TEXT NOT NULL,
+            shared_secret TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            message_count INTEGER NOT NULL DEFAULT 0,
+            kem_confirmed INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS sessions_pair ON sessions (sender, receiver, created_at)")
+
+    # Create message wraps table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS message_wraps (
+            message_id INTEGER NOT NULL,
+            receiver TEXT NOT NULL,
+            kem_ciphertext TEXT NOT NULL,
+            wrapped_key TEXT NOT NULL,
+            PRIMARY KEY (message_id, receiver),
+            FOREIGN KEY(message_id) REFERENCES messages(id) ON DELETE CASCADE
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS message_wraps_receiver ON message_wraps (receiver)")
+
+    # Create blob store tables
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS blobs (
+            hash TEXT PRIMARY KEY NOT NULL,
+            size INTEGER NOT NULL,
+            chunks TEXT NOT NULL,
+            refcount INTEGER NOT NULL DEFAULT 1
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS blob_chunks (
+            hash TEXT PRIMARY KEY NOT NULL,
+            size INTEGER NOT NULL,
+            refcount INTEGER NOT NULL DEFAULT 1
+        )
+    ''')
+
+    # Messages stored before sessions existed lack the session columns
+    existing = {row[1] for row in c.execute("PRAGMA table_info(messages)")}
+    for column, definition in (("session_id", "TEXT"), ("counter", "INTEGER")):
+        if column not in existing:
+            c.execute(f"ALTER TABLE messages ADD COLUMN {column} {definition}")
+
+    # Sessions stored before KEM confirmation was tracked lack its column
+    if "kem_confirmed" not in {row[1] for row in c.execute("PRAGMA table_info(sessions)")}:
+        c.execute("ALTER TABLE sessions ADD COLUMN kem_confirmed INTEGER NOT NULL DEFAULT 0")
+
+    # Databases that kept one key per validator in the validators table start their history from it
+    existing = {row[1] for row in c.execute("PRAGMA table_info(validators)")}
+    if "added_height" in existing and c.execute("SELECT 1 FROM validator_keys LIMIT 1").fetchone() is None:
+        c.execute('''
+            INSERT INTO validator_keys (address, public_key, from_height, to_height)
+            SELECT address, public_key, added_height, removed_height FROM validators ORDER BY id
+        ''')
+
     conn.commit()
     conn.close()
 
@@ -134,6 +214,295 @@ def add_user(address: str, dilithium_pub: str, dilithium_priv: str, kyber_pub: s
     conn.close()
 
 
+def add_message(sender: str, receiver: str, content: str, timestamp: str, signature: str, ciphertext: str, session_id: str = "", counter: int = 0):
+    """
+    Stores a sent message.
+
+    param sender: Sender address, or SYSTEM for registration notices
+    type sender: str
+    param receiver: Recipient address, or public
+    type receiver: str
+    param content: Plaintext for public messages, encrypted payload otherwise
+    type content: str
+    param timestamp: UTC timestamp (ISO format)
+    type timestamp: str
+    param signature: Base64 Dilithium signature
+    type signature: str
+    param ciphertext: Base64 Kyber ciphertext on the first message of a session, empty otherwise
+    type ciphertext: str
+    param session_id: Session the message key was derived from, empty for public messages
+    type session_id: str
+    param counter: Message number within the session
+    type counter: int
+    return: None
+    """
+    with sqlite3.connect(DATABASE) as db:
+        db.execute("""
+            INSERT INTO messages (sender, receiver, content, timestamp, signature, ciphertext, session_id, counter)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (sender, receiver, content, timestamp, signature, ciphertext, session_id or None, counter or None))
+        db.commit()
+
+
+def add_group_message(sender: str, content: str, timestamp: str, signature: str, wraps: Dict[str, Tuple[str, str]]) -> int:
+    """
+    Stores a group message once, together with one content-key wrap per recipient.
+
+    param sender: Sender address
+    type sender: str
+    param content: Base64 ciphertext of the content
+    type content: str
+    param timestamp: ISO timestamp
+    type timestamp: str
+    param signature: Base64 Dilithium signature
+    type signature: str
+    param wraps: Recipient address -> (Base64 Kyber ciphertext, Base64 wrapped content key)
+    type wraps: Dict[str, Tuple[str, str]]
+    return: Id of the stored message
+    rtype: int
+    """
+    with sqlite3.connect(DATABASE) as db:
+        cursor = db.execute("""
+            INSERT INTO messages (sender, receiver, content, timestamp, signature, ciphertext)
+            VALUES (?, 'group', ?, ?, ?, '')
+        """, (sender, content, timestamp, signature))
+        message_id = cursor.lastrowid
+        db.executemany("""
+            INSERT INTO message_wraps (message_id, receiver, kem_ciphertext, wrapped_key)
+            VALUES (?, ?, ?, ?)
+        """, [(message_id, receiver, kem_ciphertext, wrapped_key) for receiver, (kem_ciphertext, wrapped_key) in wraps.items()])
+        db.commit()
+    return message_id
+
+
+def add_session(session_id: str, sender: str, receiver: str, kem_ciphertext: str, shared_secret: str, created_at: float):
+    """
+    Stores a newly established Kyber session.
+
+    param session_id: Session identifier
+    type session_id: str
+    param sender: Sender address
+    type sender: str
+    param receiver: Recipient address
+    type receiver: str
+    param kem_ciphertext: Base64 Kyber ciphertext the recipient decapsulates
+    type kem_ciphertext: str
+    param shared_secret: Base64 shared secret
+    type shared_secret: str
+    param created_at: Unix time of establishment
+    type created_at: float
+    return: None
+    """
+    with sqlite3.connect(DATABASE) as db:
+        db.execute("""
+            INSERT INTO sessions (session_id, sender, receiver, kem_ciphertext, shared_secret, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (session_id, sender, receiver, kem_ciphertext, shared_secret, created_at))
+        db.commit()
+
+
+def get_latest_session(sender: str, receiver: str) -> Optional[dict]:
+    """
+    Returns the most recently established session of a sender-recipient pair.
+
+    param sender: Sender address
+    type sender: str
+    param receiver: Recipient address
+    type receiver: str
+    return: Session row as a dictionary, or None if the pair has none
+    rtype: Optional[dict]
+    """
+    with sqlite3.connect(DATABASE) as db:
+        db.row_factory = sqlite3.Row
+        row = db.execute("""
+            SELECT * FROM sessions WHERE sender = ? AND receiver = ?
+            ORDER BY created_at DESC LIMIT 1
+        """, (sender, receiver)).fetchone()
+    return dict(row) if row else None
+
+
+def next_session_counter(session_id: str) -> Tuple[int, bool]:
+    """
+    Atomically allocates the next message number of a session.
+
+    The increment happens in SQLite, so API workers sharing the database
+    never hand out the same number twice.
+
+    param session_id: Session identifier
+    type session_id: str
+    return: (the allocated number, starting at 1; True if the session's KEM ciphertext is already on chain)
+    rtype: Tuple[int, bool]
+    """
+    with sqlite3.connect(DATABASE) as db:
+        row = db.execute(
+            "UPDATE sessions SET message_count = message_count + 1 WHERE session_id = ? RETURNING message_count, kem_confirmed",
+            (session_id,),
+        ).fetchone()
+        db.commit()
+    if row is None:
+        raise KeyError(f"Unknown session {session_id}")
+    return row[0], bool(row[1])
+
+
+def confirm_sessions(session_ids: List[str]) -> int:
+    """
+    Records that a block carrying the KEM ciphertext of these sessions reached the chain.
+
+    param session_ids: Session identifiers
+    type session_ids: List[str]
+    return: Number of sessions of this node that were confirmed
+    rtype: int
+    """
+    with sqlite3.connect(DATABASE) as db:
+        cursor = db.executemany(
+            "UPDATE sessions SET kem_confirmed = 1 WHERE session_id = ? AND kem_confirmed = 0",
+            [(session_id,) for session_id in session_ids],
+        )
+        db.commit()
+    return cursor.rowcount
+
+
+def pin_blob_chunk(chunk_hash: str, size: int):
+    """
+    Counts one reference to a chunk a blob writer is about to store.
+
+    The writer pins each chunk before writing its file, so a concurrent release
+    of another blob sharing the chunk cannot delete it before the new blob is
+    registered.
+
+    param chunk_hash: SHA-256 of the chunk, hex
+    type chunk_hash: str
+    param size: Chunk size in bytes
+    type size: int
+    """
+    with sqlite3.connect(DATABASE) as db:
+        db.execute("""
+            INSERT INTO blob_chunks (hash, size) VALUES (?, ?)
+            ON CONFLICT(hash) DO UPDATE SET refcount = refcount + 1
+        """, (chunk_hash, size))
+        db.commit()
+
+
+def _drop_chunk_references(db: sqlite3.Connection, chunks: List[str]) -> List[str]:
+    """Drops one reference per listed chunk and forgets the chunks left unreferenced, returning their hashes."""
+    if not chunks:
+        return []
+    db.executemany("UPDATE blob_chunks SET refcount = refcount - 1 WHERE hash = ?", [(c,) for c in chunks])
+    unused = [r[0] for r in db.execute(
+        f"SELECT hash FROM blob_chunks WHERE refcount <= 0 AND hash IN ({', '.join('?' * len(chunks))})", chunks
+    )]
+    db.executemany("DELETE FROM blob_chunks WHERE hash = ?", [(c,) for c in unused])
+    return unused
+
+
+def add_blob_reference(blob_hash: str, size: int, chunks: List[Tuple[str, int]]) -> List[str]:
+    """
+    Records one more reference to a blob, registering its manifest if it is new.
+
+    The chunks were pinned by the writer with pin_blob_chunk: a new blob keeps
+    those references, while a blob that is already stored drops them in the
+    same transaction, so concurrent writers of the same content never count
+    its chunks twice.
+
+    param blob_hash: SHA-256 of the blob, hex
+    type blob_hash: str
+    param size: Blob size in bytes
+    type size: int
+    param chunks: (chunk_hash, chunk_size) in blob order, pinned by the caller
+    type chunks: List[Tuple[str, int]]
+    return: Hashes of chunks no longer referenced by any blob, whose data can be deleted
+    rtype: List[str]
+    """
+    with sqlite3.connect(DATABASE) as db:
+        refcount = db.execute("""
+            INSERT INTO blobs (hash, size, chunks) VALUES (?, ?, ?)
+            ON CONFLICT(hash) DO UPDATE SET refcount = refcount + 1
+            RETURNING refcount
+        """, (blob_hash, size, ",".join(chunk_hash for chunk_hash, _ in chunks))).fetchone()[0]
+        unused = [] if refcount == 1 else _drop_chunk_references(db, [chunk_hash for chunk_hash, _ in chunks])
+        db.commit()
+    return unused
+
+
+def release_blob_chunks(chunks: List[str]) -> List[str]:
+    """
+    Drops the pins of a blob writer that was aborted.
+
+    param chunks: Hashes of the chunks pinned by the writer
+    type chunks: List[str]
+    return: Hashes of chunks no longer referenced by any blob, whose data can be deleted
+    rtype: List[str]
+    """
+    with sqlite3.connect(DATABASE) as db:
+        unused = _drop_chunk_references(db, chunks)
+        db.commit()
+    return unused
+
+
+def get_blob_manifest(blob_hash: str) -> Optional[Tuple[int, List[str]]]:
+    """
+    Returns the size and chunk hashes of a stored blob.
+
+    param blob_hash: SHA-256 of the blob, hex
+    type blob_hash: str
+    return: (size, chunk_hashes), or None if the blob is not stored
+    rtype: Optional[Tuple[int, List[str]]]
+    """
+    with sqlite3.connect(DATABASE) as db:
+        row = db.execute("SELECT size, chunks FROM blobs WHERE hash = ?", (blob_hash,)).fetchone()
+    if row is None:
+        return None
+    return row[0], row[1].split(",") if row[1] else []
+
+
+def release_blob_reference(blob_hash: str) -> List[str]:
+    """
+    Drops one reference to a blob, forgetting it and its unshared chunks at zero.
+
+    param blob_hash: SHA-256 of the blob, hex
+    type blob_hash: str
+    return: Hashes of chunks no longer referenced by any blob, whose data can be deleted
+    rtype: List[str]
+    """
+    with sqlite3.connect(DATABASE) as db:
+        row = db.execute(
+            "UPDATE blobs SET refcount = refcount - 1 WHERE hash = ? RETURNING refcount, chunks", (blob_hash,)
+        ).fetchone()
+        if row is None or row[0] > 0:
+            db.commit()
+            return []
+        db.execute("DELETE FROM blobs WHERE hash = ?", (blob_hash,))
+        unused = _drop_chunk_references(db, row[1].split(",") if row[1] else [])
+        db.commit()
+    return unused
+
+
+def delete_unreferenced_chunk(chunk_hash: str, delete: Callable[[], None]) -> bool:
+    """
+    Runs delete if no blob and no writer references a chunk.
+
+    The check and the deletion happen under the database write lock, which
+    pin_blob_chunk also takes, so a chunk cannot be pinned in between.
+
+    param chunk_hash: SHA-256 of the chunk, hex
+    type chunk_hash: str
+    param delete: Removes the chunk's data
+    type delete: Callable[[], None]
+    return: True if the chunk was unreferenced and delete ran
+    rtype: bool
+    """
+    db = sqlite3.connect(DATABASE, isolation_level=None)
+    try:
+        db.execute("BEGIN IMMEDIATE")
+        unreferenced = db.execute("SELECT 1 FROM blob_chunks WHERE hash = ?", (chunk_hash,)).fetchone() is None
+        if unreferenced:
+            delete()
+        db.execute("COMMIT")
+    finally:
+        db.close()
+    return unreferenced
+
+
 def get_user_by_address(address: str) -> Optional[dict]:
     """
     Retrieves a user's public and private key information based on their address.
@@ -159,6 +528,116 @@ def get_user_by_address(address: str) -> Optional[dict]:
         }
     return None
 
+def get_kyber_public_keys(addresses: List[str]) -> Dict[str, str]:
+    """
+    Looks up the Kyber public keys of several users in one query.
+
+    param addresses: User addresses
+    type addresses: List[str]
+    return: Address -> Base64 Kyber public key, for the users that exist and have one
+    rtype: Dict[str, str]
+    """
+    if not addresses:
+        return {}
+    with sqlite3.connect(DATABASE) as db:
+        rows = db.execute(
+            f"SELECT address, kyber_pub FROM users WHERE address IN ({', '.join('?' * len(addresses))})",
+            list(addresses),
+        ).fetchall()
+    return {address: kyber_pub for address, kyber_pub in rows if kyber_pub}
+
+
+def get_validator_keys() -> List[dict]:
+    """
+    Returns the key history of every validator, including closed ranges.
+
+    return: List of dictionaries with address, public_key, from_height and to_height, oldest first
+    rtype: List[dict]
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT address, public_key, from_height, to_height FROM validator_keys ORDER BY id")
+    rows = cursor.fetchall()
+    conn.close()
+    return [
+        {"address": row[0], "public_key": row[1], "from_height": row[2], "to_height": row[3]}
+        for row in rows
+    ]
+
+
+def open_validator_key(address: str, public_key: Optional[str], from_height: int):
+    """
+    Starts a new key range for a validator, closing its open range at the same height.
+
+    Closed ranges are never changed, so blocks signed under an earlier key
+    keep verifying against it.
+
+    param address: Validator identifier
+    type address: str
+    param public_key: Base64 Dilithium public key, None if not known yet
+    type public_key: Optional[str]
+    param from_height: First block index the key may sign
+    type from_height: int
+    return: None
+    """
+    with sqlite3.connect(DATABASE) as db:
+        db.execute("INSERT OR IGNORE INTO validators (address) VALUES (?)", (address,))
+        db.execute(
+            "UPDATE validator_keys SET to_height = MAX(from_height, ?) WHERE address = ? AND to_height IS NULL",
+            (from_height, address),
+        )
+        db.execute(
+            "INSERT INTO validator_keys (address, public_key, from_height) VALUES (?, ?, ?)",
+            (address, public_key, from_height),
+        )
+        db.commit()
+
+
+def set_validator_key(address: str, public_key: str) -> bool:
+    """
+    Fills in the public key of a validator's open range if it has none yet.
+
+    A range without a key cannot have signed any block, so nothing verified
+    earlier depends on it.
+
+    param address: Validator identifier
+    type address: str
+    param public_key: Base64 Dilithium public key
+    type public_key: str
+    return: True if a range was updated
+    rtype: bool
+    """
+    with sqlite3.connect(DATABASE) as db:
+        cursor = db.execute(
+            "UPDATE validator_keys SET public_key = ? WHERE address = ? AND to_height IS NULL AND public_key IS NULL",
+            (public_key, address),
+        )
+        db.commit()
+    return cursor.rowcount > 0
+
+
+def close_validator_key(address: str, to_height: int) -> bool:
+    """
+    Removes a validator from the active set from the given block index on.
+
+    Its key history is kept so blocks it signed earlier still verify.
+
+    param address: Validator identifier
+    type address: str
+    param to_height: First block index the validator may no longer sign
+    type to_height: int
+    return: True if an active validator was removed
+    rtype: bool
+    """
+    with sqlite3.connect(DATABASE) as db:
+        cursor = db.execute(
+            "UPDATE validator_keys SET to_height = MAX(from_height, ?) WHERE address = ? AND to_height IS NULL",
+            (to_height, address),
+        )
+        db.commit()
+    return cursor.rowcount > 0
+
+
 def get_all_messages_from_db():
     import sqlite3
     from models import Message
@@ -176,7 +655,9 @@ def get_all_messages_from_db():
             content=row[3],
             timestamp=row[4],
             signature=row[5],
-            ciphertext=row[6]
+            ciphertext=row[6],
+            session_id=row[7] or "",
+            counter=row[8] or 0
         )
         for row in rows
     ]
\ No newline at end of file
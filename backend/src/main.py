@@ -4,6 +4,9 @@ Main FastAPI Application Module
 Implements API endpoints, WebSocket messaging, and integrates blockchain
 with automatic peer syncing.
 
+With --workers N > 1 the chain, mempool and P2P node run in a dedicated
+chain-state process and N stateless API workers reach it over a Unix socket.
+
 Author: LunaLynx12
 """
 
@@ -15,66 +18,104 @@ from fastapi.middleware.cors import CORSMiddleware
 from routes import tests_route as tests_routes
 from fastapi.responses import RedirectResponse
 from contextlib import asynccontextmanager
+from state_service import StateService, run_state_process
+from routes import metrics_route as metrics_routes
 from routes import p2p_route as p2p_routes
+from state_client import StateClient, LocalState, set_state
+from validator_registry import get_validator_registry
 from blockchain import get_blockchain
 from local_database import init_db
+from executor import get_executor
+from key_pool import get_key_pool
+from pqc_backend import select_backend
+from signing_service import get_signing_service
 from p2p_node import P2PNode
 from fastapi import FastAPI
+import multiprocessing
 import argparse
 import uvicorn
-import asyncio
 import config
+import os
+
+STATE_SOCKET_ENV = "PQC_STATE_SOCKET"
+"""
+Environment variable pointing API workers at the chain-state socket; unset in single-process mode.
+"""
 
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("--api-port", type=int, default=8000, help="FastAPI server port")
     parser.add_argument("--peer-port", type=int, default=8762, help="P2P peer server port")
+    parser.add_argument("--fast-sync", action="store_true", help="Accept synced blocks on their validator signature and audit transactions in the background")
+    parser.add_argument("--dev-validator-keys", action="store_true", help="Development only: generate signing keys for validators that have none")
+    parser.add_argument("--workers", type=int, default=1, help="API worker processes; above 1, chain state runs in its own process")
     return parser.parse_args()
 
-async def periodic_sync_task():
-    """
-    Periodically synchronizes the blockchain with peers every 60 seconds.
-
-    The task waits 10 seconds before starting and then runs in an infinite loop.
-    Currently only logs activity; actual P2P sync logic needs to be implemented.
-
-    return: None
-    """
-    await asyncio.sleep(10)
-    while True:
-        print("[Background] Running periodic blockchain sync...")
-        await p2p_routes.full_sync_endpoint()
-        await asyncio.sleep(60)
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     Manages application lifecycle events (startup and shutdown).
 
     On startup:
-        - Initializes the local database
-        - Starts the periodic blockchain synchronization task
+        - Selects the post-quantum crypto backend and self-tests it, before the
+          process pool is forked so its workers use the same backend
+        - Starts the process and thread pools that keep crypto and sqlite off the event loop,
+          the key pool that pre-generates registration keys in idle time and the
+          signing service that batches message signatures; with several workers each
+          process takes its share of the cores and of the key pool (see API_WORKERS_ENV)
+        - As an API worker (STATE_SOCKET_ENV set), connects to the chain-state process
+        - Otherwise initializes the local database, loads the validator set from it
+          (generating missing validator keys with --dev-validator-keys) and starts
+          the P2P node, which syncs the chain whenever a peer announces a newer tip
 
     On shutdown:
-        - Placeholder for cleanup operations (currently none)
+        - Stops the P2P node, or closes the connections to the chain-state process
+        - Shuts the pools down
 
     param app: The FastAPI application instance
     yield: Control is passed to the application
     """
+    select_backend()
+    executor = get_executor()
+    executor.start()
+    key_pool = get_key_pool()
+    key_pool.start()
+    signing = get_signing_service()
+    signing.start()
+
+    socket_path = os.environ.get(STATE_SOCKET_ENV)
+    if socket_path:
+        print(f"[Startup] API worker {os.getpid()} using chain state at {socket_path}")
+        state = StateClient(socket_path)
+        set_state(state)
+
+        yield
+
+        await state.close()
+        await key_pool.stop()
+        await signing.stop()
+        executor.shutdown()
+        return
+
     print("[Startup] Initializing database...")
     init_db()
+    registry = get_validator_registry()
+    registry.reload()
+    if config.DEV_VALIDATOR_KEYS:
+        registry.create_missing_keys()
 
     print(f"[Startup] Starting P2P node on port {config.peer_port}...")
-    p2p_routes.p2p_node = P2PNode("127.0.0.1", config.peer_port)
-    await p2p_routes.p2p_node.start()
-    asyncio.create_task(p2p_routes.p2p_node.scan_for_peers())
-    asyncio.create_task(periodic_sync_task())
+    p2p_node = P2PNode("127.0.0.1", config.peer_port, fast_sync=config.FAST_SYNC)
+    await p2p_node.start()
+    set_state(LocalState(StateService(get_blockchain(), p2p_node, executor, config.DEV_VALIDATOR_KEYS)))
 
     yield
 
     print("[Shutdown] Shutting down P2P node...")
-    if hasattr(p2p_routes, "p2p_node"):
-        await p2p_routes.p2p_node.server.ws_server.close()
+    await p2p_node.stop()
+    await key_pool.stop()
+    await signing.stop()
+    executor.shutdown()
 
 app = FastAPI(lifespan=lifespan)
 """
@@ -88,6 +129,7 @@ app.include_router(accounts_routes.router)
 app.include_router(p2p_routes.router)
 app.include_router(tests_routes.router)
 app.include_router(messages_routes.router)
+app.include_router(metrics_routes.router)
 
 
 app.add_middleware(
@@ -98,11 +140,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-bc = get_blockchain()
-"""
-Reference to the global blockchain instance used across the application.
-"""
-
 @app.get("/", include_in_schema=False)
 async def index():
     """
@@ -123,6 +160,27 @@ if __name__ == "__main__":
     # Override the global config ports
     config.api_port = args.api_port
     config.peer_port = args.peer_port
-
-    print(f"[Main] Launching FastAPI server on port {args.api_port} with P2P on {args.peer_port}")
-    uvicorn.run("main:app", host="127.0.0.1", port=args.api_port, reload=False)
\ No newline at end of file
+    config.FAST_SYNC = args.fast_sync
+    config.DEV_VALIDATOR_KEYS = args.dev_validator_keys
+
+    # Every process of the node sizes its CPU pool and key pool from the worker count
+    os.environ[config.API_WORKERS_ENV] = str(max(1, args.workers))
+
+    if args.workers <= 1:
+        print(f"[Main] Launching FastAPI server on port {args.api_port} with P2P on {args.peer_port}")
+        uvicorn.run("main:app", host="127.0.0.1", port=args.api_port, reload=False)
+    else:
+        # Workers are separate interpreters, so they find the state process through the environment
+        os.environ[STATE_SOCKET_ENV] = os.path.abspath(config.STATE_SOCKET)
+        state_process = multiprocessing.Process(
+            target=run_state_process,
+            args=(os.environ[STATE_SOCKET_ENV], args.peer_port, args.fast_sync, args.dev_validator_keys),
+            name="chain-state",
+        )
+        state_process.start()
+        print(f"[Main] Launching {args.workers} FastAPI workers on port {args.api_port}, chain state with P2P on {args.peer_port}")
+        try:
+            uvicorn.run("main:app", host="127.0.0.1", port=args.api_port, reload=False, workers=args.workers)
+        finally:
+            state_process.terminate()
+            state_process.join()
@@ -1,7 +1,14 @@
 import os
 import hashlib
-from typing import List
-from config import WORDLIST
+import itertools
+import unicodedata
+from typing import Dict, List, Tuple
+from config import WORDLIST, MNEMONIC_MAX_AMBIGUOUS_WORDS
+
+# A few words appear twice in WORDLIST, so a word may stand for two indices
+WORD_INDICES: Dict[str, Tuple[int, ...]] = {}
+for _index, _word in enumerate(WORDLIST):
+    WORD_INDICES[_word] = WORD_INDICES.get(_word, ()) + (_index,)
 
 def generate_entropy(num_bits: int = 160) -> bytes:
     """
@@ -68,6 +75,59 @@ def generate_mnemonic_phrase(word_count: int = 12) -> str:
     entropy = generate_entropy(bits_map[word_count])
     return " ".join(entropy_to_mnemonic(entropy))
 
+def normalize_mnemonic(mnemonic: str) -> str:
+    """
+    Brings a mnemonic to the form its seed is derived from.
+
+    The phrase is NFKD-normalized as BIP-39 requires, and its words are joined
+    by single spaces, so the same words typed differently give the same keys.
+
+    :param mnemonic: Mnemonic string
+    :return: Normalized mnemonic string
+    """
+    return " ".join(unicodedata.normalize("NFKD", mnemonic).split())
+
+
+def mnemonic_to_entropy(mnemonic: str) -> bytes:
+    """
+    Decode a mnemonic phrase back to its entropy, checking the BIP-39 checksum.
+
+    Costs a dictionary lookup per word and one SHA-256, so malformed phrases
+    are rejected before any key derivation. A word listed twice in WORDLIST
+    may stand for either index, so each combination of those is tried.
+
+    :param mnemonic: Mnemonic string
+    :return: Entropy bytes
+    :raises ValueError: If the word count, a word or the checksum is invalid
+    """
+    words = normalize_mnemonic(mnemonic).split()
+    if len(words) not in (12, 15, 18, 21, 24):
+        raise ValueError(f"Mnemonic must have 12, 15, 18, 21 or 24 words, got {len(words)}")
+
+    candidates = []
+    for word in words:
+        indices = WORD_INDICES.get(word)
+        if indices is None:
+            raise ValueError(f"Unknown mnemonic word: {word}")
+        candidates.append(indices)
+    if sum(len(indices) > 1 for indices in candidates) > MNEMONIC_MAX_AMBIGUOUS_WORDS:
+        raise ValueError("Mnemonic has too many ambiguous words")
+
+    total_bits = len(words) * 11
+    checksum_bits = total_bits // 33
+    entropy_bits = total_bits - checksum_bits
+    for choice in itertools.product(*candidates):
+        combined = 0
+        for index in choice:
+            combined = (combined << 11) | index
+        entropy = (combined >> checksum_bits).to_bytes(entropy_bits // 8, byteorder="big")
+
+        h = hashlib.sha256(entropy).digest()
+        if combined & ((1 << checksum_bits) - 1) == h[0] >> (8 - checksum_bits):
+            return entropy
+    raise ValueError("Invalid mnemonic checksum")
+
+
 def seed_to_master_key(mnemonic: str, passphrase: str = "") -> bytes:
     """
     Convert mnemonic + passphrase to a 64-byte seed.
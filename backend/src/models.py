@@ -8,6 +8,7 @@ Author: LunaLynx12
 """
 
 from pydantic import BaseModel, Field
+from typing import List, Optional
 
 class User(BaseModel):
     """
@@ -29,6 +30,20 @@ class Message(BaseModel):
     timestamp: str = Field(default="", description="Auto-filled by server")
     signature: str = Field(default="", description="Auto-filled by server")
     ciphertext: str = Field(default="", description="Auto-filled by server")
+    session_id: str = Field(default="", description="Auto-filled by server for private messages")
+    counter: int = Field(default=0, description="Auto-filled by server for private messages")
+
+class GroupMessage(BaseModel):
+    """
+    Represents a private message sent to several users at once.
+    The content is encrypted once; each recipient gets their own wrap of its key.
+    """
+    id: int = Field(default=0, description="Auto-filled by server")
+    sender: str
+    receivers: List[str] = Field(..., min_length=1)
+    content: str
+    timestamp: str = Field(default="", description="Auto-filled by server")
+    signature: str = Field(default="", description="Auto-filled by server")
 
 class UserRegisterRequest(BaseModel):
     """
@@ -42,4 +57,12 @@ class EncryptedMessage(BaseModel):
     receiver: str
     content: str  # This will be the encrypted blob
     timestamp: str = Field(default="", description="Auto-filled by server")
-    ciphertext: str  # Optional if storing separately
\ No newline at end of file
+    ciphertext: str  # Optional if storing separately
+class ValidatorAddRequest(BaseModel):
+    """
+    Model for adding a validator to the active set.
+    Leave public_key empty to keep the validator's known key, or on a node started
+    with --dev-validator-keys to generate a key pair there.
+    """
+    address: str
+    public_key: Optional[str] = Field(default=None, description="Base64 Dilithium public key")
@@ -1,167 +1,421 @@
 import asyncio
 import websockets
-from typing import Set, Tuple, Dict, List
+from typing import Set, Tuple, Dict, List, Optional
 import hashlib
 import json
-import time
+import os
+from config import (
+    P2P_CONNECT_TIMEOUT,
+    P2P_MAX_PARTIAL_BLOCKS,
+    P2P_SYNC_BATCH,
+    P2P_SYNC_TIMEOUT,
+    P2P_PIPELINE_WINDOW,
+    P2P_MAX_FRAME_SIZE,
+    P2P_MAX_EXPENSIVE_HANDLERS,
+    P2P_BLOB_TIMEOUT,
+    BLOB_CHUNK_SIZE,
+)
+from connection_manager import ConnectionManager, PeerConnection
 from peer_discovery import PeerDiscovery
-from protocol import MessageTypes, deserialize_peer_list
-
-
-class Block:
-    def __init__(self, index: int, timestamp: float, data: List[Dict], previous_hash: str):
-        self.index = index
-        self.timestamp = timestamp
-        self.data = data  # Now a list of dictionaries
-        self.previous_hash = previous_hash
-        self.hash = self.calculate_hash()
-
-    def calculate_hash(self):
-        block_string = f"{self.index}{self.timestamp}{json.dumps(self.data)}{self.previous_hash}"
-        return hashlib.sha256(block_string.encode()).hexdigest()
-
-    def to_dict(self):
-        return {
-            "index": self.index,
-            "timestamp": self.timestamp,
-            "data": self.data,
-            "previous_hash": self.previous_hash,
-            "hash": self.hash,
-        }
+from sync_scheduler import SyncScheduler
+from sync_pipeline import BlockPipeline, BlockAuditor, decode_block
+from blockchain import Block, Transaction, get_blockchain, verify_block_signatures, verify_transactions
+from blob_store import get_blob_store
+from executor import get_executor
+from collections import OrderedDict
+from fastapi import HTTPException
+from protocol import (
+    MessageTypes,
+    NODE_ID_SIZE,
+    deserialize_peer_list,
+    serialize_hello,
+    deserialize_hello,
+    serialize_ping,
+    deserialize_ping,
+    encode_varint,
+    decode_varint,
+)
 
-    @staticmethod
-    def from_dict(block_data):
-        block = Block(
-            block_data['index'],
-            block_data['timestamp'],
-            block_data['data'],  # now expects a list of dicts
-            block_data['previous_hash']
-        )
-        block.hash = block_data['hash']
-        return block
 
+class MessageTypesExtended(MessageTypes):
+    NEW_BLOCK = 0x03
+    # 0x04 and 0x05 carried whole chains in a single frame and are no longer used
+    GET_BLOCK_BY_INDEX = 0x06
+    BLOCK_RESPONSE = 0x07
+    TRANSACTION = 0x0B
+    COMPACT_BLOCK = 0x0C
+    GET_BLOCK_TXN = 0x0D
+    BLOCK_TXN = 0x0E
+    TIP = 0x0F
+    GET_BLOCKS = 0x10
+    SYNC_BLOCK = 0x11
+    GET_BLOB = 0x12
+    BLOB = 0x13
+
+
+SHORT_ID_SIZE = 6
+MALFORMED_PENALTY = 10
+UNSOLICITED_PENALTY = 20
+OVER_BUDGET_PENALTY = 1
+
+# Budget cost of each message type; requests that make us do a lot of work cost more,
+# replies we asked for are free (unsolicited ones are penalised instead)
+MESSAGE_COSTS = {
+    MessageTypesExtended.GET_BLOCKS: 20,
+    MessageTypesExtended.PEER_LIST: 5,
+    MessageTypesExtended.GET_BLOCK_TXN: 2,
+    MessageTypesExtended.GET_BLOB: 5,
+    MessageTypesExtended.BLOB: 0,
+    MessageTypesExtended.SYNC_BLOCK: 0,
+    MessageTypesExtended.BLOCK_TXN: 0,
+    MessageTypesExtended.PONG: 0,
+}
+
+# Handlers that serialize batches of blocks or validate full blocks
+EXPENSIVE_MESSAGES = {
+    MessageTypesExtended.GET_BLOCKS,
+    MessageTypesExtended.NEW_BLOCK,
+    MessageTypesExtended.BLOCK_TXN,
+}
+COMPACT_HEADER_FIELDS = ("index", "validator", "prev_hash", "timestamp", "hash", "signature")
 
-class Blockchain:
-    def __init__(self):
-        self.chain: List[Block] = [self.create_genesis_block()]
 
-    def create_genesis_block(self):
-        return Block(0, time.time(), [{"id": 0, "content": "Genesis Block", "author": "System"}], "0")
+def serialize_block(block: Block) -> bytes:
+    return bytes([MessageTypesExtended.NEW_BLOCK]) + block.model_dump_json().encode('utf-8')
 
-    def get_latest_block(self):
-        return self.chain[-1]
 
-    def add_block(self, new_block: Block):
-        self.chain.append(new_block)
-        print(f"Block added: {new_block.index} | Entries: {len(new_block.data)} | Hash: {new_block.hash}")
-        return True
+def deserialize_block(data: bytes) -> Block:
+    return Block.model_validate_json(data[1:])
 
-    def replace_chain(self, new_chain: List[Block]):
-        if len(new_chain) > len(self.chain) and self.validate_chain(new_chain):
-            self.chain = new_chain
-            print("Chain replaced.")
-            return True
-        return False
 
-    def validate_chain(self, chain: List[Block]) -> bool:
-        for i in range(1, len(chain)):
-            current_block = chain[i]
-            previous_block = chain[i - 1]
-            if current_block.hash != current_block.calculate_hash():
-                return False
-            if current_block.previous_hash != previous_block.hash:
-                return False
-        return True
+def serialize_transaction(tx: Transaction) -> bytes:
+    return bytes([MessageTypesExtended.TRANSACTION]) + tx.model_dump_json().encode('utf-8')
 
 
-class MessageTypesExtended(MessageTypes):
-    NEW_BLOCK = 0x03
-    BLOCKCHAIN_REQUEST = 0x04
-    BLOCKCHAIN_RESPONSE = 0x05
-    GET_BLOCK_BY_INDEX = 0x06
-    BLOCK_RESPONSE = 0x07
+def deserialize_transaction(data: bytes) -> Transaction:
+    return Transaction.model_validate_json(data[1:])
 
 
-def serialize_block(block: Block) -> bytes:
-    json_data = json.dumps(block.to_dict())
-    return bytes([MessageTypesExtended.NEW_BLOCK]) + json_data.encode('utf-8')
+def short_transaction_id(block_hash: str, tx_hash: str) -> bytes:
+    """6-byte transaction ID salted with the block hash, so collisions cannot be precomputed."""
+    return hashlib.sha256(bytes.fromhex(block_hash) + bytes.fromhex(tx_hash)).digest()[:SHORT_ID_SIZE]
 
 
-def deserialize_block(data: bytes) -> Block:
-    json_str = data[1:].decode('utf-8')
-    block_data = json.loads(json_str)
-    return Block.from_dict(block_data)
+def serialize_compact_block(block: Block) -> bytes:
+    """Format: [TYPE:1][HEADER_LEN:varint][HEADER:json][COUNT:varint][SHORT_ID:6]..."""
+    header = json.dumps({field: getattr(block, field) for field in COMPACT_HEADER_FIELDS}).encode('utf-8')
+    short_ids = [short_transaction_id(block.hash, tx.compute_hash()) for tx in block.transactions]
+    return b"".join(
+        [bytes([MessageTypesExtended.COMPACT_BLOCK]), encode_varint(len(header)), header, encode_varint(len(short_ids))]
+        + short_ids
+    )
+
+
+def deserialize_compact_block(data: bytes) -> Tuple[dict, List[bytes]]:
+    header_len, offset = decode_varint(data, 1)
+    header = json.loads(data[offset:offset + header_len])
+    count, offset = decode_varint(data, offset + header_len)
+    if offset + count * SHORT_ID_SIZE != len(data):
+        raise ValueError("Malformed COMPACT_BLOCK")
+    short_ids = [bytes(data[offset + i * SHORT_ID_SIZE:offset + (i + 1) * SHORT_ID_SIZE]) for i in range(count)]
+    return header, short_ids
+
+
+def serialize_get_block_txn(block_hash: str, indexes: List[int]) -> bytes:
+    """Format: [TYPE:1][BLOCK_HASH:32][COUNT:varint][INDEX:varint]..."""
+    return b"".join(
+        [bytes([MessageTypesExtended.GET_BLOCK_TXN]), bytes.fromhex(block_hash), encode_varint(len(indexes))]
+        + [encode_varint(index) for index in indexes]
+    )
+
+
+def deserialize_get_block_txn(data: bytes) -> Tuple[str, List[int]]:
+    block_hash = bytes(data[1:33]).hex()
+    count, offset = decode_varint(data, 33)
+    indexes = []
+    for _ in range(count):
+        index, offset = decode_varint(data, offset)
+        indexes.append(index)
+    return block_hash, indexes
+
+
+def serialize_block_txn(block_hash: str, transactions: List[Transaction]) -> bytes:
+    """Format: [TYPE:1][BLOCK_HASH:32][TRANSACTIONS:json]"""
+    payload = json.dumps([tx.model_dump() for tx in transactions]).encode('utf-8')
+    return bytes([MessageTypesExtended.BLOCK_TXN]) + bytes.fromhex(block_hash) + payload
+
 
+def deserialize_block_txn(data: bytes) -> Tuple[str, List[Transaction]]:
+    block_hash = bytes(data[1:33]).hex()
+    return block_hash, [Transaction.model_validate(tx) for tx in json.loads(data[33:])]
 
-def serialize_blockchain(chain: List[Block]) -> bytes:
-    json_data = json.dumps([block.to_dict() for block in chain])
-    return bytes([MessageTypesExtended.BLOCKCHAIN_RESPONSE]) + json_data.encode('utf-8')
 
+def serialize_tip(block: Block) -> bytes:
+    """Format: [TYPE:1][HEIGHT:varint][HASH:32]"""
+    return bytes([MessageTypesExtended.TIP]) + encode_varint(block.index) + bytes.fromhex(block.hash)
 
-def deserialize_blockchain(data: bytes) -> List[Block]:
-    json_str = data[1:].decode('utf-8')
-    block_dicts = json.loads(json_str)
-    return [Block.from_dict(bd) for bd in block_dicts]
+
+def deserialize_tip(data: bytes) -> Tuple[int, str]:
+    height, offset = decode_varint(data, 1)
+    if len(data) != offset + 32:
+        raise ValueError("Malformed TIP")
+    return height, bytes(data[offset:]).hex()
+
+
+def serialize_get_blocks(start: int, count: int) -> bytes:
+    """Format: [TYPE:1][START_INDEX:varint][MAX_COUNT:varint]"""
+    return bytes([MessageTypesExtended.GET_BLOCKS]) + encode_varint(start) + encode_varint(count)
+
+
+def deserialize_get_blocks(data: bytes) -> Tuple[int, int]:
+    start, offset = decode_varint(data, 1)
+    count, _ = decode_varint(data, offset)
+    return start, count
+
+
+def serialize_sync_block(block: Optional[Block]) -> bytes:
+    """Format: [TYPE:1][BLOCK:json] - one frame per block of a GET_BLOCKS reply, a bare [TYPE:1] ends it"""
+    payload = block.model_dump_json().encode('utf-8') if block is not None else b""
+    return bytes([MessageTypesExtended.SYNC_BLOCK]) + payload
+
+
+def serialize_get_blob(blob_hash: str, index: int) -> bytes:
+    """Format: [TYPE:1][BLOB_HASH:32][CHUNK_INDEX:varint]"""
+    return bytes([MessageTypesExtended.GET_BLOB]) + bytes.fromhex(blob_hash) + encode_varint(index)
+
+
+def deserialize_get_blob(data: bytes) -> Tuple[str, int]:
+    if len(data) < 34:
+        raise ValueError("Malformed GET_BLOB")
+    index, offset = decode_varint(data, 33)
+    if offset != len(data):
+        raise ValueError("Malformed GET_BLOB")
+    return bytes(data[1:33]).hex(), index
+
+
+def serialize_blob(blob_hash: str, index: int, count: int, chunk: bytes) -> bytes:
+    """Format: [TYPE:1][BLOB_HASH:32][CHUNK_INDEX:varint][CHUNK_COUNT:varint][DATA] - a count of 0 means not stored"""
+    return b"".join(
+        [bytes([MessageTypesExtended.BLOB]), bytes.fromhex(blob_hash), encode_varint(index), encode_varint(count), chunk]
+    )
+
+
+def deserialize_blob(data: bytes) -> Tuple[str, int, int, bytes]:
+    if len(data) < 35:
+        raise ValueError("Malformed BLOB")
+    index, offset = decode_varint(data, 33)
+    count, offset = decode_varint(data, offset)
+    return bytes(data[1:33]).hex(), index, count, bytes(data[offset:])
+
+
+def blob_chunk_reply(blob_hash: str, index: int) -> bytes:
+    """Reads the requested chunk from the blob store and frames the BLOB reply; runs in the I/O pool."""
+    store = get_blob_store()
+    count = store.chunk_count(blob_hash)
+    chunk = store.read_chunk(blob_hash, index) if count else None
+    if chunk is None:
+        return serialize_blob(blob_hash, index, 0, b"")
+    return serialize_blob(blob_hash, index, count, chunk)
 
 
 class P2PNode:
-    def __init__(self, host: str, port: int):
+    def __init__(self, host: str, port: int, fast_sync: bool = False):
         self.host = host
         self.port = port
-        self.peers: Set[Tuple[str, int]] = set()
-        self.connected_websockets: Dict[Tuple[str, int], websockets.WebSocketClientProtocol] = dict()
-        self.failed_connections: Set[Tuple[str, int]] = set()
+        # Fast sync: accept downloaded blocks on their validator signature, audit transactions later
+        self.fast_sync = fast_sync
+        self.node_id = os.urandom(NODE_ID_SIZE)
         self.server = None
+        self.tasks: List[asyncio.Task] = []
+        self.connections = ConnectionManager(self)
         self.discovery = PeerDiscovery(self)
-        self.blockchain = Blockchain()
+        self.sync = SyncScheduler(self)
+        self.auditor = BlockAuditor(self)
+        self.blockchain = get_blockchain()
+        # Compact blocks waiting for transactions requested with GET_BLOCK_TXN
+        self.partial_blocks: "OrderedDict[str, Tuple[dict, List[Optional[Transaction]]]]" = OrderedDict()
+        # Caps expensive handlers across all peers so a few busy peers cannot starve the API
+        self.expensive_handlers = asyncio.Semaphore(P2P_MAX_EXPENSIVE_HANDLERS)
+
+    @property
+    def peers(self) -> Set[Tuple[str, int]]:
+        return self.connections.connected_addresses()
 
     async def start(self):
-        self.server = await websockets.serve(self.handle_connection, self.host, self.port)
+        # Liveness is tracked with our own PING/PONG, so the library keepalive is disabled
+        self.server = await websockets.serve(
+            self.handle_connection, self.host, self.port, ping_interval=None, max_size=P2P_MAX_FRAME_SIZE
+        )
         print(f"P2P Node running on ws://{self.host}:{self.port}")
+        self.blockchain.add_transaction_listener(self.on_transaction)
+        self.blockchain.add_block_listener(self.on_block)
+        self.blockchain.add_tip_listener(self.on_tip)
+        self.tasks.append(asyncio.create_task(self.connections.maintain()))
+        self.tasks.append(asyncio.create_task(self.connections.keepalive()))
+        self.tasks.append(asyncio.create_task(self.discovery.share_peers()))
+        self.tasks.append(asyncio.create_task(self.auditor.run()))
+
+    async def stop(self):
+        if self.on_transaction in self.blockchain.transaction_listeners:
+            self.blockchain.transaction_listeners.remove(self.on_transaction)
+        if self.on_block in self.blockchain.block_listeners:
+            self.blockchain.block_listeners.remove(self.on_block)
+        if self.on_tip in self.blockchain.tip_listeners:
+            self.blockchain.tip_listeners.remove(self.on_tip)
+        self.sync.cancel_all()
+        for task in self.tasks:
+            task.cancel()
+        self.tasks.clear()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        await self.connections.close_all()
 
     async def handle_connection(self, websocket):
         peer_address = websocket.remote_address[:2]
-        ip, port = peer_address
-        print(f"Accepted connection from {ip}:{port}")
-        self.peers.add((ip, port))
-        self.connected_websockets[(ip, port)] = websocket
+        if not self.connections.has_capacity():
+            print(f"Rejecting connection from {peer_address[0]}:{peer_address[1]}: peer limit reached")
+            await websocket.close()
+            return
+        await self.serve_peer(PeerConnection(websocket, peer_address, inbound=True))
+
+    async def serve_peer(self, peer: PeerConnection):
+        """
+        Runs the HELLO handshake on a fresh connection, then reads its frames until it closes.
+
+        Frames are queued in the peer's bounded inbox and handled by a separate
+        task, so a peer whose messages are slow to handle only delays itself.
+        """
+        registered = False
+        worker = None
         try:
-            asyncio.create_task(self.send_messages(ip, port, websocket))
-            async for message in websocket:
-                await self.process_message(message, websocket)
-        except websockets.ConnectionClosed:
+            await peer.send(serialize_hello(self.node_id, self.port))
+            hello = await asyncio.wait_for(peer.websocket.recv(), P2P_CONNECT_TIMEOUT)
+            node_id, listen_port = deserialize_hello(hello)
+            registered = self.connections.register(peer, node_id, listen_port)
+            if not registered:
+                return
+            print(f"Connected to {peer.address[0]}:{peer.address[1]} ({'inbound' if peer.inbound else 'outbound'})")
+            await self.send_tip(peer, self.blockchain.chain[-1])
+            for tx in list(self.blockchain.pending_transactions):
+                await self.send_transaction(peer, tx, tx.compute_hash())
+            worker = asyncio.create_task(self.handle_inbox(peer))
+            async for message in peer.websocket:
+                peer.mark_received()
+                await self.receive(message, peer)
+        except (websockets.ConnectionClosed, asyncio.TimeoutError, ValueError):
             pass
         finally:
-            print(f"Connection closed with {ip}:{port}")
-            self.connected_websockets.pop((ip, port), None)
-            self.peers.discard((ip, port))
+            if worker is not None:
+                worker.cancel()
+            if registered:
+                print(f"Connection closed with {peer.address[0]}:{peer.address[1]}")
+            self.connections.unregister(peer)
+            await peer.close()
+
+    async def receive(self, message: bytes, peer: PeerConnection):
+        """
+        Admits one frame from a peer's socket.
+
+        The frame is charged against the peer's message budget; frames over budget
+        are dropped and count towards the peer's misbehavior score. Keepalives are
+        answered right away and streamed sync blocks go to their pipeline; all other
+        frames wait in the peer's inbox, and a full inbox stops reading from the socket.
+        """
+        if not message:
+            return
+        msg_type = message[0]
+        if not peer.msg_budget.consume(MESSAGE_COSTS.get(msg_type, 1)):
+            self.connections.penalize(peer, OVER_BUDGET_PENALTY, "message budget exceeded")
+            return
+        if msg_type == MessageTypes.PING:
+            try:
+                await peer.send(serialize_ping(deserialize_ping(message), pong=True))
+            except ValueError as e:
+                print("Failed to parse PING:", e)
+                self.connections.penalize(peer, MALFORMED_PENALTY, "malformed PING")
+        elif msg_type == MessageTypes.PONG:
+            try:
+                peer.handle_pong(deserialize_ping(message))
+            except ValueError as e:
+                print("Failed to parse PONG:", e)
+                self.connections.penalize(peer, MALFORMED_PENALTY, "malformed PONG")
+        elif msg_type == MessageTypesExtended.SYNC_BLOCK:
+            if not await peer.feed_stream(message):
+                self.connections.penalize(peer, OVER_BUDGET_PENALTY, "unsolicited SYNC_BLOCK")
+        else:
+            await peer.inbox.put(message)
+
+    async def handle_inbox(self, peer: PeerConnection):
+        """Handles the queued frames of one peer in order, holding the global slot for expensive ones."""
+        while True:
+            message = await peer.inbox.get()
+            try:
+                if message[0] in EXPENSIVE_MESSAGES:
+                    async with self.expensive_handlers:
+                        await self.process_message(message, peer)
+                else:
+                    await self.process_message(message, peer)
+            except websockets.ConnectionClosed:
+                return
+            except Exception as e:
+                print(f"[P2P] Error handling message {message[0]:#04x} from {peer}: {e}")
 
-    async def process_message(self, message: bytes, websocket):
+    async def process_message(self, message: bytes, peer: PeerConnection):
         if not message:
             return
         msg_type = message[0]
         if msg_type == MessageTypes.PEER_LIST:
             try:
-                peers = deserialize_peer_list(message)
-                for peer in peers:
-                    if peer not in self.peers and peer != (self.host, self.port):
-                        asyncio.create_task(self.connect_to_peer(*peer))
+                for ip, port, last_seen in deserialize_peer_list(message):
+                    if (ip, port) != (self.host, self.port):
+                        self.connections.address_book.add((ip, port), last_seen)
             except Exception as e:
                 print("Failed to parse PEER_LIST:", e)
+                self.connections.penalize(peer, MALFORMED_PENALTY, "malformed PEER_LIST")
         elif msg_type == MessageTypes.TEXT_MSG:
             pass
+        elif msg_type == MessageTypesExtended.TRANSACTION:
+            if not peer.tx_budget.consume():
+                self.connections.penalize(peer, OVER_BUDGET_PENALTY, "transaction budget exceeded")
+                return
+            try:
+                tx = deserialize_transaction(message)
+            except Exception as e:
+                print("Failed to parse TRANSACTION:", e)
+                self.connections.penalize(peer, MALFORMED_PENALTY, "malformed TRANSACTION")
+                return
+            await self.admit_transaction(tx, peer)
+        elif msg_type == MessageTypesExtended.COMPACT_BLOCK:
+            try:
+                header, short_ids = deserialize_compact_block(message)
+                await self.handle_compact_block(header, short_ids, peer)
+            except Exception as e:
+                print(f"Failed to process COMPACT_BLOCK: {e}")
+        elif msg_type == MessageTypesExtended.GET_BLOCK_TXN:
+            try:
+                block_hash, indexes = deserialize_get_block_txn(message)
+                block = self.blockchain.find_block(block_hash)
+                if block is not None and all(0 <= i < len(block.transactions) for i in indexes):
+                    await peer.send(serialize_block_txn(block_hash, [block.transactions[i] for i in indexes]))
+            except Exception as e:
+                print(f"Failed to process GET_BLOCK_TXN: {e}")
+        elif msg_type == MessageTypesExtended.BLOCK_TXN:
+            try:
+                block_hash, transactions = deserialize_block_txn(message)
+                await self.complete_compact_block(block_hash, transactions, peer)
+            except Exception as e:
+                print(f"Failed to process BLOCK_TXN: {e}")
         elif msg_type == MessageTypesExtended.NEW_BLOCK:
             try:
                 block = deserialize_block(message)
-                # Ensure the data is a simple dictionary, not a list of blocks
-                if isinstance(block.data, list):
-                    print("Received block contains nested blocks. Ignoring.")
-                # Validate the block
-                if all(b.hash != block.hash for b in self.blockchain.chain):
-                    self.blockchain.add_block(block)
-                    await self.broadcast(message, exclude_ws=websocket)
-                else:
+                if self.blockchain.find_block(block.hash) is not None:
                     print(f"Duplicate block ignored: {block.index}")
+                elif block.index > len(self.blockchain.chain):
+                    peer.update_tip(block.index, block.hash)
+                    self.sync.schedule()
+                else:
+                    await self.admit_block(block, peer)
             except Exception as e:
                 print(f"Failed to process NEW_BLOCK: {e}")
         elif msg_type == MessageTypesExtended.GET_BLOCK_BY_INDEX:
@@ -170,90 +424,316 @@ class P2PNode:
                 if 0 <= index < len(self.blockchain.chain):
                     block = self.blockchain.chain[index]
                     block_msg = serialize_block(block)
-                    await websocket.send(block_msg)
+                    await peer.send(block_msg)
                 else:
-                    await websocket.send(bytes([MessageTypesExtended.BLOCK_RESPONSE]) + b'Block not found')
+                    await peer.send(bytes([MessageTypesExtended.BLOCK_RESPONSE]) + b'Block not found')
             except Exception as e:
                 print(f"Error getting block by index: {e}")
-        elif msg_type == MessageTypesExtended.BLOCKCHAIN_REQUEST:
-            full_chain = serialize_blockchain(self.blockchain.chain)
-            await websocket.send(full_chain)
-        elif msg_type == MessageTypesExtended.BLOCKCHAIN_RESPONSE:
+        elif msg_type == MessageTypesExtended.TIP:
+            try:
+                height, tip_hash = deserialize_tip(message)
+            except ValueError as e:
+                print("Failed to parse TIP:", e)
+                self.connections.penalize(peer, MALFORMED_PENALTY, "malformed TIP")
+                return
+            if peer.update_tip(height, tip_hash):
+                self.sync.schedule()
+        elif msg_type == MessageTypesExtended.GET_BLOCKS:
             try:
-                new_chain = deserialize_blockchain(message)
-                print("Replacing local blockchain with received one")
-                self.blockchain.replace_chain(new_chain)
+                start, count = deserialize_get_blocks(message)
+                chain = self.blockchain.chain
+                for block in chain[start:start + min(count, P2P_SYNC_BATCH)]:
+                    await peer.send(serialize_sync_block(block))
+                await peer.send(serialize_sync_block(None))
             except Exception as e:
-                print("Failed to process BLOCKCHAIN_RESPONSE:", e)
-
-    async def send_messages(self, ip: str, port: int, websocket):
-        count = 1
-        while True:
+                print(f"Failed to process GET_BLOCKS: {e}")
+        elif msg_type == MessageTypesExtended.GET_BLOB:
             try:
-                text = f"Hello from {self.port} - {count}"
-                payload = count.to_bytes(4, 'big') + text.encode('utf-8')
-                msg = bytes([MessageTypes.TEXT_MSG]) + payload
-                await websocket.send(msg)
-                count += 1
-                await asyncio.sleep(3)
-            except Exception:
-                self.connected_websockets.pop((ip, port), None)
-                self.peers.discard((ip, port))
-                break
-
-    def create_new_block(self, data: dict) -> Block:
-        """Create a new block with user-provided content."""
-        latest_block = self.blockchain.get_latest_block()
-        new_block = Block(
-            index=latest_block.index + 1,
-            timestamp=time.time(),
-            data=[data],  # Only accept user content here
-            previous_hash=latest_block.hash
+                blob_hash, index = deserialize_get_blob(message)
+            except ValueError as e:
+                print("Failed to parse GET_BLOB:", e)
+                self.connections.penalize(peer, MALFORMED_PENALTY, "malformed GET_BLOB")
+                return
+            await peer.send(await get_executor().run_io("blob_serve", blob_chunk_reply, blob_hash, index))
+        elif msg_type == MessageTypesExtended.BLOB:
+            # Blob chunks are only accepted as the reply to our own fetch_blob request
+            if not peer.resolve_response(message):
+                self.connections.penalize(peer, UNSOLICITED_PENALTY, "unsolicited BLOB")
+
+    def on_transaction(self, tx: Transaction, origin):
+        """Mempool listener: relays every newly admitted transaction to the other peers."""
+        asyncio.create_task(self.relay_transaction(tx, exclude=origin))
+
+    async def relay_transaction(self, tx: Transaction, exclude: PeerConnection = None):
+        tx_hash = tx.compute_hash()
+        for peer in self.connections.active_peers():
+            if peer is not exclude:
+                await self.send_transaction(peer, tx, tx_hash)
+
+    async def send_transaction(self, peer: PeerConnection, tx: Transaction, tx_hash: str):
+        """Sends a transaction unless the peer is already known to have it."""
+        if peer.knows_transaction(tx_hash):
+            return
+        peer.mark_transaction_known(tx_hash)
+        try:
+            await peer.send(serialize_transaction(tx))
+        except Exception:
+            self.connections.unregister(peer)
+
+    def on_block(self, block: Block, origin):
+        """Block listener: announces every new tip block to the other peers as a compact block."""
+        if origin is not None and block.index < origin.tip_height:
+            # Historical block downloaded during a sync; the final tip is announced by on_tip
+            return
+        for peer in self.connections.active_peers():
+            if peer is not origin:
+                peer.announced_tip = block.hash
+        asyncio.create_task(self.broadcast(serialize_compact_block(block), exclude=origin))
+
+    def on_tip(self, tip: Block, origin):
+        """Tip listener: sends a TIP to every peer that has not heard of the new tip yet."""
+        for peer in self.connections.active_peers():
+            if peer.announced_tip != tip.hash and peer.tip_hash != tip.hash:
+                asyncio.create_task(self.send_tip(peer, tip))
+
+    async def send_tip(self, peer: PeerConnection, tip: Block):
+        peer.announced_tip = tip.hash
+        try:
+            await peer.send(serialize_tip(tip))
+        except Exception:
+            self.connections.unregister(peer)
+
+    async def handle_compact_block(self, header: dict, short_ids: List[bytes], peer: PeerConnection):
+        """
+        Rebuilds a block from the mempool using its short transaction IDs.
+
+        Transactions that are not in our mempool are requested from the sender
+        with GET_BLOCK_TXN; everything else never crosses the wire again.
+        """
+        block_hash = header["hash"]
+        peer.update_tip(header["index"], block_hash)
+        if self.blockchain.find_block(block_hash) is not None or block_hash in self.partial_blocks:
+            return
+        if header["index"] > len(self.blockchain.chain):
+            # We are more than one block behind: let the scheduler download the gap
+            self.sync.schedule()
+            return
+        if header["index"] < len(self.blockchain.chain):
+            return
+
+        by_short_id = {
+            short_transaction_id(block_hash, tx.compute_hash()): tx
+            for tx in list(self.blockchain.pending_transactions)
+        }
+        transactions = [by_short_id.get(short_id) for short_id in short_ids]
+        missing = [i for i, tx in enumerate(transactions) if tx is None]
+        if not missing:
+            if await self.assemble_compact_block(header, transactions, peer):
+                return
+            # A short ID collision picked the wrong transaction: fetch them all
+            missing = list(range(len(short_ids)))
+            transactions = [None] * len(short_ids)
+
+        self.partial_blocks[block_hash] = (header, transactions)
+        while len(self.partial_blocks) > P2P_MAX_PARTIAL_BLOCKS:
+            self.partial_blocks.popitem(last=False)
+        await peer.send(serialize_get_block_txn(block_hash, missing))
+
+    async def complete_compact_block(self, block_hash: str, received: List[Transaction], peer: PeerConnection):
+        """Fills the gaps of a pending compact block with the transactions a peer sent back."""
+        partial = self.partial_blocks.pop(block_hash, None)
+        if partial is None:
+            return
+        header, transactions = partial
+        gaps = [i for i, tx in enumerate(transactions) if tx is None]
+        if len(gaps) != len(received):
+            print(f"BLOCK_TXN for {block_hash[:16]} has {len(received)} transactions, expected {len(gaps)}")
+            return
+        for i, tx in zip(gaps, received):
+            transactions[i] = tx
+        await self.assemble_compact_block(header, transactions, peer)
+
+    async def assemble_compact_block(self, header: dict, transactions: List[Transaction], peer: PeerConnection) -> bool:
+        """Builds the full block and appends it; the hash check catches any wrong transaction."""
+        block = Block(
+            index=header["index"],
+            validator=header["validator"],
+            transactions=transactions,
+            prev_hash=header["prev_hash"],
+            timestamp=header["timestamp"],
+            hash=header["hash"],
+            signature=header["signature"],
         )
-        self.blockchain.add_block(new_block)
-        return new_block
+        if block.compute_hash() != header["hash"]:
+            return False
+        return await self.admit_block(block, peer)
+
+    async def admit_block(self, block: Block, peer: PeerConnection) -> bool:
+        """
+        Verifies a block announced live in the CPU pool, then appends it.
+
+        The header signature and the transactions not seen in the mempool are
+        checked off the event loop and outside the chain lock; add_block then
+        re-checks the link to the tip and the slot, which may have changed
+        meanwhile. When the CPU lane is full the block is left to the sync.
+
+        return: True if the block was appended
+        """
+        tip = self.blockchain.chain[-1]
+        if block.index != tip.index + 1 or block.prev_hash != tip.hash:
+            return False
+        public_key = self.blockchain.validators.public_key(block.validator, block.index)
+        if public_key is None:
+            print(f"[WARNING] Block {block.index} from {peer} is signed by {block.validator}, not a validator at that height")
+            return False
+        keys = self.blockchain.signer_keys(block.transactions, block.index)
+        if keys is None:
+            return False
+        unverified = [tx for tx in block.transactions if not self.blockchain.is_verified(tx.compute_hash())]
+        try:
+            valid = await get_executor().run_cpu(
+                "verify_live_block", verify_block_signatures, block.hash, block.signature, public_key, unverified, keys
+            )
+        except HTTPException:
+            peer.update_tip(block.index, block.hash)
+            self.sync.schedule()
+            return False
+        if not valid:
+            print(f"[WARNING] Rejected block {block.index} with an invalid signature from {peer}")
+            return False
+        return self.blockchain.add_block(block, origin=peer, signatures_verified=True, live=True)
+
+    async def download_blocks(self, peer: PeerConnection, start: int, count: int) -> Tuple[int, bool]:
+        """
+        Downloads up to count blocks from index start and feeds them through the validation pipeline.
+
+        return: (number of blocks appended, True if the peer's blocks do not build on our chain)
+        """
+        frames = peer.open_stream(MessageTypesExtended.SYNC_BLOCK, P2P_PIPELINE_WINDOW)
+        try:
+            await peer.send(serialize_get_blocks(start, count))
+            auditor = self.auditor if self.fast_sync else None
+            pipeline = BlockPipeline(self.blockchain, get_executor(), auditor=auditor)
+            return await pipeline.run(frames, start, origin=peer)
+        finally:
+            peer.close_stream()
+
+    async def fetch_blocks(self, peer: PeerConnection, start: int, count: int) -> List[Block]:
+        """
+        Downloads up to count blocks from index start without applying them, to resolve a fork.
+
+        Blocks arrive one per frame like any GET_BLOCKS reply, are decoded in the
+        CPU pool and must form an unbroken run with correct hashes.
+
+        return: The blocks the peer sent, in chain order
+        """
+        executor = get_executor()
+        frames = peer.open_stream(MessageTypesExtended.SYNC_BLOCK, P2P_PIPELINE_WINDOW)
+        blocks: List[Block] = []
+        try:
+            await peer.send(serialize_get_blocks(start, count))
+            while len(frame := await asyncio.wait_for(frames.get(), P2P_SYNC_TIMEOUT)) > 1:
+                if len(blocks) >= count:
+                    raise ValueError(f"{peer} sent more than the {count} blocks requested")
+                block, block_hash = await executor.run_cpu_background("sync_decode", decode_block, frame)
+                if block is None or block_hash != block.hash or block.index != start + len(blocks):
+                    raise ValueError(f"{peer} sent a bad block for index {start + len(blocks)}")
+                if blocks and block.prev_hash != blocks[-1].hash:
+                    raise ValueError(f"{peer} sent block {block.index} that does not link to the previous one")
+                blocks.append(block)
+        finally:
+            peer.close_stream()
+        return blocks
+
+    async def admit_transaction(self, tx: Transaction, peer: PeerConnection) -> bool:
+        """
+        Verifies a transaction relayed by a peer in the CPU pool, then adds it to the mempool.
+
+        Dilithium verification is too slow for the event loop, which also serves
+        every other peer. Transactions already seen skip verification altogether;
+        when the CPU lane is full the transaction is dropped, as it will come back
+        with the next relay or inside a block.
+
+        return: True if the transaction entered the mempool
+        """
+        tx_hash = tx.compute_hash()
+        peer.mark_transaction_known(tx_hash)
+        if self.blockchain.is_verified(tx_hash):
+            return False
+        keys = self.blockchain.signer_keys([tx])
+        if keys is None:
+            return self.blockchain.add_transaction(tx, origin=peer)
+        try:
+            valid = await get_executor().run_cpu("verify_relayed_transaction", verify_transactions, [tx], keys)
+        except HTTPException:
+            return False
+        if not valid:
+            print(f"[WARNING] Rejected invalid {tx.tx_type} transaction {tx_hash[:16]} from {peer}")
+            return False
+        return self.blockchain.add_transaction(tx, origin=peer, verified=True)
+
+    async def fetch_blob(self, blob_hash: str, size: int) -> bool:
+        """
+        Downloads a blob from the first peer that has it, chunk by chunk, into the blob store.
+
+        The transfer is bounded by the size declared by the transaction carrying
+        the blob: a peer must announce exactly ceil(size / BLOB_CHUNK_SIZE)
+        chunks of at most BLOB_CHUNK_SIZE bytes. The content is checked against
+        blob_hash before it is registered, so a peer cannot substitute other data.
+
+        param blob_hash: SHA-256 of the blob, hex
+        type blob_hash: str
+        param size: Size of the blob declared by its transaction
+        type size: int
+        return: True if the blob is stored locally afterwards
+        """
+        expected = -(-size // BLOB_CHUNK_SIZE)
+        if expected == 0:
+            return False
+        executor = get_executor()
+        store = get_blob_store()
+        for peer in self.connections.fastest_peers():
+            writer = store.writer()
+            try:
+                index, count = 0, expected
+                while index < count:
+                    reply = await peer.request(serialize_get_blob(blob_hash, index), MessageTypesExtended.BLOB, P2P_BLOB_TIMEOUT)
+                    reply_hash, reply_index, count, chunk = deserialize_blob(reply)
+                    if count == 0:
+                        break
+                    if reply_hash != blob_hash or reply_index != index:
+                        raise ValueError("BLOB reply does not match the request")
+                    if count != expected:
+                        raise ValueError(f"BLOB reply announces {count} chunks, the transaction allows {expected}")
+                    if len(chunk) > BLOB_CHUNK_SIZE or writer.size + len(chunk) > size:
+                        raise ValueError("BLOB reply exceeds the declared size")
+                    await executor.run_io("blob_write", writer.write, chunk)
+                    index += 1
+                if count == 0:
+                    await executor.run_io("blob_abort", writer.abort)
+                    continue
+                await executor.run_io("blob_close", writer.close, blob_hash)
+                return True
+            except Exception as e:
+                print(f"[P2P] Fetching blob {blob_hash[:16]} from {peer} failed: {e}")
+                await executor.run_io("blob_abort", writer.abort)
+                if isinstance(e, ValueError):
+                    self.connections.penalize(peer, MALFORMED_PENALTY, "bad BLOB")
+        return False
 
-    async def broadcast(self, message: bytes, exclude_ws=None):
-        disconnected = set()
-        for (ip, port), ws in list(self.connected_websockets.items()):
-            if ws == exclude_ws:
+    async def broadcast(self, message: bytes, exclude: PeerConnection = None):
+        for peer in self.connections.active_peers():
+            if peer is exclude:
                 continue
             try:
-                await ws.send(message)
+                await peer.send(message)
             except Exception:
-                disconnected.add((ip, port))
-        for dead in disconnected:
-            self.connected_websockets.pop(dead, None)
-            self.peers.discard(dead)
+                self.connections.unregister(peer)
 
     async def connect_to_peer(self, peer_ip: str, peer_port: int):
-        uri = f"ws://{peer_ip}:{peer_port}/ws"
-        if (peer_ip, peer_port) in self.connected_websockets or (peer_ip, peer_port) in self.failed_connections or (peer_ip, peer_port) == (self.host, self.port):
+        """Adds an address to the address book and dials it in the background unless already connected."""
+        address = (peer_ip, peer_port)
+        if address == (self.host, self.port) or address in self.peers:
             return
-        try:
-            ws = await websockets.connect(uri)
-            self.peers.add((peer_ip, peer_port))
-            self.connected_websockets[(peer_ip, peer_port)] = ws
-            self.failed_connections.discard((peer_ip, peer_port))
-            await asyncio.sleep(1)
-            await ws.send(bytes([MessageTypesExtended.BLOCKCHAIN_REQUEST]))
-            asyncio.create_task(self.send_messages(peer_ip, peer_port, ws))
-            async def listen():
-                try:
-                    async for message in ws:
-                        await self.process_message(message, ws)
-                except websockets.ConnectionClosed:
-                    pass
-                finally:
-                    self.connected_websockets.pop((peer_ip, peer_port), None)
-                    self.peers.discard((peer_ip, peer_port))
-            asyncio.create_task(listen())
-        except Exception as e:
-            self.failed_connections.add((peer_ip, peer_port))
-
-    async def scan_for_peers(self, ip="127.0.0.1", port_range=range(8760, 8770)):
-        while True:
-            for port in port_range:
-                if (ip, port) not in self.peers and port != self.port:
-                    asyncio.create_task(self.connect_to_peer(ip, port))
-            await asyncio.sleep(10)
\ No newline at end of file
+        self.connections.address_book.add(address)
+        asyncio.create_task(self.connections.dial(address))
@@ -0,0 +1,417 @@
+"""
+Post-Quantum Crypto Backends
+
+Every Dilithium and ML-KEM-512 operation in the node goes through one
+backend interface: keygen, sign and verify for signatures, keygen, encaps and
+decaps for key encapsulation. The backend is chosen once per process at
+startup: a native provider (liboqs through the optional liboqs-python
+package) when it is installed, then the NumPy-vectorized implementation in
+pqc_numpy when NumPy is, otherwise the pure-Python dilithium_py and
+kyber_py libraries. A non-reference backend is only used after a self-test shows
+that its keys, signatures and ciphertexts interoperate with the pure-Python
+ones, so nodes running different backends still validate each other's chain.
+
+Author: LunaLynx12
+"""
+
+
+from dilithium_py.dilithium.default_parameters import DEFAULT_PARAMETERS
+from dilithium_py.dilithium import Dilithium2
+from dilithium_py.dilithium.dilithium import Dilithium
+from kyber_py.ml_kem import ML_KEM_512
+from config import PQC_BACKEND
+from typing import Dict, List, Optional, Sequence, Tuple, Type
+import os
+
+
+class PQCBackend:
+    """
+    Interface of a post-quantum crypto provider.
+
+    Attributes:
+        name (str): Identifier reported by the node
+        signature_algorithm (str): Signature scheme implemented
+        kem_algorithm (str): Key encapsulation mechanism implemented
+    """
+    name = "abstract"
+    signature_algorithm = "Dilithium2"
+    kem_algorithm = "ML-KEM-512"
+
+    def sign_keygen(self) -> Tuple[bytes, bytes]:
+        """
+        Generates a signature keypair.
+
+        return: (public_key, secret_key)
+        """
+        raise NotImplementedError
+
+    def sign(self, secret_key: bytes, message: bytes) -> bytes:
+        """
+        Signs a message.
+
+        param secret_key: Signature secret key
+        type secret_key: bytes
+        param message: Message bytes
+        type message: bytes
+        return: Raw signature
+        """
+        raise NotImplementedError
+
+    def verify(self, public_key: bytes, message: bytes, signature: bytes) -> bool:
+        """
+        Verifies a signature; malformed input counts as invalid.
+
+        param public_key: Signature public key
+        type public_key: bytes
+        param message: Message bytes
+        type message: bytes
+        param signature: Raw signature
+        type signature: bytes
+        return: True if the signature is valid
+        """
+        raise NotImplementedError
+
+    def kem_keygen(self) -> Tuple[bytes, bytes]:
+        """
+        Generates a KEM keypair.
+
+        return: (encapsulation_key, decapsulation_key)
+        """
+        raise NotImplementedError
+
+    def encaps(self, public_key: bytes) -> Tuple[bytes, bytes]:
+        """
+        Encapsulates a fresh shared key to a public key.
+
+        param public_key: Recipient encapsulation key
+        type public_key: bytes
+        return: (shared_key, ciphertext)
+        """
+        raise NotImplementedError
+
+    def decaps(self, secret_key: bytes, ciphertext: bytes) -> bytes:
+        """
+        Recovers the shared key from a ciphertext.
+
+        param secret_key: Recipient decapsulation key
+        type secret_key: bytes
+        param ciphertext: KEM ciphertext
+        type ciphertext: bytes
+        return: Shared key
+        """
+        raise NotImplementedError
+
+    def sign_keygen_batch(self, count: int) -> List[Tuple[bytes, bytes]]:
+        """
+        Generates several signature keypairs; backends that vectorize override this.
+
+        param count: Number of keypairs
+        type count: int
+        return: List of (public_key, secret_key)
+        """
+        return [self.sign_keygen() for _ in range(count)]
+
+    def kem_keygen_batch(self, count: int) -> List[Tuple[bytes, bytes]]:
+        """
+        Generates several KEM keypairs; backends that vectorize override this.
+
+        param count: Number of keypairs
+        type count: int
+        return: List of (encapsulation_key, decapsulation_key)
+        """
+        return [self.kem_keygen() for _ in range(count)]
+
+    def sign_batch(self, secret_key: bytes, messages: Sequence[bytes]) -> List[bytes]:
+        """
+        Signs several messages with one key; backends that can reuse the
+        unpacked key across messages override this.
+
+        param secret_key: Signature secret key
+        type secret_key: bytes
+        param messages: Messages to sign
+        type messages: Sequence[bytes]
+        return: Signature per message
+        """
+        return [self.sign(secret_key, message) for message in messages]
+
+    def verify_batch(self, items: Sequence[Tuple[bytes, bytes, bytes]]) -> List[bool]:
+        """
+        Verifies several signatures; backends that vectorize override this.
+
+        param items: (public_key, message, signature) triples
+        type items: Sequence[Tuple[bytes, bytes, bytes]]
+        return: Validity per item
+        """
+        return [self.verify(*item) for item in items]
+
+
+class PurePythonBackend(PQCBackend):
+    """
+    Reference backend built on dilithium_py and kyber_py; always available.
+
+    Also the only backend offering seeded key generation, which mnemonic
+    recovery relies on to derive the same keys on every node.
+    """
+    name = "pure-python"
+
+    def sign_keygen(self) -> Tuple[bytes, bytes]:
+        return Dilithium2.keygen()
+
+    def sign(self, secret_key: bytes, message: bytes) -> bytes:
+        return Dilithium2.sign(secret_key, message)
+
+    def verify(self, public_key: bytes, message: bytes, signature: bytes) -> bool:
+        try:
+            return Dilithium2.verify(public_key, message, signature)
+        except Exception:
+            return False
+
+    def kem_keygen(self) -> Tuple[bytes, bytes]:
+        return ML_KEM_512.keygen()
+
+    def encaps(self, public_key: bytes) -> Tuple[bytes, bytes]:
+        return ML_KEM_512.encaps(public_key)
+
+    def decaps(self, secret_key: bytes, ciphertext: bytes) -> bytes:
+        return ML_KEM_512.decaps(secret_key, ciphertext)
+
+    def sign_keygen_from_seed(self, seed: bytes) -> Tuple[bytes, bytes]:
+        """
+        Derives a signature keypair deterministically.
+
+        param seed: 32-byte key generation seed
+        type seed: bytes
+        return: (public_key, secret_key)
+        """
+        # A private instance, so the seed cannot leak into concurrent keygens
+        dilithium = Dilithium(DEFAULT_PARAMETERS["dilithium2"])
+        dilithium.random_bytes = lambda n: seed[:n]
+        return dilithium.keygen()
+
+    def kem_keygen_from_seed(self, seed: bytes) -> Tuple[bytes, bytes]:
+        """
+        Derives a KEM keypair deterministically (FIPS 203 internal keygen).
+
+        param seed: 64-byte seed, split into the d and z values
+        type seed: bytes
+        return: (encapsulation_key, decapsulation_key)
+        """
+        return ML_KEM_512._keygen_internal(seed[:32], seed[32:64])
+
+
+class LibOQSBackend(PQCBackend):
+    """
+    Native backend on liboqs; constructing it raises ImportError or RuntimeError
+    when liboqs-python is missing or lacks one of the algorithms.
+    """
+    name = "liboqs"
+
+    def __init__(self):
+        import oqs
+        self.oqs = oqs
+        if self.signature_algorithm not in oqs.get_enabled_sig_mechanisms():
+            raise RuntimeError(f"liboqs was built without {self.signature_algorithm}")
+        if self.kem_algorithm not in oqs.get_enabled_kem_mechanisms():
+            raise RuntimeError(f"liboqs was built without {self.kem_algorithm}")
+
+    def sign_keygen(self) -> Tuple[bytes, bytes]:
+        with self.oqs.Signature(self.signature_algorithm) as signer:
+            public_key = signer.generate_keypair()
+            return bytes(public_key), bytes(signer.export_secret_key())
+
+    def sign(self, secret_key: bytes, message: bytes) -> bytes:
+        with self.oqs.Signature(self.signature_algorithm, secret_key) as signer:
+            return bytes(signer.sign(message))
+
+    def verify(self, public_key: bytes, message: bytes, signature: bytes) -> bool:
+        try:
+            with self.oqs.Signature(self.signature_algorithm) as verifier:
+                return verifier.verify(message, signature, public_key)
+        except Exception:
+            return False
+
+    def kem_keygen(self) -> Tuple[bytes, bytes]:
+        with self.oqs.KeyEncapsulation(self.kem_algorithm) as kem:
+            public_key = kem.generate_keypair()
+            return bytes(public_key), bytes(kem.export_secret_key())
+
+    def encaps(self, public_key: bytes) -> Tuple[bytes, bytes]:
+        with self.oqs.KeyEncapsulation(self.kem_algorithm) as kem:
+            ciphertext, shared_key = kem.encap_secret(public_key)
+            return bytes(shared_key), bytes(ciphertext)
+
+    def decaps(self, secret_key: bytes, ciphertext: bytes) -> bytes:
+        with self.oqs.KeyEncapsulation(self.kem_algorithm, secret_key) as kem:
+            return bytes(kem.decap_secret(ciphertext))
+
+
+class NumpyBackend(PQCBackend):
+    """
+    Pure-Python schemes with NumPy lattice arithmetic (pqc_numpy), batched
+    across keys and signatures; constructing it raises ImportError without NumPy.
+    """
+    name = "numpy"
+
+    def __init__(self):
+        from pqc_numpy import Dilithium2Numpy, MLKEM512Numpy
+        self.dilithium = Dilithium2Numpy()
+        self.kem = MLKEM512Numpy()
+
+    def sign_keygen(self) -> Tuple[bytes, bytes]:
+        return self.dilithium.keygen()
+
+    def sign(self, secret_key: bytes, message: bytes) -> bytes:
+        return self.dilithium.sign(secret_key, message)
+
+    def sign_batch(self, secret_key: bytes, messages: Sequence[bytes]) -> List[bytes]:
+        return self.dilithium.sign_many(secret_key, messages)
+
+    def verify(self, public_key: bytes, message: bytes, signature: bytes) -> bool:
+        return self.verify_batch([(public_key, message, signature)])[0]
+
+    def verify_batch(self, items: Sequence[Tuple[bytes, bytes, bytes]]) -> List[bool]:
+        try:
+            return self.dilithium.verify_batch(items)
+        except Exception:
+            # Isolate the item that broke the batch
+            if len(items) > 1:
+                return [self.verify(*item) for item in items]
+            return [False]
+
+    def kem_keygen(self) -> Tuple[bytes, bytes]:
+        return self.kem.keygen()
+
+    def kem_keygen_batch(self, count: int) -> List[Tuple[bytes, bytes]]:
+        return self.kem.keygen_batch(count)
+
+    def encaps(self, public_key: bytes) -> Tuple[bytes, bytes]:
+        return self.kem.encaps(public_key)
+
+    def decaps(self, secret_key: bytes, ciphertext: bytes) -> bytes:
+        return self.kem.decaps(secret_key, ciphertext)
+
+
+BACKENDS: Dict[str, Type[PQCBackend]] = {
+    "native": LibOQSBackend,
+    "numpy": NumpyBackend,
+    "pure": PurePythonBackend,
+}
+"""
+Backends in order of preference for "auto".
+"""
+
+
+REFERENCE_BACKEND = PurePythonBackend()
+"""
+Pure-Python backend every other backend is checked against.
+"""
+
+
+def self_test(candidate: PQCBackend, reference: PQCBackend = REFERENCE_BACKEND) -> Optional[str]:
+    """
+    Checks that a backend round-trips and interoperates with the reference backend.
+
+    Signatures made by either backend must verify under the other, and a key
+    encapsulated by either must decapsulate to the same shared key in the other.
+
+    param candidate: Backend under test
+    type candidate: PQCBackend
+    param reference: Backend it must agree with
+    type reference: PQCBackend
+    return: None if every check passed, otherwise a description of the first failure
+    """
+    message = b"PQC-Hub backend self-test " + os.urandom(16)
+    # Testing the reference against itself needs only the round trip
+    pairs = list(dict.fromkeys(((candidate, candidate), (candidate, reference), (reference, candidate))))
+    try:
+        for signer, verifier in pairs:
+            public_key, secret_key = signer.sign_keygen()
+            signature = signer.sign(secret_key, message)
+            if not verifier.verify(public_key, message, signature):
+                return f"{verifier.name} rejected a signature made by {signer.name}"
+            if verifier.verify(public_key, message + b"!", signature):
+                return f"{verifier.name} accepted a signature over a different message"
+
+        for owner, sender in pairs:
+            public_key, secret_key = owner.kem_keygen()
+            shared_key, ciphertext = sender.encaps(public_key)
+            if owner.decaps(secret_key, ciphertext) != shared_key:
+                return f"{owner.name} decapsulated a different key than {sender.name} encapsulated"
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+_backend: Optional[PQCBackend] = None
+"""
+Backend of this process, chosen by select_backend().
+"""
+
+_selection: dict = {}
+"""
+How the active backend was chosen, for reporting.
+"""
+
+def select_backend(preference: str = PQC_BACKEND) -> PQCBackend:
+    """
+    Chooses and self-tests the backend of this process.
+
+    Should run at startup, before worker processes are forked, so they inherit
+    the choice. With "auto" a native backend that is missing or fails the
+    self-test is skipped with a log line; naming an unusable backend is an error.
+
+    param preference: "auto" or a key of BACKENDS
+    type preference: str
+    return: The active backend
+    raises RuntimeError: If the requested backend cannot be used
+    """
+    global _backend, _selection
+    if preference not in ("auto", *BACKENDS):
+        raise RuntimeError(f"Unknown PQC backend '{preference}'")
+
+    skipped = {}
+    for key in BACKENDS:
+        if preference not in ("auto", key):
+            continue
+        try:
+            backend = REFERENCE_BACKEND if key == "pure" else BACKENDS[key]()
+        except Exception as e:
+            skipped[key] = f"unavailable: {e}"
+            continue
+        failure = self_test(backend)
+        if failure is not None:
+            skipped[key] = f"self-test failed: {failure}"
+            continue
+        _backend = backend
+        _selection = {"preference": preference, "skipped": skipped}
+        print(f"[Crypto] Using {backend.name} backend ({backend.signature_algorithm}, {backend.kem_algorithm}), self-test passed")
+        for name, reason in skipped.items():
+            print(f"[Crypto] Skipped {name} backend: {reason}")
+        return backend
+
+    raise RuntimeError(f"No usable PQC backend for '{preference}': {skipped}")
+
+
+def get_backend() -> PQCBackend:
+    """
+    Returns the backend of this process, selecting it on first use.
+
+    return: Active backend
+    rtype: PQCBackend
+    """
+    if _backend is None:
+        return select_backend()
+    return _backend
+
+
+def describe_backend() -> dict:
+    """Returns the active backend, its algorithms and why other backends were skipped."""
+    backend = get_backend()
+    return {
+        "backend": backend.name,
+        "signature_algorithm": backend.signature_algorithm,
+        "kem_algorithm": backend.kem_algorithm,
+        "preference": _selection.get("preference"),
+        "self_test": "passed",
+        "skipped": _selection.get("skipped", {}),
+    }
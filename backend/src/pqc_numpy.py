@@ -0,0 +1,593 @@
+"""
+NumPy Lattice Arithmetic
+
+Dilithium2 (round 3) and ML-KEM-512 with the polynomial arithmetic done on
+NumPy arrays instead of per-coefficient Python loops. Polynomials are int64
+arrays whose last axis holds the 256 coefficients; every leading axis is a
+batch axis, so one NTT call transforms a whole module vector, or the vectors
+of many keys or signatures at once.
+
+Hashing, sampling order and byte encodings follow dilithium_py and kyber_py
+exactly, so keys, signatures and ciphertexts are byte-for-byte identical to
+theirs for the same randomness. NumPy is an optional dependency; the backend
+registry only offers this module when it imports.
+
+Author: LunaLynx12
+"""
+
+
+from hashlib import sha3_256, sha3_512, shake_128, shake_256
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+import os
+
+
+def _zetas(root: int, q: int, count: int, bits: int) -> np.ndarray:
+    return np.array([pow(root, int(format(i, f"0{bits}b")[::-1], 2), q) for i in range(count)], dtype=np.int64)
+
+
+def pack_bits(coeffs: np.ndarray, n_bits: int) -> bytes:
+    """
+    Packs non-negative coefficients little-endian, n_bits each, in array order.
+
+    param coeffs: Coefficients, any shape
+    type coeffs: np.ndarray
+    param n_bits: Bits per coefficient
+    type n_bits: int
+    return: Packed bytes
+    """
+    bits = (coeffs.reshape(-1, 1) >> np.arange(n_bits)) & 1
+    return np.packbits(bits.astype(np.uint8).reshape(-1), bitorder="little").tobytes()
+
+
+def unpack_bits(data: bytes, n_bits: int) -> np.ndarray:
+    """
+    Inverse of pack_bits.
+
+    param data: Packed bytes
+    type data: bytes
+    param n_bits: Bits per coefficient
+    type n_bits: int
+    return: Flat int64 array of coefficients
+    """
+    bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8), bitorder="little")
+    return (bits.reshape(-1, n_bits).astype(np.int64) << np.arange(n_bits)).sum(axis=1)
+
+
+class MLKEM512Numpy:
+    """
+    ML-KEM-512 (FIPS 203) with vectorized NTT, base multiplication and coding.
+
+    The *_batch methods process many keys or ciphertexts with one array
+    operation per step; the single-item methods are batches of one.
+    """
+    q = 3329
+    k = 2
+    eta_1 = 3
+    eta_2 = 2
+    du = 10
+    dv = 4
+    zetas = _zetas(17, 3329, 128, 7)
+    ntt_f = pow(128, -1, 3329)
+
+    # --- Arithmetic ---
+
+    def ntt(self, a: np.ndarray) -> np.ndarray:
+        q, zetas = self.q, self.zetas
+        shape = a.shape
+        k, length = 1, 128
+        while length >= 2:
+            blocks = 256 // (2 * length)
+            v = a.reshape(*shape[:-1], blocks, 2, length)
+            t = zetas[k:k + blocks, None] * v[..., 1, :] % q
+            a = np.stack(((v[..., 0, :] + t) % q, (v[..., 0, :] - t) % q), axis=-2).reshape(shape)
+            k += blocks
+            length >>= 1
+        return a
+
+    def intt(self, a: np.ndarray) -> np.ndarray:
+        q, zetas = self.q, self.zetas
+        shape = a.shape
+        k, length = 127, 2
+        while length <= 128:
+            blocks = 256 // (2 * length)
+            v = a.reshape(*shape[:-1], blocks, 2, length)
+            zeta = zetas[k - blocks + 1:k + 1][::-1, None]
+            low, high = v[..., 0, :], v[..., 1, :]
+            a = np.stack(((low + high) % q, zeta * (high - low) % q), axis=-2).reshape(shape)
+            k -= blocks
+            length <<= 1
+        return a * self.ntt_f % self.q
+
+    def multiply(self, f: np.ndarray, g: np.ndarray) -> np.ndarray:
+        """Multiplies in the NTT domain (degree-one base cases), broadcasting over leading axes."""
+        q = self.q
+        f = f.reshape(*f.shape[:-1], 64, 2, 2)
+        g = g.reshape(*g.shape[:-1], 64, 2, 2)
+        zeta = self.zetas[64:128, None] * np.array([1, -1])
+        r0 = (f[..., 0] * g[..., 0] + zeta * (f[..., 1] * g[..., 1] % q)) % q
+        r1 = (f[..., 1] * g[..., 0] + f[..., 0] * g[..., 1]) % q
+        result = np.stack((r0, r1), axis=-1)
+        return result.reshape(*result.shape[:-3], 256)
+
+    def matvec(self, a: np.ndarray, v: np.ndarray) -> np.ndarray:
+        """(..., k, k, 256) x (..., k, 256) -> (..., k, 256)"""
+        return self.multiply(a, v[..., None, :, :]).sum(axis=-2) % self.q
+
+    def dot(self, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+        """(..., k, 256) . (..., k, 256) -> (..., 256)"""
+        return self.multiply(u, v).sum(axis=-2) % self.q
+
+    def compress(self, x: np.ndarray, d: int) -> np.ndarray:
+        return (((1 << d) * x + 1664) // self.q) % (1 << d)
+
+    def decompress(self, x: np.ndarray, d: int) -> np.ndarray:
+        return (self.q * x + (1 << (d - 1))) >> d
+
+    def decode(self, data: bytes, d: int, count: int) -> np.ndarray:
+        coeffs = unpack_bits(data, d).reshape(count, 256)
+        return coeffs % self.q if d == 12 else coeffs
+
+    # --- Sampling ---
+
+    @staticmethod
+    def _xof(rho: bytes, i: int, j: int) -> bytes:
+        return shake_128(rho + bytes([i, j])).digest(840)
+
+    @staticmethod
+    def _prf(eta: int, s: bytes, b: int) -> bytes:
+        return shake_256(s + bytes([b])).digest(eta * 64)
+
+    def sample_ntt(self, xof_bytes: bytes) -> np.ndarray:
+        b = np.frombuffer(xof_bytes, dtype=np.uint8).astype(np.int64).reshape(-1, 3)
+        d1 = b[:, 0] + 256 * (b[:, 1] % 16)
+        d2 = b[:, 1] // 16 + 16 * b[:, 2]
+        candidates = np.stack((d1, d2), axis=1).reshape(-1)
+        accepted = candidates[candidates < self.q]
+        if len(accepted) < 256:
+            raise ValueError("Not enough XOF output to sample a polynomial")
+        return accepted[:256]
+
+    def cbd(self, data: bytes, eta: int) -> np.ndarray:
+        bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8), bitorder="little").reshape(256, 2, eta)
+        counts = bits.sum(axis=2, dtype=np.int64)
+        return (counts[:, 0] - counts[:, 1]) % self.q
+
+    def generate_matrix(self, rho: bytes, transpose: bool = False) -> np.ndarray:
+        matrix = np.empty((self.k, self.k, 256), dtype=np.int64)
+        for i in range(self.k):
+            for j in range(self.k):
+                sample = self.sample_ntt(self._xof(rho, j, i))
+                if transpose:
+                    matrix[j, i] = sample
+                else:
+                    matrix[i, j] = sample
+        return matrix
+
+    def _error_vectors(self, sigma: bytes, etas: Sequence[int]) -> np.ndarray:
+        return np.stack([self.cbd(self._prf(eta, sigma, n), eta) for n, eta in enumerate(etas)])
+
+    # --- K-PKE ---
+
+    def _pke_keygen_batch(self, ds: Sequence[bytes]) -> List[Tuple[bytes, bytes]]:
+        rhos, a, s, e = [], [], [], []
+        for d in ds:
+            h = sha3_512(d + bytes([self.k])).digest()
+            rho, sigma = h[:32], h[32:]
+            rhos.append(rho)
+            a.append(self.generate_matrix(rho))
+            noise = self._error_vectors(sigma, [self.eta_1] * (2 * self.k))
+            s.append(noise[:self.k])
+            e.append(noise[self.k:])
+        s_hat = self.ntt(np.stack(s))
+        t_hat = (self.matvec(np.stack(a), s_hat) + self.ntt(np.stack(e))) % self.q
+        return [(pack_bits(t_hat[n], 12) + rhos[n], pack_bits(s_hat[n], 12)) for n in range(len(ds))]
+
+    def _pke_encrypt_batch(self, items: Sequence[Tuple[bytes, bytes, bytes]]) -> List[bytes]:
+        t, a, y, e1, e2, mu = [], [], [], [], [], []
+        for ek_pke, m, r in items:
+            if len(ek_pke) != 384 * self.k + 32:
+                raise ValueError(f"Type check failed, ek_pke has the wrong length, expected {384 * self.k + 32} bytes and received {len(ek_pke)}")
+            t_hat_bytes, rho = ek_pke[:-32], ek_pke[-32:]
+            t_hat = self.decode(t_hat_bytes, 12, self.k)
+            if pack_bits(t_hat, 12) != t_hat_bytes:
+                raise ValueError("Modulus check failed, t_hat does not encode correctly")
+            t.append(t_hat)
+            a.append(self.generate_matrix(rho, transpose=True))
+            noise = self._error_vectors(r, [self.eta_1] * self.k + [self.eta_2] * (self.k + 1))
+            y.append(noise[:self.k])
+            e1.append(noise[self.k:2 * self.k])
+            e2.append(noise[2 * self.k])
+            mu.append(self.decompress(self.decode(m, 1, 1)[0], 1))
+        y_hat = self.ntt(np.stack(y))
+        u = (self.intt(self.matvec(np.stack(a), y_hat)) + np.stack(e1)) % self.q
+        v = (self.intt(self.dot(np.stack(t), y_hat)) + np.stack(e2) + np.stack(mu)) % self.q
+        c1 = self.compress(u, self.du)
+        c2 = self.compress(v, self.dv)
+        return [pack_bits(c1[n], self.du) + pack_bits(c2[n], self.dv) for n in range(len(items))]
+
+    def _pke_decrypt_batch(self, items: Sequence[Tuple[bytes, bytes]]) -> List[bytes]:
+        n = self.k * self.du * 32
+        u = np.stack([self.decompress(self.decode(c[:n], self.du, self.k), self.du) for _, c in items])
+        v = np.stack([self.decompress(self.decode(c[n:], self.dv, 1)[0], self.dv) for _, c in items])
+        s_hat = np.stack([self.decode(dk_pke, 12, self.k) for dk_pke, _ in items])
+        w = (v - self.intt(self.dot(s_hat, self.ntt(u)))) % self.q
+        m = self.compress(w, 1)
+        return [pack_bits(m[i], 1) for i in range(len(items))]
+
+    # --- ML-KEM ---
+
+    def keygen_internal_batch(self, seeds: Sequence[Tuple[bytes, bytes]]) -> List[Tuple[bytes, bytes]]:
+        """
+        Derives keypairs from (d, z) seeds, as ML_KEM._keygen_internal does.
+
+        param seeds: One (d, z) pair of 32-byte values per key
+        type seeds: Sequence[Tuple[bytes, bytes]]
+        return: (encapsulation_key, decapsulation_key) per seed
+        """
+        keys = self._pke_keygen_batch([d for d, _ in seeds])
+        return [(ek, dk_pke + ek + sha3_256(ek).digest() + z) for (ek, dk_pke), (_, z) in zip(keys, seeds)]
+
+    def keygen_batch(self, count: int) -> List[Tuple[bytes, bytes]]:
+        return self.keygen_internal_batch([(os.urandom(32), os.urandom(32)) for _ in range(count)])
+
+    def keygen(self) -> Tuple[bytes, bytes]:
+        return self.keygen_batch(1)[0]
+
+    def encaps_internal_batch(self, items: Sequence[Tuple[bytes, bytes]]) -> List[Tuple[bytes, bytes]]:
+        """
+        Encapsulates given 32-byte messages, as ML_KEM._encaps_internal does.
+
+        param items: (encapsulation_key, m) pairs
+        type items: Sequence[Tuple[bytes, bytes]]
+        return: (shared_key, ciphertext) per item
+        """
+        derived = [sha3_512(m + sha3_256(ek).digest()).digest() for ek, m in items]
+        try:
+            ciphertexts = self._pke_encrypt_batch([(ek, m, h[32:]) for (ek, m), h in zip(items, derived)])
+        except ValueError as e:
+            raise ValueError(f"Validation of encapsulation key failed: {e = }")
+        return [(h[:32], c) for h, c in zip(derived, ciphertexts)]
+
+    def encaps_batch(self, public_keys: Sequence[bytes]) -> List[Tuple[bytes, bytes]]:
+        return self.encaps_internal_batch([(ek, os.urandom(32)) for ek in public_keys])
+
+    def encaps(self, ek: bytes) -> Tuple[bytes, bytes]:
+        return self.encaps_batch([ek])[0]
+
+    def decaps_batch(self, items: Sequence[Tuple[bytes, bytes]]) -> List[bytes]:
+        """
+        Recovers shared keys with implicit rejection.
+
+        param items: (decapsulation_key, ciphertext) pairs
+        type items: Sequence[Tuple[bytes, bytes]]
+        return: Shared key per item
+        """
+        k = self.k
+        parsed = []
+        for dk, c in items:
+            if len(c) != 32 * (self.du * k + self.dv):
+                raise ValueError(f"ciphertext type check failed. Expected {32 * (self.du * k + self.dv)} bytes and obtained {len(c)}")
+            if len(dk) != 768 * k + 96:
+                raise ValueError(f"decapsulation type check failed. Expected {768 * k + 96} bytes and obtained {len(dk)}")
+            dk_pke, ek_pke = dk[:384 * k], dk[384 * k:768 * k + 32]
+            h, z = dk[768 * k + 32:768 * k + 64], dk[768 * k + 64:]
+            if sha3_256(ek_pke).digest() != h:
+                raise ValueError("hash check failed")
+            parsed.append((dk_pke, ek_pke, h, z, c))
+
+        messages = self._pke_decrypt_batch([(dk_pke, c) for dk_pke, _, _, _, c in parsed])
+        derived = [sha3_512(m + h).digest() for m, (_, _, h, _, _) in zip(messages, parsed)]
+        reencrypted = self._pke_encrypt_batch([(ek_pke, m, d[32:]) for m, d, (_, ek_pke, _, _, _) in zip(messages, derived, parsed)])
+        return [
+            d[:32] if c_prime == c else shake_256(z + c).digest(32)
+            for d, c_prime, (_, _, _, z, c) in zip(derived, reencrypted, parsed)
+        ]
+
+    def decaps(self, dk: bytes, c: bytes) -> bytes:
+        return self.decaps_batch([(dk, c)])[0]
+
+
+class Dilithium2Numpy:
+    """
+    Round-3 Dilithium2 with vectorized NTT, matrix products, rounding and hints.
+
+    Signing runs the rejection loop on whole vectors; verify_batch checks many
+    signatures with one NTT pass per step.
+    """
+    q = 8380417
+    d = 13
+    k = 4
+    l = 4
+    eta = 2
+    tau = 39
+    omega = 80
+    gamma_1 = 1 << 17
+    gamma_2 = (8380417 - 1) // 88
+    beta = 39 * 2
+    zetas = _zetas(1753, 8380417, 256, 8)
+    ntt_f = pow(256, -1, 8380417)
+
+    # --- Arithmetic ---
+
+    def ntt(self, a: np.ndarray) -> np.ndarray:
+        q, zetas = self.q, self.zetas
+        shape = a.shape
+        a = a % q
+        k, length = 1, 128
+        while length >= 1:
+            blocks = 256 // (2 * length)
+            v = a.reshape(*shape[:-1], blocks, 2, length)
+            t = zetas[k:k + blocks, None] * v[..., 1, :] % q
+            a = np.stack(((v[..., 0, :] + t) % q, (v[..., 0, :] - t) % q), axis=-2).reshape(shape)
+            k += blocks
+            length >>= 1
+        return a
+
+    def intt(self, a: np.ndarray) -> np.ndarray:
+        q, zetas = self.q, self.zetas
+        shape = a.shape
+        k, length = 256, 1
+        while length < 256:
+            blocks = 256 // (2 * length)
+            v = a.reshape(*shape[:-1], blocks, 2, length)
+            zeta = -zetas[k - blocks:k][::-1, None]
+            low, high = v[..., 0, :], v[..., 1, :]
+            a = np.stack(((low + high) % q, zeta * (low - high) % q), axis=-2).reshape(shape)
+            k -= blocks
+            length <<= 1
+        return a * self.ntt_f % q
+
+    def matvec(self, a: np.ndarray, v: np.ndarray) -> np.ndarray:
+        """(..., k, l, 256) x (..., l, 256) -> (..., k, 256), NTT domain"""
+        return (a * v[..., None, :, :] % self.q).sum(axis=-2) % self.q
+
+    def centered(self, a: np.ndarray) -> np.ndarray:
+        a = a % self.q
+        return np.where(a > (self.q - 1) >> 1, a - self.q, a)
+
+    def exceeds(self, a: np.ndarray, bound: int, axis=None) -> np.ndarray:
+        """True where any coefficient has infinity norm >= bound."""
+        return (np.abs(self.centered(a)) >= bound).any(axis=axis)
+
+    def power_2_round(self, t: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        r = t % self.q
+        r0 = r % (1 << self.d)
+        r0 = np.where(r0 > 1 << (self.d - 1), r0 - (1 << self.d), r0)
+        return (r - r0) >> self.d, r0
+
+    def decompose(self, r: np.ndarray, alpha: int) -> Tuple[np.ndarray, np.ndarray]:
+        rp = r % self.q
+        r0 = rp % alpha
+        r0 = np.where(r0 > alpha >> 1, r0 - alpha, r0)
+        wraps = rp - r0 == self.q - 1
+        r1 = np.where(wraps, 0, (rp - r0) // alpha)
+        return r1, np.where(wraps, r0 - 1, r0)
+
+    def make_hint(self, z0: np.ndarray, r1: np.ndarray, alpha: int) -> np.ndarray:
+        gamma2 = alpha >> 1
+        z0 = z0 % self.q
+        keep = (z0 <= gamma2) | (z0 > self.q - gamma2) | ((z0 == self.q - gamma2) & (r1 == 0))
+        return np.where(keep, 0, 1)
+
+    def use_hint(self, h: np.ndarray, r: np.ndarray, alpha: int) -> np.ndarray:
+        m = (self.q - 1) // alpha
+        r1, r0 = self.decompose(r, alpha)
+        return np.where(h == 1, np.where(r0 > 0, r1 + 1, r1 - 1) % m, r1)
+
+    # --- Sampling ---
+
+    @staticmethod
+    def _h(data: bytes, length: int) -> bytes:
+        return shake_256(data).digest(length)
+
+    @staticmethod
+    def _stream(xof, seed: bytes, minimum: int, accept) -> np.ndarray:
+        """Reads a growing XOF prefix until accept() yields 256 values."""
+        length = minimum
+        while True:
+            values = accept(xof(seed).digest(length))
+            if len(values) >= 256:
+                return values[:256]
+            length *= 2
+
+    def _uniform(self, data: bytes) -> np.ndarray:
+        b = np.frombuffer(data[:len(data) - len(data) % 3], dtype=np.uint8).astype(np.int64).reshape(-1, 3)
+        candidates = (b[:, 0] | b[:, 1] << 8 | b[:, 2] << 16) & 0x7FFFFF
+        return candidates[candidates < self.q]
+
+    def _bounded(self, data: bytes) -> np.ndarray:
+        b = np.frombuffer(data, dtype=np.uint8).astype(np.int64)
+        nibbles = np.stack((b & 15, b >> 4), axis=1).reshape(-1)
+        nibbles = nibbles[nibbles < 15]
+        return 2 - nibbles % 5
+
+    def expand_matrix(self, rho: bytes) -> np.ndarray:
+        return np.stack([
+            np.stack([self._stream(shake_128, rho + bytes([j, i]), 840, self._uniform) for j in range(self.l)])
+            for i in range(self.k)
+        ])
+
+    def expand_secrets(self, rho_prime: bytes) -> Tuple[np.ndarray, np.ndarray]:
+        polys = np.stack([
+            self._stream(shake_256, rho_prime + i.to_bytes(2, "little"), 272, self._bounded)
+            for i in range(self.l + self.k)
+        ])
+        return polys[:self.l], polys[self.l:]
+
+    def expand_mask(self, rho_prime: bytes, kappa: int) -> np.ndarray:
+        data = b"".join(shake_256(rho_prime + (kappa + i).to_bytes(2, "little")).digest(576) for i in range(self.l))
+        return self.gamma_1 - unpack_bits(data, 18).reshape(self.l, 256)
+
+    def sample_in_ball(self, seed: bytes) -> np.ndarray:
+        length = 136
+        while True:
+            stream = shake_256(seed).digest(length)
+            signs = int.from_bytes(stream[:8], "little")
+            position = 8
+            coeffs = [0] * 256
+            for i in range(256 - self.tau, 256):
+                while position < length and stream[position] > i:
+                    position += 1
+                if position == length:
+                    break
+                j = stream[position]
+                position += 1
+                coeffs[i] = coeffs[j]
+                coeffs[j] = 1 - 2 * (signs & 1)
+                signs >>= 1
+            else:
+                return np.array(coeffs, dtype=np.int64)
+            length *= 2
+
+    # --- Encodings ---
+
+    def _pack_h(self, h: np.ndarray) -> bytes:
+        packed, offsets = [], []
+        for row in h:
+            packed.extend(np.flatnonzero(row).tolist())
+            offsets.append(len(packed))
+        return bytes(packed + [0] * (self.omega - offsets[-1]) + offsets)
+
+    def _unpack_h(self, h_bytes: bytes) -> np.ndarray:
+        offsets = [0] + list(h_bytes[-self.k:])
+        h = np.zeros((self.k, 256), dtype=np.int64)
+        for i in range(self.k):
+            h[i, list(h_bytes[offsets[i]:offsets[i + 1]])] = 1
+        return h
+
+    def _unpack_sk(self, sk: bytes):
+        s_len = 96
+        if len(sk) != 96 + s_len * (self.l + self.k) + 416 * self.k:
+            raise ValueError("SK packed bytes is of the wrong length")
+        rho, key, tr = sk[:32], sk[32:64], sk[64:96]
+        vectors = sk[96:]
+        s1 = self.eta - unpack_bits(vectors[:s_len * self.l], 3).reshape(self.l, 256)
+        s2 = self.eta - unpack_bits(vectors[s_len * self.l:s_len * (self.l + self.k)], 3).reshape(self.k, 256)
+        t0 = (1 << 12) - unpack_bits(vectors[-416 * self.k:], 13).reshape(self.k, 256)
+        return rho, key, tr, s1, s2, t0
+
+    # --- Scheme ---
+
+    def keygen_from_seed(self, zeta: bytes) -> Tuple[bytes, bytes]:
+        """
+        Derives a keypair from the 32-byte seed Dilithium.keygen draws.
+
+        param zeta: Key generation seed
+        type zeta: bytes
+        return: (public_key, secret_key)
+        """
+        seed_bytes = self._h(zeta, 128)
+        rho, rho_prime, key = seed_bytes[:32], seed_bytes[32:96], seed_bytes[96:]
+        a_hat = self.expand_matrix(rho)
+        s1, s2 = self.expand_secrets(rho_prime)
+        t = (self.intt(self.matvec(a_hat, self.ntt(s1))) + s2) % self.q
+        t1, t0 = self.power_2_round(t)
+        pk = rho + pack_bits(t1, 10)
+        tr = self._h(pk, 32)
+        sk = rho + key + tr + pack_bits(self.eta - s1, 3) + pack_bits(self.eta - s2, 3) + pack_bits((1 << 12) - t0, 13)
+        return pk, sk
+
+    def keygen(self) -> Tuple[bytes, bytes]:
+        return self.keygen_from_seed(os.urandom(32))
+
+    def sign(self, sk: bytes, m: bytes) -> bytes:
+        return self.sign_many(sk, [m])[0]
+
+    def sign_many(self, sk: bytes, messages: Sequence[bytes]) -> List[bytes]:
+        """
+        Signs several messages with one key, unpacking the key and expanding
+        its matrix once.
+
+        param sk: Secret key
+        type sk: bytes
+        param messages: Messages to sign
+        type messages: Sequence[bytes]
+        return: Signature per message
+        """
+        rho, key, tr, s1, s2, t0 = self._unpack_sk(sk)
+        prepared = (self.expand_matrix(rho), key, tr, self.ntt(s1), self.ntt(s2), self.ntt(t0))
+        return [self._sign_prepared(prepared, m) for m in messages]
+
+    def _sign_prepared(self, prepared: tuple, m: bytes) -> bytes:
+        q = self.q
+        a_hat, key, tr, s1_hat, s2_hat, t0_hat = prepared
+        mu = self._h(tr + m, 64)
+        rho_prime = self._h(key + mu, 64)
+        alpha = self.gamma_2 << 1
+        kappa = 0
+        while True:
+            y = self.expand_mask(rho_prime, kappa)
+            kappa += self.l
+            w = self.intt(self.matvec(a_hat, self.ntt(y)))
+            w1, w0 = self.decompose(w, alpha)
+            c_tilde = self._h(mu + pack_bits(w1, 6), 32)
+            c_hat = self.ntt(self.sample_in_ball(c_tilde))
+
+            z = (y + self.intt(s1_hat * c_hat % q)) % q
+            if self.exceeds(z, self.gamma_1 - self.beta):
+                continue
+            w0_minus_cs2 = (w0 - self.intt(s2_hat * c_hat % q)) % q
+            if self.exceeds(w0_minus_cs2, self.gamma_2 - self.beta):
+                continue
+            c_t0 = self.intt(t0_hat * c_hat % q)
+            if self.exceeds(c_t0, self.gamma_2):
+                continue
+            h = self.make_hint(w0_minus_cs2 + c_t0, w1, alpha)
+            if h.sum() > self.omega:
+                continue
+            return c_tilde + pack_bits((self.gamma_1 - z) % q, 18) + self._pack_h(h)
+
+    def verify_batch(self, items: Sequence[Tuple[bytes, bytes, bytes]]) -> List[bool]:
+        """
+        Verifies many (public_key, message, signature) triples.
+
+        Decoding, challenge sampling and matrix expansion run per item; the
+        NTTs, products and hint application run once over the whole batch.
+
+        param items: (public_key, message, signature) triples
+        type items: Sequence[Tuple[bytes, bytes, bytes]]
+        return: Validity per item; malformed input counts as invalid
+        """
+        q = self.q
+        results: List[bool] = [False] * len(items)
+        index, c_tildes, mus, a, z, t1, c, h = [], [], [], [], [], [], [], []
+        for n, (pk, m, sig) in enumerate(items):
+            parsed = self._parse_for_verify(pk, m, sig)
+            if parsed is None:
+                continue
+            index.append(n)
+            for column, value in zip((c_tildes, mus, a, z, t1, c, h), parsed):
+                column.append(value)
+        if not index:
+            return results
+
+        z_hat = self.ntt(np.stack(z))
+        t1_hat = self.ntt(np.stack(t1) << self.d)
+        c_hat = self.ntt(np.stack(c))[:, None, :]
+        az_minus_ct1 = self.intt((self.matvec(np.stack(a), z_hat) - t1_hat * c_hat % q) % q)
+        w1 = self.use_hint(np.stack(h), az_minus_ct1, 2 * self.gamma_2)
+        for i, n in enumerate(index):
+            results[n] = c_tildes[i] == self._h(mus[i] + pack_bits(w1[i], 6), 32)
+        return results
+
+    def _parse_for_verify(self, pk: bytes, m: bytes, sig: bytes) -> Optional[tuple]:
+        if len(pk) != 32 + 320 * self.k or len(sig) != 32 + 576 * self.l + self.omega + self.k:
+            return None
+        try:
+            h = self._unpack_h(sig[-(self.k + self.omega):])
+        except (IndexError, ValueError):
+            return None
+        if h.sum() > self.omega:
+            return None
+        z = self.gamma_1 - unpack_bits(sig[32:32 + 576 * self.l], 18).reshape(self.l, 256)
+        if self.exceeds(z, self.gamma_1 - self.beta):
+            return None
+        rho = pk[:32]
+        t1 = unpack_bits(pk[32:], 10).reshape(self.k, 256)
+        mu = self._h(self._h(pk, 32) + m, 64)
+        c_tilde = sig[:32]
+        return c_tilde, mu, self.expand_matrix(rho), z, t1, self.sample_in_ball(c_tilde), h
+
+    def verify(self, pk: bytes, m: bytes, sig: bytes) -> bool:
+        return self.verify_batch([(pk, m, sig)])[0]
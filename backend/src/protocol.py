@@ -1,21 +1,108 @@
+from config import P2P_MAX_PEER_LIST
+import ipaddress
+import time
+
 class MessageTypes:
     PEER_LIST = 0x01
     TEXT_MSG = 0x02
+    HELLO = 0x08
+    PING = 0x09
+    PONG = 0x0A
+
+NODE_ID_SIZE = 16
+NONCE_SIZE = 8
+
+def encode_varint(value: int) -> bytes:
+    """Unsigned LEB128: 7 bits per byte, high bit set on every byte but the last"""
+    if value < 0:
+        raise ValueError("varint must be non-negative")
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+def decode_varint(data: bytes, offset: int) -> tuple:
+    """Read a varint starting at offset, returning (value, next_offset)"""
+    value = 0
+    shift = 0
+    while True:
+        if offset >= len(data) or shift > 63:
+            raise ValueError("Truncated or oversized varint")
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
 
 def serialize_peer_list(peers: list) -> bytes:
-    """Format: [TYPE:1][COUNT:1][IP:4][PORT:2]..."""
-    msg = bytes([MessageTypes.PEER_LIST, len(peers)])
-    for ip, port in peers:
-        msg += bytes(map(int, ip.split('.'))) + port.to_bytes(2, 'big')
-    return msg
-
-def deserialize_peer_list(data: bytes) -> list:
-    """Parse peer list messages"""
-    count = data[1]
+    """
+    Format: [TYPE:1][COUNT:varint] then per peer [FAMILY:1][IP:4|16][PORT:2][LAST_SEEN:4]
+
+    FAMILY is 4 or 6. Peers are (ip, port) or (ip, port, last_seen) tuples;
+    entries whose host is not a literal IP address are skipped.
+    """
+    now = int(time.time())
+    entries = []
+    for peer in peers:
+        ip, port = peer[0], peer[1]
+        last_seen = int(peer[2]) if len(peer) > 2 else now
+        try:
+            packed = ipaddress.ip_address(ip).packed
+        except ValueError:
+            continue
+        entries.append(
+            bytes([4 if len(packed) == 4 else 6]) + packed
+            + port.to_bytes(2, 'big') + max(0, min(last_seen, now)).to_bytes(4, 'big')
+        )
+    return b"".join([bytes([MessageTypes.PEER_LIST]), encode_varint(len(entries))] + entries)
+
+def deserialize_peer_list(data: bytes, max_count: int = P2P_MAX_PEER_LIST) -> list:
+    """Parse peer list messages into (ip, port, last_seen) tuples"""
+    count, offset = decode_varint(data, 1)
+    if count > max_count:
+        raise ValueError(f"PEER_LIST announces {count} peers, limit is {max_count}")
     peers = []
-    for i in range(count):
-        start = 2 + i * 6
-        ip = ".".join(map(str, data[start:start+4]))
-        port = int.from_bytes(data[start+4:start+6], 'big')
-        peers.append((ip, port))
-    return peers
\ No newline at end of file
+    for _ in range(count):
+        if offset >= len(data):
+            raise ValueError("Truncated PEER_LIST")
+        family = data[offset]
+        if family not in (4, 6):
+            raise ValueError(f"Unknown address family {family}")
+        size = 4 if family == 4 else 16
+        end = offset + 1 + size + 6
+        if end > len(data):
+            raise ValueError("Truncated PEER_LIST")
+        ip = str(ipaddress.ip_address(bytes(data[offset + 1:offset + 1 + size])))
+        port = int.from_bytes(data[end - 6:end - 4], 'big')
+        last_seen = int.from_bytes(data[end - 4:end], 'big')
+        peers.append((ip, port, last_seen))
+        offset = end
+    return peers
+
+def serialize_hello(node_id: bytes, listen_port: int) -> bytes:
+    """Format: [TYPE:1][NODE_ID:16][LISTEN_PORT:2]"""
+    return bytes([MessageTypes.HELLO]) + node_id + listen_port.to_bytes(2, 'big')
+
+def deserialize_hello(data: bytes) -> tuple:
+    """Parse a handshake message into (node_id, listen_port)"""
+    if len(data) != 1 + NODE_ID_SIZE + 2 or data[0] != MessageTypes.HELLO:
+        raise ValueError("Malformed HELLO message")
+    node_id = bytes(data[1:1 + NODE_ID_SIZE])
+    listen_port = int.from_bytes(data[1 + NODE_ID_SIZE:], 'big')
+    return node_id, listen_port
+
+def serialize_ping(nonce: bytes, pong: bool = False) -> bytes:
+    """Format: [TYPE:1][NONCE:8] - a PONG echoes the nonce of the PING it answers"""
+    return bytes([MessageTypes.PONG if pong else MessageTypes.PING]) + nonce
+
+def deserialize_ping(data: bytes) -> bytes:
+    """Return the nonce carried by a PING or PONG message"""
+    if len(data) != 1 + NONCE_SIZE:
+        raise ValueError("Malformed PING/PONG message")
+    return bytes(data[1:])
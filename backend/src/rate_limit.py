@@ -0,0 +1,45 @@
+"""
+Token bucket rate limiting for peer traffic.
+
+Author: LunaLynx12
+"""
+
+
+import time
+
+
+class TokenBucket:
+    """
+    Classic token bucket: refills at `rate` tokens per second up to `capacity`.
+
+    Each accepted event consumes tokens; events arriving on an empty bucket are
+    rejected, so sustained throughput is capped at `rate` while short bursts of
+    up to `capacity` events still pass.
+    """
+    def __init__(self, rate: float, capacity: float):
+        """
+        param rate: Tokens added per second
+        type rate: float
+        param capacity: Maximum number of stored tokens (burst size)
+        type capacity: float
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def consume(self, amount: float = 1.0) -> bool:
+        """
+        Takes `amount` tokens from the bucket if enough are available.
+
+        param amount: Cost of the event
+        type amount: float
+        return: True if the event is within budget
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens < amount:
+            return False
+        self.tokens -= amount
+        return True
@@ -6,24 +6,22 @@ Author: LunaLynx12
 """
 
 
-from key_derivation import derive_dilithium_keypair, derive_kyber_keypair
-from dilithium_py.dilithium import Dilithium2 as Dilithium
-from blockchain import get_blockchain, create_transaction
-from local_database import add_user, get_user_by_address
+from key_derivation import derive_identity
+from local_database import add_user, add_message, get_user_by_address
+from signing_service import get_signing_service
 from mnemonics import generate_mnemonic_phrase
 from fastapi import APIRouter, HTTPException
+from blockchain import create_transaction
 from datetime import datetime, timezone
 from models import UserRegisterRequest
-from kyber import generate_kyber_keys
-from blockchain import get_blockchain
-from local_database import DATABASE
-from dilithium import sign_message
-import sqlite3
+from executor import get_executor
+from key_pool import get_key_pool
+from state_client import get_state
+import asyncio
 import base64
 import uuid
 
 router = APIRouter()
-bc = get_blockchain()
 
 def generate_uid():
     return "0x" + uuid.uuid4().hex
@@ -36,56 +34,42 @@ async def register_user(user: UserRegisterRequest):
     
     Only the public key is returned — private key is kept server-side for signing.
     """
+    executor = get_executor()
+
     # Generate unique address
     address = generate_uid()
     mnemonic = generate_mnemonic_phrase(15)
 
-    # Generate Dilithium keys
-    public_key_bytes, secret_key_bytes = Dilithium.keygen()
+    # Take pre-generated Dilithium and Kyber keys, generating them off the event loop if the pool is empty
+    key_pool = get_key_pool()
+    (public_key_bytes, secret_key_bytes), (kyber_pub, kyber_priv) = await asyncio.gather(
+        key_pool.get("dilithium"),
+        key_pool.get("kyber"),
+    )
     dilithium_pub_b64 = base64.b64encode(public_key_bytes).decode("utf-8")
     dilithium_priv_b64 = base64.b64encode(secret_key_bytes).decode("utf-8")
-
-    # Generate Kyber keys
-    kyber_pub, kyber_priv = generate_kyber_keys()
     kyber_pub_b64 = base64.b64encode(kyber_pub).decode("utf-8")
     kyber_priv_b64 = base64.b64encode(kyber_priv).decode("utf-8")
 
     # Store in DB
-    add_user(
-        address=address,
-        dilithium_pub=dilithium_pub_b64,
-        dilithium_priv=dilithium_priv_b64,
-        kyber_pub=kyber_pub_b64,
-        kyber_priv=kyber_priv_b64,
-        mnemonic=mnemonic
+    await executor.run_io(
+        "add_user",
+        add_user,
+        address,
+        dilithium_pub_b64,
+        dilithium_priv_b64,
+        kyber_pub_b64,
+        kyber_priv_b64,
+        mnemonic,
     )
 
     # Sign registration transaction
     message_to_sign = f"REGISTER:{address}"
-    signature_bytes = sign_message(secret_key_bytes, message_to_sign)
+    signature_bytes = await get_signing_service().sign(secret_key_bytes, message_to_sign)
     signature_b64 = base64.b64encode(signature_bytes).decode("utf-8")
 
     timestamp = datetime.now(timezone.utc).isoformat()
-    with sqlite3.connect(DATABASE) as db:
-        c = db.cursor()
-        c.execute("""
-            INSERT INTO messages (
-                sender, 
-                receiver, 
-                   content, 
-                   timestamp, 
-                   signature, 
-                   ciphertext
-               ) VALUES (?, ?, ?, ?, ?, ?)
-        """, (
-            "SYSTEM",
-            "public",
-            message_to_sign,
-            timestamp,
-            signature_b64,
-            ""
-        ))
-        db.commit()
+    await executor.run_io("add_message", add_message, "SYSTEM", "public", message_to_sign, timestamp, signature_b64, "")
 
     # Create and add to mempool
     tx = create_transaction(
@@ -98,8 +82,8 @@ async def register_user(user: UserRegisterRequest):
             "signature": signature_b64
         }
     )
-    if not bc.add_transaction(tx):
-        raise HTTPException(status_code=400, detail="Too many transactions in pool")
+    if not await get_state().add_transaction(tx):
+        raise HTTPException(status_code=400, detail="Transaction rejected: invalid, duplicate or mempool full")
 
     return {
         "status": "success",
@@ -111,7 +95,7 @@ async def register_user(user: UserRegisterRequest):
 
 @router.post("/whoami/{address}", description="Used for retriving a user from blockchain", tags=["Accounts"], summary="Check an existing address")
 async def whoami(address: str):
-    result = get_user_by_address(address)
+    result = await get_executor().run_io("get_user", get_user_by_address, address)
     if not result:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -126,8 +110,7 @@ async def whoami(address: str):
 async def recover_account(mnemonic: str):
     try:
         # Re-derive keys from mnemonic
-        d_pub, d_priv = derive_dilithium_keypair(mnemonic)
-        k_pub, k_priv = derive_kyber_keypair(mnemonic)
+        (d_pub, d_priv), (k_pub, k_priv) = await derive_identity(mnemonic)
 
         # Return base64-encoded versions
         return {
@@ -135,5 +118,7 @@ async def recover_account(mnemonic: str):
             "dilithium_pub": base64.b64encode(d_pub).decode(),
             "kyber_pub": base64.b64encode(k_pub).decode()
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid mnemonic: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Recovery failed: {str(e)}")
\ No newline at end of file
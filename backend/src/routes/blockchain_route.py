@@ -5,13 +5,13 @@ Author: LunaLynx12
 """
 
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from blockchain import get_blockchain
-import json
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Response
 from local_database import get_all_messages_from_db
+from executor import get_executor
+from state_client import get_state
+import json
 
 router = APIRouter()
-bc = get_blockchain()
 
 @router.post("/chain", tags=["Blockchain"])
 async def get_chain():
@@ -20,16 +20,18 @@ async def get_chain():
 
     @return: JSON object containing the full chain.
     """
-    return {"chain": [block.model_dump() for block in bc.chain]}
+    return Response(content=await get_state().chain_json(), media_type="application/json")
 
 @router.websocket("/ws/chain")
 async def websocket_chain(websocket: WebSocket):
     await websocket.accept()
-    
+    state = get_state()
+
     try:
         # Load initial data from both blockchain and database
-        chain_data = [block.model_dump() for block in bc.chain]
-        messages_data = [msg.model_dump() for msg in get_all_messages_from_db()]
+        chain_data = json.loads(await state.chain_json())["chain"]
+        messages = await get_executor().run_io("get_messages", get_all_messages_from_db)
+        messages_data = [msg.model_dump() for msg in messages]
 
         # Send combined data
         initial_data = {
@@ -43,7 +45,7 @@ async def websocket_chain(websocket: WebSocket):
         await websocket.send_text(json.dumps(initial_data))
 
         # Register subscriber
-        bc.add_subscriber(websocket)
+        state.subscribe(websocket)
         
         # Keep connection open
         while True:
@@ -54,7 +56,7 @@ async def websocket_chain(websocket: WebSocket):
                 break
 
         # Unregister on disconnect
-        bc.remove_subscriber(websocket)
+        state.unsubscribe(websocket)
     except WebSocketDisconnect:
-        bc.remove_subscriber(websocket)
+        state.unsubscribe(websocket)
         print("[WebSocket] Client disconnected")
\ No newline at end of file
@@ -5,34 +5,38 @@ Author: LunaLynx12
 """
 
 
-from local_database import get_user_by_address, DATABASE
-from dilithium import sign_message, hash_message
-from fastapi import APIRouter, HTTPException
+from local_database import get_user_by_address, add_message, add_group_message, get_kyber_public_keys
+from signing_service import get_signing_service
+from dilithium import hash_message
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from blockchain import create_transaction
 from datetime import datetime, timezone
-from blockchain import get_blockchain
+from sessions import get_session_manager
+from executor import get_executor
+from state_client import get_state
+from encryption import aes_encrypt, wrap_key, StreamEncryptor
+from Crypto.Random import get_random_bytes
+from models import Message, GroupMessage
+from typing import List, Optional, Tuple
+from config import GROUP_MAX_RECIPIENTS, ATTACHMENT_MAX_SIZE
+from blob_store import get_blob_store, BLOB_HASH_PATTERN
 from kyber import generate_shared_key
-from encryption import aes_encrypt
-from typing import Optional
-from models import Message
-import sqlite3
+import hashlib
+import asyncio
 import base64
+import json
 
 
 router = APIRouter()
-bc = get_blockchain()
-
-def get_dilithium_secret_key(sender_address: str) -> bytes:
-    result = get_user_by_address(sender_address)
-    if not result:
-        raise HTTPException(status_code=404, detail="User not found")
-    dilithium_priv_b64 = result.get("dilithium_priv")
-    if not dilithium_priv_b64:
-        raise HTTPException(status_code=500, detail="Private key missing from DB")
-    try:
-        return base64.b64decode(dilithium_priv_b64)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to decode private key: {str(e)}")
+
+def wrap_for_recipients(kyber_pubs: List[bytes], content_key: bytes) -> List[Tuple[bytes, bytes]]:
+    """Encapsulates to each recipient and wraps the content key under the shared secret; runs in the process pool."""
+    wraps = []
+    for kyber_pub in kyber_pubs:
+        shared_key, kem_ciphertext = generate_shared_key(kyber_pub)
+        wraps.append((kem_ciphertext, wrap_key(shared_key, content_key)))
+    return wraps
 
 @router.post("/send", response_model=Message, tags=["Message"])
 async def send_message(msg: Message):
@@ -40,82 +44,71 @@ async def send_message(msg: Message):
     Sends a message to another user.
 
     If receiver is 'public', message goes into blockchain.
-    If private, message is encrypted using Kyber + AES-GCM.
+    If private, message is encrypted with AES-GCM under a key derived from the
+    pair's Kyber session; messages carry the KEM ciphertext until one of them is
+    confirmed in a block, so the receiver can still derive the key if earlier ones are lost.
+    The ciphertext goes to the blob store; the transaction carries its hash and size.
     All messages are signed using Dilithium.
 
     @param msg: Message object containing sender, receiver, content, timestamp
     @return: The same message after processing
     """
+    executor = get_executor()
+    blob_hash: Optional[str] = None
+    accepted = False
     try:
-        # Step 1: Get sender keys
-        secret_key = get_dilithium_secret_key(msg.sender)
-        sender_data = get_user_by_address(msg.sender)
-        if not sender_data:
-            raise HTTPException(status_code=404, detail="Sender not found")
-        dilithium_pub_b64 = sender_data.get("dilithium_pub")
-        if not dilithium_pub_b64:
-            raise HTTPException(status_code=500, detail="Public key missing from DB")
-
-        # Step 2: Sign message_hash instead of raw content
+        signing = get_signing_service()
+
+        # Step 1: Get sender keys (cached across a burst from the same sender)
+        secret_key, _ = await signing.signer_keys(msg.sender)
+
+        # Step 2: Sign message_hash instead of raw content, batched with concurrent requests
         msg_hash = hash_message(msg.content)
-        signature_bytes = sign_message(secret_key, msg_hash)
+        signature_bytes = await signing.sign(secret_key, msg_hash)
         signature_b64 = base64.b64encode(signature_bytes).decode("utf-8")
 
         # Step 3: Handle encryption for private messages
         encrypted_content: Optional[str] = None
         ciphertext_b64: Optional[str] = None
+        blob_size = 0
+        session_id = ""
+        counter = 0
 
         if msg.receiver != "public":
-            recipient_data = get_user_by_address(msg.receiver)
+            recipient_data = await executor.run_io("get_user", get_user_by_address, msg.receiver)
             if not recipient_data:
                 raise HTTPException(status_code=404, detail="Recipient not found")
             kyber_pub_b64 = recipient_data.get("kyber_pub")
             if not kyber_pub_b64:
                 raise HTTPException(status_code=400, detail="Recipient has no Kyber public key")
             kyber_pub_bytes = base64.b64decode(kyber_pub_b64)
-            shared_key, ciphertext_data = generate_shared_key(kyber_pub_bytes)
-            encrypted_payload = aes_encrypt(shared_key, msg.content)
-            encrypted_content = base64.b64encode(encrypted_payload).decode("utf-8")
-            ciphertext_b64 = base64.b64encode(ciphertext_data).decode("utf-8")
+            session, counter, message_key = await get_session_manager().message_key(msg.sender, msg.receiver, kyber_pub_bytes)
+            session_id = session.session_id
+            encrypted_payload = aes_encrypt(message_key, msg.content)
+            blob_hash = await executor.run_io("blob_put", get_blob_store().put, encrypted_payload)
+            blob_size = len(encrypted_payload)
+            encrypted_content = f"blob:{blob_hash}"
+            if not session.kem_confirmed:
+                ciphertext_b64 = base64.b64encode(session.kem_ciphertext).decode("utf-8")
         else:
             encrypted_content = msg.content  # Public message doesn't need encryption
 
-        # Step 4: Save message to database
-        timestamp = datetime.now(timezone.utc).isoformat()
-        with sqlite3.connect(DATABASE) as db:
-            c = db.cursor()
-            c.execute("""
-                INSERT INTO messages (
-                    sender, 
-                    receiver, 
-                    content, 
-                    timestamp, 
-                    signature, 
-                    ciphertext
-                ) VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                msg.sender,
-                msg.receiver,
-                encrypted_content or "",
-                timestamp,
-                signature_b64,
-                ciphertext_b64 or ""
-            ))
-            db.commit()
-
-        # Step 5: Add to blockchain if public
+        # Step 4: Add to blockchain
         tx_data = {
             "message_hash": msg_hash,
             "signature": signature_b64,
-            "dilithium_pub": dilithium_pub_b64,
         }
 
         if msg.receiver == "public":
             tx_data["message"] = msg.content
 
         if msg.receiver != "public":
-            tx_data["ciphertext"] = encrypted_content
-            tx_data["kyber_ciphertext"] = ciphertext_b64
+            tx_data["blob"] = blob_hash
+            tx_data["size"] = str(blob_size)
+            tx_data["session_id"] = session_id
+            tx_data["counter"] = str(counter)
+            if ciphertext_b64:
+                tx_data["kyber_ciphertext"] = ciphertext_b64
 
         tx = create_transaction(
             tx_type="PRIVATE_MESSAGE" if msg.receiver != "public" else "PUBLIC_MESSAGE",
@@ -124,10 +117,229 @@ async def send_message(msg: Message):
             data=tx_data
         )
 
-        if not bc.add_transaction(tx):
-            raise HTTPException(status_code=400, detail="Mempool full — cannot add transaction now.")
+        if not await get_state().add_transaction(tx):
+            raise HTTPException(status_code=400, detail="Mempool rejected the transaction (invalid, duplicate or full).")
+        # From here on the blob is referenced by the transaction
+        accepted = True
+
+        # Step 5: Save message to database once the chain accepted it
+        timestamp = datetime.now(timezone.utc).isoformat()
+        await executor.run_io(
+            "add_message",
+            add_message,
+            msg.sender,
+            msg.receiver,
+            encrypted_content or "",
+            timestamp,
+            signature_b64,
+            ciphertext_b64 or "",
+            session_id,
+            counter,
+        )
 
     except Exception as e:
+        if blob_hash and not accepted:
+            await executor.run_io("blob_release", get_blob_store().release, blob_hash)
+        if isinstance(e, HTTPException):
+            raise
         raise HTTPException(status_code=500, detail=f"Message failed: {str(e)}")
 
-    return msg
\ No newline at end of file
+    return msg
+
+@router.post("/send/group", response_model=GroupMessage, tags=["Message"])
+async def send_group_message(msg: GroupMessage):
+    """
+    Sends one private message to several users.
+
+    The content is encrypted once with AES-GCM under a random content key,
+    and that key is wrapped for every recipient under a fresh Kyber
+    encapsulation to their public key. The ciphertext is stored once in the
+    blob store; the transaction carries its hash and size alongside the list of wraps. The message is signed using Dilithium.
+
+    @param msg: GroupMessage object containing sender, receivers and content
+    @return: The message with id, timestamp and signature filled in
+    """
+    executor = get_executor()
+    blob_hash: Optional[str] = None
+    accepted = False
+    try:
+        signing = get_signing_service()
+
+        receivers = list(dict.fromkeys(msg.receivers))
+        if "public" in receivers or msg.sender in receivers:
+            raise HTTPException(status_code=400, detail="Receivers must be other users")
+        if len(receivers) > GROUP_MAX_RECIPIENTS:
+            raise HTTPException(status_code=400, detail=f"At most {GROUP_MAX_RECIPIENTS} receivers per group message")
+
+        # Step 1: Resolve every recipient's Kyber key in one query
+        kyber_pubs = await executor.run_io("get_kyber_keys", get_kyber_public_keys, receivers)
+        missing = [receiver for receiver in receivers if receiver not in kyber_pubs]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Recipients not found or without Kyber key: {', '.join(missing)}")
+
+        # Step 2: Sign the message hash, batched with concurrent requests
+        secret_key, _ = await signing.signer_keys(msg.sender)
+        msg_hash = hash_message(msg.content)
+        signature_b64 = base64.b64encode(await signing.sign(secret_key, msg_hash)).decode("utf-8")
+
+        # Step 3: Encrypt once, then wrap the content key per recipient across the CPU workers
+        content_key = get_random_bytes(32)
+        encrypted_payload = aes_encrypt(content_key, msg.content)
+        pubs = [base64.b64decode(kyber_pubs[receiver]) for receiver in receivers]
+        share = -(-len(pubs) // executor.cpu_workers)
+        chunks = await asyncio.gather(*(
+            executor.run_cpu("kyber_wrap", wrap_for_recipients, pubs[start:start + share], content_key)
+            for start in range(0, len(pubs), share)
+        ))
+        wraps = {
+            receiver: (base64.b64encode(kem_ciphertext).decode("utf-8"), base64.b64encode(wrapped).decode("utf-8"))
+            for receiver, (kem_ciphertext, wrapped) in zip(receivers, (wrap for chunk in chunks for wrap in chunk))
+        }
+
+        # Step 4: Save the ciphertext once and add it to the blockchain with its wraps
+        blob_hash = await executor.run_io("blob_put", get_blob_store().put, encrypted_payload)
+        tx = create_transaction(
+            tx_type="GROUP_MESSAGE",
+            sender=msg.sender,
+            receiver="group",
+            data={
+                "message_hash": msg_hash,
+                "signature": signature_b64,
+                "blob": blob_hash,
+                "size": str(len(encrypted_payload)),
+                "wraps": json.dumps(
+                    {receiver: {"kyber_ciphertext": kem, "wrapped_key": wrapped} for receiver, (kem, wrapped) in wraps.items()},
+                    separators=(",", ":"),
+                ),
+            },
+        )
+
+        if not await get_state().add_transaction(tx):
+            raise HTTPException(status_code=400, detail="Mempool rejected the transaction (invalid, duplicate or full).")
+        # From here on the blob is referenced by the transaction
+        accepted = True
+
+        # Step 5: Save the message with its wraps once the chain accepted it
+        timestamp = datetime.now(timezone.utc).isoformat()
+        message_id = await executor.run_io(
+            "add_group_message", add_group_message, msg.sender, f"blob:{blob_hash}", timestamp, signature_b64, wraps
+        )
+
+    except Exception as e:
+        if blob_hash and not accepted:
+            await executor.run_io("blob_release", get_blob_store().release, blob_hash)
+        if isinstance(e, HTTPException):
+            raise
+        raise HTTPException(status_code=500, detail=f"Group message failed: {str(e)}")
+
+    return msg.model_copy(update={"id": message_id, "receivers": receivers, "timestamp": timestamp, "signature": signature_b64})
+
+
+
+@router.post("/send/attachment", response_model=Message, tags=["Message"])
+async def send_attachment(sender: str, receiver: str, request: Request):
+    """
+    Sends a file to another user, streamed as the raw request body.
+
+    The body is encrypted chunk by chunk with the streaming AES-GCM format
+    under a key of the pair's Kyber session and written to the blob store as
+    it arrives, so memory use does not grow with the file size. The chain
+    carries the blob hash, its size and the signed hash of the plaintext.
+
+    @param sender: Sender address
+    @param receiver: Recipient address
+    @param request: Request whose body is the file
+    @return: The stored message, its content pointing at the blob
+    """
+    executor = get_executor()
+    writer = None
+    blob_hash = None
+    accepted = False
+    try:
+        # Step 1: Resolve the recipient and the key before reading the body
+        recipient_data = await executor.run_io("get_user", get_user_by_address, receiver)
+        if not recipient_data or not recipient_data.get("kyber_pub"):
+            raise HTTPException(status_code=404, detail="Recipient not found")
+        secret_key, _ = await get_signing_service().signer_keys(sender)
+        session, counter, message_key = await get_session_manager().message_key(
+            sender, receiver, base64.b64decode(recipient_data["kyber_pub"])
+        )
+
+        # Step 2: Encrypt the body into the blob store as it streams in
+        writer = get_blob_store().writer()
+        encryptor = StreamEncryptor(message_key)
+        digest = hashlib.sha256()
+        async for piece in request.stream():
+            if encryptor.size + len(piece) > ATTACHMENT_MAX_SIZE:
+                raise HTTPException(status_code=413, detail=f"Attachment exceeds {ATTACHMENT_MAX_SIZE} bytes")
+            digest.update(piece)
+            out = encryptor.update(piece)
+            if out:
+                await executor.run_io("blob_write", writer.write, out)
+        await executor.run_io("blob_write", writer.write, encryptor.finalize())
+        blob_hash = await executor.run_io("blob_close", writer.close)
+
+        # Step 3: Sign the plaintext hash and add the message to the blockchain
+        msg_hash = digest.hexdigest()
+        signature_b64 = base64.b64encode(await get_signing_service().sign(secret_key, msg_hash)).decode("utf-8")
+        ciphertext_b64 = "" if session.kem_confirmed else base64.b64encode(session.kem_ciphertext).decode("utf-8")
+        tx_data = {
+            "message_hash": msg_hash,
+            "signature": signature_b64,
+            "blob": blob_hash,
+            "size": str(writer.size),
+            "session_id": session.session_id,
+            "counter": str(counter),
+        }
+        if ciphertext_b64:
+            tx_data["kyber_ciphertext"] = ciphertext_b64
+        tx = create_transaction(tx_type="PRIVATE_MESSAGE", sender=sender, receiver=receiver, data=tx_data)
+        if not await get_state().add_transaction(tx):
+            raise HTTPException(status_code=400, detail="Mempool rejected the transaction (invalid, duplicate or full).")
+        # From here on the blob is referenced by the transaction
+        accepted = True
+
+        # Step 4: Record the message once the chain accepted it
+        content = f"blob:{blob_hash}"
+        timestamp = datetime.now(timezone.utc).isoformat()
+        await executor.run_io(
+            "add_message", add_message, sender, receiver, content, timestamp, signature_b64, ciphertext_b64,
+            session.session_id, counter,
+        )
+
+    except Exception as e:
+        if blob_hash is not None and not accepted:
+            await executor.run_io("blob_release", get_blob_store().release, blob_hash)
+        elif blob_hash is None and writer is not None:
+            await executor.run_io("blob_abort", writer.abort)
+        if isinstance(e, HTTPException):
+            raise
+        raise HTTPException(status_code=500, detail=f"Attachment failed: {str(e)}")
+
+    return Message(
+        sender=sender, receiver=receiver, content=content, timestamp=timestamp, signature=signature_b64,
+        ciphertext=ciphertext_b64, session_id=session.session_id, counter=counter,
+    )
+
+@router.get("/blobs/{blob_hash}", tags=["Message"])
+async def get_blob(blob_hash: str):
+    """
+    Streams a message payload, fetching it from peers if this node does not hold it.
+
+    Only blobs carried by a transaction of the chain or the mempool are served.
+
+    @param blob_hash: SHA-256 of the blob, as carried by the message transaction
+    @return: The blob content
+    """
+    if not BLOB_HASH_PATTERN.fullmatch(blob_hash):
+        raise HTTPException(status_code=404, detail="Blob not found")
+    if not await get_state().fetch_blob(blob_hash):
+        raise HTTPException(status_code=404, detail="Blob not found")
+    store = get_blob_store()
+    size = await get_executor().run_io("blob_size", store.size, blob_hash)
+    if size is None:
+        raise HTTPException(status_code=404, detail="Blob not found")
+
+    return StreamingResponse(
+        store.iter_chunks(blob_hash), media_type="application/octet-stream", headers={"Content-Length": str(size)}
+    )
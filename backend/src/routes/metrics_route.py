@@ -0,0 +1,50 @@
+"""
+Route for inspecting how blocking work and crypto are executed
+
+Author: LunaLynx12
+"""
+
+
+from fastapi import APIRouter
+from executor import get_executor
+from key_pool import get_key_pool
+from signing_service import get_signing_service
+from pqc_backend import describe_backend
+from state_client import get_state
+
+router = APIRouter()
+
+@router.get("/metrics/executor", description="Pool occupancy and per-operation timings", tags=["Metrics"], summary="Executor metrics")
+async def executor_metrics():
+    """
+    Reports queue depths and latency percentiles of the crypto and I/O pools,
+    for this API process and for the process owning the chain state.
+    """
+    return {
+        "api": get_executor().stats(),
+        "state": await get_state().executor_stats(),
+    }
+
+@router.get("/metrics/keypool", description="Fill level and refill rate of the pre-generated key pool", tags=["Metrics"], summary="Key pool metrics")
+async def key_pool_metrics():
+    """
+    Reports how many keypairs are buffered per algorithm in this API process,
+    how many registrations were served from the buffer and how fast it refills.
+    """
+    return get_key_pool().stats()
+
+@router.get("/metrics/crypto", description="Active post-quantum crypto backend", tags=["Metrics"], summary="Crypto backend")
+async def crypto_backend():
+    """
+    Reports which backend (native liboqs or pure Python) this API process
+    signs and encapsulates with, and why any other backend was skipped.
+    """
+    return describe_backend()
+
+@router.get("/metrics/signing", description="Batch sizes and key cache of the signing service", tags=["Metrics"], summary="Signing service metrics")
+async def signing_metrics():
+    """
+    Reports how many sign requests are queued in this API process, how large
+    the batches sent to the CPU pool are and how often signer keys came from the cache.
+    """
+    return get_signing_service().stats()
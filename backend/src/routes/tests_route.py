@@ -5,10 +5,10 @@ Author: LunaLynx12
 """
 
 
-from dilithium_py.dilithium import Dilithium2 as Dilithium
 from encryption import aes_encrypt, aes_decrypt
 from fastapi import APIRouter, HTTPException
 from kyber import generate_kyber_keys
+from dilithium import generate_dilithium_keys
 from config import TEST_KEY
 import base64
 
@@ -38,7 +38,7 @@ async def generate_keys():
     """
     Generates a new Dilithium keypair and returns them in Base64 format.
     """
-    public_key, secret_key = Dilithium.keygen()
+    public_key, secret_key = generate_dilithium_keys()
     
     return {
         "dilithium_pub": base64.b64encode(public_key).decode("utf-8"),
@@ -1,34 +1,85 @@
 """
-Route for checking the current pool and validating it using PoA
+Route for checking the current pool and validating it using PoA,
+and for managing the validator set at runtime.
 
 Author: LunaLynx12
 """
 
 
-from fastapi import APIRouter, HTTPException
-from blockchain import get_blockchain
+from fastapi import APIRouter, Depends, Header, HTTPException
+from config import ADMIN_TOKEN_ENV
+from models import ValidatorAddRequest
+from state_client import get_state
+from typing import Optional
+import secrets
+import os
 
-bc = get_blockchain()
 router = APIRouter()
 
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    """
+    Rejects requests that do not carry the admin token in the X-Admin-Token header.
+
+    The routes using it are disabled (503) while ADMIN_TOKEN_ENV is unset.
+    """
+    token = os.environ.get(ADMIN_TOKEN_ENV)
+    if not token:
+        raise HTTPException(status_code=503, detail=f"Validator management is disabled, set {ADMIN_TOKEN_ENV} to enable it")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token.encode(), token.encode()):
+        raise HTTPException(status_code=401, detail="Invalid or missing admin token")
+
 @router.get("/validate", description="Used for PoA validation", tags=["Validation"], summary="Validate the mempool")
 async def validate_block(validator: str):
     """
     Allows a validator to propose and commit a new block from pending transactions.
+
+    Only the scheduled leader of the current slot may do so (409 otherwise).
     """
-    new_block = bc.mine_block(validator)
+    return await get_state().mine_block(validator)
 
-    if new_block is None:
-        raise HTTPException(status_code=403, detail="Validator not authorized or no pending transactions")
+@router.get("/schedule", description="Shows the leader schedule for the next block", tags=["Validation"], summary="Leader schedule")
+async def leader_schedule(slots: int = 5):
+    """
+    Lists who may produce the next block in the current slot and the following ones.
 
-    return {
-        "status": "success",
-        "block": new_block.model_dump()
-    }
+    Each slot lasts LEADER_TIMEOUT seconds from the previous block; when the
+    leader of a slot stays silent, the leader of the next one takes over.
+    """
+    return await get_state().schedule(slots)
 
 @router.get("/mempool", description="Used for checking the mempool", tags=["Validation"], summary="Check the mempool")
 async def get_pending_transactions():
-    return {
-        "pending_count": len(bc.pending_transactions),
-        "pending": [dict(t) for t in bc.pending_transactions]
-    }
\ No newline at end of file
+    return await get_state().mempool()
+
+@router.get("/validators", description="Lists the validator set", tags=["Validation"], summary="List validators")
+async def list_validators():
+    """
+    Returns every known validator with its key and the block heights it may sign.
+    """
+    return await get_state().validators()
+
+@router.post("/validators", description="Adds a validator to the active set", tags=["Validation"], summary="Add a validator", dependencies=[Depends(require_admin)])
+async def add_validator(request: ValidatorAddRequest):
+    """
+    Authorizes a validator from the next block on, without a restart.
+
+    Without a public key the validator keeps the key already known for it; a node
+    started with --dev-validator-keys generates and keeps a key pair instead.
+    """
+    return await get_state().add_validator(request.address, request.public_key)
+
+@router.delete("/validators/{address}", description="Removes a validator from the active set", tags=["Validation"], summary="Remove a validator", dependencies=[Depends(require_admin)])
+async def remove_validator(address: str):
+    """
+    Revokes a validator from the next block on, without a restart.
+
+    Blocks it signed before stay valid.
+    """
+    return await get_state().remove_validator(address)
+
+@router.post("/validators/reload", description="Reloads the validator set from the database", tags=["Validation"], summary="Reload validators", dependencies=[Depends(require_admin)])
+async def reload_validators():
+    """
+    Picks up changes made directly in the validator_keys table.
+    """
+    return await get_state().reload_validators()
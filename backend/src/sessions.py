@@ -0,0 +1,227 @@
+"""
+Kyber Sessions for Private Messages
+
+Instead of one ML-KEM encapsulation per private message, a sender-recipient
+pair shares a session: one encapsulation to the recipient's Kyber key yields
+a shared secret, and the AES key of every message is derived from it with a
+counter-mode KDF (NIST SP 800-108, HMAC-SHA256) over the session id and the
+message number. Messages carry the KEM ciphertext until one of them is
+confirmed in a block, so losing the first message of a session does not make
+the rest undecryptable. A pair is rekeyed after SESSION_MAX_MESSAGES messages
+or SESSION_MAX_AGE seconds.
+
+Author: LunaLynx12
+"""
+
+
+from local_database import add_session, get_latest_session, next_session_counter
+from config import SESSION_MAX_MESSAGES, SESSION_MAX_AGE, SESSION_CACHE_SIZE
+from executor import TaskExecutor, get_executor
+from typing import Dict, List, Optional, Tuple
+from kyber import generate_shared_key
+from collections import OrderedDict
+import asyncio
+import hashlib
+import base64
+import hmac
+import time
+import uuid
+
+
+MESSAGE_KEY_LABEL = b"PQC-Hub message key"
+
+
+def derive_message_key(shared_secret: bytes, session_id: str, counter: int) -> bytes:
+    """
+    Derives the AES-256 key of one message of a session.
+
+    KDF in counter mode with HMAC-SHA256 as PRF: a single 256-bit block
+    K(1) = HMAC(secret, [1]_32 || label || 0x00 || context || [256]_32),
+    where the context binds the session id and the message number.
+
+    param shared_secret: Session shared secret
+    type shared_secret: bytes
+    param session_id: Session identifier
+    type session_id: str
+    param counter: Message number within the session, from 1
+    type counter: int
+    return: 32-byte message key
+    """
+    context = session_id.encode() + counter.to_bytes(8, 'big')
+    block = (1).to_bytes(4, 'big') + MESSAGE_KEY_LABEL + b"\x00" + context + (256).to_bytes(4, 'big')
+    return hmac.new(shared_secret, block, hashlib.sha256).digest()
+
+
+class Session:
+    """
+    Shared secret of a sender-recipient pair.
+
+    Attributes:
+        session_id (str): Identifier carried by every message of the session
+        shared_secret (bytes): Secret the message keys are derived from
+        kem_ciphertext (bytes): Kyber ciphertext the recipient decapsulates to obtain it
+        created_at (float): Unix time of establishment
+        kem_confirmed (bool): True once a block carries a message with the KEM ciphertext
+    """
+    __slots__ = ("session_id", "shared_secret", "kem_ciphertext", "created_at", "kem_confirmed")
+
+    def __init__(self, session_id: str, shared_secret: bytes, kem_ciphertext: bytes, created_at: float, kem_confirmed: bool = False):
+        self.session_id = session_id
+        self.shared_secret = shared_secret
+        self.kem_ciphertext = kem_ciphertext
+        self.created_at = created_at
+        self.kem_confirmed = kem_confirmed
+
+    @classmethod
+    def from_row(cls, row: dict) -> "Session":
+        return cls(
+            row["session_id"],
+            base64.b64decode(row["shared_secret"]),
+            base64.b64decode(row["kem_ciphertext"]),
+            row["created_at"],
+            bool(row.get("kem_confirmed")),
+        )
+
+
+class SessionManager:
+    """
+    Hands out per-message keys, establishing and rekeying sessions as needed.
+
+    Features:
+        - Sessions cached per pair, least recently used first out; the database
+          is consulted on a cache miss, so sessions survive restarts and are
+          shared by API workers
+        - Message numbers allocated atomically in SQLite
+        - Concurrent first messages of a pair share one encapsulation
+        - Rekeying by message count and by age
+        - Establishment locks exist only while a pair is being established
+    """
+    def __init__(
+        self,
+        executor: Optional[TaskExecutor] = None,
+        max_messages: int = SESSION_MAX_MESSAGES,
+        max_age: float = SESSION_MAX_AGE,
+        cache_size: int = SESSION_CACHE_SIZE,
+    ):
+        """
+        Initializes the manager.
+
+        param executor: Executor for the encapsulation and the sqlite calls, defaults to the process executor
+        type executor: Optional[TaskExecutor]
+        param max_messages: Messages per session before rekeying
+        type max_messages: int
+        param max_age: Seconds before a session is rekeyed
+        type max_age: float
+        param cache_size: Most sessions kept in memory
+        type cache_size: int
+        """
+        self.executor = executor or get_executor()
+        self.max_messages = max_messages
+        self.max_age = max_age
+        self.cache_size = cache_size
+        self._sessions: "OrderedDict[Tuple[str, str], Session]" = OrderedDict()
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+
+    async def message_key(self, sender: str, receiver: str, kyber_pub: bytes) -> Tuple[Session, int, bytes]:
+        """
+        Returns the session, message number and AES key for the next message of a pair.
+
+        param sender: Sender address
+        type sender: str
+        param receiver: Recipient address
+        type receiver: str
+        param kyber_pub: Recipient's Kyber public key, used if a session has to be established
+        type kyber_pub: bytes
+        return: (session, counter, message_key); the message must carry the KEM ciphertext unless session.kem_confirmed
+        """
+        session = await self._current(sender, receiver, kyber_pub)
+        counter, confirmed = await self.executor.run_io("session_counter", next_session_counter, session.session_id)
+        if counter > self.max_messages:
+            session = await self._current(sender, receiver, kyber_pub, exhausted=session)
+            counter, confirmed = await self.executor.run_io("session_counter", next_session_counter, session.session_id)
+        session.kem_confirmed = session.kem_confirmed or confirmed
+        return session, counter, derive_message_key(session.shared_secret, session.session_id, counter)
+
+    async def _current(self, sender: str, receiver: str, kyber_pub: bytes, exhausted: Optional[Session] = None) -> Session:
+        """Returns the pair's usable session, establishing one if it has none, it is too old or it is exhausted."""
+        pair = (sender, receiver)
+        session = self._sessions.get(pair)
+        if session is not None and session is not exhausted and not self._expired(session):
+            self._sessions.move_to_end(pair)
+            return session
+
+        lock = self._locks.setdefault(pair, asyncio.Lock())
+        try:
+            async with lock:
+                # Another request may have established a session while this one waited
+                session = self._sessions.get(pair)
+                if session is None:
+                    row = await self.executor.run_io("get_session", get_latest_session, sender, receiver)
+                    session = Session.from_row(row) if row else None
+                    if session is not None and row["message_count"] >= self.max_messages:
+                        exhausted = session
+                if session is None or session is exhausted or self._expired(session):
+                    session = await self._establish(sender, receiver, kyber_pub)
+                self._remember(pair, session)
+                return session
+        finally:
+            # Requests already waiting keep their reference; later ones find the session cached
+            if not lock.locked() and self._locks.get(pair) is lock:
+                del self._locks[pair]
+
+    def _remember(self, pair: Tuple[str, str], session: Session):
+        self._sessions[pair] = session
+        self._sessions.move_to_end(pair)
+        while len(self._sessions) > self.cache_size:
+            self._sessions.popitem(last=False)
+
+    def _expired(self, session: Session) -> bool:
+        return time.time() - session.created_at >= self.max_age
+
+    async def _establish(self, sender: str, receiver: str, kyber_pub: bytes) -> Session:
+        shared_secret, kem_ciphertext = await self.executor.run_cpu("kyber_encaps", generate_shared_key, kyber_pub)
+        session = Session(uuid.uuid4().hex, shared_secret, kem_ciphertext, time.time())
+        await self.executor.run_io(
+            "add_session",
+            add_session,
+            session.session_id,
+            sender,
+            receiver,
+            base64.b64encode(kem_ciphertext).decode(),
+            base64.b64encode(shared_secret).decode(),
+            session.created_at,
+        )
+        return session
+
+
+def introduced_sessions(block) -> List[str]:
+    """
+    Lists the sessions whose KEM ciphertext a block carries.
+
+    param block: Block appended to the chain
+    type block: Block
+    return: Session identifiers
+    """
+    return [
+        tx.data["session_id"]
+        for tx in block.transactions
+        if tx.tx_type == "PRIVATE_MESSAGE" and tx.data.get("kyber_ciphertext") and tx.data.get("session_id")
+    ]
+
+
+_session_manager: Optional[SessionManager] = None
+"""
+Session manager of this process, created on first use.
+"""
+
+def get_session_manager() -> SessionManager:
+    """
+    Returns the session manager of this process.
+
+    return: Shared SessionManager instance
+    rtype: SessionManager
+    """
+    global _session_manager
+    if _session_manager is None:
+        _session_manager = SessionManager()
+    return _session_manager
@@ -0,0 +1,277 @@
+"""
+Batched Signing Service
+
+Message submission signs with the sender's Dilithium key on every request.
+Instead of one process-pool round trip per signature, routes hand their sign
+requests to this service and await the result. A background task drains the
+queue in batches, groups each batch by key so a worker unpacks every key once,
+and spreads the groups over the CPU pool. Decoded signer keys are cached for a
+short time, so a burst from one address costs one database lookup.
+
+Author: LunaLynx12
+"""
+
+
+from config import SIGNING_BATCH_SIZE, SIGNING_QUEUE_SIZE, SIGNING_KEY_TTL, SIGNING_KEY_CACHE_SIZE
+from executor import TaskExecutor, get_executor
+from local_database import get_user_by_address
+from typing import Dict, List, Optional, Tuple
+from pqc_backend import get_backend
+from collections import OrderedDict
+from fastapi import HTTPException
+import asyncio
+import base64
+import math
+import time
+
+
+def sign_grouped(groups: List[Tuple[bytes, List[str]]]) -> List[List[bytes]]:
+    """
+    Signs messages grouped by secret key; runs in a worker process.
+
+    param groups: (secret_key, messages) pairs
+    type groups: List[Tuple[bytes, List[str]]]
+    return: Signatures per group, in message order
+    """
+    backend = get_backend()
+    return [backend.sign_batch(secret_key, [m.encode("utf-8") for m in messages]) for secret_key, messages in groups]
+
+
+class SigningService:
+    """
+    Queue of sign requests, drained in batches into the CPU pool.
+
+    Features:
+        - Short-TTL cache of decoded signer keys, with concurrent lookups of the
+          same address sharing one database query
+        - Bounded queue; a full queue answers 503 with Retry-After
+        - Batches formed from whatever is queued, so idle traffic is signed
+          without delay and bursts are signed in bulk
+        - Batches grouped by key and split across the pool's workers
+    """
+    def __init__(
+        self,
+        executor: Optional[TaskExecutor] = None,
+        batch_size: int = SIGNING_BATCH_SIZE,
+        queue_size: int = SIGNING_QUEUE_SIZE,
+        key_ttl: float = SIGNING_KEY_TTL,
+        key_cache_size: int = SIGNING_KEY_CACHE_SIZE,
+    ):
+        """
+        Initializes the service; the drain task starts with start() or the first sign request.
+
+        param executor: Executor whose CPU pool signs, defaults to the process executor
+        type executor: Optional[TaskExecutor]
+        param batch_size: Most requests signed per batch
+        type batch_size: int
+        param queue_size: Requests allowed to wait
+        type queue_size: int
+        param key_ttl: Seconds a cached key stays valid
+        type key_ttl: float
+        param key_cache_size: Most keys cached at once
+        type key_cache_size: int
+        """
+        self.executor = executor or get_executor()
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.key_ttl = key_ttl
+        self.key_cache_size = key_cache_size
+        self._keys: "OrderedDict[str, Tuple[float, bytes, str]]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.key_hits = 0
+        self.key_misses = 0
+        self.batches = 0
+        self.signed = 0
+        self.rejected = 0
+        self.largest_batch = 0
+
+    def start(self):
+        """Starts the drain task."""
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._task = asyncio.create_task(self._drain_loop())
+
+    async def stop(self):
+        """Stops draining and fails requests still queued or being signed."""
+        if self._task is not None:
+            # The drain loop fails the batch it was signing when it is cancelled
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        queued = []
+        while self._queue is not None and not self._queue.empty():
+            queued.append(self._queue.get_nowait())
+        self._fail_stopped(queued)
+
+    @staticmethod
+    def _fail_stopped(requests: list):
+        for _, _, future in requests:
+            if not future.done():
+                future.set_exception(HTTPException(status_code=503, detail="Signing service stopped"))
+
+    async def signer_keys(self, address: str) -> Tuple[bytes, str]:
+        """
+        Returns the decoded Dilithium secret key and the Base64 public key of a user.
+
+        param address: User address
+        type address: str
+        return: (secret_key, public_key_b64)
+        raises HTTPException: 404 if the user does not exist, 500 if their keys are missing or corrupt
+        """
+        entry = self._keys.get(address)
+        if entry is not None and entry[0] > time.monotonic():
+            self.key_hits += 1
+            self._keys.move_to_end(address)
+            return entry[1], entry[2]
+
+        self.key_misses += 1
+        loading = self._loading.get(address)
+        if loading is not None:
+            return await asyncio.shield(loading)
+
+        loading = self._loading[address] = asyncio.get_running_loop().create_future()
+        try:
+            keys = self._decode_keys(await self.executor.run_io("get_user", get_user_by_address, address))
+        except BaseException as e:
+            if isinstance(e, Exception):
+                loading.set_exception(e)
+                # Waiters re-raise it; mark it retrieved in case there were none
+                loading.exception()
+            else:
+                loading.cancel()
+            raise
+        finally:
+            del self._loading[address]
+        loading.set_result(keys)
+
+        self._keys[address] = (time.monotonic() + self.key_ttl, *keys)
+        self._keys.move_to_end(address)
+        while len(self._keys) > self.key_cache_size:
+            self._keys.popitem(last=False)
+        return keys
+
+    @staticmethod
+    def _decode_keys(user: Optional[dict]) -> Tuple[bytes, str]:
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        dilithium_priv_b64 = user.get("dilithium_priv")
+        if not dilithium_priv_b64:
+            raise HTTPException(status_code=500, detail="Private key missing from DB")
+        dilithium_pub_b64 = user.get("dilithium_pub")
+        if not dilithium_pub_b64:
+            raise HTTPException(status_code=500, detail="Public key missing from DB")
+        try:
+            return base64.b64decode(dilithium_priv_b64), dilithium_pub_b64
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to decode private key: {str(e)}")
+
+    async def sign(self, secret_key: bytes, message: str) -> bytes:
+        """
+        Queues a message for signing and waits for its signature.
+
+        param secret_key: Dilithium secret key
+        type secret_key: bytes
+        param message: Message to sign, encoded as UTF-8
+        type message: str
+        return: Raw signature
+        raises HTTPException: 503 if the queue is full
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((secret_key, message, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Server busy (signing queue full)", headers={"Retry-After": "1"})
+        return await future
+
+    async def _drain_loop(self):
+        """Takes everything queued, up to batch_size, and signs it as one batch."""
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            batch = [request for request in batch if not request[2].done()]
+            if not batch:
+                continue
+            self.batches += 1
+            self.largest_batch = max(self.largest_batch, len(batch))
+            try:
+                await asyncio.gather(*(self._sign_chunk(chunk) for chunk in self._partition(batch)))
+            except asyncio.CancelledError:
+                self._fail_stopped(batch)
+                raise
+
+    def _partition(self, batch: list) -> List[List[Tuple[bytes, list]]]:
+        """
+        Groups a batch by key and splits it into one chunk per CPU worker.
+
+        Groups larger than a fair share are cut into slices so a burst from a
+        single address still uses every worker.
+        """
+        groups: Dict[bytes, list] = {}
+        for secret_key, message, future in batch:
+            groups.setdefault(secret_key, []).append((message, future))
+
+        workers = max(1, min(self.executor.cpu_workers, len(batch)))
+        share = math.ceil(len(batch) / workers)
+        chunks: List[List[Tuple[bytes, list]]] = [[] for _ in range(workers)]
+        loads = [0] * workers
+        for secret_key, requests in groups.items():
+            for start in range(0, len(requests), share):
+                piece = requests[start:start + share]
+                target = loads.index(min(loads))
+                chunks[target].append((secret_key, piece))
+                loads[target] += len(piece)
+        return [chunk for chunk in chunks if chunk]
+
+    async def _sign_chunk(self, chunk: List[Tuple[bytes, list]]):
+        groups = [(secret_key, [message for message, _ in requests]) for secret_key, requests in chunk]
+        try:
+            signatures = await self.executor.run_cpu("dilithium_sign_batch", sign_grouped, groups)
+        except Exception as e:
+            for _, requests in chunk:
+                for _, future in requests:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        for (_, requests), group_signatures in zip(chunk, signatures):
+            for (_, future), signature in zip(requests, group_signatures):
+                if not future.done():
+                    future.set_result(signature)
+            self.signed += len(requests)
+
+    def stats(self) -> dict:
+        """Returns queue depth, batch sizes and key cache effectiveness."""
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "signed": self.signed,
+            "rejected": self.rejected,
+            "mean_batch": round(self.signed / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "key_cache": {"size": len(self._keys), "hits": self.key_hits, "misses": self.key_misses},
+        }
+
+
+_signing_service: Optional[SigningService] = None
+"""
+Signing service of this process, created on first use.
+"""
+
+def get_signing_service() -> SigningService:
+    """
+    Returns the signing service of this process.
+
+    return: Shared SigningService instance
+    rtype: SigningService
+    """
+    global _signing_service
+    if _signing_service is None:
+        _signing_service = SigningService()
+    return _signing_service
@@ -0,0 +1,211 @@
+"""
+Chain-State Client
+
+The API routes reach the chain state only through the object returned by
+get_state(). With one API process that is a LocalState calling the
+StateService directly; with several workers each one holds a StateClient
+talking to the chain-state process over its Unix socket.
+
+Author: LunaLynx12
+"""
+
+
+from state_protocol import StateOps, STATUS_OK, RAW_RESPONSES, encode_json, read_frame
+from blockchain import Transaction
+from fastapi import HTTPException, WebSocket
+from config import STATE_CLIENT_CONNECTIONS
+from typing import Any, List, Optional, Set
+import asyncio
+import json
+
+
+class StateClient:
+    """
+    Worker-side access to the chain state over a Unix socket.
+
+    Features:
+        - Typed methods for every state operation used by the routes
+        - A pool of idle connections, so concurrent requests do not queue on one socket
+        - Transactions are verified by the chain-state process, in its process
+          pool, against the registered keys only it holds
+        - One subscription per worker, fanned out to its WebSocket clients
+    """
+    def __init__(self, path: Optional[str], max_idle: int = STATE_CLIENT_CONNECTIONS):
+        """
+        Initializes the client; connections are opened on first use.
+
+        param path: Unix socket of the chain-state process
+        type path: Optional[str]
+        param max_idle: Number of idle connections kept open
+        type max_idle: int
+        """
+        self.path = path
+        self.max_idle = max_idle
+        self._idle: List[tuple] = []
+        self._subscribers: Set[WebSocket] = set()
+        self._updates: Optional[asyncio.Task] = None
+
+    async def _connect(self) -> tuple:
+        try:
+            return await asyncio.open_unix_connection(self.path)
+        except OSError as e:
+            raise HTTPException(status_code=503, detail=f"Chain state process unavailable: {e}")
+
+    async def request(self, op: int, **args) -> Any:
+        """
+        Sends one operation to the chain-state process and waits for its result.
+
+        param op: Operation code from StateOps
+        type op: int
+        return: Decoded JSON result, or raw bytes for RAW_RESPONSES
+        """
+        reader, writer = self._idle.pop() if self._idle else await self._connect()
+        try:
+            writer.write(encode_json(op, args))
+            await writer.drain()
+            status, body = await read_frame(reader)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+            writer.close()
+            raise HTTPException(status_code=503, detail=f"Chain state process unavailable: {e}")
+        if len(self._idle) < self.max_idle:
+            self._idle.append((reader, writer))
+        else:
+            writer.close()
+        if status != STATUS_OK:
+            error = json.loads(body)
+            raise HTTPException(status_code=error["status_code"], detail=error["detail"])
+        return body if op in RAW_RESPONSES else json.loads(body)
+
+    async def close(self):
+        """Closes every pooled connection and the update stream."""
+        if self._updates is not None:
+            self._updates.cancel()
+        while self._idle:
+            self._idle.pop()[1].close()
+
+    async def chain_json(self) -> bytes:
+        return await self.request(StateOps.CHAIN)
+
+    async def add_transaction(self, tx: Transaction) -> bool:
+        """Submits a transaction to the mempool; the chain-state process verifies it against the sender's registered key."""
+        result = await self.request(StateOps.ADD_TRANSACTION, tx=tx.model_dump())
+        return result["accepted"]
+
+    async def mine_block(self, validator: str) -> dict:
+        return await self.request(StateOps.MINE_BLOCK, validator=validator)
+
+    async def mempool(self) -> dict:
+        return await self.request(StateOps.MEMPOOL)
+
+    async def schedule(self, slots: int) -> dict:
+        return await self.request(StateOps.SCHEDULE, slots=slots)
+
+    async def validators(self) -> dict:
+        return await self.request(StateOps.VALIDATORS)
+
+    async def add_validator(self, address: str, public_key: Optional[str]) -> dict:
+        return await self.request(StateOps.ADD_VALIDATOR, address=address, public_key=public_key)
+
+    async def remove_validator(self, address: str) -> dict:
+        return await self.request(StateOps.REMOVE_VALIDATOR, address=address)
+
+    async def reload_validators(self) -> dict:
+        return await self.request(StateOps.RELOAD_VALIDATORS)
+
+    async def sync_peer(self, peer_url: str) -> dict:
+        return await self.request(StateOps.SYNC_PEER, peer_url=peer_url)
+
+    async def sync_all(self) -> dict:
+        return await self.request(StateOps.SYNC_ALL)
+
+    async def peers(self) -> dict:
+        return await self.request(StateOps.PEERS)
+
+    async def executor_stats(self) -> dict:
+        return await self.request(StateOps.EXECUTOR_STATS)
+
+    async def fetch_blob(self, blob_hash: str) -> bool:
+        result = await self.request(StateOps.FETCH_BLOB, blob_hash=blob_hash)
+        return result["found"]
+
+    def subscribe(self, websocket: WebSocket):
+        """Registers a WebSocket client for chain updates."""
+        self._subscribers.add(websocket)
+        if self._updates is None or self._updates.done():
+            self._updates = asyncio.create_task(self._forward_updates())
+
+    def unsubscribe(self, websocket: WebSocket):
+        self._subscribers.discard(websocket)
+
+    async def _forward_updates(self):
+        """Relays the chain-state process's update stream to this worker's WebSocket clients."""
+        reader, writer = await self._connect()
+        try:
+            writer.write(encode_json(StateOps.SUBSCRIBE, {}))
+            await writer.drain()
+            await read_frame(reader)
+            while self._subscribers:
+                _, body = await read_frame(reader)
+                text = body.decode('utf-8')
+                for websocket in list(self._subscribers):
+                    try:
+                        await websocket.send_text(text)
+                    except Exception:
+                        self._subscribers.discard(websocket)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+            print(f"[State] Update stream closed: {e}")
+        finally:
+            writer.close()
+
+
+class LocalState(StateClient):
+    """
+    In-process access to the chain state, used when a single API process owns it.
+
+    Operations call the StateService directly, without framing or a socket.
+    """
+    def __init__(self, service):
+        """
+        Initializes the local state access.
+
+        param service: Service of this process
+        type service: StateService
+        """
+        super().__init__(None)
+        self.service = service
+
+    async def request(self, op: int, **args) -> Any:
+        return await self.service.handlers[op](**args)
+
+    def subscribe(self, websocket: WebSocket):
+        self.service.blockchain.add_subscriber(websocket)
+
+    def unsubscribe(self, websocket: WebSocket):
+        self.service.blockchain.remove_subscriber(websocket)
+
+
+_state: Optional[StateClient] = None
+"""
+State access of this process, set during application startup.
+"""
+
+def set_state(state: StateClient):
+    """
+    Installs the state access used by the routes.
+
+    param state: LocalState or StateClient
+    type state: StateClient
+    """
+    global _state
+    _state = state
+
+def get_state() -> StateClient:
+    """
+    Returns the state access of this process.
+
+    return: State access installed at startup
+    rtype: StateClient
+    """
+    if _state is None:
+        raise HTTPException(status_code=503, detail="Chain state not initialized")
+    return _state
@@ -0,0 +1,69 @@
+"""
+Chain-State IPC Protocol
+
+Framing and operation codes spoken between the API worker processes and the
+chain-state process over a local Unix socket.
+
+Every frame is [LENGTH:4][CODE:1][BODY]: LENGTH counts CODE and BODY, CODE is
+the operation of a request or the status of a response, and BODY is compact
+JSON (or raw bytes for operations listed in RAW_RESPONSES).
+
+Author: LunaLynx12
+"""
+
+
+from typing import Tuple
+import asyncio
+import json
+
+
+class StateOps:
+    CHAIN = 0x01
+    ADD_TRANSACTION = 0x02
+    MINE_BLOCK = 0x03
+    MEMPOOL = 0x04
+    SCHEDULE = 0x05
+    VALIDATORS = 0x06
+    ADD_VALIDATOR = 0x07
+    REMOVE_VALIDATOR = 0x08
+    RELOAD_VALIDATORS = 0x09
+    SYNC_PEER = 0x0A
+    SYNC_ALL = 0x0B
+    PEERS = 0x0C
+    SUBSCRIBE = 0x0D
+    EXECUTOR_STATS = 0x0E
+    FETCH_BLOB = 0x0F
+
+
+STATUS_OK = 0x00
+STATUS_ERROR = 0x01
+
+# Responses passed through as bytes instead of being decoded by the worker
+RAW_RESPONSES = {StateOps.CHAIN}
+
+HEADER_SIZE = 4
+
+
+def encode_frame(code: int, body: bytes = b"") -> bytes:
+    """Format: [LENGTH:4][CODE:1][BODY]"""
+    return (len(body) + 1).to_bytes(HEADER_SIZE, 'big') + bytes([code]) + body
+
+
+def encode_json(code: int, payload) -> bytes:
+    """Frames a JSON payload without whitespace."""
+    return encode_frame(code, json.dumps(payload, separators=(",", ":")).encode('utf-8'))
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    """
+    Reads one frame from a stream.
+
+    Raises asyncio.IncompleteReadError when the other side closes the connection.
+
+    return: (code, body)
+    """
+    length = int.from_bytes(await reader.readexactly(HEADER_SIZE), 'big')
+    if length < 1:
+        raise ValueError("Empty state frame")
+    frame = await reader.readexactly(length)
+    return frame[0], frame[1:]
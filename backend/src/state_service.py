@@ -0,0 +1,431 @@
+"""
+Chain-State Service
+
+The chain, the mempool, the validator set and the P2P node live in exactly one
+process. StateService implements every operation the API needs on that state;
+StateServer exposes it on a Unix socket so several stateless API worker
+processes can share it (see state_client.py), and run_state_process is the
+entry point of that dedicated process.
+
+With a single API process the service is called in-process instead, and no
+socket is opened.
+
+Author: LunaLynx12
+"""
+
+
+from state_protocol import StateOps, STATUS_OK, STATUS_ERROR, encode_frame, encode_json, read_frame
+from blockchain import Blockchain, Transaction, get_blockchain, slot_rank, verify_transactions
+from validator_registry import get_validator_registry, sign_block_header
+from sessions import introduced_sessions
+from local_database import confirm_sessions
+from executor import TaskExecutor, get_executor
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from config import LEADER_TIMEOUT
+from pqc_backend import select_backend
+from p2p_node import P2PNode
+from blob_store import get_blob_store
+from dilithium import generate_dilithium_keys
+from typing import Any, Dict, Optional, Set
+import asyncio
+import binascii
+import sqlite3
+import base64
+import signal
+import json
+import os
+
+
+class StateService:
+    """
+    Operations on the chain state, callable in-process or through StateServer.
+
+    Handlers take keyword arguments decoded from the request and return a
+    JSON-serializable dict (or raw JSON bytes for the chain); failures are
+    raised as HTTPException so they reach the API client unchanged.
+    """
+    def __init__(
+        self,
+        blockchain: Blockchain,
+        p2p_node: Optional[P2PNode] = None,
+        executor: Optional[TaskExecutor] = None,
+        dev_validator_keys: bool = False,
+    ):
+        """
+        Initializes the service.
+
+        param blockchain: Chain and mempool owned by this process
+        type blockchain: Blockchain
+        param p2p_node: P2P node syncing the chain, None if networking is disabled
+        type p2p_node: Optional[P2PNode]
+        param executor: Runs signing, verification and registry I/O off the event loop, defaults to the process executor
+        type executor: Optional[TaskExecutor]
+        param dev_validator_keys: Generate key pairs for validators added without a public key (development only)
+        type dev_validator_keys: bool
+        """
+        self.blockchain = blockchain
+        self.registry = blockchain.validators
+        self.p2p_node = p2p_node
+        self.executor = executor or get_executor()
+        self.dev_validator_keys = dev_validator_keys
+        self._chain_json: Optional[tuple] = None
+        # Validator changes write and re-read the registry in the I/O pool, one at a time
+        self._validator_changes = asyncio.Lock()
+        self._confirmations: Set[asyncio.Task] = set()
+        self.blockchain.add_block_listener(self.on_block)
+        self.handlers = {
+            StateOps.CHAIN: self.chain,
+            StateOps.ADD_TRANSACTION: self.add_transaction,
+            StateOps.MINE_BLOCK: self.mine_block,
+            StateOps.MEMPOOL: self.mempool,
+            StateOps.SCHEDULE: self.schedule,
+            StateOps.VALIDATORS: self.validators,
+            StateOps.ADD_VALIDATOR: self.add_validator,
+            StateOps.REMOVE_VALIDATOR: self.remove_validator,
+            StateOps.RELOAD_VALIDATORS: self.reload_validators,
+            StateOps.SYNC_PEER: self.sync_peer,
+            StateOps.SYNC_ALL: self.sync_all,
+            StateOps.PEERS: self.peers,
+            StateOps.EXECUTOR_STATS: self.executor_stats,
+            StateOps.FETCH_BLOB: self.fetch_blob,
+        }
+
+    def on_block(self, block, origin):
+        """Marks the sessions whose KEM ciphertext reached the chain, so their next messages leave it out."""
+        session_ids = introduced_sessions(block)
+        if not session_ids:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Appended outside the event loop, e.g. by Blockchain.mine_block
+            self._store_confirmations(session_ids)
+            return
+        task = loop.create_task(self._confirm_sessions(session_ids))
+        self._confirmations.add(task)
+        task.add_done_callback(self._confirmations.discard)
+
+    async def _confirm_sessions(self, session_ids):
+        try:
+            await self.executor.run_io("confirm_sessions", self._store_confirmations, session_ids)
+        except HTTPException as e:
+            print(f"[State] Could not record confirmed sessions: {e.detail}")
+
+    @staticmethod
+    def _store_confirmations(session_ids):
+        try:
+            confirm_sessions(session_ids)
+        except sqlite3.Error as e:
+            print(f"[State] Could not record confirmed sessions: {e}")
+
+    def _node(self) -> P2PNode:
+        if self.p2p_node is None:
+            raise HTTPException(status_code=503, detail="P2P node is not running")
+        return self.p2p_node
+
+    async def chain(self) -> bytes:
+        """Returns the whole chain as JSON, serialized once per tip."""
+        tip = self.blockchain.chain[-1]
+        if self._chain_json is None or self._chain_json[0] != (tip.index, tip.hash):
+            blocks = b",".join(block.model_dump_json().encode('utf-8') for block in self.blockchain.chain)
+            self._chain_json = ((tip.index, tip.hash), b'{"chain":[' + blocks + b']}')
+        return self._chain_json[1]
+
+    async def add_transaction(self, tx: Dict[str, Any]) -> dict:
+        """
+        Admits a transaction into the mempool after verifying it in the process pool.
+
+        The signature is checked here against the sender's registered key, which
+        only this process knows, and never taken on trust from a client.
+        """
+        tx = Transaction.model_validate(tx)
+        keys = self.blockchain.signer_keys([tx])
+        if keys is not None and not await self.executor.run_cpu("verify_transaction", verify_transactions, [tx], keys):
+            print(f"[WARNING] Rejected invalid {tx.tx_type} transaction from {tx.sender}")
+            return {"accepted": False}
+        # Without keys (a REGISTER rebinding an address) add_transaction rejects it itself
+        return {"accepted": self.blockchain.add_transaction(tx, verified=keys is not None)}
+
+    async def mine_block(self, validator: str) -> dict:
+        """Produces a block from the mempool if it is the validator's slot; build_block checks the slot under the chain lock."""
+        refused = HTTPException(status_code=403, detail="Validator not authorized, signing key not on this node, or no pending transactions")
+        new_block = self.blockchain.build_block(validator)
+        if new_block is None:
+            raise refused
+        secret_key = self.registry.secret_key(validator)
+        if secret_key is None:
+            raise refused
+        new_block.signature = await self.executor.run_cpu("sign_block", sign_block_header, new_block.hash, secret_key)
+        if self.blockchain.commit_block(new_block) is None:
+            raise HTTPException(status_code=409, detail="The chain tip changed while the block was being signed")
+        return {"status": "success", "block": new_block.model_dump()}
+
+    async def mempool(self) -> dict:
+        pending = list(self.blockchain.pending_transactions)
+        return {"pending_count": len(pending), "pending": [tx.model_dump() for tx in pending]}
+
+    async def schedule(self, slots: int = 5) -> dict:
+        """Lists the leaders of the current and following slots for the next block."""
+        slots = max(1, min(slots, 100))
+        last_block = self.blockchain.chain[-1]
+        height = last_block.index + 1
+        opened = datetime.fromisoformat(last_block.timestamp)
+        current = slot_rank(last_block.timestamp, datetime.utcnow().isoformat()) or 0
+        return {
+            "height": height,
+            "slot_duration": LEADER_TIMEOUT,
+            "current_slot": current,
+            "leader": self.registry.leader(height, current),
+            "slots": [
+                {
+                    "slot": rank,
+                    "leader": self.registry.leader(height, rank),
+                    "starts_at": (opened + timedelta(seconds=rank * LEADER_TIMEOUT)).isoformat(),
+                }
+                for rank in range(current, current + slots)
+            ],
+        }
+
+    async def validators(self) -> dict:
+        return {
+            "version": self.registry.version,
+            "active": self.registry.validators,
+            "validators": [entry.describe() for ranges in self.registry.history.values() for entry in ranges],
+        }
+
+    async def add_validator(self, address: str, public_key: Optional[str] = None) -> dict:
+        """Authorizes a validator from the next block on; without a public key one is generated here on development networks."""
+        try:
+            key = base64.b64decode(public_key, validate=True) if public_key else None
+        except binascii.Error:
+            raise HTTPException(status_code=400, detail="public_key must be base64")
+        async with self._validator_changes:
+            known = self.registry.entries.get(address)
+            if key is None and (known is None or known.public_key is None) and not self.dev_validator_keys:
+                raise HTTPException(status_code=400, detail="public_key is required unless the node runs with --dev-validator-keys")
+            entry = await self.executor.run_io(
+                "validator_add", self.registry.add, address, key, len(self.blockchain.chain)
+            )
+            if entry.public_key is None:
+                keypair = await self.executor.run_cpu("validator_keygen", generate_dilithium_keys)
+                await self.executor.run_io("validator_store_keys", self.registry.create_keys, address, keypair)
+        return {"status": "success", "version": self.registry.version, "validator": entry.describe()}
+
+    async def remove_validator(self, address: str) -> dict:
+        """Revokes a validator from the next block on."""
+        async with self._validator_changes:
+            removed = await self.executor.run_io(
+                "validator_remove", self.registry.remove, address, len(self.blockchain.chain)
+            )
+        if not removed:
+            raise HTTPException(status_code=404, detail="No active validator with this address")
+        return {"status": "success", "version": self.registry.version, "active": self.registry.validators}
+
+    async def reload_validators(self) -> dict:
+        async with self._validator_changes:
+            await self.executor.run_io("validator_reload", self.registry.reload)
+        return {"status": "success", "version": self.registry.version, "active": self.registry.validators}
+
+    async def sync_peer(self, peer_url: str) -> dict:
+        """Starts a download from one peer, connecting to it first if needed."""
+        node = self._node()
+        ip, port = peer_url.rsplit(":", 1)
+        address = (ip, int(port))
+        peer = next((p for p in node.connections.active_peers() if p.address == address), None)
+        if peer is None:
+            await node.connect_to_peer(*address)
+            return {"status": "success", "action": "connecting", "peer": peer_url}
+        started = node.sync.start(peer)
+        return {"status": "success", "action": "sync_started" if started else "sync_in_progress", "peer": peer_url}
+
+    async def sync_all(self) -> dict:
+        """Starts downloads from the connected peers that are ahead of us."""
+        node = self._node()
+        started = node.sync.schedule()
+        return {
+            "status": "success",
+            "action": "sync_started" if started else "up_to_date",
+            "started_peers": [peer.stats()["address"] for peer in started],
+            "syncing_peers": [peer.stats()["address"] for peer in node.sync.in_flight()],
+            "peers_ahead": [peer.stats()["address"] for peer in node.sync.peers_ahead()],
+            "local_chain_length": len(self.blockchain.chain),
+            "fast_sync": node.fast_sync,
+            "audit_pending": node.auditor.pending,
+        }
+
+    async def peers(self) -> dict:
+        node = self._node()
+        return {
+            "node_id": node.node_id.hex(),
+            "peer_count": len(node.connections.peers),
+            "peers": [peer.stats() for peer in node.connections.fastest_peers()],
+        }
+
+    async def executor_stats(self) -> dict:
+        return self.executor.stats()
+
+    async def fetch_blob(self, blob_hash: str) -> dict:
+        """
+        Makes a blob available in the shared blob store, downloading it from the peers if needed.
+
+        Only blobs carried by a transaction of the chain or the mempool are
+        served, and a download is bounded by the size that transaction declares.
+        """
+        size = self.blockchain.blob_size(blob_hash)
+        if size is None:
+            return {"found": False}
+        if await self.executor.run_io("blob_has", get_blob_store().has, blob_hash):
+            return {"found": True}
+        return {"found": await self._node().fetch_blob(blob_hash, size)}
+
+
+class _SubscriberStream:
+    """Forwards chain updates to a subscribed worker; registered like a WebSocket subscriber."""
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+
+    async def send_text(self, text: str):
+        self.writer.write(encode_frame(STATUS_OK, text.encode('utf-8')))
+        await self.writer.drain()
+
+
+class StateServer:
+    """
+    Serves a StateService to API workers on a Unix socket.
+
+    Each connection carries one request at a time; workers open several
+    connections for concurrent requests. A SUBSCRIBE request turns its
+    connection into a stream of chain updates.
+    """
+    def __init__(self, service: StateService, path: str):
+        """
+        Initializes the server.
+
+        param service: Service answering the requests
+        type service: StateService
+        param path: Filesystem path of the Unix socket
+        type path: str
+        """
+        self.service = service
+        self.path = path
+        self.server: Optional[asyncio.AbstractServer] = None
+        self._connections: Set[asyncio.StreamWriter] = set()
+
+    async def start(self):
+        """
+        Binds the socket so that only this user can connect to it.
+
+        Clients of the socket can fill the mempool and manage validators, so it
+        is created owner-only rather than chmod-ed after the bind, which would
+        leave a window for other local users to connect.
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        umask = os.umask(0o177)
+        try:
+            self.server = await asyncio.start_unix_server(self.handle_connection, self.path)
+        finally:
+            os.umask(umask)
+        os.chmod(self.path, 0o600)
+        print(f"[State] Serving chain state on {self.path}")
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            for writer in list(self._connections):
+                writer.close()
+            await self.server.wait_closed()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections.add(writer)
+        try:
+            while True:
+                op, body = await read_frame(reader)
+                if op == StateOps.SUBSCRIBE:
+                    await self.stream_updates(reader, writer)
+                    return
+                writer.write(await self.handle_request(op, body))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def handle_request(self, op: int, body: bytes) -> bytes:
+        """
+        Runs one operation and frames its result.
+
+        return: Response frame, STATUS_ERROR carrying the HTTP status code and detail on failure
+        """
+        handler = self.service.handlers.get(op)
+        try:
+            if handler is None:
+                raise HTTPException(status_code=400, detail=f"Unknown state operation {op:#x}")
+            result = await handler(**(json.loads(body) if body else {}))
+        except HTTPException as e:
+            return encode_json(STATUS_ERROR, {"status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            print(f"[State] Operation {op:#x} failed: {e}")
+            return encode_json(STATUS_ERROR, {"status_code": 500, "detail": str(e)})
+        if isinstance(result, bytes):
+            return encode_frame(STATUS_OK, result)
+        return encode_json(STATUS_OK, result)
+
+    async def stream_updates(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Pushes every chain update to the worker until it disconnects."""
+        subscriber = _SubscriberStream(writer)
+        self.service.blockchain.add_subscriber(subscriber)
+        try:
+            writer.write(encode_frame(STATUS_OK))
+            await writer.drain()
+            await reader.read()
+        finally:
+            self.service.blockchain.remove_subscriber(subscriber)
+
+
+def run_state_process(path: str, peer_port: int, fast_sync: bool = False, dev_validator_keys: bool = False):
+    """
+    Entry point of the chain-state process: runs the P2P node and the state server until terminated.
+
+    param path: Unix socket the API workers connect to
+    type path: str
+    param peer_port: P2P listening port
+    type peer_port: int
+    param fast_sync: Start the P2P node in fast sync mode
+    type fast_sync: bool
+    param dev_validator_keys: Generate key pairs for validators without one (development only)
+    type dev_validator_keys: bool
+    """
+    from local_database import init_db
+
+    async def serve():
+        select_backend()
+        init_db()
+        registry = get_validator_registry()
+        registry.reload()
+        if dev_validator_keys:
+            registry.create_missing_keys()
+
+        executor = get_executor()
+        executor.start()
+        node = P2PNode("127.0.0.1", peer_port, fast_sync=fast_sync)
+        await node.start()
+        server = StateServer(StateService(get_blockchain(), node, executor, dev_validator_keys), path)
+        await server.start()
+
+        stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stopped.set)
+        await stopped.wait()
+
+        print("[State] Shutting down...")
+        await server.stop()
+        await node.stop()
+        executor.shutdown()
+
+    asyncio.run(serve())
@@ -0,0 +1,268 @@
+"""
+Staged Validation Pipeline for Downloaded Blocks
+
+A block download arrives as one frame per block. Instead of decoding the whole
+batch and validating it serially, the frames flow through four stages joined by
+bounded queues:
+
+    decode -> hash and linkage check -> signature verification -> in-order apply
+
+Decoding, hashing and signature checks run in the CPU lane of the executor
+shared with the API, so the event loop only routes blocks between stages, the
+work on different blocks overlaps across cores, and memory is bounded by the
+queue sizes rather than by the length of the chain.
+
+In fast sync only the validator signature of each block is checked before it
+is appended; its transactions are verified afterwards by the BlockAuditor.
+
+Author: LunaLynx12
+"""
+
+
+from blockchain import Block, Blockchain, verify_transactions, verify_block_signatures
+from config import P2P_PIPELINE_WINDOW, P2P_SYNC_TIMEOUT
+from executor import TaskExecutor, get_executor
+from typing import Any, Callable, Dict, Optional, Tuple
+from collections import ChainMap
+import asyncio
+
+
+def decode_block(frame: bytes) -> Tuple[Optional[Block], str]:
+    """
+    Parses a SYNC_BLOCK frame and recomputes the block hash.
+
+    Defined at module level so it can run in a worker process.
+
+    param frame: SYNC_BLOCK frame carrying one block
+    type frame: bytes
+    return: (block, recomputed hash), or (None, reason) if the frame does not decode
+    """
+    try:
+        block = Block.model_validate_json(frame[1:])
+    except ValueError as e:
+        return None, str(e)
+    return block, block.compute_hash()
+
+
+class BlockPipeline:
+    """
+    Validates and applies one streamed batch of blocks.
+
+    A stage that finds a bad block marks the batch as failed; every stage keeps
+    draining its input until the end of the batch so no producer is left blocked
+    on a full queue, but nothing after the failure is verified or applied.
+    """
+    def __init__(
+        self,
+        blockchain: Blockchain,
+        executor: Optional[TaskExecutor] = None,
+        window: int = P2P_PIPELINE_WINDOW,
+        auditor: Optional["BlockAuditor"] = None,
+    ):
+        """
+        Initializes the pipeline.
+
+        param blockchain: Chain the blocks are appended to
+        type blockchain: Blockchain
+        param executor: Executor whose CPU lane runs decoding, hashing and verification, None to run them on the event loop
+        type executor: Optional[TaskExecutor]
+        param window: Capacity of each queue between two stages
+        type window: int
+        param auditor: Fast sync: only header signatures are checked and appended blocks go to this auditor
+        type auditor: Optional[BlockAuditor]
+        """
+        self.blockchain = blockchain
+        self.executor = executor
+        self.window = window
+        self.auditor = auditor
+        self.applied = 0
+        self.fork = False
+        self.error: Optional[str] = None
+
+    def _fail(self, reason: str):
+        if self.error is None:
+            self.error = reason
+
+    def _offload(self, operation: str, fn: Callable, *args) -> Any:
+        """Starts fn in the CPU lane and returns its future, or runs it right away without an executor."""
+        if self.executor is None:
+            return fn(*args)
+        return asyncio.ensure_future(self.executor.run_cpu_background(operation, fn, *args))
+
+    async def run(self, frames: asyncio.Queue, start: int, origin: Any = None) -> Tuple[int, bool]:
+        """
+        Pushes a batch through all stages and waits until it is fully drained.
+
+        param frames: Raw block frames in chain order; a frame with no payload ends the batch
+        type frames: asyncio.Queue
+        param start: Index of the first block in the batch
+        type start: int
+        param origin: Peer the blocks came from
+        type origin: Any
+        return: (number of blocks appended, True if the first block does not build on our chain)
+        """
+        decoded = asyncio.Queue(self.window)
+        linked = asyncio.Queue(self.window)
+        await asyncio.gather(
+            self._decode(frames, decoded),
+            self._link(decoded, linked, start),
+            self._apply(linked, origin),
+        )
+        if self.error:
+            print(f"[Sync] Batch from {origin} rejected: {self.error}")
+        return self.applied, self.fork
+
+    async def _decode(self, frames: asyncio.Queue, out: asyncio.Queue):
+        """Stage 1: hands each frame to the pool for parsing and hashing as soon as it arrives."""
+        try:
+            while True:
+                frame = await asyncio.wait_for(frames.get(), P2P_SYNC_TIMEOUT)
+                if len(frame) <= 1:
+                    break
+                if self.error:
+                    continue
+                await out.put(self._offload("sync_decode", decode_block, frame))
+        except asyncio.TimeoutError:
+            self._fail("peer stopped sending blocks")
+        finally:
+            await out.put(None)
+
+    async def _link(self, source: asyncio.Queue, out: asyncio.Queue, start: int):
+        """
+        Stage 2: checks each block hash and its link to the previous block.
+
+        Decoded blocks are taken in order; those that pass have their signatures
+        handed to the pool right away, and the bounded queues limit how many
+        decodings and verifications are in flight.
+        """
+        chain = self.blockchain.chain
+        prev = chain[start - 1] if 0 < start <= len(chain) else None
+        if prev is None:
+            self._fail(f"batch starts at {start}, our chain has {len(chain)} blocks")
+        # Registrations of the blocks of this batch, which reach the chain only in stage 4
+        batch_keys: Dict[str, Tuple[str, int]] = {}
+        registered = ChainMap(batch_keys, self.blockchain.account_keys)
+        while (decoding := await source.get()) is not None:
+            if self.error:
+                if isinstance(decoding, asyncio.Future):
+                    decoding.cancel()
+                continue
+            try:
+                block, block_hash = await decoding if isinstance(decoding, asyncio.Future) else decoding
+            except Exception as e:
+                self._fail(f"decoding crashed: {e}")
+                continue
+            if block is None:
+                self._fail(f"undecodable block: {block_hash}")
+                continue
+            if block.index != prev.index + 1 or block.prev_hash != prev.hash:
+                self.fork = block.index == start
+                self._fail(f"block {block.index} does not link to block {prev.index}")
+                continue
+            if block_hash != block.hash:
+                self._fail(f"block {block.index} has a wrong hash")
+                continue
+            if block.validator != self.blockchain.scheduled_leader(block.index, prev, block.timestamp):
+                self._fail(f"block {block.index} was produced by {block.validator} outside its slot")
+                continue
+            public_key = self.blockchain.validators.public_key(block.validator, block.index)
+            if public_key is None:
+                self._fail(f"block {block.index} is signed by {block.validator}, not a validator at that height")
+                continue
+            keys = self.blockchain.signer_keys(block.transactions, block.index, registered)
+            if keys is None:
+                self._fail(f"block {block.index} registers an address already bound to another key")
+                continue
+            Blockchain.index_registrations(block, batch_keys)
+            if self.auditor is not None:
+                unverified = []
+            else:
+                unverified = [tx for tx in block.transactions if not self.blockchain.is_verified(tx.compute_hash())]
+            verification = self._offload("sync_verify", verify_block_signatures, block.hash, block.signature, public_key, unverified, keys)
+            await out.put((block, verification))
+            prev = block
+        await out.put(None)
+
+    async def _apply(self, source: asyncio.Queue, origin: Any):
+        """Stage 4: waits for each block's verification and appends the blocks in order."""
+        while (item := await source.get()) is not None:
+            block, verification = item
+            if self.error:
+                if isinstance(verification, asyncio.Future):
+                    verification.cancel()
+                continue
+            try:
+                valid = await verification if isinstance(verification, asyncio.Future) else verification
+            except Exception as e:
+                self._fail(f"verification of block {block.index} crashed: {e}")
+                continue
+            if not valid:
+                self._fail(f"block {block.index} has an invalid signature")
+            elif self.blockchain.add_block(
+                block, origin=origin, signatures_verified=True, audit_pending=self.auditor is not None
+            ):
+                self.applied += 1
+                if self.auditor is not None:
+                    self.auditor.enqueue(block)
+            elif self.blockchain.find_block(block.hash) is None:
+                self._fail(f"block {block.index} does not extend our chain")
+
+
+class BlockAuditor:
+    """
+    Verifies, in the background, the transactions of blocks accepted by fast sync.
+
+    If a block turns out to contain an invalid transaction, the chain is rolled
+    back to just before it and the node leaves fast sync, so the blocks are
+    downloaded again with full verification.
+    """
+    def __init__(self, node):
+        """
+        Initializes the auditor.
+
+        param node: P2P node owning the chain and the fast sync flag
+        type node: P2PNode
+        """
+        self.node = node
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.audited = 0
+
+    @property
+    def pending(self) -> int:
+        """Number of blocks waiting for their audit."""
+        return self.queue.qsize()
+
+    def enqueue(self, block: Block):
+        """Schedules the transactions of an appended block for verification."""
+        self.queue.put_nowait((block.index, block.hash))
+
+    def _still_in_chain(self, index: int, block_hash: str) -> bool:
+        chain = self.node.blockchain.chain
+        return index < len(chain) and chain[index].hash == block_hash
+
+    async def run(self):
+        """Background loop auditing queued blocks in chain order."""
+        blockchain = self.node.blockchain
+        while True:
+            index, block_hash = await self.queue.get()
+            if not self._still_in_chain(index, block_hash):
+                continue
+            block = blockchain.chain[index]
+            unverified = [tx for tx in block.transactions if not blockchain.is_verified(tx.compute_hash())]
+            keys = blockchain.signer_keys(block.transactions, index)
+            if keys is None:
+                valid = False
+            else:
+                valid = await get_executor().run_cpu_background("sync_audit", verify_transactions, unverified, keys)
+            if valid:
+                blockchain.mark_verified([tx.compute_hash() for tx in unverified])
+                self.audited += 1
+                continue
+            if not self._still_in_chain(index, block_hash):
+                continue
+            print(f"[ERROR] Audit found an invalid transaction in block {index}, rolling back and leaving fast sync")
+            self.node.fast_sync = False
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            blockchain.rollback(index)
+            self.node.sync.schedule()
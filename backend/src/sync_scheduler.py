@@ -0,0 +1,189 @@
+"""
+Tip-Driven Block Sync Scheduler
+
+Peers announce their tip (height and hash) whenever it changes. The scheduler
+starts a block download only towards peers that are ahead of us, keeps at most
+P2P_MAX_CONCURRENT_SYNCS downloads running, prefers the lowest-RTT peers and
+fetches only the blocks above our tip. When the peer is on a different fork,
+only the blocks above the last common one are fetched, page by page. An idle
+network produces no sync traffic at all.
+
+Author: LunaLynx12
+"""
+
+
+from config import P2P_MAX_CONCURRENT_SYNCS, P2P_SYNC_BATCH
+from connection_manager import PeerConnection
+from blockchain import verify_block_signatures
+from executor import get_executor
+from typing import Dict, List
+import asyncio
+
+
+class SyncScheduler:
+    """
+    Decides when, and from which peers, to download blocks.
+
+    Features:
+        - Syncs only start when a peer's announced tip is above our own
+        - At most max_concurrent downloads at once, fastest peers first
+        - A single download per announced tip, even if several peers announce it
+        - Incremental GET_BLOCKS batches, also for switching to another fork
+    """
+    def __init__(self, node, max_concurrent: int = P2P_MAX_CONCURRENT_SYNCS):
+        """
+        Initializes the scheduler.
+
+        param node: P2P node whose chain is synced and whose peers are used
+        type node: P2PNode
+        param max_concurrent: Maximum number of simultaneous downloads
+        type max_concurrent: int
+        """
+        self.node = node
+        self.max_concurrent = max_concurrent
+        self._syncing: Dict[bytes, asyncio.Task] = {}
+        # Tip hash of each peer at the moment its last sync failed; the peer is
+        # not retried until it announces a different tip
+        self._failed_tips: Dict[bytes, str] = {}
+
+    @property
+    def local_height(self) -> int:
+        """Index of our own tip block."""
+        return len(self.node.blockchain.chain) - 1
+
+    def in_flight(self) -> List[PeerConnection]:
+        """Returns the peers a download is currently running from."""
+        return [peer for peer in self.node.connections.active_peers() if peer.node_id in self._syncing]
+
+    def peers_ahead(self) -> List[PeerConnection]:
+        """Returns the peers whose announced tip is above ours, fastest first."""
+        height = self.local_height
+        return [peer for peer in self.node.connections.fastest_peers() if peer.tip_height > height]
+
+    def schedule(self) -> List[PeerConnection]:
+        """
+        Starts downloads from peers that are ahead, up to the concurrency limit.
+
+        Called whenever a peer announces a new tip and whenever a download ends.
+
+        return: Peers a download was started from
+        """
+        started = []
+        syncing_tips = {peer.tip_hash for peer in self.in_flight()}
+        for peer in self.peers_ahead():
+            if len(self._syncing) >= self.max_concurrent:
+                break
+            if peer.node_id in self._syncing or peer.tip_hash in syncing_tips:
+                continue
+            if self._failed_tips.get(peer.node_id) == peer.tip_hash:
+                continue
+            self.start(peer)
+            syncing_tips.add(peer.tip_hash)
+            started.append(peer)
+        return started
+
+    def start(self, peer: PeerConnection) -> bool:
+        """
+        Starts a download from one peer regardless of its position in the ranking.
+
+        param peer: Peer to download from
+        type peer: PeerConnection
+        return: False if a download from this peer is already running
+        """
+        if peer.node_id in self._syncing:
+            return False
+        self._failed_tips.pop(peer.node_id, None)
+        self._syncing[peer.node_id] = asyncio.create_task(self._run(peer))
+        return True
+
+    async def _run(self, peer: PeerConnection):
+        """Runs one download and schedules the next one when it ends."""
+        try:
+            caught_up = await self.sync_from(peer)
+        except (asyncio.TimeoutError, ConnectionError, RuntimeError, ValueError) as e:
+            print(f"[Sync] Download from {peer} failed: {e}")
+            caught_up = False
+        except Exception as e:
+            print(f"[Sync] Download from {peer} aborted: {e}")
+            caught_up = False
+        finally:
+            self._syncing.pop(peer.node_id, None)
+        if not caught_up:
+            self._failed_tips[peer.node_id] = peer.tip_hash
+        self.schedule()
+
+    async def sync_from(self, peer: PeerConnection) -> bool:
+        """
+        Downloads the blocks above our tip from a peer and appends them.
+
+        Blocks are streamed in batches through the node's validation pipeline. If
+        the first block does not build on our chain the peer is on another fork,
+        which resolve_fork switches to.
+
+        param peer: Peer whose announced tip is ahead of ours
+        type peer: PeerConnection
+        return: True if we reached the peer's announced height
+        """
+        while peer.tip_height > self.local_height:
+            height = self.local_height
+            applied, fork = await self.node.download_blocks(peer, height + 1, P2P_SYNC_BATCH)
+            if fork:
+                return await self.resolve_fork(peer)
+            if not applied and self.local_height == height:
+                return False
+        return True
+
+    async def resolve_fork(self, peer: PeerConnection) -> bool:
+        """
+        Switches to a peer's fork, downloading only the blocks above the last common one.
+
+        The fork point is searched backwards from our tip in steps that double
+        each time, fetching one block per probe. The blocks above it are then
+        paged in with GET_BLOCKS, so no message ever carries the whole chain. Their
+        signatures are verified in the executor's CPU lane, and only the blocks
+        above the fork point are checked again, structurally, when replace_chain
+        swaps them in together with our own blocks below the fork.
+
+        param peer: Peer whose blocks do not build on our tip
+        type peer: PeerConnection
+        return: True if we reached the peer's announced height
+        """
+        blockchain = self.node.blockchain
+        chain = blockchain.chain
+        step = 1
+        while True:
+            start = max(1, len(chain) - step)
+            blocks = await self.node.fetch_blocks(peer, start, 1)
+            if not blocks:
+                return False
+            if blocks[0].prev_hash == chain[start - 1].hash:
+                break
+            if start == 1:
+                print(f"[Sync] {peer} does not share our genesis block")
+                return False
+            step *= 2
+        print(f"[Sync] {peer} is on another fork from block {start}, fetching {peer.tip_height - start + 1} blocks")
+        while start + len(blocks) <= peer.tip_height:
+            page = await self.node.fetch_blocks(peer, start + len(blocks), P2P_SYNC_BATCH)
+            if not page:
+                break
+            if page[0].prev_hash != blocks[-1].hash:
+                raise ValueError(f"{peer} sent block {page[0].index} that does not link to the previous one")
+            blocks.extend(page)
+        checks = blockchain.fork_verification(start, blocks)
+        if checks is None:
+            raise ValueError(f"{peer} sent a fork signed by a non-validator or rebinding a registered address")
+        executor = get_executor()
+        verified = await asyncio.gather(*(
+            executor.run_cpu_background("fork_verify", verify_block_signatures, *check) for check in checks
+        ))
+        if not all(verified):
+            raise ValueError(f"{peer} sent a fork with an invalid signature")
+        blockchain.replace_chain(chain[:start] + blocks, origin=peer, start=start, signatures_verified=True)
+        return self.local_height >= peer.tip_height
+
+    def cancel_all(self):
+        """Cancels every running download."""
+        for task in self._syncing.values():
+            task.cancel()
+        self._syncing.clear()
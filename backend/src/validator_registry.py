@@ -0,0 +1,412 @@
+"""
+Validator Registry
+
+Keeps the PoA validator set from the validator_keys table in memory, with the
+key history of every validator decoded and ready for header verification,
+and holds the secret keys of the validators this node signs for. Secret keys
+are stored with dilithium.save_key/load_key as <validator>.key (next to a
+<validator>.pub copy of the public key) under VALIDATOR_KEY_DIR.
+
+Author: LunaLynx12
+"""
+
+
+from config import VALIDATORS, VALIDATOR_KEY_DIR
+from local_database import get_validator_keys, open_validator_key, set_validator_key, close_validator_key
+from dilithium import save_key, load_key
+from pqc_backend import get_backend
+from typing import Dict, List, Optional, Tuple
+import sqlite3
+import base64
+import os
+
+
+def verify_block_header(block_hash: str, signature: str, public_key: bytes) -> bool:
+    """
+    Verifies a validator's signature over a block hash.
+
+    Defined at module level so it can run in a worker process.
+
+    param block_hash: Hex hash of the block
+    type block_hash: str
+    param signature: Base64 Dilithium signature carried by the block
+    type signature: str
+    param public_key: Validator public key
+    type public_key: bytes
+    return: True if the signature is valid
+    """
+    try:
+        return get_backend().verify(public_key, block_hash.encode(), base64.b64decode(signature))
+    except Exception:
+        return False
+
+
+def sign_block_header(block_hash: str, secret_key: bytes) -> str:
+    """
+    Signs a block hash with a validator's secret key.
+
+    Defined at module level so it can run in a worker process.
+
+    param block_hash: Hex hash of the block
+    type block_hash: str
+    param secret_key: Validator secret key
+    type secret_key: bytes
+    return: Base64 Dilithium signature
+    """
+    return base64.b64encode(get_backend().sign(secret_key, block_hash.encode())).decode()
+
+
+class ValidatorInfo:
+    """
+    One key range of a validator: the key it signs with between two block heights.
+
+    Attributes:
+        address (str): Validator identifier, as named in the blocks it signs
+        public_key (Optional[bytes]): Decoded Dilithium public key, None until known
+        from_height (int): First block index the key may sign
+        to_height (Optional[int]): First block index it may no longer sign, None while the range is open
+    """
+    __slots__ = ("address", "public_key", "from_height", "to_height")
+
+    def __init__(self, address: str, public_key: Optional[bytes], from_height: int = 0, to_height: Optional[int] = None):
+        self.address = address
+        self.public_key = public_key
+        self.from_height = from_height
+        self.to_height = to_height
+
+    def active_at(self, height: Optional[int]) -> bool:
+        """True if the range covers the block at height (None: the next block to be produced)."""
+        if height is None:
+            return self.to_height is None
+        return self.from_height <= height and (self.to_height is None or height < self.to_height)
+
+    def describe(self) -> dict:
+        """Returns a JSON-serializable view of the range."""
+        return {
+            "address": self.address,
+            "public_key": base64.b64encode(self.public_key).decode() if self.public_key else None,
+            "from_height": self.from_height,
+            "to_height": self.to_height,
+            "active": self.to_height is None,
+        }
+
+
+class ValidatorRegistry:
+    """
+    The validator set, backed by the validator_keys table and kept in memory.
+
+    Features:
+        - O(1) lookup of a validator's key ranges by address
+        - Public keys decoded once when the set is loaded
+        - Each key is authorized for a range of block heights; adding, re-adding
+          or re-keying a validator opens a new range and removing it closes the
+          open one, so blocks signed under an earlier key or before a removal
+          still verify
+        - `version` increases on every change, and changes apply without a restart
+        - Secret keys are only present for validators whose key files exist on this node
+    """
+    def __init__(self, validators: List[str] = VALIDATORS, persistent: bool = True):
+        """
+        Initializes the registry; the set itself is loaded on first use.
+
+        param validators: Initial validator set, written to an empty validator_keys table
+        type validators: List[str]
+        param persistent: False keeps the set and the keys in memory only
+        type persistent: bool
+        """
+        self.initial_validators = list(validators)
+        self.persistent = persistent
+        self.key_dir = VALIDATOR_KEY_DIR if persistent else None
+        self.version = 0
+        self._history: Optional[Dict[str, List[ValidatorInfo]]] = None
+        self._secret_keys: Dict[str, bytes] = {}
+
+    def _key_path(self, validator: str, suffix: str) -> Optional[str]:
+        if self.key_dir is None:
+            return None
+        return os.path.join(self.key_dir, f"{validator}.{suffix}")
+
+    def _load_key_file(self, validator: str, suffix: str) -> Optional[bytes]:
+        path = self._key_path(validator, suffix)
+        if path is None or not os.path.exists(path):
+            return None
+        return load_key(path)
+
+    def reload(self):
+        """
+        Loads the key history from the validator_keys table, seeding it with the initial set if it is empty.
+
+        Changes made directly in the database take effect on the next reload.
+        """
+        if not self.persistent:
+            if self._history is None:
+                self._history = {address: [ValidatorInfo(address, None)] for address in self.initial_validators}
+                self.version += 1
+            return
+        try:
+            rows = get_validator_keys()
+            if not rows:
+                for address in self.initial_validators:
+                    public_key = self._load_key_file(address, "pub")
+                    open_validator_key(address, base64.b64encode(public_key).decode() if public_key else None, 0)
+                rows = get_validator_keys()
+        except sqlite3.Error as e:
+            print(f"[ValidatorRegistry] Validator keys table unavailable ({e}), using the initial set")
+            rows = [{"address": address, "public_key": None, "from_height": 0, "to_height": None}
+                    for address in self.initial_validators]
+        history: Dict[str, List[ValidatorInfo]] = {}
+        for row in rows:
+            if row["public_key"]:
+                public_key = base64.b64decode(row["public_key"])
+            else:
+                public_key = self._load_key_file(row["address"], "pub") if row["to_height"] is None else None
+            history.setdefault(row["address"], []).append(
+                ValidatorInfo(row["address"], public_key, row["from_height"], row["to_height"])
+            )
+        # Swapped in one assignment, so readers never see a half-loaded set
+        self._history = history
+        self.version += 1
+
+    @property
+    def history(self) -> Dict[str, List[ValidatorInfo]]:
+        """Key ranges of every known validator by address, oldest first, loading the set on first use."""
+        if self._history is None:
+            self.reload()
+        return self._history
+
+    @property
+    def entries(self) -> Dict[str, ValidatorInfo]:
+        """Latest key range of every known validator by address."""
+        return {address: ranges[-1] for address, ranges in self.history.items()}
+
+    def _range_at(self, validator: str, height: Optional[int]) -> Optional[ValidatorInfo]:
+        for entry in reversed(self.history.get(validator, ())):
+            if entry.active_at(height):
+                return entry
+        return None
+
+    @property
+    def validators(self) -> List[str]:
+        """Addresses of the currently active validators, sorted."""
+        return sorted(address for address, ranges in self.history.items() if ranges[-1].to_height is None)
+
+    def validators_at(self, height: int) -> List[str]:
+        """
+        Returns the validators authorized to sign the block at a height, sorted.
+
+        param height: Index of the block
+        type height: int
+        return: Sorted validator addresses
+        """
+        return sorted(address for address, ranges in self.history.items() if any(r.active_at(height) for r in ranges))
+
+    def leader(self, height: int, rank: int = 0) -> Optional[str]:
+        """
+        Returns the validator scheduled to produce a block.
+
+        The schedule is round-robin over the sorted validator set at that height,
+        so every node computes the same leader without exchanging messages.
+
+        param height: Index of the block
+        type height: int
+        param rank: Number of slots the previous leaders let pass, 0 for the primary leader
+        type rank: int
+        return: Scheduled validator, or None if there are no validators at that height
+        """
+        validators = self.validators_at(height)
+        if not validators:
+            return None
+        return validators[(height + rank) % len(validators)]
+
+    def is_validator(self, validator: str, height: Optional[int] = None) -> bool:
+        """
+        Checks whether a validator may sign a block.
+
+        param validator: Validator identifier
+        type validator: str
+        param height: Index of the block, None for the next block to be produced
+        type height: Optional[int]
+        return: True if the validator is authorized at that height
+        """
+        return self._range_at(validator, height) is not None
+
+    def public_key(self, validator: str, height: Optional[int] = None) -> Optional[bytes]:
+        """
+        Returns the public key a validator signs with at the given height.
+
+        param validator: Validator identifier
+        type validator: str
+        param height: Index of the block, None for the next block to be produced
+        type height: Optional[int]
+        return: Raw Dilithium public key, or None if unknown or not authorized
+        """
+        entry = self._range_at(validator, height)
+        return entry.public_key if entry is not None else None
+
+    def secret_key(self, validator: str) -> Optional[bytes]:
+        """
+        Returns the secret key of a validator this node signs for.
+
+        param validator: Validator identifier
+        type validator: str
+        return: Raw Dilithium secret key, or None if this node does not hold it
+        """
+        if validator not in self._secret_keys:
+            secret_key = self._load_key_file(validator, "key")
+            if secret_key is None:
+                return None
+            self._secret_keys[validator] = secret_key
+        return self._secret_keys[validator]
+
+    def create_keys(self, validator: str, keypair: Optional[Tuple[bytes, bytes]] = None) -> bytes:
+        """
+        Generates and stores a new key pair for a validator.
+
+        The public key only fills an open range that has no key yet; changing
+        the key of a validator is done with add, which opens a new range.
+
+        param validator: Validator identifier
+        type validator: str
+        param keypair: (public_key, secret_key) generated by the caller, e.g. in the executor's CPU lane;
+            None generates one here
+        type keypair: Optional[Tuple[bytes, bytes]]
+        return: The new public key
+        """
+        public_key, secret_key = keypair or get_backend().sign_keygen()
+        if self.key_dir is not None:
+            if not os.path.exists(self.key_dir):
+                os.makedirs(self.key_dir)
+            save_key(self._key_path(validator, "pub"), public_key)
+            save_key(self._key_path(validator, "key"), secret_key)
+        self._secret_keys[validator] = secret_key
+        entry = self._range_at(validator, None)
+        if entry is not None and entry.public_key is None:
+            if self.persistent:
+                try:
+                    set_validator_key(validator, base64.b64encode(public_key).decode())
+                except sqlite3.Error as e:
+                    print(f"[ValidatorRegistry] Could not store the public key of {validator}: {e}")
+            entry.public_key = public_key
+            self.version += 1
+        return public_key
+
+    def create_missing_keys(self) -> List[str]:
+        """
+        Generates key pairs for the active validators that have no public key anywhere yet.
+
+        For development networks only, started with --dev-validator-keys; on a
+        real network each validator creates its keys offline and only the public
+        key is registered.
+
+        return: Validators a key pair was generated for
+        """
+        created = []
+        for address in self.validators:
+            if self.public_key(address) is None:
+                print(f"[WARNING] Generating development signing keys for validator {address}")
+                self.create_keys(address)
+                created.append(address)
+        return created
+
+    def add(self, validator: str, public_key: Optional[bytes], height: int) -> ValidatorInfo:
+        """
+        Adds a validator, re-activates a removed one or changes its key, effective from a block height.
+
+        A new key range is opened and the open one, if any, is closed at the same
+        height; ranges that already cover blocks are never changed.
+
+        param validator: Validator identifier
+        type validator: str
+        param public_key: Its Dilithium public key, None to keep the key last known for it
+        type public_key: Optional[bytes]
+        param height: First block index the validator may sign with the key
+        type height: int
+        return: The new range, or the open one if nothing changed
+        """
+        ranges = self.history.get(validator, [])
+        if public_key is None and ranges:
+            public_key = ranges[-1].public_key
+        current = self._range_at(validator, None)
+        if current is not None and current.public_key == public_key:
+            return current
+        if self.persistent:
+            open_validator_key(validator, base64.b64encode(public_key).decode() if public_key else None, height)
+            self.reload()
+        else:
+            history = dict(self.history)
+            if current is not None:
+                ranges = ranges[:-1] + [ValidatorInfo(validator, current.public_key, current.from_height, max(current.from_height, height))]
+            history[validator] = ranges + [ValidatorInfo(validator, public_key, height)]
+            self._history = history
+            self.version += 1
+        return self.history[validator][-1]
+
+    def remove(self, validator: str, height: int) -> bool:
+        """
+        Removes a validator from the active set from a block height on.
+
+        param validator: Validator identifier
+        type validator: str
+        param height: First block index the validator may no longer sign
+        type height: int
+        return: True if an active validator was removed
+        """
+        current = self._range_at(validator, None)
+        if current is None:
+            return False
+        if self.persistent:
+            close_validator_key(validator, height)
+            self.reload()
+        else:
+            history = dict(self.history)
+            history[validator] = history[validator][:-1] + [
+                ValidatorInfo(validator, current.public_key, current.from_height, max(current.from_height, height))
+            ]
+            self._history = history
+            self.version += 1
+        return True
+
+    def sign_block(self, validator: str, block_hash: str) -> Optional[str]:
+        """
+        Signs a block hash with a validator's secret key.
+
+        Keys are never generated here; see create_missing_keys.
+
+        param validator: Validator producing the block
+        type validator: str
+        param block_hash: Hex hash of the block
+        type block_hash: str
+        return: Base64 signature, or None if the secret key is not on this node
+        """
+        secret_key = self.secret_key(validator)
+        if secret_key is None:
+            return None
+        return sign_block_header(block_hash, secret_key)
+
+    def verify_block(self, block) -> bool:
+        """
+        Checks that a block was signed by a validator authorized at its height.
+
+        param block: Block to check
+        type block: Block
+        return: True if the header signature is valid
+        """
+        public_key = self.public_key(block.validator, block.index)
+        if public_key is None or not block.signature:
+            return False
+        return verify_block_header(block.hash, block.signature, public_key)
+
+
+_registry = ValidatorRegistry()
+"""
+Singleton validator registry shared by the chain and the P2P node.
+"""
+
+def get_validator_registry() -> ValidatorRegistry:
+    """
+    Returns the shared validator registry.
+
+    return: Shared ValidatorRegistry instance
+    rtype: ValidatorRegistry
+    """
+    return _registry
@@ -0,0 +1,120 @@
+import base64
+import hashlib
+
+import pytest
+
+from blockchain import Blockchain, create_transaction, verify_transactions
+from pqc_backend import get_backend
+
+# These tests mine blocks right after picking the leader
+pytestmark = pytest.mark.usefixtures("long_slots")
+
+
+def register(address, public_key, secret_key):
+    signature = get_backend().sign(secret_key, f"REGISTER:{address}".encode())
+    return create_transaction("REGISTER", address, "", {
+        "dilithium_pub": base64.b64encode(public_key).decode(),
+        "kyber_pub": "k" * 16,
+        "signature": base64.b64encode(signature).decode(),
+    })
+
+
+def public_message(address, secret_key, text):
+    message_hash = hashlib.sha256(text.encode()).hexdigest()
+    signature = get_backend().sign(secret_key, message_hash.encode())
+    return create_transaction("PUBLIC_MESSAGE", address, "public", {
+        "message_hash": message_hash,
+        "signature": base64.b64encode(signature).decode(),
+        "message": text,
+    })
+
+
+def test_messages_are_checked_against_the_registered_key(registry):
+    alice_pub, alice_priv = get_backend().sign_keygen()
+    mallory_pub, mallory_priv = get_backend().sign_keygen()
+    bc = Blockchain(registry)
+
+    # Unknown senders are rejected, a pending registration is enough
+    assert not bc.add_transaction(public_message("0xalice", alice_priv, "too early"))
+    assert bc.add_transaction(register("0xalice", alice_pub, alice_priv))
+    assert bc.add_transaction(public_message("0xalice", alice_priv, "hello"))
+
+    # Neither another key's signatures nor a new key for the address are accepted
+    assert not bc.add_transaction(public_message("0xalice", mallory_priv, "forged"))
+    assert not bc.add_transaction(register("0xalice", mallory_pub, mallory_priv))
+
+    block = bc.mine_block(bc.next_leader())
+    assert block is not None
+    assert bc.account_keys["0xalice"] == (base64.b64encode(alice_pub).decode(), 1)
+
+    # A fresh node resolves the key from the REGISTER earlier in the same block
+    assert Blockchain(registry).validate_block(block)
+    assert "dilithium_pub" not in block.transactions[1].data
+
+
+def test_block_rebinding_a_registered_address_is_rejected(registry):
+    alice_pub, alice_priv = get_backend().sign_keygen()
+    mallory_pub, mallory_priv = get_backend().sign_keygen()
+    bc = Blockchain(registry)
+    assert bc.add_transaction(register("0xalice", alice_pub, alice_priv))
+    assert bc.mine_block(bc.next_leader()) is not None
+
+    assert bc.signer_keys([register("0xalice", mallory_pub, mallory_priv)]) is None
+    assert bc.signer_keys([register("0xalice", alice_pub, alice_priv)]) is not None
+    assert bc.signer_keys([public_message("0xalice", alice_priv, "hi")]) == {"0xalice": alice_pub}
+
+
+@pytest.mark.parametrize("tx_type, receiver, extra", [
+    ("PRIVATE_MESSAGE", "0xbob", {"blob": "b" * 64, "size": "32", "session_id": "s" * 32, "counter": "1"}),
+    ("GROUP_MESSAGE", "group", {"blob": "b" * 64, "size": "32", "wraps": "{}"}),
+])
+def test_private_and_group_messages_are_checked_against_the_registered_key(registry, tx_type, receiver, extra):
+    alice_pub, alice_priv = get_backend().sign_keygen()
+    _, mallory_priv = get_backend().sign_keygen()
+    bc = Blockchain(registry)
+
+    def message(secret_key, text):
+        message_hash = hashlib.sha256(text.encode()).hexdigest()
+        signature = get_backend().sign(secret_key, message_hash.encode())
+        return create_transaction(tx_type, "0xalice", receiver, {
+            "message_hash": message_hash,
+            "signature": base64.b64encode(signature).decode(),
+            **extra,
+        })
+
+    assert not bc.add_transaction(message(alice_priv, "too early"))
+    assert bc.add_transaction(register("0xalice", alice_pub, alice_priv))
+    assert not bc.add_transaction(message(mallory_priv, "forged"))
+    unsigned = message(alice_priv, "unsigned")
+    del unsigned.data["signature"]
+    assert not bc.add_transaction(unsigned)
+    genuine = message(alice_priv, "hello")
+    assert bc.add_transaction(genuine)
+
+    # A block carrying a forged message is rejected by other nodes too
+    block = bc.mine_block(bc.next_leader())
+    assert block is not None and Blockchain(registry).validate_block(block)
+    forged = message(mallory_priv, "forged")
+    assert not verify_transactions([forged], bc.signer_keys([forged]))
+
+
+def test_fork_transactions_are_verified_against_the_fork_keys(registry):
+    alice_pub, alice_priv = get_backend().sign_keygen()
+    mallory_pub, mallory_priv = get_backend().sign_keygen()
+    message = public_message("0xalice", alice_priv, "hello")
+
+    bc = Blockchain(registry)
+    assert bc.add_transaction(register("0xalice", alice_pub, alice_priv))
+    assert bc.mine_block(bc.next_leader()) is not None
+    assert bc.add_transaction(message)
+    assert bc.is_verified(message.compute_hash())
+
+    # On the fork the address belongs to another key, so the message seen here does not verify there
+    fork = Blockchain(registry)
+    assert fork.add_transaction(register("0xalice", mallory_pub, mallory_priv))
+    assert fork.mine_block(fork.next_leader()) is not None
+    fork.pending_transactions.append(message)
+    assert fork.mine_block(fork.next_leader()) is not None
+
+    assert not bc.validate_chain(fork.chain)
+    assert bc.validate_chain(fork.chain[:2])
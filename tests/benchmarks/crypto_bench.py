@@ -0,0 +1,329 @@
+"""
+Crypto Micro-Benchmarks
+
+Measures throughput and latency percentiles of the operations a node spends
+its CPU on: Dilithium keygen, sign and verify, ML-KEM keygen, encaps and
+decaps on every usable PQC backend and batch size, AES-GCM at several payload
+sizes, PBKDF2 seed derivation and Block.compute_hash.
+
+Inputs are derived from a fixed seed, so runs on the same machine measure the
+same work. The report is JSON with sorted keys, one entry per case, and can
+be compared against a committed baseline:
+
+    python tests/benchmarks/crypto_bench.py --output current.json --baseline tests/benchmarks/baseline.json
+
+Author: LunaLynx12
+"""
+
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend", "src"))
+
+from blockchain import Block, create_transaction
+from encryption import aes_encrypt, encrypt_stream, decrypt_stream
+from pqc_backend import BACKENDS, REFERENCE_BACKEND, PQCBackend, self_test
+from mnemonics import entropy_to_mnemonic, seed_to_master_key
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import argparse
+import platform
+import random
+import json
+import time
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+"""
+Committed reference report.
+"""
+
+BATCH_SIZES = (1, 8)
+"""
+Batch sizes of the PQC operations; sizes above 1 go through the backend's batch API where it has one.
+"""
+
+AES_PAYLOAD_SIZES = (64, 1024, 64 * 1024)
+"""
+Message sizes of the AES-GCM cases, in bytes.
+"""
+
+STREAM_PAYLOAD_SIZE = 1024 * 1024
+"""
+Size of the streamed AES-GCM case, in bytes.
+"""
+
+BLOCK_SIZES = (1, 100)
+"""
+Transaction counts of the Block.compute_hash cases.
+"""
+
+MIN_TIME = 0.5
+"""
+Seconds each case is timed for at least, after one warm-up run.
+"""
+
+MIN_RUNS = 5
+"""
+Runs each case is timed for at least.
+"""
+
+MAX_RUNS = 1000
+"""
+Runs after which a case stops even if MIN_TIME has not elapsed.
+"""
+
+TOLERANCE = 0.25
+"""
+Fraction by which ops/sec may drop below the baseline before a case counts as a regression.
+"""
+
+SEED = 20240601
+"""
+Seed of the benchmark inputs.
+"""
+
+
+def percentile(samples: Sequence[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile of a non-empty list of samples.
+
+    param samples: Measured values
+    type samples: Sequence[float]
+    param fraction: Percentile as a fraction, e.g. 0.99
+    type fraction: float
+    return: The percentile
+    """
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def measure(fn: Callable[[], object], ops_per_run: int = 1, min_time: float = MIN_TIME,
+            min_runs: int = MIN_RUNS, max_runs: int = MAX_RUNS) -> dict:
+    """
+    Times repeated calls of a function.
+
+    param fn: Function doing ops_per_run operations per call
+    type fn: Callable[[], object]
+    param ops_per_run: Operations per call, the batch size
+    type ops_per_run: int
+    param min_time: Seconds to keep timing for
+    type min_time: float
+    param min_runs: Calls to time at least
+    type min_runs: int
+    param max_runs: Calls to time at most
+    type max_runs: int
+    return: ops/sec over all timed calls and per-call latency percentiles in milliseconds
+    """
+    fn()
+    latencies: List[float] = []
+    started = time.perf_counter()
+    while len(latencies) < max_runs and (len(latencies) < min_runs or time.perf_counter() - started < min_time):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+    total = sum(latencies)
+    return {
+        "batch": ops_per_run,
+        "runs": len(latencies),
+        "ops_per_sec": round(ops_per_run * len(latencies) / total, 3),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 4),
+        "p90_ms": round(percentile(latencies, 0.90) * 1000, 4),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 4),
+    }
+
+
+def available_backends() -> Tuple[Dict[str, PQCBackend], Dict[str, str]]:
+    """
+    Instantiates every backend that is installed and passes the self-test.
+
+    return: (usable backends by key, reasons the others were skipped)
+    """
+    usable, skipped = {}, {}
+    for key, cls in BACKENDS.items():
+        try:
+            backend = REFERENCE_BACKEND if key == "pure" else cls()
+        except Exception as e:
+            skipped[key] = f"unavailable: {e}"
+            continue
+        failure = self_test(backend)
+        if failure is not None:
+            skipped[key] = f"self-test failed: {failure}"
+            continue
+        usable[key] = backend
+    return usable, skipped
+
+
+def pqc_cases(backend: PQCBackend, batch_sizes: Sequence[int], rng: random.Random) -> Dict[str, Tuple[Callable[[], object], int]]:
+    """
+    Builds the signature and KEM cases of one backend.
+
+    param backend: Backend to measure
+    type backend: PQCBackend
+    param batch_sizes: Batch sizes to measure
+    type batch_sizes: Sequence[int]
+    param rng: Source of the messages
+    type rng: random.Random
+    return: Case name -> (function, operations per call)
+    """
+    public_key, secret_key = backend.sign_keygen()
+    kem_public, kem_secret = backend.kem_keygen()
+    _, kem_ciphertext = backend.encaps(kem_public)
+
+    cases = {}
+    for batch in batch_sizes:
+        messages = [rng.randbytes(64) for _ in range(batch)]
+        signed = [(public_key, m, backend.sign(secret_key, m)) for m in messages]
+        if batch == 1:
+            message, (_, _, signature) = messages[0], signed[0]
+            cases["dilithium_keygen/batch=1"] = (backend.sign_keygen, 1)
+            cases["dilithium_sign/batch=1"] = (lambda m=message: backend.sign(secret_key, m), 1)
+            cases["dilithium_verify/batch=1"] = (lambda m=message, s=signature: backend.verify(public_key, m, s), 1)
+            cases["mlkem_keygen/batch=1"] = (backend.kem_keygen, 1)
+            cases["mlkem_encaps/batch=1"] = (lambda: backend.encaps(kem_public), 1)
+            cases["mlkem_decaps/batch=1"] = (lambda: backend.decaps(kem_secret, kem_ciphertext), 1)
+        else:
+            cases[f"dilithium_keygen/batch={batch}"] = (lambda b=batch: backend.sign_keygen_batch(b), batch)
+            cases[f"dilithium_sign/batch={batch}"] = (lambda ms=messages: backend.sign_batch(secret_key, ms), batch)
+            cases[f"dilithium_verify/batch={batch}"] = (lambda items=signed: backend.verify_batch(items), batch)
+            cases[f"mlkem_keygen/batch={batch}"] = (lambda b=batch: backend.kem_keygen_batch(b), batch)
+    return cases
+
+
+def symmetric_cases(rng: random.Random) -> Dict[str, Tuple[Callable[[], object], int]]:
+    """
+    Builds the backend-independent cases: AES-GCM, PBKDF2 and block hashing.
+
+    param rng: Source of the keys and payloads
+    type rng: random.Random
+    return: Case name -> (function, operations per call)
+    """
+    key = rng.randbytes(32)
+    cases = {}
+    for size in AES_PAYLOAD_SIZES:
+        text = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(size))
+        cases[f"aes_gcm_encrypt/size={size}"] = (lambda t=text: aes_encrypt(key, t), 1)
+
+    payload = rng.randbytes(STREAM_PAYLOAD_SIZE)
+    cases[f"aes_gcm_stream_roundtrip/size={STREAM_PAYLOAD_SIZE}"] = (
+        lambda: b"".join(decrypt_stream(key, encrypt_stream(key, [payload]))), 1
+    )
+
+    mnemonic = " ".join(entropy_to_mnemonic(rng.randbytes(20)))
+    cases["pbkdf2_seed"] = (lambda: seed_to_master_key(mnemonic), 1)
+
+    for count in BLOCK_SIZES:
+        transactions = [
+            create_transaction("PRIVATE_MESSAGE", f"0x{rng.getrandbits(128):032x}", f"0x{rng.getrandbits(128):032x}",
+                               {"blob": f"{rng.getrandbits(256):064x}", "size": "1024", "signature": "s" * 3228})
+            for _ in range(count)
+        ]
+        block = Block(index=1, validator="validator_001", transactions=transactions, prev_hash="0" * 64,
+                      timestamp="2024-06-01T00:00:00")
+        cases[f"block_hash/transactions={count}"] = (block.compute_hash, 1)
+    return cases
+
+
+def run(batch_sizes: Sequence[int] = BATCH_SIZES, min_time: float = MIN_TIME, min_runs: int = MIN_RUNS,
+        backends: Optional[Sequence[str]] = None, only: Optional[str] = None) -> dict:
+    """
+    Runs the whole suite.
+
+    param batch_sizes: Batch sizes of the PQC operations
+    type batch_sizes: Sequence[int]
+    param min_time: Seconds each case is timed for at least
+    type min_time: float
+    param min_runs: Calls each case is timed for at least
+    type min_runs: int
+    param backends: Backend keys to measure, defaults to every usable one
+    type backends: Optional[Sequence[str]]
+    param only: Substring a case name must contain to run
+    type only: Optional[str]
+    return: Report with the environment and one result per case
+    """
+    usable, skipped = available_backends()
+    if backends is not None:
+        usable = {key: backend for key, backend in usable.items() if key in backends}
+
+    cases = {}
+    for key, backend in usable.items():
+        for name, case in pqc_cases(backend, batch_sizes, random.Random(SEED)).items():
+            cases[f"{key}/{name}"] = case
+    cases.update(symmetric_cases(random.Random(SEED)))
+
+    results = {}
+    for name, (fn, ops_per_run) in cases.items():
+        if only and only not in name:
+            continue
+        results[name] = measure(fn, ops_per_run, min_time=min_time, min_runs=min_runs)
+        print(f"[Bench] {name}: {results[name]['ops_per_sec']} ops/s, p99 {results[name]['p99_ms']} ms", file=sys.stderr)
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "backends": sorted(usable),
+            "skipped_backends": skipped,
+        },
+        "results": results,
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float = TOLERANCE) -> List[str]:
+    """
+    Lists the cases that got slower than the baseline allows.
+
+    Cases missing from either report are ignored, so adding a case or a
+    backend does not fail the comparison.
+
+    param report: Current report
+    type report: dict
+    param baseline: Reference report
+    type baseline: dict
+    param tolerance: Allowed fractional drop in ops/sec
+    type tolerance: float
+    return: One line per regressed case
+    """
+    regressions = []
+    for name, result in sorted(report["results"].items()):
+        reference = baseline["results"].get(name)
+        if reference is None:
+            continue
+        ratio = result["ops_per_sec"] / reference["ops_per_sec"]
+        if ratio < 1 - tolerance:
+            regressions.append(f"{name}: {result['ops_per_sec']} ops/s vs {reference['ops_per_sec']} in the baseline ({ratio:.0%})")
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Crypto micro-benchmarks")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", nargs="?", const=BASELINE_PATH, help="Compare against a baseline report")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="Allowed fractional drop in ops/sec")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=list(BATCH_SIZES))
+    parser.add_argument("--backends", nargs="+", help="Backends to measure, defaults to every usable one")
+    parser.add_argument("--only", help="Run only cases whose name contains this text")
+    parser.add_argument("--min-time", type=float, default=MIN_TIME)
+    args = parser.parse_args(argv)
+
+    report = run(args.batch_sizes, args.min_time, backends=args.backends, only=args.only)
+    text = json.dumps(report, indent=2, sort_keys=True) + "\n"
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"[Bench] Regression: {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
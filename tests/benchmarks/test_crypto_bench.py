@@ -0,0 +1,30 @@
+import json
+
+import crypto_bench
+
+
+def test_suite_reports_every_case_and_compares_against_a_baseline():
+    report = crypto_bench.run(batch_sizes=(1, 2), min_time=0, min_runs=1, backends=["pure"])
+    results = report["results"]
+    assert "pure" in report["environment"]["backends"]
+    for name in ("dilithium_sign", "dilithium_verify", "mlkem_encaps", "mlkem_decaps"):
+        assert f"pure/{name}/batch=1" in results
+    assert results["pure/dilithium_verify/batch=2"]["batch"] == 2
+    assert "pbkdf2_seed" in results and "block_hash/transactions=100" in results
+    for result in results.values():
+        assert result["ops_per_sec"] > 0 and result["p50_ms"] <= result["p99_ms"]
+
+    # Regressions beyond the tolerance are reported, cases missing from the baseline are not
+    slower = {"results": {name: dict(result, ops_per_sec=result["ops_per_sec"] * 2) for name, result in results.items()}}
+    del slower["results"]["pbkdf2_seed"]
+    assert crypto_bench.compare(report, report) == []
+    assert len(crypto_bench.compare(report, slower)) == len(results) - 1
+
+
+def test_committed_baseline_has_the_report_layout():
+    with open(crypto_bench.BASELINE_PATH) as f:
+        baseline = json.load(f)
+    assert baseline["environment"]["backends"]
+    assert any(name.startswith("pure/") for name in baseline["results"])
+    for result in baseline["results"].values():
+        assert set(result) == {"batch", "runs", "ops_per_sec", "p50_ms", "p90_ms", "p99_ms"}
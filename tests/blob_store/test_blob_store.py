@@ -0,0 +1,164 @@
+import asyncio
+import base64
+import hashlib
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import blob_store
+import local_database
+import p2p_node
+from blob_store import BlobStore
+from blockchain import Blockchain, create_transaction
+from p2p_node import P2PNode, blob_chunk_reply, deserialize_blob, deserialize_get_blob, serialize_blob, serialize_get_blob
+from pqc_backend import get_backend
+from state_service import StateService
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # The database and the blobs live under ../database relative to the working directory
+    (tmp_path / "run").mkdir()
+    monkeypatch.chdir(tmp_path / "run")
+    local_database.init_db()
+    store = BlobStore(chunk_size=1000)
+    monkeypatch.setattr(blob_store, "_blob_store", store)
+    return store
+
+
+def chunk_files(store):
+    return sorted(name for _, _, names in os.walk(store.root) for name in names)
+
+
+def test_equal_content_and_shared_chunks_are_stored_once(store):
+    shared = os.urandom(1000)
+    first = store.put(shared + b"a" * 500)
+    second = store.put(shared + b"b" * 500)
+
+    assert first == hashlib.sha256(shared + b"a" * 500).hexdigest()
+    assert store.put(shared + b"a" * 500) == first
+    assert len(chunk_files(store)) == 3
+    assert store.get(second) == shared + b"b" * 500
+
+    store.release(first)
+    assert store.has(first)
+    store.release(first)
+    assert not store.has(first)
+    assert len(chunk_files(store)) == 2
+
+    store.release(second)
+    assert chunk_files(store) == []
+
+
+def test_blob_transfers_chunk_by_chunk_and_is_checked_against_its_hash(store):
+    data = os.urandom(2500)
+    blob_hash = store.put(data)
+
+    received, index, count = [], 0, 1
+    while index < count:
+        requested_hash, requested_index = deserialize_get_blob(serialize_get_blob(blob_hash, index))
+        reply_hash, reply_index, count, chunk = deserialize_blob(blob_chunk_reply(requested_hash, requested_index))
+        assert (reply_hash, reply_index) == (blob_hash, index)
+        received.append(chunk)
+        index += 1
+    assert count == 3 and b"".join(received) == data
+
+    assert deserialize_blob(blob_chunk_reply("00" * 32, 0))[2] == 0
+
+    writer = store.writer()
+    writer.write(b"".join(received)[:-1] + b"\x00")
+    with pytest.raises(ValueError):
+        writer.close(blob_hash)
+    assert store.get(blob_hash) == data
+
+
+def test_chunk_released_by_another_blob_survives_a_pending_writer(store):
+    shared = os.urandom(1000)
+    first = store.put(shared)
+
+    writer = store.writer()
+    writer.write(shared + b"tail")
+    # The other blob goes away while the writer still holds the shared chunk
+    store.release(first)
+    assert not store.has(first)
+    second = writer.close()
+    assert store.get(second) == shared + b"tail"
+
+    aborted = store.writer()
+    aborted.write(os.urandom(1500))
+    aborted.abort()
+    store.release(second)
+    assert chunk_files(store) == []
+
+
+class FakePeer:
+    def __init__(self, data, chunk_size, counts=None):
+        self.chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+        self.counts = counts or [len(self.chunks)] * len(self.chunks)
+
+    async def request(self, message, reply_type, timeout):
+        blob_hash, index = deserialize_get_blob(message)
+        return serialize_blob(blob_hash, index, self.counts[index], self.chunks[index])
+
+
+class FakeConnections:
+    def __init__(self, peers):
+        self.peers = peers
+        self.penalized = []
+
+    def fastest_peers(self):
+        return self.peers
+
+    def penalize(self, peer, points, reason):
+        self.penalized.append(reason)
+
+
+def fetch(peer, blob_hash, size):
+    node = SimpleNamespace(connections=FakeConnections([peer]))
+    return asyncio.run(P2PNode.fetch_blob(node, blob_hash, size)), node.connections.penalized
+
+
+def test_fetched_blob_is_bounded_by_the_declared_size(store, monkeypatch):
+    monkeypatch.setattr(p2p_node, "BLOB_CHUNK_SIZE", 1000)
+    data = os.urandom(2500)
+    blob_hash = hashlib.sha256(data).hexdigest()
+
+    # Too many chunks for the size, oversized chunks and a count that changes midway are refused
+    assert fetch(FakePeer(data, 1000), blob_hash, 1500) == (False, ["bad BLOB"])
+    assert fetch(FakePeer(data, 2000), blob_hash, 2500) == (False, ["bad BLOB"])
+    assert fetch(FakePeer(data, 1000, counts=[3, 4, 4]), blob_hash, 2500) == (False, ["bad BLOB"])
+    assert not store.has(blob_hash) and chunk_files(store) == []
+
+    assert fetch(FakePeer(data, 1000), blob_hash, 2500) == (True, [])
+    assert store.get(blob_hash) == data
+
+
+def test_only_blobs_of_known_transactions_are_served(store, registry, long_slots):
+    public_key, secret_key = get_backend().sign_keygen()
+    bc = Blockchain(registry)
+    service = StateService(bc)
+    payload = os.urandom(1200)
+    blob_hash = store.put(payload)
+    assert not asyncio.run(service.fetch_blob(blob_hash))["found"]
+
+    signature = get_backend().sign(secret_key, b"REGISTER:0xalice")
+    assert bc.add_transaction(create_transaction("REGISTER", "0xalice", "", {
+        "dilithium_pub": base64.b64encode(public_key).decode(),
+        "kyber_pub": "k" * 16,
+        "signature": base64.b64encode(signature).decode(),
+    }))
+    message_hash = hashlib.sha256(b"hello").hexdigest()
+    assert bc.add_transaction(create_transaction("PRIVATE_MESSAGE", "0xalice", "0xbob", {
+        "message_hash": message_hash,
+        "signature": base64.b64encode(get_backend().sign(secret_key, message_hash.encode())).decode(),
+        "blob": blob_hash,
+        "size": str(len(payload)),
+    }))
+    assert bc.blob_size(blob_hash) == len(payload)
+    assert asyncio.run(service.fetch_blob(blob_hash))["found"]
+
+    block = bc.mine_block(bc.next_leader())
+    assert block is not None and bc.blob_size(blob_hash) == len(payload)
+    bc.rollback(block.index)
+    assert bc.blob_size(blob_hash) is None
@@ -0,0 +1,91 @@
+import asyncio
+import base64
+
+import pytest
+
+from p2p_node import serialize_sync_block
+from sync_pipeline import BlockPipeline
+from blockchain import Blockchain, create_transaction
+from executor import TaskExecutor
+from pqc_backend import get_backend
+
+# These tests mine blocks right after picking the leader
+pytestmark = pytest.mark.usefixtures("long_slots")
+
+
+def register(address):
+    public_key, secret_key = get_backend().sign_keygen()
+    signature = get_backend().sign(secret_key, f"REGISTER:{address}".encode())
+    return create_transaction("REGISTER", address, "", {
+        "dilithium_pub": base64.b64encode(public_key).decode(),
+        "kyber_pub": "k" * 16,
+        "signature": base64.b64encode(signature).decode(),
+    })
+
+
+def make_chain(registry, blocks: int, prefix: str = "0xsender"):
+    bc = Blockchain(registry)
+    for i in range(blocks):
+        bc.add_transaction(register(f"{prefix}{i}"))
+        bc.mine_block(bc.next_leader())
+    return bc
+
+
+def run_batch(receiver: Blockchain, blocks, start: int, executor=None):
+    async def feed_and_run():
+        frames = asyncio.Queue(4)
+        pipeline = BlockPipeline(receiver, executor, window=4)
+
+        async def feed():
+            for block in blocks:
+                await frames.put(serialize_sync_block(block))
+            await frames.put(serialize_sync_block(None))
+
+        result, _ = await asyncio.gather(pipeline.run(frames, start), feed())
+        return result
+    return asyncio.run(feed_and_run())
+
+
+def test_pipeline_applies_batch_larger_than_window(registry):
+    source = make_chain(registry, 10)
+    receiver = Blockchain(registry)
+    applied, fork = run_batch(receiver, source.chain[1:], 1)
+    assert (applied, fork) == (10, False)
+    assert [b.hash for b in receiver.chain] == [b.hash for b in source.chain]
+
+
+def test_pipeline_reports_fork_and_drains_batch(registry):
+    source = make_chain(registry, 6)
+    receiver = make_chain(registry, 2, prefix="0xother")
+    applied, fork = run_batch(receiver, source.chain[3:], 3)
+    assert (applied, fork) == (0, True)
+    assert len(receiver.chain) == 3
+
+
+def test_pipeline_rejects_block_with_forged_header(registry):
+    source = make_chain(registry, 3)
+    forged = source.chain[2].model_copy(update={"signature": source.chain[1].signature})
+    receiver = Blockchain(registry)
+    applied, fork = run_batch(receiver, [source.chain[1], forged, source.chain[3]], 1)
+    assert (applied, fork) == (1, False)
+    assert len(receiver.chain) == 2
+
+
+def test_pipeline_decodes_hashes_and_verifies_in_pool(registry):
+    source = make_chain(registry, 5)
+    receiver = Blockchain(registry)
+    tampered = source.chain[3].model_copy(update={"validator": "validator_999"})
+    executor = TaskExecutor(cpu_workers=1)
+    try:
+        assert run_batch(receiver, source.chain[1:], 1, executor) == (5, False)
+    finally:
+        executor.shutdown()
+    receiver = Blockchain(registry)
+    try:
+        applied, fork = run_batch(receiver, [source.chain[1], source.chain[2], tampered], 1, executor)
+    finally:
+        executor.shutdown()
+    # Blocks before the bad one may or may not be applied, depending on how far the stages ran ahead
+    assert applied <= 2 and not fork
+    assert len(receiver.chain) == 1 + applied
+    assert executor.operations["sync_verify"].count > 0
@@ -0,0 +1,79 @@
+import base64
+
+import pytest
+
+from blockchain import Blockchain, create_transaction, get_blockchain, verify_block_signatures
+from p2p_node import P2PNode, serialize_block, deserialize_block
+from pqc_backend import get_backend
+
+# These tests mine blocks right after picking the leader
+pytestmark = pytest.mark.usefixtures("long_slots")
+
+
+def register(address):
+    public_key, secret_key = get_backend().sign_keygen()
+    signature = get_backend().sign(secret_key, f"REGISTER:{address}".encode())
+    return create_transaction("REGISTER", address, "", {
+        "dilithium_pub": base64.b64encode(public_key).decode(),
+        "kyber_pub": "k" * 16,
+        "signature": base64.b64encode(signature).decode(),
+    })
+
+
+def test_node_reads_and_writes_the_api_chain(tmp_path, monkeypatch):
+    (tmp_path / "run").mkdir()
+    monkeypatch.chdir(tmp_path / "run")
+    node = P2PNode("127.0.0.1", 18781)
+    assert node.blockchain is get_blockchain()
+
+
+def test_independent_stores_share_genesis(registry):
+    first, second = Blockchain(registry), Blockchain(registry)
+    assert first.chain[0].hash == second.chain[0].hash
+    assert first.validate_chain(second.chain)
+
+
+def test_block_encoding_round_trips(registry):
+    bc = Blockchain(registry)
+    assert bc.add_transaction(register("0xalice"))
+    block = bc.mine_block(bc.next_leader())
+    decoded = deserialize_block(serialize_block(block))
+    assert decoded.hash == block.hash
+    assert Blockchain(registry).validate_block(decoded)
+
+
+def test_replace_chain_adopts_peer_blocks_and_prunes_mempool(registry):
+    tx = register("0xalice")
+    source, receiver = Blockchain(registry), Blockchain(registry)
+    assert source.add_transaction(tx)
+    assert receiver.add_transaction(tx)
+    assert source.mine_block(source.next_leader()) is not None
+
+    tips = []
+    receiver.add_tip_listener(lambda tip, origin: tips.append(tip.hash))
+    assert receiver.replace_chain(source.chain)
+    assert [b.hash for b in receiver.chain] == [b.hash for b in source.chain]
+    assert receiver.pending_transactions == []
+    assert tips == [source.chain[-1].hash]
+    assert receiver.account_keys["0xalice"] == source.account_keys["0xalice"]
+
+
+def test_fork_above_a_common_prefix_is_verified_apart_and_swapped_in(registry):
+    source, receiver = Blockchain(registry), Blockchain(registry)
+    for address in ("0xalice", "0xbob", "0xcarol"):
+        assert source.add_transaction(register(address))
+        assert source.mine_block(source.next_leader()) is not None
+    assert receiver.replace_chain(source.chain[:2])
+    assert receiver.add_transaction(register("0xdave"))
+    assert receiver.mine_block(receiver.next_leader()) is not None
+
+    checks = receiver.fork_verification(2, source.chain[2:])
+    assert checks is not None and all(verify_block_signatures(*check) for check in checks)
+    # The blocks below start must be our own
+    other = Blockchain(registry)
+    assert other.add_transaction(register("0xeve"))
+    assert other.mine_block(other.next_leader()) is not None
+    assert not receiver.replace_chain(other.chain + source.chain[2:], start=2, signatures_verified=True)
+    assert receiver.replace_chain(source.chain, start=2, signatures_verified=True)
+    assert [b.hash for b in receiver.chain] == [b.hash for b in source.chain]
+    assert "0xdave" not in receiver.account_keys and "0xcarol" in receiver.account_keys
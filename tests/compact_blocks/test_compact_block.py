@@ -0,0 +1,104 @@
+import asyncio
+import base64
+
+import pytest
+
+from connection_manager import PeerConnection
+from executor import get_executor
+from p2p_node import (
+    MessageTypesExtended,
+    P2PNode,
+    serialize_block,
+    serialize_compact_block,
+    deserialize_compact_block,
+    serialize_get_block_txn,
+    deserialize_get_block_txn,
+    serialize_block_txn,
+    deserialize_block_txn,
+    short_transaction_id,
+)
+from blockchain import Blockchain, create_transaction
+from pqc_backend import get_backend
+
+# These tests mine blocks right after picking the leader
+pytestmark = pytest.mark.usefixtures("long_slots")
+
+
+def register(address):
+    public_key, secret_key = get_backend().sign_keygen()
+    signature = get_backend().sign(secret_key, f"REGISTER:{address}".encode())
+    return create_transaction("REGISTER", address, "", {
+        "dilithium_pub": base64.b64encode(public_key).decode(),
+        "kyber_pub": "k" * 16,
+        "signature": base64.b64encode(signature).decode(),
+    })
+
+
+def make_block(registry):
+    bc = Blockchain(registry)
+    for i in range(4):
+        bc.add_transaction(register(f"0xsender{i}"))
+    return bc, bc.mine_block(bc.next_leader())
+
+
+def test_compact_block_roundtrip_is_small(registry):
+    _, block = make_block(registry)
+    message = serialize_compact_block(block)
+    header, short_ids = deserialize_compact_block(message)
+    assert message[0] == MessageTypesExtended.COMPACT_BLOCK
+    assert header["hash"] == block.hash
+    assert short_ids == [short_transaction_id(block.hash, tx.compute_hash()) for tx in block.transactions]
+    assert len(message) < len(block.model_dump_json())
+
+
+def test_missing_transactions_request_and_reply(registry):
+    _, block = make_block(registry)
+    block_hash, indexes = deserialize_get_block_txn(serialize_get_block_txn(block.hash, [0, 3]))
+    assert (block_hash, indexes) == (block.hash, [0, 3])
+    block_hash, transactions = deserialize_block_txn(serialize_block_txn(block.hash, [block.transactions[i] for i in indexes]))
+    assert block_hash == block.hash
+    assert [tx.compute_hash() for tx in transactions] == [block.transactions[i].compute_hash() for i in indexes]
+
+
+def test_add_block_drains_mempool(registry):
+    source, block = make_block(registry)
+    receiver = Blockchain(registry)
+    receiver.chain = [source.chain[0]]
+    for tx in block.transactions:
+        receiver.add_transaction(tx)
+    assert receiver.add_block(block)
+    assert receiver.pending_transactions == []
+    assert not receiver.add_block(block)
+
+
+class SilentSocket:
+    async def send(self, message):
+        pass
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def node(registry, tmp_path, monkeypatch):
+    (tmp_path / "run").mkdir()
+    monkeypatch.chdir(tmp_path / "run")
+    node = P2PNode("127.0.0.1", 18793)
+    node.blockchain = Blockchain(registry)
+    return node
+
+
+def test_live_block_is_verified_in_the_executor(registry, node):
+    source, block = make_block(registry)
+    node.blockchain.chain = [source.chain[0]]
+    forged = block.model_copy(update={"signature": base64.b64encode(b"\x00" * 64).decode()})
+    peer = PeerConnection(SilentSocket(), ("127.0.0.1", 18794), inbound=False)
+
+    async def scenario():
+        await node.process_message(serialize_block(forged), peer)
+        assert len(node.blockchain.chain) == 1
+        await node.process_message(serialize_block(block), peer)
+
+    asyncio.run(scenario())
+    assert node.blockchain.chain[-1].hash == block.hash
+    assert get_executor().stats()["operations"]["verify_live_block"]["count"] == 2
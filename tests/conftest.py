@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+# Make the backend modules (config, protocol, blockchain, ...) importable from the tests
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend", "src"))
+
+import blockchain
+from executor import get_executor
+from validator_registry import ValidatorRegistry
+
+
+@pytest.fixture(scope="session")
+def registry():
+    """In-memory validator set with development keys, shared by the tests that only read it."""
+    registry = ValidatorRegistry(persistent=False)
+    registry.create_missing_keys()
+    return registry
+
+
+@pytest.fixture
+def long_slots(monkeypatch):
+    """Leader slots long enough that no slot boundary falls between picking the leader and mining."""
+    monkeypatch.setattr(blockchain, "LEADER_TIMEOUT", 1e9)
+
+
+@pytest.fixture(autouse=True)
+def fresh_executor():
+    """Stops the shared executor after each test, since its lanes belong to the event loop of the test that started them."""
+    yield
+    get_executor().shutdown()
@@ -0,0 +1,110 @@
+import asyncio
+import random
+
+from config import P2P_BACKOFF_BASE, P2P_BACKOFF_MAX
+from address_book import AddressBook
+from connection_manager import ConnectionManager, PeerConnection
+
+
+class FakeSocket:
+    def __init__(self):
+        self.closed = False
+
+    async def send(self, message):
+        pass
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeNode:
+    def __init__(self, node_id: bytes, port: int = 9000):
+        self.host = "127.0.0.1"
+        self.port = port
+        self.node_id = node_id
+
+
+def make_manager(tmp_path, monkeypatch, node_id=b"\x50" * 32, **kwargs):
+    run = tmp_path / "run"
+    run.mkdir(exist_ok=True)
+    monkeypatch.chdir(run)
+    return ConnectionManager(FakeNode(node_id), **kwargs)
+
+
+def test_backoff_doubles_up_to_the_cap(monkeypatch):
+    # Take the upper end of the jitter range, so the delays show the raw schedule
+    monkeypatch.setattr(random, "uniform", lambda low, high: high)
+    book = AddressBook()
+    delays = [book.mark_failure(("10.0.0.1", 8760)) for _ in range(12)]
+    expected = [min(P2P_BACKOFF_MAX, P2P_BACKOFF_BASE * 2 ** i) for i in range(12)]
+    assert delays == expected
+    assert delays[-1] == P2P_BACKOFF_MAX
+    assert ("10.0.0.1", 8760) not in book.candidates(set())
+
+    book.mark_success(("10.0.0.1", 8760))
+    assert book.candidates(set()) == [("10.0.0.1", 8760)]
+    assert book.mark_failure(("10.0.0.1", 8760)) == P2P_BACKOFF_BASE
+
+
+def test_backoff_jitter_stays_in_range():
+    book = AddressBook()
+    for attempt in range(1, 8):
+        delay = book.mark_failure(("10.0.0.2", 8760))
+        ceiling = min(P2P_BACKOFF_MAX, P2P_BACKOFF_BASE * 2 ** (attempt - 1))
+        assert ceiling / 2 <= delay <= ceiling
+
+
+def test_peer_cap(tmp_path, monkeypatch):
+    manager = make_manager(tmp_path, monkeypatch, target_peers=1, max_peers=2)
+    peers = [PeerConnection(FakeSocket(), ("10.0.0.1", 8760 + i), inbound=True) for i in range(3)]
+    assert manager.register(peers[0], b"\x01" * 32, 8760)
+    assert manager.register(peers[1], b"\x02" * 32, 8761)
+    assert not manager.has_capacity()
+    assert not manager.register(peers[2], b"\x03" * 32, 8762)
+    assert len(manager.peers) == 2
+
+    manager.unregister(peers[0])
+    assert manager.register(peers[2], b"\x03" * 32, 8762)
+
+
+def test_self_connection_is_refused(tmp_path, monkeypatch):
+    manager = make_manager(tmp_path, monkeypatch)
+    peer = PeerConnection(FakeSocket(), ("127.0.0.2", 9000), inbound=False)
+    assert not manager.register(peer, manager.node.node_id, 9000)
+    assert not manager.peers
+
+
+def test_duplicate_hello_same_direction_is_refused(tmp_path, monkeypatch):
+    manager = make_manager(tmp_path, monkeypatch)
+    remote = b"\x60" * 32
+    first = PeerConnection(FakeSocket(), ("10.0.0.1", 8760), inbound=False)
+    second = PeerConnection(FakeSocket(), ("10.0.0.1", 8760), inbound=False)
+    assert manager.register(first, remote, 8760)
+    assert not manager.register(second, remote, 8760)
+    assert manager.peers[remote] is first
+
+
+def test_duplicate_hello_keeps_the_socket_dialed_by_the_lower_node_id(tmp_path, monkeypatch):
+    async def scenario():
+        remote = b"\x60" * 32
+        # Our id is lower: both ends keep the socket we dialed
+        low = make_manager(tmp_path, monkeypatch, node_id=b"\x10" * 32)
+        inbound = PeerConnection(FakeSocket(), ("10.0.0.1", 50000), inbound=True)
+        outbound = PeerConnection(FakeSocket(), ("10.0.0.1", 8760), inbound=False)
+        assert low.register(inbound, remote, 8760)
+        assert low.register(outbound, remote, 8760)
+        assert low.peers[remote] is outbound
+        await asyncio.sleep(0)
+        assert inbound.websocket.closed
+
+        # Our id is higher: the socket the remote dialed wins, whatever arrives first
+        high = make_manager(tmp_path, monkeypatch, node_id=b"\x90" * 32)
+        inbound = PeerConnection(FakeSocket(), ("10.0.0.1", 50001), inbound=True)
+        outbound = PeerConnection(FakeSocket(), ("10.0.0.1", 8760), inbound=False)
+        assert high.register(outbound, remote, 8760)
+        assert high.register(inbound, remote, 8760)
+        assert high.peers[remote] is inbound
+        assert inbound.address == ("10.0.0.1", 8760)
+        await asyncio.sleep(0)
+        assert outbound.websocket.closed
+    asyncio.run(scenario())
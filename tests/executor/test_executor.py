@@ -0,0 +1,95 @@
+import asyncio
+import math
+import os
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from config import API_WORKERS_ENV, KEY_POOL_SIZE
+from executor import TaskExecutor, default_cpu_workers
+from key_pool import KeyPool
+
+
+def test_full_queue_is_rejected_with_503():
+    async def main():
+        executor = TaskExecutor(cpu_workers=1, io_workers=1, cpu_queue=1, io_queue=1)
+        executor.start()
+        try:
+            tasks = [asyncio.create_task(executor.run_io("sleep", time.sleep, 0.2)) for _ in range(3)]
+            return await asyncio.gather(*tasks, return_exceptions=True), executor.stats()
+        finally:
+            executor.shutdown()
+
+    results, stats = asyncio.run(main())
+    rejected = [r for r in results if isinstance(r, HTTPException)]
+    assert len(rejected) == 1 and rejected[0].status_code == 503
+    assert stats["operations"]["sleep"]["count"] == 2
+    assert stats["operations"]["sleep"]["rejected"] == 1
+    assert stats["operations"]["sleep"]["p99_ms"] >= 150
+
+
+def test_cpu_work_runs_in_process_pool_and_is_timed():
+    async def main():
+        executor = TaskExecutor(cpu_workers=2)
+        try:
+            results = await asyncio.gather(*(executor.run_cpu("factorial", math.factorial, 2000) for _ in range(4)))
+            with pytest.raises(ValueError):
+                await executor.run_cpu("factorial", math.factorial, -1)
+            return results, executor.stats()
+        finally:
+            executor.shutdown()
+
+    results, stats = asyncio.run(main())
+    assert all(r == math.factorial(2000) for r in results)
+    assert stats["operations"]["factorial"]["count"] == 5
+    assert stats["operations"]["factorial"]["errors"] == 1
+
+
+def test_cancelled_request_keeps_its_slot_until_the_job_ends():
+    async def main():
+        executor = TaskExecutor(cpu_workers=1, io_workers=1, cpu_queue=1, io_queue=1)
+        executor.start()
+        try:
+            task = asyncio.create_task(executor.run_io("sleep", time.sleep, 0.3))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            await asyncio.sleep(0.05)
+            held = executor.io.running, executor.io.slots.locked()
+            await asyncio.sleep(0.3)
+            return held, (executor.io.running, executor.io.slots.locked())
+        finally:
+            executor.shutdown()
+
+    assert asyncio.run(main()) == ((1, True), (0, False))
+
+
+def test_background_work_waits_instead_of_being_refused():
+    async def main():
+        executor = TaskExecutor(cpu_workers=1, cpu_queue=1)
+        try:
+            results = await asyncio.gather(*(executor.run_cpu_background("factorial", math.factorial, 10) for _ in range(4)))
+            return results, executor.stats()
+        finally:
+            executor.shutdown()
+
+    results, stats = asyncio.run(main())
+    assert results == [math.factorial(10)] * 4
+    assert stats["operations"]["factorial"]["rejected"] == 0
+
+
+def test_api_workers_share_the_cores_and_the_key_pool(monkeypatch):
+    monkeypatch.setattr(os, "cpu_count", lambda: 8)
+    monkeypatch.delenv(API_WORKERS_ENV, raising=False)
+    executor = TaskExecutor()
+    assert executor.cpu_workers == 8
+
+    # The shared executor exists before main.py sets the worker count, so start() resolves its share again
+    monkeypatch.setenv(API_WORKERS_ENV, "3")
+    assert default_cpu_workers() == 2
+    executor.start()
+    try:
+        assert executor.cpu_workers == 2
+        assert KeyPool(executor).size == KEY_POOL_SIZE // 3
+    finally:
+        executor.shutdown()
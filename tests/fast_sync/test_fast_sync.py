@@ -0,0 +1,139 @@
+import asyncio
+import base64
+
+import pytest
+
+from blockchain import Block, Blockchain, create_transaction
+from executor import get_executor
+from p2p_node import serialize_sync_block
+from pqc_backend import get_backend
+from sync_pipeline import BlockAuditor, BlockPipeline
+from validator_registry import ValidatorRegistry
+
+# These tests mine blocks right after picking the leader
+pytestmark = pytest.mark.usefixtures("long_slots")
+
+
+class FakeSync:
+    def __init__(self):
+        self.scheduled = 0
+
+    def schedule(self):
+        self.scheduled += 1
+
+
+class FakeNode:
+    def __init__(self, blockchain: Blockchain):
+        self.blockchain = blockchain
+        self.fast_sync = True
+        self.sync = FakeSync()
+
+
+def register(address, forged: bool = False):
+    public_key, secret_key = get_backend().sign_keygen()
+    if forged:
+        _, secret_key = get_backend().sign_keygen()
+    signature = get_backend().sign(secret_key, f"REGISTER:{address}".encode())
+    return create_transaction("REGISTER", address, "", {
+        "dilithium_pub": base64.b64encode(public_key).decode(),
+        "kyber_pub": "k" * 16,
+        "signature": base64.b64encode(signature).decode(),
+    })
+
+
+def append_signed(registry, bc: Blockchain, transactions) -> Block:
+    """Appends a block signed by the scheduled leader without checking its transactions, as a dishonest validator would."""
+    prev = bc.chain[-1]
+    block = Block(index=prev.index + 1, validator=bc.next_leader(), transactions=transactions, prev_hash=prev.hash)
+    block.signature = registry.sign_block(block.validator, block.hash)
+    assert bc.commit_block(block) is not None
+    return block
+
+
+def make_chain(registry, bad_at: int = 0, blocks: int = 4) -> Blockchain:
+    bc = Blockchain(registry)
+    for i in range(1, blocks + 1):
+        append_signed(registry, bc, [register(f"0xuser{i}", forged=i == bad_at)])
+    return bc
+
+
+def sync(receiver: Blockchain, blocks, auditor=None):
+    async def run():
+        frames = asyncio.Queue()
+        for block in blocks:
+            frames.put_nowait(serialize_sync_block(block))
+        frames.put_nowait(serialize_sync_block(None))
+        return await BlockPipeline(receiver, auditor=auditor).run(frames, 1)
+    return asyncio.run(run())
+
+
+def audit(auditor: BlockAuditor, blocks: int):
+    """Runs the auditor until it has confirmed the blocks or rolled the chain back."""
+    async def run():
+        task = asyncio.create_task(auditor.run())
+        try:
+            while auditor.audited < blocks and auditor.node.fast_sync:
+                await asyncio.sleep(0.01)
+        finally:
+            task.cancel()
+            get_executor().shutdown()
+    asyncio.run(asyncio.wait_for(run(), 60))
+
+
+def test_fast_sync_appends_on_header_and_audit_confirms(registry):
+    source = make_chain(registry)
+    receiver = Blockchain(registry)
+    node = FakeNode(receiver)
+    auditor = BlockAuditor(node)
+    assert sync(receiver, source.chain[1:], auditor) == (4, False)
+    assert auditor.pending == 4
+    assert not receiver.is_verified(source.chain[1].transactions[0].compute_hash())
+
+    audit(auditor, 4)
+    assert auditor.audited == 4
+    assert receiver.is_verified(source.chain[1].transactions[0].compute_hash())
+    assert len(receiver.chain) == 5 and node.fast_sync
+
+
+def test_audit_failure_rolls_back_and_leaves_fast_sync(registry):
+    source = make_chain(registry, bad_at=3)
+    # Full verification refuses the bad block outright
+    assert sync(Blockchain(registry), source.chain[1:]) == (2, False)
+
+    receiver = Blockchain(registry)
+    node = FakeNode(receiver)
+    auditor = BlockAuditor(node)
+    assert sync(receiver, source.chain[1:], auditor) == (4, False)
+    audit(auditor, 4)
+    assert [b.hash for b in receiver.chain] == [b.hash for b in source.chain[:3]]
+    assert not node.fast_sync
+    assert node.sync.scheduled == 1
+    assert "0xuser3" not in receiver.account_keys
+
+
+def test_rollback_drops_blocks_and_their_registrations(registry):
+    bc = make_chain(registry)
+    tips = []
+    bc.add_tip_listener(lambda tip, origin: tips.append(tip.index))
+    assert not bc.rollback(0)
+    assert not bc.rollback(len(bc.chain))
+    assert bc.rollback(2)
+    assert len(bc.chain) == 2
+    assert tips == [1]
+    assert set(bc.account_keys) == {"0xuser1"}
+    # The chain grows again from the new tip
+    append_signed(registry, bc, [register("0xuser9")])
+    assert bc.validate_chain(bc.chain)
+
+
+def test_signing_never_generates_keys(registry):
+    registry = ValidatorRegistry(["validator_009"], persistent=False)
+    assert registry.sign_block("validator_009", "00" * 32) is None
+    assert registry.public_key("validator_009") is None
+    bc = Blockchain(registry)
+    assert bc.add_transaction(register("0xuser1"))
+    assert bc.mine_block("validator_009") is None
+
+    assert registry.create_missing_keys() == ["validator_009"]
+    assert registry.create_missing_keys() == []
+    assert bc.mine_block("validator_009") is not None
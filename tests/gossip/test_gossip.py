@@ -0,0 +1,82 @@
+import asyncio
+import base64
+
+from blockchain import Blockchain, create_transaction
+from connection_manager import PeerConnection
+from executor import get_executor
+from p2p_node import P2PNode
+from pqc_backend import get_backend
+
+
+class SilentSocket:
+    async def send(self, message):
+        pass
+
+    async def close(self):
+        pass
+
+
+def register(address, public_key, secret_key):
+    signature = get_backend().sign(secret_key, f"REGISTER:{address}".encode())
+    return create_transaction("REGISTER", address, "", {
+        "dilithium_pub": base64.b64encode(public_key).decode(),
+        "kyber_pub": "k" * 16,
+        "signature": base64.b64encode(signature).decode(),
+    })
+
+
+def make_node(registry, port: int) -> P2PNode:
+    node = P2PNode("127.0.0.1", port)
+    node.blockchain = Blockchain(registry)
+    # Only dial the peers the test connects explicitly
+    node.connections.address_book.entries.clear()
+    return node
+
+
+async def wait_for(condition, timeout: float = 20.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not reached in time"
+        await asyncio.sleep(0.05)
+
+
+def test_transaction_gossips_between_nodes(registry, tmp_path, monkeypatch):
+    (tmp_path / "run").mkdir()
+    monkeypatch.chdir(tmp_path / "run")
+    public_key, secret_key = get_backend().sign_keygen()
+    tx = register("0xalice", public_key, secret_key)
+
+    async def scenario():
+        first, second = make_node(registry, 18771), make_node(registry, 18772)
+        await first.start()
+        await second.start()
+        try:
+            await second.connect_to_peer("127.0.0.1", 18771)
+            await wait_for(lambda: first.connections.peers and second.connections.peers)
+            assert first.blockchain.add_transaction(tx)
+            await wait_for(lambda: second.blockchain.pending_transactions)
+            assert second.blockchain.pending_transactions[0].compute_hash() == tx.compute_hash()
+            # Relayed transactions are verified in the CPU pool, not on the event loop
+            assert get_executor().operations["verify_relayed_transaction"].count >= 1
+        finally:
+            await second.stop()
+            await first.stop()
+    asyncio.run(scenario())
+    get_executor().shutdown()
+
+
+def test_forged_relayed_transaction_is_rejected(registry, tmp_path, monkeypatch):
+    (tmp_path / "run").mkdir()
+    monkeypatch.chdir(tmp_path / "run")
+    public_key, _ = get_backend().sign_keygen()
+    _, other_secret = get_backend().sign_keygen()
+    forged = register("0xalice", public_key, other_secret)
+    node = make_node(registry, 18773)
+    peer = PeerConnection(SilentSocket(), ("127.0.0.1", 18774), inbound=True)
+
+    async def scenario():
+        return await node.admit_transaction(forged, peer)
+    assert not asyncio.run(scenario())
+    assert not node.blockchain.pending_transactions
+    assert peer.knows_transaction(forged.compute_hash())
+    get_executor().shutdown()
@@ -0,0 +1,68 @@
+import base64
+import hashlib
+import sqlite3
+
+import local_database
+from blockchain import Blockchain, create_transaction
+from encryption import unwrap_key
+from kyber import generate_kyber_keys, recover_shared_key
+from pqc_backend import get_backend
+from routes.messages_route import wrap_for_recipients
+
+
+def test_every_recipient_unwraps_the_content_key():
+    keypairs = [generate_kyber_keys() for _ in range(3)]
+    content_key = bytes(range(32))
+
+    wraps = wrap_for_recipients([public_key for public_key, _ in keypairs], content_key)
+
+    assert len({kem_ciphertext for kem_ciphertext, _ in wraps}) == 3
+    for (_, secret_key), (kem_ciphertext, wrapped) in zip(keypairs, wraps):
+        assert unwrap_key(recover_shared_key(secret_key, kem_ciphertext), wrapped) == content_key
+
+
+def test_group_message_is_stored_once_with_a_wrap_per_recipient(tmp_path, monkeypatch):
+    # The database lives at ../database relative to the working directory
+    (tmp_path / "run").mkdir()
+    monkeypatch.chdir(tmp_path / "run")
+    local_database.init_db()
+
+    wraps = {f"0xreceiver{i}": (f"kem{i}", f"wrap{i}") for i in range(4)}
+    message_id = local_database.add_group_message("0xsender", "payload", "now", "sig", wraps)
+
+    with sqlite3.connect(local_database.DATABASE) as db:
+        assert db.execute("SELECT COUNT(*), MAX(content) FROM messages").fetchone() == (1, "payload")
+        stored = db.execute("SELECT receiver, kem_ciphertext, wrapped_key FROM message_wraps WHERE message_id = ?", (message_id,)).fetchall()
+    assert {receiver: (kem, wrapped) for receiver, kem, wrapped in stored} == wraps
+
+
+def group_message(address, secret_key, text):
+    message_hash = hashlib.sha256(text.encode()).hexdigest()
+    signature = get_backend().sign(secret_key, message_hash.encode())
+    return create_transaction("GROUP_MESSAGE", address, "group", {
+        "message_hash": message_hash,
+        "signature": base64.b64encode(signature).decode(),
+        "blob": "b" * 64,
+        "size": "32",
+        "wraps": "{}",
+    })
+
+
+def test_group_messages_are_checked_against_the_registered_key(registry):
+    alice_pub, alice_priv = get_backend().sign_keygen()
+    _, mallory_priv = get_backend().sign_keygen()
+    signature = get_backend().sign(alice_priv, b"REGISTER:0xalice")
+    bc = Blockchain(registry)
+
+    assert not bc.add_transaction(group_message("0xalice", alice_priv, "too early"))
+    assert bc.add_transaction(create_transaction("REGISTER", "0xalice", "", {
+        "dilithium_pub": base64.b64encode(alice_pub).decode(),
+        "kyber_pub": "k" * 16,
+        "signature": base64.b64encode(signature).decode(),
+    }))
+    assert bc.add_transaction(group_message("0xalice", alice_priv, "hello"))
+    assert not bc.add_transaction(group_message("0xalice", mallory_priv, "forged"))
+
+    unsigned = group_message("0xalice", alice_priv, "unsigned")
+    del unsigned.data["signature"]
+    assert not bc.add_transaction(unsigned)
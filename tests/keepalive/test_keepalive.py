@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+import pytest
+
+from protocol import MessageTypes, serialize_ping, deserialize_ping
+from connection_manager import PeerConnection, RTT_SMOOTHING
+from p2p_node import P2PNode
+
+
+class RecordingSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def node(tmp_path, monkeypatch):
+    (tmp_path / "run").mkdir()
+    monkeypatch.chdir(tmp_path / "run")
+    return P2PNode("127.0.0.1", 9100)
+
+
+def answer(peer: PeerConnection, elapsed: float) -> bytes:
+    """Sends a PING and returns the PONG a peer would send `elapsed` seconds later."""
+    nonce = deserialize_ping(peer.start_ping())
+    peer._ping_sent_at = time.monotonic() - elapsed
+    return serialize_ping(nonce, pong=True)
+
+
+def test_pong_updates_smoothed_rtt(node):
+    peer = PeerConnection(RecordingSocket(), ("127.0.0.1", 9101), inbound=False)
+
+    async def scenario():
+        await node.receive(answer(peer, 0.2), peer)
+        first = peer.rtt
+        await node.receive(answer(peer, 0.1), peer)
+        return first, peer.rtt
+
+    first, second = asyncio.run(scenario())
+    assert first == pytest.approx(0.2, abs=0.01)
+    assert second == pytest.approx((1 - RTT_SMOOTHING) * first + RTT_SMOOTHING * 0.1, abs=0.01)
+    assert not peer.ping_outstanding
+    assert peer.missed_pings == 0
+
+
+def test_pong_with_foreign_nonce_is_ignored(node):
+    peer = PeerConnection(RecordingSocket(), ("127.0.0.1", 9101), inbound=False)
+    peer.start_ping()
+    asyncio.run(node.receive(serialize_ping(b"\x00" * 8, pong=True), peer))
+    assert peer.rtt is None
+    assert peer.ping_outstanding
+
+
+def test_ping_is_answered_with_matching_pong(node):
+    socket = RecordingSocket()
+    peer = PeerConnection(socket, ("127.0.0.1", 9101), inbound=True)
+    asyncio.run(node.receive(serialize_ping(b"\x07" * 8), peer))
+    assert len(socket.sent) == 1
+    assert socket.sent[0][0] == MessageTypes.PONG
+    assert deserialize_ping(socket.sent[0]) == b"\x07" * 8
+
+
+def test_missed_ping_lowers_liveness():
+    peer = PeerConnection(RecordingSocket(), ("127.0.0.1", 9101), inbound=False)
+    peer.start_ping()
+    assert not peer.check_ping_timeout(time.monotonic())
+    assert peer.check_ping_timeout(time.monotonic() + 3600)
+    assert peer.missed_pings == 1
+    assert peer.liveness < 1.0
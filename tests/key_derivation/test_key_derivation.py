@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from executor import TaskExecutor
+from key_derivation import derive_dilithium_keypair, derive_identity, derive_kyber_keypair
+from mnemonics import WORD_INDICES, entropy_to_mnemonic, generate_mnemonic_phrase, mnemonic_to_entropy
+
+
+def test_mnemonic_checksum_round_trips_and_rejects_bad_phrases():
+    entropy = bytes(range(20))
+    words = entropy_to_mnemonic(entropy)
+    assert mnemonic_to_entropy(" ".join(words)) == entropy
+
+    # Swapping the last word breaks the checksum
+    other = next(w for w in WORD_INDICES if w != words[-1])
+    with pytest.raises(ValueError, match="checksum"):
+        mnemonic_to_entropy(" ".join(words[:-1] + [other]))
+    with pytest.raises(ValueError, match="Unknown"):
+        mnemonic_to_entropy(" ".join(words[:-1] + ["notaword"]))
+    with pytest.raises(ValueError, match="words"):
+        mnemonic_to_entropy(" ".join(words[:-1]))
+
+
+def test_identity_matches_separate_derivations():
+    mnemonic = generate_mnemonic_phrase(15)
+
+    async def main():
+        executor = TaskExecutor(cpu_workers=2)
+        executor.start()
+        try:
+            identity = await derive_identity(mnemonic, executor)
+            with pytest.raises(ValueError):
+                await derive_identity(mnemonic + " " + mnemonic.split()[0], executor)
+            return identity, executor.stats()
+        finally:
+            executor.shutdown()
+
+    (dilithium, kyber), stats = asyncio.run(main())
+    assert dilithium == derive_dilithium_keypair(mnemonic)
+    assert kyber == derive_kyber_keypair(mnemonic)
+    assert stats["operations"]["mnemonic_seed"]["count"] == 1
+
+
+def test_words_listed_twice_decode_with_either_index():
+    word = next(w for w, indices in WORD_INDICES.items() if len(indices) > 1)
+    for index in WORD_INDICES[word]:
+        entropy = (index << (128 - 11)).to_bytes(16, byteorder="big")
+        words = entropy_to_mnemonic(entropy)
+        assert words[0] == word
+        # Both readings may pass the checksum; either one spells the same phrase
+        assert entropy_to_mnemonic(mnemonic_to_entropy(" ".join(words))) == words
+
+
+def test_identity_ignores_spacing_and_compatibility_characters():
+    words = entropy_to_mnemonic(bytes(range(16)))
+    # Fullwidth letters decompose to ASCII under NFKD
+    fullwidth = "".join(chr(ord(c) + 0xFEE0) for c in words[0])
+    typed = "  " + "　".join([fullwidth] + words[1:]) + "\n"
+
+    async def main():
+        return await derive_identity(typed), await derive_identity(" ".join(words))
+
+    identity, expected = asyncio.run(main())
+    assert identity == expected
+    assert identity[0] == derive_dilithium_keypair(typed)
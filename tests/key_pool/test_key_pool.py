@@ -0,0 +1,33 @@
+import asyncio
+
+from executor import TaskExecutor
+from key_pool import KeyPool
+
+
+def test_pool_fills_in_background_and_falls_back_when_empty():
+    async def main():
+        executor = TaskExecutor(cpu_workers=1)
+        executor.start()
+        pool = KeyPool(executor, size=4, batch=2, idle_wait=0.01)
+        try:
+            # Empty buffer: generated on demand
+            first = await pool.get("kyber")
+
+            pool.start()
+            while pool.stats()["fill"] != {"dilithium": 4, "kyber": 4}:
+                await asyncio.sleep(0.01)
+            taken = [await pool.get("dilithium") for _ in range(3)]
+
+            # Taking keys wakes the refill task, which tops the buffer up again
+            while pool.stats()["fill"]["dilithium"] < 4:
+                await asyncio.sleep(0.01)
+            return first, taken, pool.stats()
+        finally:
+            await pool.stop()
+            executor.shutdown()
+
+    first, taken, stats = asyncio.run(main())
+    assert len(first) == 2
+    assert len({public_key for public_key, _ in taken}) == 3
+    assert (stats["hits"], stats["misses"]) == (3, 1)
+    assert stats["generated"] == 11
@@ -0,0 +1,65 @@
+import base64
+from datetime import datetime, timedelta
+
+import blockchain
+from blockchain import Block, Blockchain, create_transaction, slot_rank
+from config import LEADER_TIMEOUT
+from pqc_backend import get_backend
+
+
+def register(address):
+    public_key, secret_key = get_backend().sign_keygen()
+    signature = get_backend().sign(secret_key, f"REGISTER:{address}".encode())
+    return create_transaction("REGISTER", address, "", {
+        "dilithium_pub": base64.b64encode(public_key).decode(),
+        "kyber_pub": "k" * 16,
+        "signature": base64.b64encode(signature).decode(),
+    })
+
+
+def test_leader_rotates_and_falls_back_after_timeout(registry):
+    assert registry.validators_at(1) == ["validator_001", "validator_002"]
+    assert [registry.leader(height) for height in (1, 2, 3)] == ["validator_002", "validator_001", "validator_002"]
+
+    bc = Blockchain(registry)
+    parent = bc.chain[-1]
+    late = (datetime.fromisoformat(parent.timestamp) + timedelta(seconds=LEADER_TIMEOUT * 1.5)).isoformat()
+    assert bc.scheduled_leader(1, parent, parent.timestamp) == "validator_002"
+    assert bc.scheduled_leader(1, parent, late) == "validator_001"
+
+
+def test_only_scheduled_leader_produces_blocks(registry, long_slots):
+    bc = Blockchain(registry)
+    leader = bc.next_leader()
+    other = next(v for v in registry.validators if v != leader)
+
+    bc.add_transaction(register("0xsender"))
+    assert bc.mine_block(other) is None
+    block = bc.mine_block(leader)
+    assert block is not None
+
+    # A block claiming the same slot for another validator is rejected
+    forged = Block(index=1, validator=other, transactions=block.transactions,
+                   prev_hash=block.prev_hash, timestamp=block.timestamp)
+    forged.signature = registry.sign_block(other, forged.hash)
+    assert not Blockchain(registry).validate_block(forged)
+
+
+def test_backdated_and_future_blocks_are_rejected(registry, monkeypatch):
+    monkeypatch.setattr(blockchain, "LEADER_TIMEOUT", 10.0)
+    bc = Blockchain(registry)
+    genesis = bc.chain[0]
+
+    def signed_block(timestamp: datetime) -> Block:
+        rank = slot_rank(genesis.timestamp, timestamp.isoformat())
+        block = Block(index=1, validator=registry.leader(1, rank), transactions=[],
+                      prev_hash=genesis.hash, timestamp=timestamp.isoformat())
+        block.signature = registry.sign_block(block.validator, block.hash)
+        return block
+
+    now = datetime.utcnow()
+    backdated = signed_block(datetime.fromisoformat(genesis.timestamp) + timedelta(seconds=5))
+    assert bc.validate_block(backdated)
+    assert not bc.validate_block(backdated, live=True)
+    assert bc.validate_block(signed_block(now), live=True)
+    assert not bc.validate_block(signed_block(now + timedelta(seconds=60)))
@@ -0,0 +1,124 @@
+import asyncio
+import base64
+
+import pytest
+
+from blockchain import Blockchain, create_transaction
+from config import P2P_BAN_SCORE
+from connection_manager import PeerConnection
+from executor import get_executor
+from p2p_node import (
+    MALFORMED_PENALTY,
+    OVER_BUDGET_PENALTY,
+    UNSOLICITED_PENALTY,
+    MessageTypesExtended,
+    P2PNode,
+    serialize_blob,
+    serialize_get_blocks,
+    serialize_sync_block,
+    serialize_transaction,
+)
+from pqc_backend import get_backend
+from rate_limit import TokenBucket
+
+
+class SilentSocket:
+    async def send(self, message):
+        pass
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def node(registry, tmp_path, monkeypatch):
+    (tmp_path / "run").mkdir()
+    monkeypatch.chdir(tmp_path / "run")
+    node = P2PNode("127.0.0.1", 18801)
+    node.blockchain = Blockchain(registry)
+    return node
+
+
+def connect(node: P2PNode) -> PeerConnection:
+    peer = PeerConnection(SilentSocket(), ("127.0.0.1", 18802), inbound=False)
+    assert node.connections.register(peer, b"\x42" * 32, 18802)
+    return peer
+
+
+def register(address):
+    public_key, secret_key = get_backend().sign_keygen()
+    signature = get_backend().sign(secret_key, f"REGISTER:{address}".encode())
+    return create_transaction("REGISTER", address, "", {
+        "dilithium_pub": base64.b64encode(public_key).decode(),
+        "kyber_pub": "k" * 16,
+        "signature": base64.b64encode(signature).decode(),
+    })
+
+
+def test_messages_over_budget_are_dropped_and_penalised(node):
+    peer = connect(node)
+    # No refill, room for two GET_BLOCKS
+    peer.msg_budget = TokenBucket(0.0, 40)
+
+    async def scenario():
+        for _ in range(3):
+            await node.receive(serialize_get_blocks(1, 10), peer)
+
+    asyncio.run(scenario())
+    assert peer.inbox.qsize() == 2
+    assert peer.misbehavior == pytest.approx(OVER_BUDGET_PENALTY, rel=0.01)
+
+
+def test_requested_replies_cost_nothing(node):
+    peer = connect(node)
+    peer.msg_budget = TokenBucket(0.0, 1)
+
+    async def scenario():
+        frames = peer.open_stream(MessageTypesExtended.SYNC_BLOCK, 8)
+        for _ in range(5):
+            await node.receive(serialize_sync_block(node.blockchain.chain[0]), peer)
+        return frames.qsize()
+
+    assert asyncio.run(scenario()) == 5
+    assert peer.misbehavior == 0
+
+
+def test_transactions_over_budget_are_penalised(node):
+    peer = connect(node)
+    peer.tx_budget = TokenBucket(0.0, 2)
+    transactions = [register(f"0xuser{i}") for i in range(3)]
+
+    async def scenario():
+        for tx in transactions:
+            await node.process_message(serialize_transaction(tx), peer)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        get_executor().shutdown()
+    assert len(node.blockchain.pending_transactions) == 2
+    assert peer.misbehavior == pytest.approx(OVER_BUDGET_PENALTY, rel=0.01)
+
+
+def test_unsolicited_reply_is_penalised(node):
+    peer = connect(node)
+    asyncio.run(node.process_message(serialize_blob("ab" * 32, 0, 1, b"data"), peer))
+    assert peer.misbehavior == pytest.approx(UNSOLICITED_PENALTY, rel=0.01)
+
+
+def test_repeated_misbehavior_bans_the_peer(node):
+    peer = connect(node)
+    malformed_tip = bytes([MessageTypesExtended.TIP, 0x01])
+
+    async def scenario():
+        # One more than the exact count, since the score decays between offences
+        for _ in range(P2P_BAN_SCORE // MALFORMED_PENALTY + 1):
+            await node.process_message(malformed_tip, peer)
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert peer.node_id not in node.connections.peers
+    assert node.connections.address_book.is_banned(peer.address)
+    # A banned address cannot come back under a new connection
+    again = PeerConnection(SilentSocket(), ("127.0.0.1", 18802), inbound=False)
+    assert not node.connections.register(again, b"\x43" * 32, 18802)
@@ -0,0 +1,40 @@
+from protocol import (
+    MessageTypes,
+    encode_varint,
+    decode_varint,
+    serialize_peer_list,
+    deserialize_peer_list,
+)
+import pytest
+
+
+def test_varint_roundtrip():
+    for value in (0, 1, 127, 128, 255, 300, 16384, 2**32 + 5):
+        encoded = encode_varint(value)
+        assert decode_varint(b"\x00" + encoded, 1) == (value, 1 + len(encoded))
+    assert len(encode_varint(127)) == 1
+    assert len(encode_varint(128)) == 2
+
+
+def test_peer_list_mixed_families():
+    peers = [("127.0.0.1", 8760, 1700000000), ("::1", 8761, 1700000001), ("2001:db8::7", 65535, 0)]
+    message = serialize_peer_list(peers)
+    assert message[0] == MessageTypes.PEER_LIST
+    assert deserialize_peer_list(message) == peers
+
+
+def test_peer_list_above_single_byte_count():
+    peers = [(f"10.0.{i // 256}.{i % 256}", 8000 + i % 1000, 1700000000) for i in range(600)]
+    assert deserialize_peer_list(serialize_peer_list(peers)) == peers
+
+
+def test_peer_list_skips_hostnames():
+    assert deserialize_peer_list(serialize_peer_list([("localhost", 8760, 0)])) == []
+
+
+def test_peer_list_rejects_oversized_and_truncated():
+    message = serialize_peer_list([("127.0.0.1", 8760, 0)] * 3)
+    with pytest.raises(ValueError):
+        deserialize_peer_list(message, max_count=2)
+    with pytest.raises(ValueError):
+        deserialize_peer_list(message[:-1])
@@ -0,0 +1,30 @@
+import pqc_backend
+from pqc_backend import PurePythonBackend, REFERENCE_BACKEND, self_test, select_backend
+
+
+class TruncatingBackend(PurePythonBackend):
+    """Signs like the reference but emits signatures the reference cannot parse."""
+    name = "truncating"
+
+    def sign(self, secret_key, message):
+        return super().sign(secret_key, message)[:-1]
+
+
+def test_auto_selection_falls_back_to_pure_python_and_rejects_incompatible_backends(monkeypatch):
+    assert self_test(PurePythonBackend()) is None
+    assert "rejected a signature made by truncating" in self_test(TruncatingBackend())
+
+    monkeypatch.setattr(pqc_backend, "BACKENDS", {"native": TruncatingBackend, "pure": PurePythonBackend})
+    monkeypatch.setattr(pqc_backend, "_backend", None)
+    backend = select_backend("auto")
+    assert backend is REFERENCE_BACKEND
+    assert "self-test failed" in pqc_backend.describe_backend()["skipped"]["native"]
+
+
+def test_seeded_keygen_is_deterministic():
+    seed = bytes(range(64))
+    assert REFERENCE_BACKEND.sign_keygen_from_seed(seed[:32]) == REFERENCE_BACKEND.sign_keygen_from_seed(seed[:32])
+    public_key, secret_key = REFERENCE_BACKEND.kem_keygen_from_seed(seed)
+    assert public_key == REFERENCE_BACKEND.kem_keygen_from_seed(seed)[0]
+    shared_key, ciphertext = REFERENCE_BACKEND.encaps(public_key)
+    assert REFERENCE_BACKEND.decaps(secret_key, ciphertext) == shared_key
@@ -0,0 +1,75 @@
+import asyncio
+
+import local_database
+from blockchain import Block, create_transaction
+from executor import TaskExecutor
+from kyber import generate_kyber_keys, recover_shared_key
+from sessions import SessionManager, derive_message_key, introduced_sessions
+
+
+def test_message_keys_are_distinct_per_counter():
+    secret = bytes(32)
+    assert derive_message_key(secret, "s", 1) == derive_message_key(secret, "s", 1)
+    assert len({derive_message_key(secret, "s", n) for n in range(1, 6)}) == 5
+    assert derive_message_key(secret, "s", 1) != derive_message_key(secret, "t", 1)
+
+
+def test_pair_reuses_one_encapsulation_until_rekey(tmp_path, monkeypatch):
+    # The database lives at ../database relative to the working directory
+    (tmp_path / "run").mkdir()
+    monkeypatch.chdir(tmp_path / "run")
+    local_database.init_db()
+    public_key, secret_key = generate_kyber_keys()
+
+    async def main():
+        executor = TaskExecutor(cpu_workers=1)
+        executor.start()
+        manager = SessionManager(executor, max_messages=3)
+        try:
+            return [await manager.message_key("alice", "bob", public_key) for _ in range(5)]
+        finally:
+            executor.shutdown()
+
+    results = asyncio.run(main())
+    sessions = [session.session_id for session, _, _ in results]
+    assert [counter for _, counter, _ in results] == [1, 2, 3, 1, 2]
+    assert sessions[0] == sessions[1] == sessions[2] != sessions[3] == sessions[4]
+
+    # The recipient recovers every message key from the ciphertext of the session's first message
+    for session, counter, key in results:
+        shared_secret = recover_shared_key(secret_key, session.kem_ciphertext)
+        assert derive_message_key(shared_secret, session.session_id, counter) == key
+
+
+def test_ciphertext_rides_until_confirmed_and_cache_is_bounded(tmp_path, monkeypatch):
+    (tmp_path / "run").mkdir()
+    monkeypatch.chdir(tmp_path / "run")
+    local_database.init_db()
+    public_key, _ = generate_kyber_keys()
+
+    async def main():
+        executor = TaskExecutor(cpu_workers=1)
+        executor.start()
+        manager = SessionManager(executor, cache_size=1)
+        try:
+            first, _, _ = await manager.message_key("alice", "bob", public_key)
+            second, counter, _ = await manager.message_key("alice", "bob", public_key)
+            unconfirmed = (first.kem_confirmed, second.kem_confirmed, counter)
+
+            tx = create_transaction("PRIVATE_MESSAGE", "alice", "bob", {
+                "session_id": first.session_id, "counter": "1", "kyber_ciphertext": "c" * 16,
+            })
+            block = Block(index=1, validator="validator_001", transactions=[tx], prev_hash="0" * 64)
+            assert introduced_sessions(block) == [first.session_id]
+            local_database.confirm_sessions(introduced_sessions(block))
+            third, _, _ = await manager.message_key("alice", "bob", public_key)
+
+            await manager.message_key("alice", "carol", public_key)
+            return unconfirmed, third.kem_confirmed, list(manager._sessions), manager._locks
+        finally:
+            executor.shutdown()
+
+    unconfirmed, confirmed, cached, locks = asyncio.run(main())
+    assert unconfirmed == (False, False, 2)
+    assert confirmed
+    assert cached == [("alice", "carol")] and locks == {}
@@ -0,0 +1,61 @@
+import asyncio
+import base64
+
+from fastapi import HTTPException
+
+import signing_service
+from executor import TaskExecutor
+from pqc_backend import get_backend
+from signing_service import SigningService
+
+
+def test_burst_is_signed_in_batches_with_one_key_lookup(monkeypatch):
+    keys = [get_backend().sign_keygen() for _ in range(2)]
+    lookups = []
+
+    def fake_lookup(address):
+        lookups.append(address)
+        public_key, secret_key = keys[int(address)]
+        return {"dilithium_pub": base64.b64encode(public_key).decode(), "dilithium_priv": base64.b64encode(secret_key).decode()}
+
+    monkeypatch.setattr(signing_service, "get_user_by_address", fake_lookup)
+
+    async def submit(service, address, text):
+        secret_key, public_key_b64 = await service.signer_keys(address)
+        return public_key_b64, text, await service.sign(secret_key, text)
+
+    async def main():
+        executor = TaskExecutor(cpu_workers=1)
+        executor.start()
+        service = SigningService(executor, batch_size=8)
+        try:
+            return await asyncio.gather(*(submit(service, str(i % 2), f"message {i}") for i in range(12))), service.stats()
+        finally:
+            await service.stop()
+            executor.shutdown()
+
+    results, stats = asyncio.run(main())
+    for public_key_b64, text, signature in results:
+        assert get_backend().verify(base64.b64decode(public_key_b64), text.encode(), signature)
+    assert sorted(lookups) == ["0", "1"]
+    assert stats["signed"] == 12 and stats["batches"] < 12
+
+
+def test_stop_fails_requests_being_signed():
+    secret_key = get_backend().sign_keygen()[1]
+
+    async def main():
+        executor = TaskExecutor(cpu_workers=1)
+        executor.start()
+        service = SigningService(executor, batch_size=2)
+        try:
+            requests = [asyncio.create_task(service.sign(secret_key, f"message {i}")) for i in range(4)]
+            # Let the first batch reach the pool before stopping
+            await asyncio.sleep(0.01)
+            await service.stop()
+            return await asyncio.wait_for(asyncio.gather(*requests, return_exceptions=True), 5)
+        finally:
+            executor.shutdown()
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, HTTPException) and r.status_code == 503 for r in results)
@@ -0,0 +1,82 @@
+import asyncio
+import base64
+import json
+import os
+import stat
+
+import pytest
+from fastapi import HTTPException
+
+from blockchain import Blockchain, create_transaction
+from pqc_backend import get_backend
+from state_client import StateClient
+from state_protocol import HEADER_SIZE
+from state_service import StateServer, StateService
+
+
+def register(address):
+    public_key, secret_key = get_backend().sign_keygen()
+    signature = get_backend().sign(secret_key, f"REGISTER:{address}".encode())
+    return create_transaction("REGISTER", address, "", {
+        "dilithium_pub": base64.b64encode(public_key).decode(),
+        "kyber_pub": "k" * 16,
+        "signature": base64.b64encode(signature).decode(),
+    })
+
+
+def run_against_server(registry, tmp_path, scenario):
+    async def main():
+        service = StateService(Blockchain(registry))
+        server = StateServer(service, str(tmp_path / "state.sock"))
+        await server.start()
+        client = StateClient(server.path)
+        try:
+            return await scenario(service, client)
+        finally:
+            await client.close()
+            await server.stop()
+    return asyncio.run(main())
+
+
+def test_worker_submits_transactions_and_mines_through_socket(registry, tmp_path, long_slots):
+    async def scenario(service, client):
+        tx = register("0xsender")
+        results = await asyncio.gather(client.add_transaction(tx), client.mempool(), client.add_transaction(tx))
+        mined = await client.mine_block(service.blockchain.next_leader())
+        chain = json.loads(await client.chain_json())["chain"]
+        return results, mined, chain, service.blockchain
+
+    (first, _, second), mined, chain, blockchain = run_against_server(registry, tmp_path, scenario)
+    assert sorted([first, second]) == [False, True]
+    assert mined["block"]["hash"] == blockchain.chain[-1].hash
+    assert [block["hash"] for block in chain] == [block.hash for block in blockchain.chain]
+
+
+def test_state_errors_reach_the_worker_as_http_errors(registry, tmp_path):
+    async def scenario(service, client):
+        with pytest.raises(HTTPException) as not_found:
+            await client.remove_validator("validator_999")
+        with pytest.raises(HTTPException) as no_node:
+            await client.peers()
+        return not_found.value.status_code, no_node.value.status_code, stat.S_IMODE(os.stat(client.path).st_mode)
+
+    assert run_against_server(registry, tmp_path, scenario) == (404, 503, 0o600)
+
+
+def test_malformed_reply_is_an_http_error(tmp_path):
+    async def empty_frame(reader, writer):
+        await reader.read(1)
+        writer.write(b"\x00" * HEADER_SIZE)
+        await writer.drain()
+
+    async def main():
+        server = await asyncio.start_unix_server(empty_frame, str(tmp_path / "state.sock"))
+        client = StateClient(str(tmp_path / "state.sock"))
+        try:
+            with pytest.raises(HTTPException) as error:
+                await client.mempool()
+            return error.value.status_code
+        finally:
+            server.close()
+
+    assert asyncio.run(main()) == 503
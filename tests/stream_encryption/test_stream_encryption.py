@@ -0,0 +1,38 @@
+import os
+
+import pytest
+
+from encryption import decrypt_stream, encrypt_stream, STREAM_HEADER_SIZE, STREAM_TAG_SIZE
+
+
+def pieces(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("length", [0, 1, 999, 1000, 1001, 25_000])
+def test_round_trip_regardless_of_piece_boundaries(length):
+    key = os.urandom(32)
+    data = os.urandom(length)
+
+    encrypted = b"".join(encrypt_stream(key, pieces(data, 777), chunk_size=1000))
+
+    chunks = max(1, -(-length // 1000))
+    assert len(encrypted) == STREAM_HEADER_SIZE + length + chunks * STREAM_TAG_SIZE
+    assert b"".join(decrypt_stream(key, pieces(encrypted, 333))) == data
+
+
+def test_reordered_truncated_and_extended_streams_are_rejected():
+    key = os.urandom(32)
+    encrypted = b"".join(encrypt_stream(key, [os.urandom(3500)], chunk_size=1000))
+    header, body = encrypted[:STREAM_HEADER_SIZE], encrypted[STREAM_HEADER_SIZE:]
+    sealed = pieces(body, 1000 + STREAM_TAG_SIZE)
+
+    tampered = [
+        header + sealed[1] + sealed[0] + sealed[2] + sealed[3],
+        header + b"".join(sealed[:3]),
+        encrypted + sealed[3],
+        encrypted[:-1],
+    ]
+    for stream in tampered:
+        with pytest.raises(ValueError):
+            b"".join(decrypt_stream(key, [stream]))
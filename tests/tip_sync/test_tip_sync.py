@@ -0,0 +1,127 @@
+import asyncio
+import base64
+
+import pytest
+
+from blockchain import Blockchain, create_transaction
+from connection_manager import PeerConnection
+from executor import get_executor
+from p2p_node import (
+    MessageTypesExtended,
+    P2PNode,
+    deserialize_get_blocks,
+    serialize_sync_block,
+    serialize_tip,
+)
+from pqc_backend import get_backend
+
+# These tests mine blocks right after picking the leader
+pytestmark = pytest.mark.usefixtures("long_slots")
+
+
+class ServingSocket:
+    """A remote peer that answers GET_BLOCKS from its own chain."""
+    def __init__(self, node: P2PNode, chain):
+        self.node = node
+        self.chain = chain
+        self.peer = None
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(message)
+        if message[0] == MessageTypesExtended.GET_BLOCKS:
+            start, count = deserialize_get_blocks(message)
+            asyncio.create_task(self.serve(start, count))
+
+    async def serve(self, start, count):
+        for block in self.chain[start:start + count]:
+            await self.node.receive(serialize_sync_block(block), self.peer)
+        await self.node.receive(serialize_sync_block(None), self.peer)
+
+    async def close(self):
+        pass
+
+
+def make_source(registry, blocks: int, prefix: str = "0xuser") -> Blockchain:
+    bc = Blockchain(registry)
+    for i in range(blocks):
+        public_key, secret_key = get_backend().sign_keygen()
+        signature = get_backend().sign(secret_key, f"REGISTER:{prefix}{i}".encode())
+        bc.add_transaction(create_transaction("REGISTER", f"{prefix}{i}", "", {
+            "dilithium_pub": base64.b64encode(public_key).decode(),
+            "kyber_pub": "k" * 16,
+            "signature": base64.b64encode(signature).decode(),
+        }))
+        bc.mine_block(bc.next_leader())
+    return bc
+
+
+@pytest.fixture
+def node(registry, tmp_path, monkeypatch):
+    (tmp_path / "run").mkdir()
+    monkeypatch.chdir(tmp_path / "run")
+    node = P2PNode("127.0.0.1", 18791)
+    node.blockchain = Blockchain(registry)
+    return node
+
+
+def connect(node: P2PNode, chain) -> ServingSocket:
+    socket = ServingSocket(node, chain)
+    socket.peer = PeerConnection(socket, ("127.0.0.1", 18792), inbound=False)
+    assert node.connections.register(socket.peer, b"\x77" * 32, 18792)
+    return socket
+
+
+def test_tip_ahead_of_us_triggers_get_blocks(registry, node):
+    source = make_source(registry, 3)
+    socket = connect(node, source.chain)
+
+    async def scenario():
+        await node.process_message(serialize_tip(source.chain[-1]), socket.peer)
+        for _ in range(200):
+            if len(node.blockchain.chain) == len(source.chain):
+                break
+            await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    requests = [m for m in socket.sent if m[0] == MessageTypesExtended.GET_BLOCKS]
+    assert len(requests) == 1
+    assert deserialize_get_blocks(requests[0])[0] == 1
+    assert [b.hash for b in node.blockchain.chain] == [b.hash for b in source.chain]
+    assert socket.peer.tip_height == 3
+
+
+def test_tip_at_our_height_starts_no_sync(node):
+    socket = connect(node, node.blockchain.chain)
+
+    async def scenario():
+        await node.process_message(serialize_tip(node.blockchain.chain[-1]), socket.peer)
+        await asyncio.sleep(0.05)
+
+    asyncio.run(scenario())
+    assert not [m for m in socket.sent if m[0] == MessageTypesExtended.GET_BLOCKS]
+    assert socket.peer.tip_height == 0
+
+
+def test_fork_is_resolved_with_paged_requests(registry, node, monkeypatch):
+    monkeypatch.setattr("sync_scheduler.P2P_SYNC_BATCH", 2)
+    source = make_source(registry, 6)
+    node.blockchain = make_source(registry, 3, prefix="0xother")
+    socket = connect(node, source.chain)
+
+    async def scenario():
+        await node.process_message(serialize_tip(source.chain[-1]), socket.peer)
+        for _ in range(500):
+            if node.blockchain.chain[-1].hash == source.chain[-1].hash:
+                break
+            await asyncio.sleep(0.01)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        get_executor().shutdown()
+    assert [b.hash for b in node.blockchain.chain] == [b.hash for b in source.chain]
+    # Every request asked for at most one page, never for the whole chain
+    requests = [deserialize_get_blocks(m) for m in socket.sent if m[0] == MessageTypesExtended.GET_BLOCKS]
+    assert all(count <= 2 for _, count in requests[1:])
+    assert requests[-1][0] + requests[-1][1] >= len(source.chain)
@@ -0,0 +1,120 @@
+import asyncio
+import base64
+
+import pytest
+from fastapi import HTTPException
+
+import local_database
+from blockchain import Blockchain, create_transaction
+from config import ADMIN_TOKEN_ENV
+from pqc_backend import get_backend
+from routes.validators_route import require_admin
+from state_service import StateService
+from validator_registry import ValidatorRegistry
+
+
+def register(address):
+    public_key, secret_key = get_backend().sign_keygen()
+    signature = get_backend().sign(secret_key, f"REGISTER:{address}".encode())
+    return create_transaction("REGISTER", address, "", {
+        "dilithium_pub": base64.b64encode(public_key).decode(),
+        "kyber_pub": "k" * 16,
+        "signature": base64.b64encode(signature).decode(),
+    })
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    # The database and the key files live under ../database relative to the working directory
+    (tmp_path / "run").mkdir()
+    monkeypatch.chdir(tmp_path / "run")
+    local_database.init_db()
+
+
+def test_add_and_remove_keep_the_key_history(database):
+    registry = ValidatorRegistry()
+    assert registry.validators == ["validator_001", "validator_002"]
+    old_key, _ = get_backend().sign_keygen()
+    new_key, _ = get_backend().sign_keygen()
+
+    registry.add("validator_003", old_key, height=5)
+    assert registry.add("validator_003", old_key, height=7).from_height == 5
+    registry.add("validator_003", new_key, height=9)
+    assert registry.public_key("validator_003", 4) is None
+    assert registry.public_key("validator_003", 8) == old_key
+    assert registry.public_key("validator_003", 9) == new_key
+
+    assert registry.remove("validator_003", height=12)
+    assert not registry.remove("validator_003", height=13)
+    assert "validator_003" not in registry.validators
+    assert registry.public_key("validator_003", 11) == new_key
+    assert not registry.is_validator("validator_003", 12)
+
+    # Re-adding without a key reuses the last one and leaves the closed ranges alone
+    registry.add("validator_003", None, height=20)
+    ranges = [(r.public_key, r.from_height, r.to_height) for r in registry.history["validator_003"]]
+    assert ranges == [(old_key, 5, 9), (new_key, 9, 12), (new_key, 20, None)]
+
+
+def test_reload_picks_up_the_stored_history(database):
+    registry = ValidatorRegistry()
+    key, _ = get_backend().sign_keygen()
+    registry.add("validator_003", key, height=3)
+    registry.remove("validator_001", height=4)
+    version = registry.version
+
+    reloaded = ValidatorRegistry()
+    assert reloaded.validators == ["validator_002", "validator_003"]
+    assert reloaded.validators_at(3) == ["validator_001", "validator_002", "validator_003"]
+    assert reloaded.public_key("validator_003", 3) == key
+
+    local_database.close_validator_key("validator_002", 6)
+    registry.reload()
+    assert registry.version > version
+    assert registry.validators == ["validator_003"]
+
+
+def test_rotated_key_keeps_old_blocks_valid(long_slots):
+    registry = ValidatorRegistry(persistent=False)
+    registry.create_missing_keys()
+    bc = Blockchain(registry)
+    assert bc.add_transaction(register("0xalice"))
+    block = bc.mine_block(bc.next_leader())
+    assert block is not None
+
+    new_key, _ = get_backend().sign_keygen()
+    registry.add(block.validator, new_key, height=len(bc.chain))
+    assert registry.public_key(block.validator) == new_key
+    assert registry.verify_block(block)
+    assert Blockchain(registry).validate_chain(bc.chain)
+
+
+def test_validator_changes_require_the_admin_token(monkeypatch):
+    monkeypatch.delenv(ADMIN_TOKEN_ENV, raising=False)
+    with pytest.raises(HTTPException) as disabled:
+        require_admin("anything")
+    assert disabled.value.status_code == 503
+
+    monkeypatch.setenv(ADMIN_TOKEN_ENV, "secret")
+    for token in (None, "wrong"):
+        with pytest.raises(HTTPException) as rejected:
+            require_admin(token)
+        assert rejected.value.status_code == 401
+    require_admin("secret")
+
+
+def test_validator_changes_run_in_the_executor():
+    registry = ValidatorRegistry(persistent=False)
+    service = StateService(Blockchain(registry), dev_validator_keys=True)
+
+    async def scenario():
+        added = await service.add_validator("validator_003")
+        removed = await service.remove_validator("validator_003")
+        await service.reload_validators()
+        return added, removed
+
+    added, removed = asyncio.run(scenario())
+    assert added["validator"]["public_key"] and "validator_003" not in removed["active"]
+    assert registry.history["validator_003"][-1].public_key is not None
+    operations = service.executor.stats()["operations"]
+    assert {"validator_add", "validator_keygen", "validator_store_keys", "validator_remove", "validator_reload"} <= set(operations)